@@ -1,19 +1,52 @@
+import startup  # first, so the import phase covers everything below
+import logging
 import os
-import json
+import re
+import threading
+import time
+import mimetypes
 from datetime import datetime, timedelta, date
 from contextlib import asynccontextmanager
 from typing import List, Optional
 from pathlib import Path
-from fastapi import FastAPI, HTTPException, Depends, Query
+from fastapi import FastAPI, HTTPException, Depends, Query, Header, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, PlainTextResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from sqlmodel import Session, SQLModel, select, create_engine, func
-from apscheduler.schedulers.background import BackgroundScheduler
 from pydantic import BaseModel
-import requests
 
-from models import HSEProgram, PROGRAM_TYPES
+from models import Attachment, HSEProgram, PROGRAM_TYPES
+from sync import change_log, collapse_changes
+from progress import calculate_progress, calculate_progress_asia, calculate_matrix_progress
+from store import (DATA_DIR, document_lock, locked_documents, read_json, write_json, write_json_batch, bump_version,
+                   parse_if_match, etag, files_signature, document_exists, overlay_views)
+from bases import BASES_FILE, get_base_registry, get_bases, get_base_name, load_all
+from singleflight import flights
+from search import search_index, program_fields
+from people import people_index, month_items, is_open_status
+from overdue import exception_tracker
+from projection import Projection
+from ics import calendar_feeds
+from overlay import DELETE, merge_overlays, repack_grown
+from kpi import kpi_rollups
+import assets
+import archive
+import attachments
+import export
+import importer
+from compress import CompressionMiddleware, Snapshot, etag_matches, response_cache
+import logs
+import metrics
+import outbox
+import profiler
+from sqlalchemy import event
+
+logs.setup()
+log = logs.get_logger("app")
+email_log = logs.get_logger("email")
+reminder_log = logs.get_logger("reminders")
 
 # Configuration
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./hse_management.db")
@@ -25,8 +58,30 @@ SENDER_NAME = "HSE Management System"
 
 engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
 
-# Global scheduler reference
-scheduler = BackgroundScheduler()
+# SQL statement timings for /metrics, labelled by verb and table (e.g. "SELECT hseprogram")
+_SQL_TABLE_RE = re.compile(r"\b(?:FROM|INTO|UPDATE|TABLE)\s+\"?(\w+)", re.IGNORECASE)
+
+
+@event.listens_for(engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+@event.listens_for(engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_start"].pop()
+    verb = statement.lstrip().split(" ", 1)[0].upper()
+    table = _SQL_TABLE_RE.search(statement)
+    label = f"{verb} {table.group(1).lower()}" if table else verb
+    metrics.db_query_duration.observe(elapsed, statement=label)
+
+# Global scheduler reference; created by start_scheduler() after startup
+# so APScheduler is not imported on the critical path
+scheduler = None
+SCHEDULER_START_DELAY = float(os.getenv("HSE_SCHEDULER_DELAY", "10"))
+
+# Email delivery thread; started in lifespan
+outbox_worker = None
 
 
 def get_session():
@@ -34,6 +89,16 @@ def get_session():
         yield session
 
 
+def check_if_match(if_match: Optional[str], current_version: int, what: str):
+    """Raise 412 if an If-Match precondition does not match the current version."""
+    expected = parse_if_match(if_match)
+    if expected is not None and current_version not in expected:
+        raise HTTPException(
+            status_code=412,
+            detail=f"{what} was modified by another user (current version {current_version})"
+        )
+
+
 # Pydantic models for request bodies
 class ProgramUpdate(BaseModel):
     actual_date: datetime
@@ -78,8 +143,21 @@ class ProgramFullUpdate(BaseModel):
     manager_email: Optional[str] = None
 
 
-def check_and_send_reminders():
-    """Check for upcoming programs and send reminder emails."""
+def queue_reminders(messages: list, source: str, dedupe: bool = True) -> int:
+    """Put reminder emails in the outbox in one transaction; returns how many were queued.
+
+    Each message's dedupe_key (one per reminder, recipient and day) keeps a
+    second run on the same day from queueing it again; dedupe=False skips
+    that check.
+    """
+    if not dedupe:
+        messages = [dict(m, dedupe_key=None) for m in messages]
+    return outbox.enqueue(engine, messages, source=source)
+
+
+def check_and_send_reminders(dedupe: bool = True):
+    """Check for upcoming programs and queue reminder emails."""
+    messages = []
     with Session(engine) as session:
         today = date.today()
 
@@ -92,12 +170,14 @@ def check_and_send_reminders():
         programs_1m = session.exec(stmt1).all()
 
         for prog in programs_1m:
-            send_email(
-                prog.manager_email,
-                f"Upcoming HSE Program: {prog.title} due in 1 Month",
-                f"Reminder: The HSE program '{prog.title}' is scheduled for {prog.planned_date.strftime('%Y-%m-%d')}."
-            )
-            print(f"[REMINDER] Sent 1-month warning for: {prog.title}")
+            messages.append({
+                "to_email": prog.manager_email,
+                "subject": f"Upcoming HSE Program: {prog.title} due in 1 Month",
+                "html_body": f"Reminder: The HSE program '{prog.title}' is scheduled for {prog.planned_date.strftime('%Y-%m-%d')}.",
+                "dedupe_key": f"hse-1m:{today}:{prog.id}:{prog.manager_email}",
+            })
+            reminder_log.info("Queued 1-month warning for: %s", prog.title,
+                              extra={"event": "reminder.queued", "kind": "1-month", "program_id": prog.id})
 
         # Logic 2: 2 Weeks Urgent Warning (exactly 14 days and not completed)
         two_weeks_date = today + timedelta(days=14)
@@ -109,12 +189,16 @@ def check_and_send_reminders():
         programs_2w = session.exec(stmt2).all()
 
         for prog in programs_2w:
-            send_email(
-                prog.manager_email,
-                f"URGENT: HSE Program {prog.title} due in 2 Weeks!",
-                f"URGENT: The HSE program '{prog.title}' is due on {prog.planned_date.strftime('%Y-%m-%d')} and is still pending."
-            )
-            print(f"[URGENT] Sent 2-week warning for: {prog.title}")
+            messages.append({
+                "to_email": prog.manager_email,
+                "subject": f"URGENT: HSE Program {prog.title} due in 2 Weeks!",
+                "html_body": f"URGENT: The HSE program '{prog.title}' is due on {prog.planned_date.strftime('%Y-%m-%d')} and is still pending.",
+                "dedupe_key": f"hse-2w:{today}:{prog.id}:{prog.manager_email}",
+            })
+            reminder_log.info("Queued 2-week warning for: %s", prog.title,
+                              extra={"event": "reminder.queued", "kind": "2-week", "program_id": prog.id})
+
+    return queue_reminders(messages, "daily_reminder_check", dedupe)
 
 
 def generate_reminder_email_html(days_remaining: int, program_name: str, source: str, plan_date: str, month: str, pic_name: str) -> str:
@@ -164,15 +248,27 @@ def generate_reminder_email_html(days_remaining: int, program_name: str, source:
 
 def send_email(to_email: str, subject: str, html_body: str):
     """Send email using Brevo HTTP API (not SMTP - port 443 works on HuggingFace)."""
+    return deliver_email(to_email, subject, html_body)[0] == "sent"
+
+
+def deliver_email(to_email: str, subject: str, html_body: str) -> tuple:
+    """Send one email; returns (outcome, detail) with outcome sent, skipped, rejected or error."""
     if not to_email or not to_email.strip():
-        print(f"[EMAIL SKIPPED] No email address provided for: {subject}")
-        return False
+        email_log.info("Skipped, no email address: %s", subject, extra={"event": "email.skipped"})
+        metrics.emails_total.inc(outcome="skipped")
+        return "skipped", "no email address"
         
     if not BREVO_API_KEY:
-        print(f"[EMAIL SKIPPED] No API key configured. Would send to {to_email}: {subject}")
-        return False
+        email_log.info("Skipped, no API key configured. Would send to %s: %s", to_email, subject,
+                       extra={"event": "email.skipped", "to": to_email})
+        metrics.emails_total.inc(outcome="skipped")
+        return "skipped", "no API key configured"
 
+    start = time.perf_counter()
+    outcome = "error"
     try:
+        import requests  # deferred: only needed once an email is actually sent
+
         url = "https://api.brevo.com/v3/smtp/email"
         headers = {
             "accept": "application/json",
@@ -189,47 +285,51 @@ def send_email(to_email: str, subject: str, html_body: str):
         response = requests.post(url, json=payload, headers=headers, timeout=30)
         
         if response.status_code in [200, 201]:
-            print(f"[EMAIL SENT] To: {to_email}, Subject: {subject}")
-            return True
+            email_log.info("Sent to %s: %s", to_email, subject, extra={"event": "email.sent", "to": to_email})
+            outcome = "sent"
+            return outcome, ""
         else:
-            print(f"[EMAIL ERROR] API returned {response.status_code}: {response.text}")
-            return False
+            email_log.error("API returned %s: %s", response.status_code, response.text,
+                            extra={"event": "email.rejected", "to": to_email})
+            outcome = "rejected"
+            return outcome, f"HTTP {response.status_code}: {response.text[:500]}"
     except Exception as e:
-        print(f"[EMAIL ERROR] Failed to send to {to_email}: {e}")
-        return False
+        email_log.error("Failed to send to %s: %s", to_email, e, extra={"event": "email.error", "to": to_email})
+        return outcome, str(e)
+    finally:
+        metrics.email_send_duration.observe(time.perf_counter() - start, outcome=outcome)
+        metrics.emails_total.inc(outcome=outcome)
 
 
-def check_otp_matrix_reminders():
-    """Check OTP and Matrix data for upcoming plan_dates and send reminders."""
+def check_otp_matrix_reminders(dedupe: bool = True):
+    """Check OTP and Matrix data for upcoming plan_dates and queue reminders."""
     today = date.today()
     
-    data_dir = Path(__file__).parent / "data"
-    reminders_sent = 0
+    data_dir = DATA_DIR
+    messages = []
     
     # Define all data sources to check
     otp_files = [
-        ("OTP Indonesia (Narogong)", "otp_indonesia_narogong.json"),
-        ("OTP Indonesia (Duri)", "otp_indonesia_duri.json"),
-        ("OTP Indonesia (Balikpapan)", "otp_indonesia_balikpapan.json"),
-        ("OTP Asia", "otp_asia_data.json"),
+        (f"OTP Indonesia ({get_base_name(base)})", f"otp_indonesia_{base}.json")
+        for base in get_bases()
     ]
+    otp_files.append(("OTP Asia", "otp_asia_data.json"))
     
     matrix_categories = ["audit", "training", "drill", "meeting"]
     matrix_files = []
     for cat in matrix_categories:
-        for base in ["narogong", "duri", "balikpapan"]:
-            matrix_files.append((f"Matrix {cat.title()} ({base.title()})", f"matrix_{cat}_indonesia_{base}.json"))
+        for base in get_bases():
+            matrix_files.append((f"Matrix {cat.title()} ({get_base_name(base)})", f"matrix_{cat}_indonesia_{base}.json"))
     
     all_files = otp_files + matrix_files
     
     for source_name, filename in all_files:
         file_path = data_dir / filename
-        if not file_path.exists():
+        if not document_exists(file_path):
             continue
             
         try:
-            with open(file_path, 'r') as f:
-                data = json.load(f)
+            data = read_json(file_path, dict)
                 
             for prog in data.get("programs", []):
                 program_name = prog.get("name", "Unknown Program")
@@ -270,28 +370,31 @@ def check_otp_matrix_reminders():
                             month=month_key,
                             pic_name=pic_name
                         )
+                        reminder_key = f"otp-matrix:{today}:{filename}:{prog.get('id')}:{month_key}"
                         
                         # Send to PIC
                         if pic_email:
-                            if send_email(pic_email, subject, html_body):
-                                reminders_sent += 1
+                            messages.append({"to_email": pic_email, "subject": subject, "html_body": html_body,
+                                             "dedupe_key": f"{reminder_key}:{pic_email}"})
                         
                         # Send to PIC Manager
                         if pic_manager_email and pic_manager_email != pic_email:
-                            if send_email(pic_manager_email, f"[Manager Copy] {subject}", html_body):
-                                reminders_sent += 1
+                            messages.append({"to_email": pic_manager_email, "subject": f"[Manager Copy] {subject}",
+                                             "html_body": html_body, "dedupe_key": f"{reminder_key}:{pic_manager_email}"})
                                 
-        except Exception as e:
-            print(f"[REMINDER ERROR] Failed to process {filename}: {e}")
+        except Exception:
+            reminder_log.exception("Failed to process %s", filename, extra={"event": "reminder.error"})
     
-    print(f"[REMINDER CHECK] Completed. Sent {reminders_sent} reminder emails.")
+    reminders_sent = queue_reminders(messages, "daily_otp_matrix_reminder_check", dedupe)
+    reminder_log.info("OTP/Matrix check completed. Queued %d reminder emails.", reminders_sent,
+                      extra={"event": "reminder.check", "sent": reminders_sent})
     return reminders_sent
 
 
-def check_task_reminders():
-    """Check tasks for upcoming implementation dates and send reminders."""
+def check_task_reminders(dedupe: bool = True):
+    """Check tasks for upcoming implementation dates and queue reminders."""
     today = date.today()
-    reminders_sent = 0
+    messages = []
     
     for task in tasks_storage:
         impl_date_str = task.get("implementation_date", "")
@@ -332,49 +435,169 @@ def check_task_reminders():
                 pic_name=pic_name
             )
             
-            if send_email(pic_email, subject, html_body):
-                reminders_sent += 1
+            messages.append({"to_email": pic_email, "subject": subject, "html_body": html_body,
+                             "dedupe_key": f"task:{today}:{task['id']}:{pic_email}"})
     
-    print(f"[TASK REMINDER CHECK] Completed. Sent {reminders_sent} task reminder emails.")
+    reminders_sent = queue_reminders(messages, "daily_task_reminder_check", dedupe)
+    reminder_log.info("Task check completed. Queued %d task reminder emails.", reminders_sent,
+                      extra={"event": "reminder.check", "sent": reminders_sent})
     return reminders_sent
 
 
+SCHEDULED_JOBS = {
+    "daily_reminder_check": check_and_send_reminders,
+    "daily_otp_matrix_reminder_check": check_otp_matrix_reminders,
+    "daily_task_reminder_check": check_task_reminders,
+}
+
+
+# job id -> (hour, minute, executor). Jobs that only read the data files or
+# the database run in a worker process ("processpool") so a slow email run
+# does not compete with requests; jobs that use this process's in-memory
+# state (the task list, the overdue tracker) stay on the thread executor.
+JOB_SCHEDULE = {
+    "daily_reminder_check": (8, 0, "processpool"),
+    "daily_otp_matrix_reminder_check": (8, 5, "processpool"),
+    "daily_task_reminder_check": (8, 10, "default"),
+    "daily_attachment_gc": (3, 0, "processpool"),
+    "daily_exception_rollover": (0, 1, "default"),
+}
+JOBSTORE_URL = os.getenv("HSE_JOBSTORE_URL", f"sqlite:///{DATA_DIR / 'jobs.sqlite'}")
+JOB_PROCESSES = int(os.getenv("HSE_JOB_PROCESSES", "1"))
+JOB_OPTIONS = {
+    # A run missed while the server was down still happens on restart if
+    # it is less than this late; several missed runs collapse into one
+    "misfire_grace_time": int(os.getenv("HSE_JOB_MISFIRE_GRACE", str(6 * 3600))),
+    "coalesce": True,
+    "max_instances": 1,
+}
+
+# job id -> last run (outcome, duration, ...), shown at /admin/jobs
+job_history = {}
+
+
+def run_scheduled_job(job_id: str) -> dict:
+    """Run a scheduled job by id and return its outcome and duration.
+
+    May run in a scheduler worker process, so metrics are recorded from the
+    returned summary by ``record_job_event`` in the API process.
+    """
+    start = time.perf_counter()
+    token = logs.request_id.set(f"{job_id}:{logs.new_id()}")
+    try:
+        result = SCHEDULED_JOBS[job_id]()
+        return {"outcome": "success", "duration": time.perf_counter() - start, "result": result}
+    except Exception as e:
+        log.exception("Job %s failed", job_id, extra={"event": "job.error", "job": job_id})
+        return {"outcome": "error", "duration": time.perf_counter() - start, "error": str(e)}
+    finally:
+        logs.request_id.reset(token)
+
+
+def record_job_event(event):
+    """Scheduler listener: job metrics and the history behind /admin/jobs."""
+    from apscheduler.events import EVENT_JOB_EXECUTED, EVENT_JOB_MISSED, EVENT_JOB_MAX_INSTANCES
+
+    summary = {"at": datetime.now().isoformat(timespec="seconds"),
+               "scheduled_for": event.scheduled_run_time.isoformat(timespec="seconds")}
+    if event.code == EVENT_JOB_EXECUTED and isinstance(event.retval, dict):
+        summary.update(outcome=event.retval["outcome"], duration=round(event.retval["duration"], 4))
+        if "error" in event.retval:
+            summary["error"] = event.retval["error"]
+        metrics.job_duration.observe(event.retval["duration"], job=event.job_id)
+    elif event.code == EVENT_JOB_MISSED:
+        summary["outcome"] = "missed"
+    elif event.code == EVENT_JOB_MAX_INSTANCES:
+        summary["outcome"] = "skipped"
+    else:
+        summary.update(outcome="error", error=str(getattr(event, "exception", "")))
+    metrics.job_runs_total.inc(job=event.job_id, outcome=summary["outcome"])
+    entry = job_history.setdefault(event.job_id, {"runs": 0})
+    entry["runs"] += 1
+    entry["last"] = summary
+    if summary["outcome"] == "success":
+        entry["last_success"] = summary
+    level = logging.INFO if summary["outcome"] == "success" else logging.WARNING
+    log.log(level, "Job %s: %s", event.job_id, summary["outcome"], extra=dict(summary, event="job.run", job=event.job_id))
+
+
+def start_scheduler():
+    """Import APScheduler, register the daily jobs and start them.
+
+    Jobs live in a persistent SQLite job store, so a run due while the
+    server was restarting is still made (within the misfire grace time)
+    instead of being skipped.
+    """
+    global scheduler
+    with startup.phase("scheduler"):
+        from apscheduler.events import EVENT_JOB_EXECUTED, EVENT_JOB_ERROR, EVENT_JOB_MISSED, EVENT_JOB_MAX_INSTANCES
+        from apscheduler.executors.pool import ProcessPoolExecutor, ThreadPoolExecutor
+        from apscheduler.jobstores.sqlalchemy import SQLAlchemyJobStore
+        from apscheduler.schedulers.background import BackgroundScheduler
+        from apscheduler.triggers.cron import CronTrigger
+
+        scheduler = BackgroundScheduler(
+            jobstores={"default": SQLAlchemyJobStore(url=JOBSTORE_URL)},
+            executors={"default": ThreadPoolExecutor(4), "processpool": ProcessPoolExecutor(JOB_PROCESSES)},
+            job_defaults=JOB_OPTIONS,
+        )
+        scheduler.add_listener(record_job_event,
+                               EVENT_JOB_EXECUTED | EVENT_JOB_ERROR | EVENT_JOB_MISSED | EVENT_JOB_MAX_INSTANCES)
+        # Paused until the stored jobs are reconciled with JOB_SCHEDULE
+        scheduler.start(paused=True)
+        for job in scheduler.get_jobs():
+            if job.id not in JOB_SCHEDULE:
+                scheduler.remove_job(job.id)
+        for job_id, (hour, minute, executor) in JOB_SCHEDULE.items():
+            trigger = CronTrigger(hour=hour, minute=minute)
+            options = dict(JOB_OPTIONS, func=run_scheduled_job, args=[job_id], executor=executor, name=job_id)
+            job = scheduler.get_job(job_id)
+            if job is None:
+                scheduler.add_job(trigger=trigger, id=job_id, **options)
+                continue
+            # Keep the stored next run time, so a missed run is still detected
+            scheduler.modify_job(job_id, **options)
+            if str(job.trigger) != str(trigger):
+                scheduler.reschedule_job(job_id, trigger=trigger)
+        scheduler.resume()
+    log.info("Scheduler started - daily checks at 08:00 (HSE), 08:05 (OTP/Matrix), 08:10 (Tasks)")
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Lifespan context manager for startup and shutdown events."""
     # Startup
-    SQLModel.metadata.create_all(engine)
-    print("[STARTUP] Database tables created")
-
-    scheduler.add_job(
-        check_and_send_reminders,
-        'cron',
-        hour=8,
-        minute=0,
-        id='daily_reminder_check'
-    )
-    scheduler.add_job(
-        check_otp_matrix_reminders,
-        'cron',
-        hour=8,
-        minute=5,
-        id='daily_otp_matrix_reminder_check'
-    )
-    scheduler.add_job(
-        check_task_reminders,
-        'cron',
-        hour=8,
-        minute=10,
-        id='daily_task_reminder_check'
-    )
-    scheduler.start()
-    print("[STARTUP] Scheduler started - daily checks at 08:00 (HSE), 08:05 (OTP/Matrix), 08:10 (Tasks)")
+    with startup.phase("database"):
+        SQLModel.metadata.create_all(engine)
+    log.info("Database tables created")
+
+    # Delivers what the reminder jobs queue in the outbox
+    global outbox_worker
+    outbox_worker = outbox.OutboxWorker(engine, deliver_email)
+    outbox_worker.start()
+
+    # The reminder jobs run at 08:00, so starting the scheduler a few
+    # seconds late costs nothing and keeps it off the critical path
+    scheduler_timer = threading.Timer(SCHEDULER_START_DELAY, start_scheduler)
+    scheduler_timer.daemon = True
+    scheduler_timer.start()
+
+    # Split and compress the frontend in the background (brotli at max
+    # quality takes about a second); a request arriving first waits for it
+    threading.Thread(target=assets.get_bundle, name="assets", daemon=True).start()
+
+    startup.mark("ready")
+    startup.start_warm_up()
+    log.info("Ready: %s", startup.summary(), extra={"event": "startup.ready"})
 
     yield
 
     # Shutdown
-    scheduler.shutdown()
-    print("[SHUTDOWN] Scheduler stopped")
+    scheduler_timer.cancel()
+    if scheduler is not None:
+        scheduler.shutdown()
+        log.info("Scheduler stopped")
+    outbox_worker.stop()
 
 
 app = FastAPI(
@@ -384,6 +607,22 @@ app = FastAPI(
     lifespan=lifespan
 )
 
+# Negotiated zstd/br/gzip for API responses over HSE_COMPRESS_MIN_BYTES
+app.add_middleware(CompressionMiddleware)
+
+# Request latency / in-flight metrics for /metrics
+app.add_middleware(metrics.MetricsMiddleware)
+
+# Time to first byte for the startup report
+app.add_middleware(startup.FirstByteMiddleware)
+
+# Correlation id for log records (X-Request-ID)
+app.add_middleware(logs.CorrelationMiddleware)
+
+# Opt-in request profiler (HSE_PROFILE=1); not installed otherwise
+if profiler.PROFILE_ENABLED:
+    app.add_middleware(profiler.ProfilerMiddleware)
+
 # Add CORS middleware for frontend access
 app.add_middleware(
     CORSMiddleware,
@@ -399,87 +638,201 @@ if static_dir.exists():
     app.mount("/static", StaticFiles(directory=str(static_dir)), name="static")
 
 
+def serve_asset(asset: "assets.Asset", request: Request) -> Response:
+    """Send the best precompressed representation, or 304 if the client has it."""
+    encoding = assets.negotiate(request.headers.get("accept-encoding"), asset.encodings)
+    headers = {
+        "ETag": asset.etag(encoding),
+        "Cache-Control": asset.cache_control,
+        "Vary": "Accept-Encoding",
+    }
+    if etag_matches(request.headers.get("if-none-match"), asset.etags()):
+        return Response(status_code=304, headers=headers)
+    if encoding != "identity":
+        headers["Content-Encoding"] = encoding
+    return Response(asset.encodings[encoding], media_type=asset.content_type, headers=headers)
+
+
 @app.get("/")
-def root():
-    """Serve the main HTML page."""
-    index_path = Path(__file__).parent / "static" / "index.html"
-    if index_path.exists():
-        return FileResponse(str(index_path))
+def root(request: Request):
+    """Serve the main HTML page (shell + fingerprinted CSS/JS bundles)."""
+    bundle = assets.get_bundle()
+    if bundle is not None:
+        return serve_asset(bundle.index, request)
     return {"status": "healthy", "service": "HSE Plan Management System", "version": "2.0.0"}
 
 
+@app.get("/assets/{name}")
+def get_asset(name: str, request: Request):
+    """Serve a fingerprinted frontend bundle (cached by browsers for a year)."""
+    bundle = assets.get_bundle()
+    asset = bundle.assets.get(name) if bundle is not None else None
+    if asset is None:
+        raise HTTPException(status_code=404, detail="Asset not found")
+    return serve_asset(asset, request)
+
+
 @app.post("/test-reminders")
 def test_reminders():
-    """Manually trigger all reminder checks for testing."""
-    otp_matrix_sent = check_otp_matrix_reminders()
-    task_sent = check_task_reminders()
+    """Manually trigger all reminder checks for testing (queued even if already sent today)."""
+    otp_matrix_sent = check_otp_matrix_reminders(dedupe=False)
+    task_sent = check_task_reminders(dedupe=False)
     total_sent = otp_matrix_sent + task_sent
     return {
         "status": "completed",
         "otp_matrix_reminders": otp_matrix_sent,
         "task_reminders": task_sent,
         "total_sent": total_sent,
-        "message": f"Sent {total_sent} reminder emails (OTP/Matrix: {otp_matrix_sent}, Tasks: {task_sent})"
+        "message": f"Queued {total_sent} reminder emails (OTP/Matrix: {otp_matrix_sent}, Tasks: {task_sent})"
     }
 
 
+@app.get("/health")
+def health():
+    """Readiness probe; answers as soon as the server is up, before warm-up."""
+    return {"status": "ok", "warmup": startup.warmup_state["status"]}
+
+
+@app.get("/admin/startup")
+def startup_report():
+    """Startup phase timings (seconds since process start) and warm-up results."""
+    return dict(startup.report(), scheduler_running=bool(scheduler and scheduler.running))
+
+
+@app.get("/admin/jobs")
+def list_jobs():
+    """Scheduled jobs: next run time, executor, misfire settings and the last run."""
+    running = bool(scheduler and scheduler.running)
+    jobs = []
+    for job_id, (hour, minute, executor) in JOB_SCHEDULE.items():
+        job = scheduler.get_job(job_id) if running else None
+        next_run = job.next_run_time if job else None
+        jobs.append({
+            "id": job_id,
+            "schedule": f"daily {hour:02d}:{minute:02d}",
+            "executor": job.executor if job else executor,
+            "next_run_time": next_run.isoformat() if next_run else None,
+            "misfire_grace_time": job.misfire_grace_time if job else JOB_OPTIONS["misfire_grace_time"],
+            "coalesce": job.coalesce if job else JOB_OPTIONS["coalesce"],
+            "max_instances": job.max_instances if job else JOB_OPTIONS["max_instances"],
+            **job_history.get(job_id, {"runs": 0}),
+        })
+    return {"running": running, "jobstore": JOBSTORE_URL.split("///")[-1] if JOBSTORE_URL.startswith("sqlite") else "external",
+            "jobs": jobs}
+
+
+@app.get("/admin/outbox")
+def outbox_status():
+    """Email outbox: queue depth, delivery latency and dead letters."""
+    return dict(outbox.stats(engine), worker_running=bool(outbox_worker and outbox_worker.running),
+                last_drain=outbox_worker.last_drain.isoformat() if outbox_worker and outbox_worker.last_drain else None)
+
+
+@app.post("/admin/outbox/{message_id}/retry")
+def retry_outbox_message(message_id: int):
+    """Requeue a dead or skipped message with a fresh set of attempts."""
+    message = outbox.requeue(engine, message_id)
+    if message is None:
+        raise HTTPException(status_code=404, detail="Message not found")
+    return {"id": message.id, "status": message.status, "to_email": message.to_email}
+
+
 @app.get("/program-types")
 def get_program_types():
     """Get available program types."""
     return PROGRAM_TYPES
 
 
+@app.get("/metrics", response_class=PlainTextResponse)
+def get_metrics():
+    """Prometheus metrics: request, store, SQLite, email and scheduler timings."""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/admin/profiles")
+def list_request_profiles():
+    """List recent request profiles written by the opt-in profiler."""
+    return {
+        "enabled": profiler.PROFILE_ENABLED,
+        "sample_rate": profiler.PROFILE_SAMPLE_RATE,
+        "directory": str(profiler.PROFILE_DIR),
+        "profiles": profiler.list_profiles(),
+    }
+
+
+@app.get("/admin/profiles/{filename}")
+def download_request_profile(filename: str):
+    """Download a profile file (open .speedscope.json at https://speedscope.app)."""
+    path = profiler.PROFILE_DIR / filename
+    if "/" in filename or "\\" in filename or not path.is_file():
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(str(path))
+
+
+@app.get("/bases")
+def list_bases():
+    """Get the configured Indonesian bases (sites)."""
+    return {"bases": get_base_registry()}
+
+
 @app.get("/statistics")
-def get_statistics(session: Session = Depends(get_session)):
+def get_statistics():
     """Get dashboard statistics."""
-    total_programs = session.exec(select(func.count(HSEProgram.id))).one()
-    completed = session.exec(
-        select(func.count(HSEProgram.id)).where(HSEProgram.status == "Closed")
-    ).one()
-    pending = session.exec(
-        select(func.count(HSEProgram.id)).where(HSEProgram.status != "Closed")
-    ).one()
-    
-    now = datetime.now()
-    first_of_month = datetime(now.year, now.month, 1)
-    if now.month == 12:
-        first_of_next = datetime(now.year + 1, 1, 1)
-    else:
-        first_of_next = datetime(now.year, now.month + 1, 1)
-    
-    this_month = session.exec(
-        select(func.count(HSEProgram.id)).where(
-            HSEProgram.planned_date >= first_of_month,
-            HSEProgram.planned_date < first_of_next
-        )
-    ).one()
-    
-    upcoming = session.exec(
-        select(func.count(HSEProgram.id)).where(
-            HSEProgram.planned_date >= datetime.now(),
-            HSEProgram.planned_date <= datetime.now() + timedelta(days=30),
-            HSEProgram.status != "Closed"
-        )
-    ).one()
-    
-    by_type = {}
-    for ptype in PROGRAM_TYPES.keys():
-        count = session.exec(
-            select(func.count(HSEProgram.id)).where(HSEProgram.program_type == ptype)
+    # Concurrent identical requests share one set of queries
+    return flights.do(("statistics",), build_statistics)
+
+
+def build_statistics():
+    """Count programs by status, period and type."""
+    with Session(engine) as session:
+        total_programs = session.exec(select(func.count(HSEProgram.id))).one()
+        completed = session.exec(
+            select(func.count(HSEProgram.id)).where(HSEProgram.status == "Closed")
         ).one()
-        by_type[ptype] = count
-    
-    completion_rate = (completed / total_programs * 100) if total_programs > 0 else 0.0
-    
-    return {
-        "total_programs": total_programs,
-        "completed": completed,
-        "pending": pending,
-        "this_month": this_month,
-        "upcoming": upcoming,
-        "completion_rate": round(completion_rate, 1),
-        "by_type": by_type,
-    }
+        pending = session.exec(
+            select(func.count(HSEProgram.id)).where(HSEProgram.status != "Closed")
+        ).one()
+        
+        now = datetime.now()
+        first_of_month = datetime(now.year, now.month, 1)
+        if now.month == 12:
+            first_of_next = datetime(now.year + 1, 1, 1)
+        else:
+            first_of_next = datetime(now.year, now.month + 1, 1)
+        
+        this_month = session.exec(
+            select(func.count(HSEProgram.id)).where(
+                HSEProgram.planned_date >= first_of_month,
+                HSEProgram.planned_date < first_of_next
+            )
+        ).one()
+        
+        upcoming = session.exec(
+            select(func.count(HSEProgram.id)).where(
+                HSEProgram.planned_date >= datetime.now(),
+                HSEProgram.planned_date <= datetime.now() + timedelta(days=30),
+                HSEProgram.status != "Closed"
+            )
+        ).one()
+        
+        by_type = {}
+        for ptype in PROGRAM_TYPES.keys():
+            count = session.exec(
+                select(func.count(HSEProgram.id)).where(HSEProgram.program_type == ptype)
+            ).one()
+            by_type[ptype] = count
+        
+        completion_rate = (completed / total_programs * 100) if total_programs > 0 else 0.0
+        
+        return {
+            "total_programs": total_programs,
+            "completed": completed,
+            "pending": pending,
+            "this_month": this_month,
+            "upcoming": upcoming,
+            "completion_rate": round(completion_rate, 1),
+            "by_type": by_type,
+        }
 
 
 @app.get("/programs", response_model=List[HSEProgram])
@@ -630,6 +983,7 @@ def create_task(task: TaskCreate):
     }
     tasks_storage.append(new_task)
     task_id_counter += 1
+    reindex_task(new_task)
     return new_task
 
 
@@ -647,6 +1001,7 @@ def update_task(task_id: str, task_update: TaskUpdate):
                 task["status"] = task_update.status
             if task_update.wpts_id is not None:
                 task["wpts_id"] = task_update.wpts_id
+            reindex_task(task)
             return task
     raise HTTPException(status_code=404, detail="Task not found")
 
@@ -672,13 +1027,33 @@ def get_schedules(session: Session = Depends(get_session)):
 
 # ===== CALENDAR EVENTS API =====
 @app.get("/calendar-events")
-def get_calendar_events():
+def get_calendar_events(request: Request):
     """Get all calendar events from OTP and Matrix screens for calendar display."""
+    # Served from the precompressed cache until any source file changes;
+    # concurrent identical rebuilds share one build
+    return response_cache.respond(request, ("calendar-events",), files_signature(calendar_source_files()),
+                                  flights.do, ("calendar-events",), calendar_events_snapshot)
+
+
+def calendar_events_snapshot():
+    # Signature first: the build is shared with requests that arrive later
+    return Snapshot(files_signature(calendar_source_files()), build_calendar_events())
+
+
+def calendar_source_files():
+    bases = get_bases()
+    return ([BASES_FILE, OTP_ASIA_DATA_FILE] + [get_otp_file_path(b) for b in bases] +
+            [get_matrix_file_path(c, "indonesia", b) for c in ["audit", "training", "drill", "meeting"] for b in bases])
+
+
+def build_calendar_events():
+    """Collect plan/implementation dates from every OTP and Matrix store."""
     events = []
     
+    bases = get_bases()
+    
     # Load OTP Indonesia - all bases
-    for base in ["narogong", "duri", "balikpapan"]:
-        otp_data = load_otp_data(base)
+    for base, otp_data in zip(bases, load_all(load_otp_data, bases)):
         for prog in otp_data.get("programs", []):
             for month_key, month_data in prog.get("months", {}).items():
                 plan_date = month_data.get("plan_date", "")
@@ -699,55 +1074,113 @@ def get_calendar_events():
                     })
     
     # Load OTP Asia
-    otp_asia_path = Path(__file__).parent / "data" / "otp_asia_data.json"
-    if otp_asia_path.exists():
-        with open(otp_asia_path, 'r') as f:
-            otp_asia_data = json.load(f)
-            for prog in otp_asia_data.get("programs", []):
-                for month_key, month_data in prog.get("months", {}).items():
-                    plan_date = month_data.get("plan_date", "")
-                    impl_date = month_data.get("impl_date", "")
-                    if plan_date or impl_date:
-                        events.append({
-                            "id": prog.get("id"),
-                            "source": "otp",
-                            "region": "asia",
-                            "base": None,
-                            "category": None,
-                            "program_name": prog.get("name", "Unknown"),
-                            "month": month_key,
-                            "plan_date": plan_date,
-                            "impl_date": impl_date,
-                            "pic_name": month_data.get("pic_name", ""),
-                            "plan_type": prog.get("plan_type", "")
-                        })
+    otp_asia_data = load_otp_asia_data()
+    for prog in otp_asia_data.get("programs", []):
+        for month_key, month_data in prog.get("months", {}).items():
+            plan_date = month_data.get("plan_date", "")
+            impl_date = month_data.get("impl_date", "")
+            if plan_date or impl_date:
+                events.append({
+                    "id": prog.get("id"),
+                    "source": "otp",
+                    "region": "asia",
+                    "base": None,
+                    "category": None,
+                    "program_name": prog.get("name", "Unknown"),
+                    "month": month_key,
+                    "plan_date": plan_date,
+                    "impl_date": impl_date,
+                    "pic_name": month_data.get("pic_name", ""),
+                    "plan_type": prog.get("plan_type", "")
+                })
     
     # Load Matrix - all categories, Indonesia all bases
-    for category in ["audit", "training", "drill", "meeting"]:
-        for base in ["narogong", "duri", "balikpapan"]:
-            matrix_data = load_matrix_data(category, "indonesia", base)
-            for prog in matrix_data.get("programs", []):
-                for month_key, month_data in prog.get("months", {}).items():
-                    plan_date = month_data.get("plan_date", "")
-                    impl_date = month_data.get("impl_date", "")
-                    if plan_date or impl_date:
-                        events.append({
-                            "id": prog.get("id"),
-                            "source": "matrix",
-                            "region": "indonesia",
-                            "base": base,
-                            "category": category,
-                            "program_name": prog.get("name", "Unknown"),
-                            "month": month_key,
-                            "plan_date": plan_date,
-                            "impl_date": impl_date,
-                            "pic_name": month_data.get("pic_name", ""),
-                            "plan_type": prog.get("plan_type", "")
-                        })
+    matrix_keys = [(category, base) for category in ["audit", "training", "drill", "meeting"] for base in bases]
+    matrix_docs = load_all(lambda key: load_matrix_data(key[0], "indonesia", key[1]), matrix_keys)
+    for (category, base), matrix_data in zip(matrix_keys, matrix_docs):
+        for prog in matrix_data.get("programs", []):
+            for month_key, month_data in prog.get("months", {}).items():
+                plan_date = month_data.get("plan_date", "")
+                impl_date = month_data.get("impl_date", "")
+                if plan_date or impl_date:
+                    events.append({
+                        "id": prog.get("id"),
+                        "source": "matrix",
+                        "region": "indonesia",
+                        "base": base,
+                        "category": category,
+                        "program_name": prog.get("name", "Unknown"),
+                        "month": month_key,
+                        "plan_date": plan_date,
+                        "impl_date": impl_date,
+                        "pic_name": month_data.get("pic_name", ""),
+                        "plan_type": prog.get("plan_type", "")
+                    })
     
     return {"events": events}
 
 
+# ===== ICALENDAR FEEDS =====
+# Subscription feeds of the same plan / implementation dates as
+# /calendar-events (the per-base stores and OTP Asia), one VEVENT per date.
+FEED_CATEGORIES = ["otp"] + ["audit", "training", "drill", "meeting"]
+
+
+def calendar_feed_sources() -> dict:
+    return {key: source for key, source in search_json_sources().items() if key[-1] != "default"}
+
+
+def file_modified(signature) -> Optional[float]:
+    return signature[0][1] / 1e9 if signature and signature[0] else None
+
+
+def refresh_calendar_feeds():
+    """Take in sources whose files changed since they were rendered (e.g. written by another worker)."""
+    sources = calendar_feed_sources()
+    calendar_feeds.retain(sources)
+    for source_key, (path, defaults) in sources.items():
+        signature = files_signature([path])
+        if signature != calendar_feeds.signature(source_key):
+            calendar_feeds.replace_source(source_key, defaults, read_json(path, dict), signature,
+                                          file_modified(signature))
+
+
+def calendar_feed(request: Request, selector: tuple, name: str) -> Response:
+    flights.do(("ics-refresh",), refresh_calendar_feeds)
+    return calendar_feeds.respond(request, selector, name)
+
+
+@app.get("/calendar.ics")
+def get_calendar_feed(request: Request):
+    """iCalendar feed of every OTP / Matrix plan and implementation date."""
+    return calendar_feed(request, ("all",), "HSE OTP & Matrix")
+
+
+@app.get("/calendar/base/{base}.ics")
+def get_base_calendar_feed(base: str, request: Request):
+    """iCalendar feed of one base's OTP and Matrix dates."""
+    if base not in get_bases():
+        raise HTTPException(status_code=404, detail=f"Unknown base: {base}")
+    return calendar_feed(request, ("base", base), f"HSE {get_base_name(base)}")
+
+
+@app.get("/calendar/category/{category}.ics")
+def get_category_calendar_feed(category: str, request: Request):
+    """iCalendar feed of one category: otp (Indonesia and Asia) or a Matrix category."""
+    if category not in FEED_CATEGORIES:
+        raise HTTPException(status_code=404, detail=f"Unknown category: {category}. Must be one of: {FEED_CATEGORIES}")
+    return calendar_feed(request, ("category", category), f"HSE {category.upper()}")
+
+
+@app.get("/calendar/pic/{email}.ics")
+def get_pic_calendar_feed(email: str, request: Request):
+    """iCalendar feed of the months where ``email`` is the PIC or the PIC's manager."""
+    email = email.strip().lower()
+    if "@" not in email:
+        raise HTTPException(status_code=400, detail="Expected an email address")
+    return calendar_feed(request, ("pic", email), f"HSE items for {email}")
+
+
 @app.post("/programs", response_model=HSEProgram)
 def create_program(program: ProgramCreate, session: Session = Depends(get_session)):
     """Create a new HSE program."""
@@ -835,26 +1268,41 @@ def delete_program(program_id: int, session: Session = Depends(get_session)):
 
 
 # ===== KPI DATA PERSISTENCE =====
-KPI_DATA_FILE = Path(__file__).parent / "data" / "kpi_data.json"
+KPI_DATA_FILE = DATA_DIR / "kpi_data.json"
 
 def load_kpi_data():
     """Load KPI data from JSON file."""
-    if KPI_DATA_FILE.exists():
-        with open(KPI_DATA_FILE, 'r') as f:
-            return json.load(f)
-    return {"man_hours": {}, "kpi": {}}
+    return read_json(KPI_DATA_FILE, lambda: {"man_hours": {}, "kpi": {}})
 
 def save_kpi_data(data):
     """Save KPI data to JSON file."""
-    KPI_DATA_FILE.parent.mkdir(parents=True, exist_ok=True)
-    with open(KPI_DATA_FILE, 'w') as f:
-        json.dump(data, f, indent=4)
+    write_json(KPI_DATA_FILE, data, indent=4)
 
 
 @app.get("/kpi")
-def get_kpi_data():
+def get_kpi_data(response: Response):
     """Get all KPI data."""
-    return load_kpi_data()
+    data = load_kpi_data()
+    response.headers["ETag"] = etag(data.get("version", 0))
+    return data
+
+
+@app.get("/kpi/summary")
+def get_kpi_summary(request: Request):
+    """Multi-year KPI roll-up: man-hours, and per metric the yearly results, rates per 200k / 1M man-hours and attainment."""
+    signature = files_signature([KPI_DATA_FILE])
+    return response_cache.respond(request, ("kpi-summary",), signature,
+                                  lambda: kpi_rollups.get(signature, load_kpi_data)["summary"])
+
+
+@app.get("/kpi/{year}")
+def get_kpi_year(year: str, request: Request):
+    """One year's KPI results with rates, target attainment and year-over-year deltas."""
+    signature = files_signature([KPI_DATA_FILE])
+    years = kpi_rollups.get(signature, load_kpi_data)["years"]
+    if year not in years:
+        raise HTTPException(status_code=404, detail=f"No KPI data for {year}")
+    return response_cache.respond(request, ("kpi", year), signature, lambda: years[year])
 
 
 class KPIYearUpdate(BaseModel):
@@ -876,57 +1324,64 @@ class KPIYearUpdate(BaseModel):
 
 
 @app.put("/kpi/{year}")
-def update_kpi_year(year: str, update: KPIYearUpdate):
-    """Update KPI data for a specific year."""
-    data = load_kpi_data()
-    
-    if year not in data["kpi"]:
-        data["kpi"][year] = {}
-    if year not in data["man_hours"]:
-        data["man_hours"][year] = 0
-    
-    if update.man_hours is not None:
-        data["man_hours"][year] = update.man_hours
-    
-    metrics = ["fatality", "trir", "pvir", "environment", "fire", "firstaid", "occupational"]
-    for metric in metrics:
-        if metric not in data["kpi"][year]:
-            data["kpi"][year][metric] = {"target": 0, "result": 0}
+def update_kpi_year(year: str, update: KPIYearUpdate, response: Response, if_match: Optional[str] = Header(None)):
+    """Update KPI data for a specific year. Send If-Match with the year's version to detect conflicts."""
+    with document_lock(KPI_DATA_FILE):
+        data = load_kpi_data()
+        # Per-year versions live beside "kpi" so the year objects keep only metrics
+        versions = data.setdefault("versions", {})
+        check_if_match(if_match, versions.get(year, 0), f"KPI year {year}")
         
-        target_attr = f"{metric}_target"
-        result_attr = f"{metric}_result"
+        if year not in data["kpi"]:
+            data["kpi"][year] = {}
+        if year not in data["man_hours"]:
+            data["man_hours"][year] = 0
         
-        if getattr(update, target_attr, None) is not None:
-            data["kpi"][year][metric]["target"] = getattr(update, target_attr)
-        if getattr(update, result_attr, None) is not None:
-            data["kpi"][year][metric]["result"] = getattr(update, result_attr)
-    
-    save_kpi_data(data)
+        if update.man_hours is not None:
+            data["man_hours"][year] = update.man_hours
+        
+        metrics = ["fatality", "trir", "pvir", "environment", "fire", "firstaid", "occupational"]
+        for metric in metrics:
+            if metric not in data["kpi"][year]:
+                data["kpi"][year][metric] = {"target": 0, "result": 0}
+            
+            target_attr = f"{metric}_target"
+            result_attr = f"{metric}_result"
+            
+            if getattr(update, target_attr, None) is not None:
+                data["kpi"][year][metric]["target"] = getattr(update, target_attr)
+            if getattr(update, result_attr, None) is not None:
+                data["kpi"][year][metric]["result"] = getattr(update, result_attr)
+        
+        versions[year] = versions.get(year, 0) + 1
+        bump_version(data)
+        save_kpi_data(data)
+        # Derived rates are computed once here, not on every read
+        kpi_rollups.update(files_signature([KPI_DATA_FILE]), data)
+        change_log.record(("kpi",), document=data)
+    response.headers["ETag"] = etag(versions[year])
     return {"message": f"KPI data for {year} updated successfully", "data": data}
 
 
 
 # ===== LL INDICATOR DATA PERSISTENCE =====
-LL_DATA_FILE = Path(__file__).parent / "data" / "ll_indicator.json"
+LL_DATA_FILE = DATA_DIR / "ll_indicator.json"
 
 def load_ll_data():
     """Load LL Indicator data from JSON file."""
-    if LL_DATA_FILE.exists():
-        with open(LL_DATA_FILE, 'r') as f:
-            return json.load(f)
-    return {"year": 2025, "lagging": [], "leading": []}
+    return read_json(LL_DATA_FILE, lambda: {"year": 2025, "lagging": [], "leading": []})
 
 def save_ll_data(data):
     """Save LL Indicator data to JSON file."""
-    LL_DATA_FILE.parent.mkdir(parents=True, exist_ok=True)
-    with open(LL_DATA_FILE, 'w') as f:
-        json.dump(data, f, indent=4)
+    write_json(LL_DATA_FILE, data, indent=4)
 
 
 @app.get("/ll-indicator")
-def get_ll_indicator():
+def get_ll_indicator(response: Response):
     """Get all LL Indicator data."""
-    return load_ll_data()
+    data = load_ll_data()
+    response.headers["ETag"] = etag(data.get("version", 0))
+    return data
 
 
 class LLIndicatorUpdate(BaseModel):
@@ -937,118 +1392,194 @@ class LLIndicatorUpdate(BaseModel):
 
 
 @app.put("/ll-indicator")
-def update_ll_indicator(update: LLIndicatorUpdate):
-    """Update a specific LL indicator."""
-    data = load_ll_data()
-    
-    indicators = data.get(update.indicator_type, [])
-    for ind in indicators:
-        if ind.get("id") == update.indicator_id:
-            if update.target is not None:
-                ind["target"] = update.target
-            if update.actual is not None:
-                ind["actual"] = update.actual
-            break
-    
-    save_ll_data(data)
+def update_ll_indicator(update: LLIndicatorUpdate, response: Response, if_match: Optional[str] = Header(None)):
+    """Update a specific LL indicator. Send If-Match with the indicator's version to detect conflicts."""
+    with document_lock(LL_DATA_FILE):
+        data = load_ll_data()
+        
+        indicators = data.get(update.indicator_type, [])
+        for ind in indicators:
+            if ind.get("id") == update.indicator_id:
+                check_if_match(if_match, ind.get("version", 0), f"LL indicator {update.indicator_id}")
+                if update.target is not None:
+                    ind["target"] = update.target
+                if update.actual is not None:
+                    ind["actual"] = update.actual
+                response.headers["ETag"] = etag(bump_version(ind))
+                break
+        
+        bump_version(data)
+        save_ll_data(data)
+        change_log.record(("ll-indicator",), document=data)
     return {"message": f"LL Indicator updated successfully", "data": data}
 
 
 @app.put("/ll-indicator/year")
 def update_ll_year(year: int):
     """Update the LL Indicator year."""
-    data = load_ll_data()
-    data["year"] = year
-    save_ll_data(data)
+    with document_lock(LL_DATA_FILE):
+        data = load_ll_data()
+        archive_before_relabel(("ll-indicator",), data, year, whole=True)
+        data["year"] = year
+        bump_version(data)
+        save_ll_data(data)
+        change_log.record(("ll-indicator",), document=data)
 
 # ===== OTP DATA PERSISTENCE =====
-OTP_DATA_FILE = Path(__file__).parent / "data" / "otp_data.json"
+OTP_DATA_FILE = DATA_DIR / "otp_data.json"
 
 def get_otp_file_path(base: str = None):
     """Get the file path for OTP data based on base."""
     if base and base != "all":
-        return Path(__file__).parent / "data" / f"otp_indonesia_{base}.json"
+        return DATA_DIR / f"otp_indonesia_{base}.json"
     return OTP_DATA_FILE
 
+def otp_store_key(base: str = None):
+    """Change-log address of an OTP Indonesia store."""
+    return ("otp", base if base and base != "all" else "default")
+
 def load_otp_data(base: str = None):
-    """Load OTP data from JSON file. If base is 'all', merge data from all bases."""
+    """Load OTP data from JSON file. If base is 'all', merge data from all bases.
+
+    The merged 'all' document is shared between concurrent callers and must
+    not be mutated.
+    """
     if base == "all":
-        # Aggregate data from all 3 bases - MERGE month data
-        programs_by_id = {}
-        for b in ["narogong", "duri", "balikpapan"]:
-            file_path = get_otp_file_path(b)
-            if file_path.exists():
-                with open(file_path, 'r') as f:
-                    data = json.load(f)
-                    for prog in data.get("programs", []):
-                        prog_id = prog.get("id")
-                        if prog_id not in programs_by_id:
-                            # First time seeing this program, add it with a copy
-                            programs_by_id[prog_id] = {
-                                "id": prog_id,
-                                "name": prog.get("name", ""),
-                                "plan_type": prog.get("plan_type", ""),
-                                "due_date": prog.get("due_date"),
-                                "months": dict(prog.get("months", {})),
-                                "progress": prog.get("progress", 0)
-                            }
-                        else:
-                            # Merge month data - use data from this base if it has values
-                            existing = programs_by_id[prog_id]
-                            for month_key, month_data in prog.get("months", {}).items():
-                                if month_key not in existing["months"]:
-                                    existing["months"][month_key] = month_data
-                                else:
-                                    # Merge: prefer non-empty values from this base
-                                    existing_month = existing["months"][month_key]
-                                    for field in ["plan", "actual", "wpts_id", "plan_date", "impl_date", "pic_name", "pic_manager", "pic_email", "pic_manager_email"]:
-                                        if month_data.get(field) and not existing_month.get(field):
-                                            existing_month[field] = month_data[field]
-        return {"year": 2026, "programs": list(programs_by_id.values())}
+        return flights.do(("otp", "all"), merged_otp_snapshot).data
     
-    file_path = get_otp_file_path(base)
-    if file_path.exists():
-        with open(file_path, 'r') as f:
-            return json.load(f)
-    return {"year": 2026, "programs": []}
+    return read_json(get_otp_file_path(base), lambda: {"year": 2026, "programs": []})
+
+# Attributes (and defaults) of a merged 'all' program, and the month fields
+# whose first non-empty value across bases wins
+OTP_MERGE_KEYS = {"name": "", "plan_type": "", "due_date": None, "months": None, "progress": 0, "version": 0}
+MERGE_MONTH_FIELDS = ["plan", "actual", "wpts_id", "plan_date", "impl_date", "pic_name", "pic_manager", "pic_email",
+                      "pic_manager_email"]
+
+
+def overlay_year(template: dict, patches: list):
+    """Year of the first base's view of a packed family (the merged document's year)."""
+    first = patches[0] if patches else {}
+    return None if "year" in first.get(DELETE, ()) else first.get("year", template.get("year"))
+
+
+def merged_otp_snapshot():
+    """merge_otp_bases() and the signature of its sources, taken before reading them."""
+    return Snapshot(files_signature(otp_source_files("all")), merge_otp_bases())
+
+
+def merge_otp_bases():
+    """Aggregate data from all bases - MERGE month data.
+
+    Files are read concurrently, then merged in registry order. The merged
+    view's versions are sums of the per-base versions, so they change
+    whenever any base changes. When every base is an overlay of one
+    template (see overlay.py), only the programs the overlays touch are
+    merged cell by cell.
+    """
+    packed = overlay_views([get_otp_file_path(b) for b in get_bases()])
+    merged = packed and merge_overlays(*packed, OTP_MERGE_KEYS, MERGE_MONTH_FIELDS)
+    if merged:
+        version, programs = merged
+        return {"year": overlay_year(*packed) or 2026, "version": version, "programs": programs}
+
+    programs_by_id = {}
+    version = 0
+    year = None
+    for data in load_all(lambda b: read_json(get_otp_file_path(b)), get_bases()):
+        if data is None:
+            continue
+        version += data.get("version", 0)
+        year = year or data.get("year")
+        for prog in data.get("programs", []):
+            prog_id = prog.get("id")
+            if prog_id not in programs_by_id:
+                # First time seeing this program, add it with a copy
+                programs_by_id[prog_id] = {
+                    "id": prog_id,
+                    "name": prog.get("name", ""),
+                    "plan_type": prog.get("plan_type", ""),
+                    "due_date": prog.get("due_date"),
+                    "months": dict(prog.get("months", {})),
+                    "progress": prog.get("progress", 0),
+                    "version": prog.get("version", 0)
+                }
+            else:
+                # Merge month data - use data from this base if it has values
+                existing = programs_by_id[prog_id]
+                existing["version"] += prog.get("version", 0)
+                for month_key, month_data in prog.get("months", {}).items():
+                    if month_key not in existing["months"]:
+                        existing["months"][month_key] = month_data
+                    else:
+                        # Merge: prefer non-empty values from this base
+                        existing_month = existing["months"][month_key]
+                        for field in ["plan", "actual", "wpts_id", "plan_date", "impl_date", "pic_name", "pic_manager", "pic_email", "pic_manager_email"]:
+                            if month_data.get(field) and not existing_month.get(field):
+                                existing_month[field] = month_data[field]
+    return {"year": year or 2026, "version": version, "programs": list(programs_by_id.values())}
 
 def save_otp_data(data, base: str = None):
     """Save OTP data to JSON file."""
-    file_path = get_otp_file_path(base)
-    file_path.parent.mkdir(parents=True, exist_ok=True)
-    with open(file_path, 'w') as f:
-        json.dump(data, f, indent=2)
-
-def calculate_progress(program):
-    """Calculate progress percentage for an OTP program."""
-    total_plan = 0
-    total_actual = 0
-    for month_data in program.get("months", {}).values():
-        total_plan += month_data.get("plan", 0)
-        total_actual += month_data.get("actual", 0)
-    if total_plan == 0:
-        return 100 if total_actual >= 0 else 0
-    return min(100, round((total_actual / total_plan) * 100))
+    write_json(get_otp_file_path(base), data, indent=2)
+    reindex_store(otp_store_key(base), data)
+
+
+def otp_source_files(base: str = None):
+    if base == "all":
+        return [BASES_FILE] + [get_otp_file_path(b) for b in get_bases()]
+    return [get_otp_file_path(base)]
+
+
+def projection_param(fields: Optional[str], months: Optional[str]) -> Projection:
+    """Parse fields= / months= (see projection.py) or fail with 400."""
+    try:
+        return Projection(fields, months)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+def projected_key(key: tuple, projection: Projection) -> tuple:
+    return key + (projection.key,) if projection else key
 
 
 @app.get("/otp")
-def get_otp_data(base: str = None):
-    """Get all OTP data. Pass base=narogong|duri|balikpapan|all for specific base data."""
-    data = load_otp_data(base)
-    # Calculate progress for each program
-    for prog in data.get("programs", []):
-        prog["progress"] = calculate_progress(prog)
-    return data
+def get_otp_data(request: Request, base: str = None, fields: Optional[str] = None, months: Optional[str] = None):
+    """Get all OTP data. Pass base=<base id>|all (see /bases) for specific base data.
+
+    fields= and months= return only the selected program / month fields and
+    months, e.g. fields=plan,actual&months=q2.
+    """
+    projection = projection_param(fields, months)
+    return response_cache.respond(request, projected_key(("otp", base), projection),
+                                  files_signature(otp_source_files(base)), build_otp_data, base, projection)
+
+
+def build_otp_data(base: str = None, projection: Projection = None):
+    if base == "all":
+        # The merge may be shared with a request that took an older signature
+        signature, data = flights.do(("otp", "all"), merged_otp_snapshot)
+        return Snapshot(signature, otp_document(data, projection))
+    return otp_document(load_otp_data(base), projection)
+
+
+def otp_document(data: dict, projection: Projection = None):
+    if projection:
+        return projection.document(data, lambda prog: {"progress": calculate_progress(prog)})
+    # Calculate progress for each program (on copies - 'all' data is shared)
+    programs = [dict(prog, progress=calculate_progress(prog)) for prog in data.get("programs", [])]
+    return dict(data, programs=programs)
 
 
 @app.get("/otp/{program_id}")
-def get_otp_program(program_id: int, base: str = None):
-    """Get a specific OTP program by ID."""
+def get_otp_program(program_id: int, response: Response, base: str = None, fields: Optional[str] = None,
+                    months: Optional[str] = None):
+    """Get a specific OTP program by ID (fields= / months= as for /otp)."""
+    projection = projection_param(fields, months)
     data = load_otp_data(base)
     for prog in data.get("programs", []):
         if prog.get("id") == program_id:
-            prog["progress"] = calculate_progress(prog)
-            return prog
+            response.headers["ETag"] = etag(prog.get("version", 0))
+            return projection.program(prog, progress=calculate_progress(prog))
     raise HTTPException(status_code=404, detail="OTP program not found")
 
 
@@ -1065,8 +1596,13 @@ class OTPMonthUpdate(BaseModel):
 
 
 @app.put("/otp/{program_id}/month/{month}")
-def update_otp_month(program_id: int, month: str, update: OTPMonthUpdate, base: str = None):
-    """Update Plan/Actual values for a specific month of an OTP program."""
+def update_otp_month(program_id: int, month: str, update: OTPMonthUpdate, response: Response,
+                     base: str = None, if_match: Optional[str] = Header(None)):
+    """Update Plan/Actual values for a specific month of an OTP program.
+
+    Send If-Match with the program's version (as returned by GET) to have
+    conflicting concurrent edits rejected with 412 instead of overwritten.
+    """
     valid_months = ["jan", "feb", "mar", "apr", "may", "jun", "jul", "aug", "sep", "oct", "nov", "dec"]
     if month.lower() not in valid_months:
         raise HTTPException(status_code=400, detail=f"Invalid month. Must be one of: {valid_months}")
@@ -1098,29 +1634,44 @@ def update_otp_month(program_id: int, month: str, update: OTPMonthUpdate, base:
             prog["months"][month_key]["pic_manager_email"] = upd.pic_manager_email
         prog["progress"] = calculate_progress(prog)
     
-    # If base is 'all', update ALL 3 bases
+    # If base is 'all', update ALL bases
     if base == "all":
-        bases_to_update = ["narogong", "duri", "balikpapan"]
-        updated_prog = None
-        for b in bases_to_update:
-            data = load_otp_data(b)
-            for prog in data.get("programs", []):
-                if prog.get("id") == program_id:
-                    update_program_month(prog, month.lower(), update)
-                    updated_prog = prog
-                    break
-            save_otp_data(data, b)
-        if updated_prog:
-            return {"message": f"OTP program {program_id} month {month} updated in all bases", "program": updated_prog}
-        raise HTTPException(status_code=404, detail="OTP program not found")
+        bases_to_update = get_bases()
+        with locked_documents(*[get_otp_file_path(b) for b in bases_to_update]):
+            found = []
+            for b in bases_to_update:
+                data = load_otp_data(b)
+                for prog in data.get("programs", []):
+                    if prog.get("id") == program_id:
+                        found.append((b, data, prog))
+                        break
+            if not found:
+                raise HTTPException(status_code=404, detail="OTP program not found")
+            check_if_match(if_match, sum(p.get("version", 0) for _, _, p in found), f"OTP program {program_id}")
+            
+            for b, data, prog in found:
+                update_program_month(prog, month.lower(), update)
+                bump_version(prog)
+                bump_version(data)
+                save_otp_data(data, b)
+                change_log.record(otp_store_key(b), program_id, month.lower(), prog["months"][month.lower()])
+        
+        updated_prog = dict(found[-1][2], version=sum(p["version"] for _, _, p in found))
+        response.headers["ETag"] = etag(updated_prog["version"])
+        return {"message": f"OTP program {program_id} month {month} updated in all bases", "program": updated_prog}
     
     # Update single base
-    data = load_otp_data(base)
-    for prog in data.get("programs", []):
-        if prog.get("id") == program_id:
-            update_program_month(prog, month.lower(), update)
-            save_otp_data(data, base)
-            return {"message": f"OTP program {program_id} month {month} updated", "program": prog}
+    with document_lock(get_otp_file_path(base)):
+        data = load_otp_data(base)
+        for prog in data.get("programs", []):
+            if prog.get("id") == program_id:
+                check_if_match(if_match, prog.get("version", 0), f"OTP program {program_id}")
+                update_program_month(prog, month.lower(), update)
+                response.headers["ETag"] = etag(bump_version(prog))
+                bump_version(data)
+                save_otp_data(data, base)
+                change_log.record(otp_store_key(base), program_id, month.lower(), prog["months"][month.lower()])
+                return {"message": f"OTP program {program_id} month {month} updated", "program": prog}
     
     raise HTTPException(status_code=404, detail="OTP program not found")
 
@@ -1134,36 +1685,39 @@ class OTPProgramCreate(BaseModel):
 @app.post("/otp")
 def create_otp_program(program: OTPProgramCreate):
     """Create a new OTP program."""
-    data = load_otp_data()
-    
-    # Generate new ID
-    max_id = max([p.get("id", 0) for p in data.get("programs", [])], default=0)
-    new_id = max_id + 1
-    
-    new_program = {
-        "id": new_id,
-        "name": program.name,
-        "plan_type": program.plan_type,
-        "due_date": program.due_date,
-        "months": {
-            "jan": {"plan": 0, "actual": 0},
-            "feb": {"plan": 0, "actual": 0},
-            "mar": {"plan": 0, "actual": 0},
-            "apr": {"plan": 0, "actual": 0},
-            "may": {"plan": 0, "actual": 0},
-            "jun": {"plan": 0, "actual": 0},
-            "jul": {"plan": 0, "actual": 0},
-            "aug": {"plan": 0, "actual": 0},
-            "sep": {"plan": 0, "actual": 0},
-            "oct": {"plan": 0, "actual": 0},
-            "nov": {"plan": 0, "actual": 0},
-            "dec": {"plan": 0, "actual": 0}
-        },
-        "progress": 0
-    }
-    
-    data["programs"].append(new_program)
-    save_otp_data(data)
+    with document_lock(get_otp_file_path()):
+        data = load_otp_data()
+        
+        # Generate new ID
+        max_id = max([p.get("id", 0) for p in data.get("programs", [])], default=0)
+        new_id = max_id + 1
+        
+        new_program = {
+            "id": new_id,
+            "name": program.name,
+            "plan_type": program.plan_type,
+            "due_date": program.due_date,
+            "months": {
+                "jan": {"plan": 0, "actual": 0},
+                "feb": {"plan": 0, "actual": 0},
+                "mar": {"plan": 0, "actual": 0},
+                "apr": {"plan": 0, "actual": 0},
+                "may": {"plan": 0, "actual": 0},
+                "jun": {"plan": 0, "actual": 0},
+                "jul": {"plan": 0, "actual": 0},
+                "aug": {"plan": 0, "actual": 0},
+                "sep": {"plan": 0, "actual": 0},
+                "oct": {"plan": 0, "actual": 0},
+                "nov": {"plan": 0, "actual": 0},
+                "dec": {"plan": 0, "actual": 0}
+            },
+            "progress": 0
+        }
+        
+        data["programs"].append(new_program)
+        bump_version(data)
+        save_otp_data(data)
+        change_log.record(otp_store_key(), new_id, program=new_program)
     return {"message": "OTP program created successfully", "program": new_program}
 
 
@@ -1174,92 +1728,102 @@ class OTPProgramUpdate(BaseModel):
 
 
 @app.put("/otp/{program_id}")
-def update_otp_program(program_id: int, update: OTPProgramUpdate):
+def update_otp_program(program_id: int, update: OTPProgramUpdate, response: Response, if_match: Optional[str] = Header(None)):
     """Update an OTP program's metadata."""
-    data = load_otp_data()
-    for prog in data.get("programs", []):
-        if prog.get("id") == program_id:
-            if update.name is not None:
-                prog["name"] = update.name
-            if update.plan_type is not None:
-                prog["plan_type"] = update.plan_type
-            if update.due_date is not None:
-                prog["due_date"] = update.due_date
-            
-            save_otp_data(data)
-            return {"message": f"OTP program {program_id} updated", "program": prog}
+    with document_lock(get_otp_file_path()):
+        data = load_otp_data()
+        for prog in data.get("programs", []):
+            if prog.get("id") == program_id:
+                check_if_match(if_match, prog.get("version", 0), f"OTP program {program_id}")
+                if update.name is not None:
+                    prog["name"] = update.name
+                if update.plan_type is not None:
+                    prog["plan_type"] = update.plan_type
+                if update.due_date is not None:
+                    prog["due_date"] = update.due_date
+                
+                response.headers["ETag"] = etag(bump_version(prog))
+                bump_version(data)
+                save_otp_data(data)
+                change_log.record(otp_store_key(), program_id, program=update.model_dump(exclude_none=True))
+                return {"message": f"OTP program {program_id} updated", "program": prog}
     
     raise HTTPException(status_code=404, detail="OTP program not found")
 
 
 @app.delete("/otp/{program_id}")
-def delete_otp_program(program_id: int):
+def delete_otp_program(program_id: int, if_match: Optional[str] = Header(None)):
     """Delete an OTP program."""
-    data = load_otp_data()
-    original_count = len(data.get("programs", []))
-    data["programs"] = [p for p in data.get("programs", []) if p.get("id") != program_id]
-    
-    if len(data["programs"]) == original_count:
-        raise HTTPException(status_code=404, detail="OTP program not found")
-    
-    save_otp_data(data)
+    with document_lock(get_otp_file_path()):
+        data = load_otp_data()
+        for prog in data.get("programs", []):
+            if prog.get("id") == program_id:
+                check_if_match(if_match, prog.get("version", 0), f"OTP program {program_id}")
+                break
+        else:
+            raise HTTPException(status_code=404, detail="OTP program not found")
+        data["programs"] = [p for p in data.get("programs", []) if p.get("id") != program_id]
+        
+        bump_version(data)
+        save_otp_data(data)
+        change_log.record(otp_store_key(), program_id, deleted=True)
     return {"message": f"OTP program {program_id} deleted successfully"}
 
 
 @app.put("/otp/year/{year}")
 def update_otp_year(year: int):
     """Update the OTP year."""
-    data = load_otp_data()
-    data["year"] = year
-    save_otp_data(data)
+    with document_lock(get_otp_file_path()):
+        data = load_otp_data()
+        archive_before_relabel(otp_store_key(), data, year)
+        data["year"] = year
+        bump_version(data)
+        save_otp_data(data)
+        change_log.record(otp_store_key(), meta={"year": year})
     return {"message": f"OTP year updated to {year}"}
 
 
 # ===== OTP ASIA DATA PERSISTENCE =====
-OTP_ASIA_DATA_FILE = Path(__file__).parent / "data" / "otp_asia_data.json"
+OTP_ASIA_DATA_FILE = DATA_DIR / "otp_asia_data.json"
 
 def load_otp_asia_data():
     """Load OTP ASIA data from JSON file."""
-    if OTP_ASIA_DATA_FILE.exists():
-        with open(OTP_ASIA_DATA_FILE, 'r') as f:
-            return json.load(f)
-    return {"year": 2026, "programs": []}
+    return read_json(OTP_ASIA_DATA_FILE, lambda: {"year": 2026, "programs": []})
 
 def save_otp_asia_data(data):
     """Save OTP ASIA data to JSON file."""
-    OTP_ASIA_DATA_FILE.parent.mkdir(parents=True, exist_ok=True)
-    with open(OTP_ASIA_DATA_FILE, 'w') as f:
-        json.dump(data, f, indent=2)
-
-def calculate_progress_asia(program):
-    """Calculate progress percentage for an OTP ASIA program."""
-    total_plan = 0
-    total_actual = 0
-    for month_data in program.get("months", {}).values():
-        total_plan += month_data.get("plan", 0)
-        total_actual += month_data.get("actual", 0)
-    if total_plan == 0:
-        return 100 if total_actual >= 0 else 0
-    return min(100, round((total_actual / total_plan) * 100))
+    write_json(OTP_ASIA_DATA_FILE, data, indent=2)
+    reindex_store(("otp-asia",), data)
 
 
 @app.get("/otp-asia")
-def get_otp_asia_data():
-    """Get all OTP ASIA data."""
+def get_otp_asia_data(request: Request, fields: Optional[str] = None, months: Optional[str] = None):
+    """Get all OTP ASIA data (fields= / months= as for /otp)."""
+    projection = projection_param(fields, months)
+    return response_cache.respond(request, projected_key(("otp-asia",), projection),
+                                  files_signature([OTP_ASIA_DATA_FILE]), build_otp_asia_data, projection)
+
+
+def build_otp_asia_data(projection: Projection = None):
     data = load_otp_asia_data()
+    if projection:
+        return projection.document(data, lambda prog: {"progress": calculate_progress_asia(prog)})
     for prog in data.get("programs", []):
         prog["progress"] = calculate_progress_asia(prog)
     return data
 
 
 @app.get("/otp-asia/{program_id}")
-def get_otp_asia_program(program_id: int):
-    """Get a specific OTP ASIA program by ID."""
+def get_otp_asia_program(program_id: int, response: Response, fields: Optional[str] = None,
+                         months: Optional[str] = None):
+    """Get a specific OTP ASIA program by ID (fields= / months= as for /otp)."""
+    projection = projection_param(fields, months)
     data = load_otp_asia_data()
     for prog in data.get("programs", []):
         if prog.get("id") == program_id:
             prog["progress"] = calculate_progress_asia(prog)
-            return prog
+            response.headers["ETag"] = etag(prog.get("version", 0))
+            return projection.program(prog) if projection else prog
     raise HTTPException(status_code=404, detail="OTP ASIA program not found")
 
 
@@ -1276,42 +1840,48 @@ class OTPAsiaMonthUpdate(BaseModel):
 
 
 @app.put("/otp-asia/{program_id}/month/{month}")
-def update_otp_asia_month(program_id: int, month: str, update: OTPAsiaMonthUpdate):
+def update_otp_asia_month(program_id: int, month: str, update: OTPAsiaMonthUpdate, response: Response,
+                          if_match: Optional[str] = Header(None)):
     """Update Plan/Actual values for a specific month of an OTP ASIA program."""
     valid_months = ["jan", "feb", "mar", "apr", "may", "jun", "jul", "aug", "sep", "oct", "nov", "dec"]
     if month.lower() not in valid_months:
         raise HTTPException(status_code=400, detail=f"Invalid month. Must be one of: {valid_months}")
     
-    data = load_otp_asia_data()
-    for prog in data.get("programs", []):
-        if prog.get("id") == program_id:
-            if "months" not in prog:
-                prog["months"] = {}
-            if month.lower() not in prog["months"]:
-                prog["months"][month.lower()] = {"plan": 0, "actual": 0}
-            
-            if update.plan is not None:
-                prog["months"][month.lower()]["plan"] = update.plan
-            if update.actual is not None:
-                prog["months"][month.lower()]["actual"] = update.actual
-            if update.wpts_id is not None:
-                prog["months"][month.lower()]["wpts_id"] = update.wpts_id
-            if update.plan_date is not None:
-                prog["months"][month.lower()]["plan_date"] = update.plan_date
-            if update.impl_date is not None:
-                prog["months"][month.lower()]["impl_date"] = update.impl_date
-            if update.pic_name is not None:
-                prog["months"][month.lower()]["pic_name"] = update.pic_name
-            if update.pic_manager is not None:
-                prog["months"][month.lower()]["pic_manager"] = update.pic_manager
-            if update.pic_email is not None:
-                prog["months"][month.lower()]["pic_email"] = update.pic_email
-            if update.pic_manager_email is not None:
-                prog["months"][month.lower()]["pic_manager_email"] = update.pic_manager_email
-            
-            prog["progress"] = calculate_progress_asia(prog)
-            save_otp_asia_data(data)
-            return {"message": f"OTP ASIA program {program_id} month {month} updated", "program": prog}
+    with document_lock(OTP_ASIA_DATA_FILE):
+        data = load_otp_asia_data()
+        for prog in data.get("programs", []):
+            if prog.get("id") == program_id:
+                check_if_match(if_match, prog.get("version", 0), f"OTP ASIA program {program_id}")
+                if "months" not in prog:
+                    prog["months"] = {}
+                if month.lower() not in prog["months"]:
+                    prog["months"][month.lower()] = {"plan": 0, "actual": 0}
+                
+                if update.plan is not None:
+                    prog["months"][month.lower()]["plan"] = update.plan
+                if update.actual is not None:
+                    prog["months"][month.lower()]["actual"] = update.actual
+                if update.wpts_id is not None:
+                    prog["months"][month.lower()]["wpts_id"] = update.wpts_id
+                if update.plan_date is not None:
+                    prog["months"][month.lower()]["plan_date"] = update.plan_date
+                if update.impl_date is not None:
+                    prog["months"][month.lower()]["impl_date"] = update.impl_date
+                if update.pic_name is not None:
+                    prog["months"][month.lower()]["pic_name"] = update.pic_name
+                if update.pic_manager is not None:
+                    prog["months"][month.lower()]["pic_manager"] = update.pic_manager
+                if update.pic_email is not None:
+                    prog["months"][month.lower()]["pic_email"] = update.pic_email
+                if update.pic_manager_email is not None:
+                    prog["months"][month.lower()]["pic_manager_email"] = update.pic_manager_email
+                
+                prog["progress"] = calculate_progress_asia(prog)
+                response.headers["ETag"] = etag(bump_version(prog))
+                bump_version(data)
+                save_otp_asia_data(data)
+                change_log.record(("otp-asia",), program_id, month.lower(), prog["months"][month.lower()])
+                return {"message": f"OTP ASIA program {program_id} month {month} updated", "program": prog}
     
     raise HTTPException(status_code=404, detail="OTP ASIA program not found")
 
@@ -1325,35 +1895,38 @@ class OTPAsiaProgramCreate(BaseModel):
 @app.post("/otp-asia")
 def create_otp_asia_program(program: OTPAsiaProgramCreate):
     """Create a new OTP ASIA program."""
-    data = load_otp_asia_data()
-    
-    max_id = max([p.get("id", 0) for p in data.get("programs", [])], default=0)
-    new_id = max_id + 1
-    
-    new_program = {
-        "id": new_id,
-        "name": program.name,
-        "plan_type": program.plan_type,
-        "due_date": program.due_date,
-        "months": {
-            "jan": {"plan": 0, "actual": 0},
-            "feb": {"plan": 0, "actual": 0},
-            "mar": {"plan": 0, "actual": 0},
-            "apr": {"plan": 0, "actual": 0},
-            "may": {"plan": 0, "actual": 0},
-            "jun": {"plan": 0, "actual": 0},
-            "jul": {"plan": 0, "actual": 0},
-            "aug": {"plan": 0, "actual": 0},
-            "sep": {"plan": 0, "actual": 0},
-            "oct": {"plan": 0, "actual": 0},
-            "nov": {"plan": 0, "actual": 0},
-            "dec": {"plan": 0, "actual": 0}
-        },
-        "progress": 0
-    }
-    
-    data["programs"].append(new_program)
-    save_otp_asia_data(data)
+    with document_lock(OTP_ASIA_DATA_FILE):
+        data = load_otp_asia_data()
+        
+        max_id = max([p.get("id", 0) for p in data.get("programs", [])], default=0)
+        new_id = max_id + 1
+        
+        new_program = {
+            "id": new_id,
+            "name": program.name,
+            "plan_type": program.plan_type,
+            "due_date": program.due_date,
+            "months": {
+                "jan": {"plan": 0, "actual": 0},
+                "feb": {"plan": 0, "actual": 0},
+                "mar": {"plan": 0, "actual": 0},
+                "apr": {"plan": 0, "actual": 0},
+                "may": {"plan": 0, "actual": 0},
+                "jun": {"plan": 0, "actual": 0},
+                "jul": {"plan": 0, "actual": 0},
+                "aug": {"plan": 0, "actual": 0},
+                "sep": {"plan": 0, "actual": 0},
+                "oct": {"plan": 0, "actual": 0},
+                "nov": {"plan": 0, "actual": 0},
+                "dec": {"plan": 0, "actual": 0}
+            },
+            "progress": 0
+        }
+        
+        data["programs"].append(new_program)
+        bump_version(data)
+        save_otp_asia_data(data)
+        change_log.record(("otp-asia",), new_id, program=new_program)
     return {"message": "OTP ASIA program created successfully", "program": new_program}
 
 
@@ -1364,44 +1937,59 @@ class OTPAsiaProgramUpdate(BaseModel):
 
 
 @app.put("/otp-asia/{program_id}")
-def update_otp_asia_program(program_id: int, update: OTPAsiaProgramUpdate):
+def update_otp_asia_program(program_id: int, update: OTPAsiaProgramUpdate, response: Response,
+                            if_match: Optional[str] = Header(None)):
     """Update an OTP ASIA program's metadata."""
-    data = load_otp_asia_data()
-    for prog in data.get("programs", []):
-        if prog.get("id") == program_id:
-            if update.name is not None:
-                prog["name"] = update.name
-            if update.plan_type is not None:
-                prog["plan_type"] = update.plan_type
-            if update.due_date is not None:
-                prog["due_date"] = update.due_date
-            
-            save_otp_asia_data(data)
-            return {"message": f"OTP ASIA program {program_id} updated", "program": prog}
+    with document_lock(OTP_ASIA_DATA_FILE):
+        data = load_otp_asia_data()
+        for prog in data.get("programs", []):
+            if prog.get("id") == program_id:
+                check_if_match(if_match, prog.get("version", 0), f"OTP ASIA program {program_id}")
+                if update.name is not None:
+                    prog["name"] = update.name
+                if update.plan_type is not None:
+                    prog["plan_type"] = update.plan_type
+                if update.due_date is not None:
+                    prog["due_date"] = update.due_date
+                
+                response.headers["ETag"] = etag(bump_version(prog))
+                bump_version(data)
+                save_otp_asia_data(data)
+                change_log.record(("otp-asia",), program_id, program=update.model_dump(exclude_none=True))
+                return {"message": f"OTP ASIA program {program_id} updated", "program": prog}
     
     raise HTTPException(status_code=404, detail="OTP ASIA program not found")
 
 
 @app.delete("/otp-asia/{program_id}")
-def delete_otp_asia_program(program_id: int):
+def delete_otp_asia_program(program_id: int, if_match: Optional[str] = Header(None)):
     """Delete an OTP ASIA program."""
-    data = load_otp_asia_data()
-    original_count = len(data.get("programs", []))
-    data["programs"] = [p for p in data.get("programs", []) if p.get("id") != program_id]
-    
-    if len(data["programs"]) == original_count:
-        raise HTTPException(status_code=404, detail="OTP ASIA program not found")
-    
-    save_otp_asia_data(data)
+    with document_lock(OTP_ASIA_DATA_FILE):
+        data = load_otp_asia_data()
+        for prog in data.get("programs", []):
+            if prog.get("id") == program_id:
+                check_if_match(if_match, prog.get("version", 0), f"OTP ASIA program {program_id}")
+                break
+        else:
+            raise HTTPException(status_code=404, detail="OTP ASIA program not found")
+        data["programs"] = [p for p in data.get("programs", []) if p.get("id") != program_id]
+        
+        bump_version(data)
+        save_otp_asia_data(data)
+        change_log.record(("otp-asia",), program_id, deleted=True)
     return {"message": f"OTP ASIA program {program_id} deleted successfully"}
 
 
 @app.put("/otp-asia/year/{year}")
 def update_otp_asia_year(year: int):
     """Update the OTP ASIA year."""
-    data = load_otp_asia_data()
-    data["year"] = year
-    save_otp_asia_data(data)
+    with document_lock(OTP_ASIA_DATA_FILE):
+        data = load_otp_asia_data()
+        archive_before_relabel(("otp-asia",), data, year)
+        data["year"] = year
+        bump_version(data)
+        save_otp_asia_data(data)
+        change_log.record(("otp-asia",), meta={"year": year})
     return {"message": f"OTP ASIA year updated to {year}"}
 
 
@@ -1412,69 +2000,98 @@ def update_otp_asia_year(year: int):
 def get_matrix_file_path(category: str, region: str, base: str = None):
     """Get the file path for a specific matrix category, region, and base."""
     if region == "indonesia" and base and base != "all":
-        return Path(__file__).parent / "data" / f"matrix_{category}_{region}_{base}.json"
-    return Path(__file__).parent / "data" / f"matrix_{category}_{region}.json"
+        return DATA_DIR / f"matrix_{category}_{region}_{base}.json"
+    return DATA_DIR / f"matrix_{category}_{region}.json"
+
+def matrix_store_key(category: str, region: str, base: str = None):
+    """Change-log address of a Matrix store."""
+    if region == "indonesia" and base and base != "all":
+        return ("matrix", category, region, base)
+    return ("matrix", category, region, "default")
 
 def load_matrix_data(category: str, region: str, base: str = None):
-    """Load matrix data for a specific category, region, and base."""
+    """Load matrix data for a specific category, region, and base.
+
+    As with OTP, the merged 'all' document is shared between concurrent
+    callers and must not be mutated.
+    """
     if region == "indonesia" and base == "all":
-        # Aggregate data from all 3 bases - MERGE month data
-        programs_by_id = {}
-        for b in ["narogong", "duri", "balikpapan"]:
-            file_path = get_matrix_file_path(category, region, b)
-            if file_path.exists():
-                with open(file_path, "r") as f:
-                    data = json.load(f)
-                    for prog in data.get("programs", []):
-                        prog_id = prog.get("id")
-                        if prog_id not in programs_by_id:
-                            # First time seeing this program, add it with a copy
-                            programs_by_id[prog_id] = {
-                                "id": prog_id,
-                                "name": prog.get("name", ""),
-                                "reference": prog.get("reference", ""),
-                                "plan_type": prog.get("plan_type", ""),
-                                "due_date": prog.get("due_date"),
-                                "months": dict(prog.get("months", {})),
-                                "progress": prog.get("progress", 0)
-                            }
-                        else:
-                            # Merge month data - use data from this base if it has values
-                            existing = programs_by_id[prog_id]
-                            for month_key, month_data in prog.get("months", {}).items():
-                                if month_key not in existing["months"]:
-                                    existing["months"][month_key] = month_data
-                                else:
-                                    # Merge: prefer non-empty values from this base
-                                    existing_month = existing["months"][month_key]
-                                    for field in ["plan", "actual", "wpts_id", "plan_date", "impl_date", "pic_name", "pic_manager", "pic_email", "pic_manager_email"]:
-                                        if month_data.get(field) and not existing_month.get(field):
-                                            existing_month[field] = month_data[field]
-        return {"year": 2026, "category": category, "region": region, "programs": list(programs_by_id.values())}
+        return flights.do(("matrix", category, region, "all"), merged_matrix_snapshot, category, region).data
     
-    file_path = get_matrix_file_path(category, region, base)
-    if file_path.exists():
-        with open(file_path, "r") as f:
-            return json.load(f)
-    return {"year": 2026, "category": category, "region": region, "programs": []}
+    return read_json(get_matrix_file_path(category, region, base),
+                     lambda: {"year": 2026, "category": category, "region": region, "programs": []})
+
+MATRIX_MERGE_KEYS = {"name": "", "reference": "", "plan_type": "", "due_date": None, "months": None, "progress": 0,
+                     "version": 0}
+
+
+def matrix_source_files(category: str, region: str, base: str = None):
+    if region == "indonesia" and base == "all":
+        return [BASES_FILE] + [get_matrix_file_path(category, region, b) for b in get_bases()]
+    return [get_matrix_file_path(category, region, base)]
+
+
+def merged_matrix_snapshot(category: str, region: str):
+    """merge_matrix_bases() and the signature of its sources, taken before reading them."""
+    return Snapshot(files_signature(matrix_source_files(category, region, "all")), merge_matrix_bases(category, region))
+
+
+def merge_matrix_bases(category: str, region: str):
+    """Aggregate data from all bases - MERGE month data.
+
+    Read concurrently and merged in registry order; merged versions are sums
+    of the per-base versions (see merge_otp_bases).
+    """
+    packed = overlay_views([get_matrix_file_path(category, region, b) for b in get_bases()])
+    merged = packed and merge_overlays(*packed, MATRIX_MERGE_KEYS, MERGE_MONTH_FIELDS)
+    if merged:
+        version, programs = merged
+        return {"year": overlay_year(*packed) or 2026, "category": category, "region": region, "version": version,
+                "programs": programs}
+
+    programs_by_id = {}
+    version = 0
+    year = None
+    for data in load_all(lambda b: read_json(get_matrix_file_path(category, region, b)), get_bases()):
+        if data is None:
+            continue
+        version += data.get("version", 0)
+        year = year or data.get("year")
+        for prog in data.get("programs", []):
+            prog_id = prog.get("id")
+            if prog_id not in programs_by_id:
+                # First time seeing this program, add it with a copy
+                programs_by_id[prog_id] = {
+                    "id": prog_id,
+                    "name": prog.get("name", ""),
+                    "reference": prog.get("reference", ""),
+                    "plan_type": prog.get("plan_type", ""),
+                    "due_date": prog.get("due_date"),
+                    "months": dict(prog.get("months", {})),
+                    "progress": prog.get("progress", 0),
+                    "version": prog.get("version", 0)
+                }
+            else:
+                # Merge month data - use data from this base if it has values
+                existing = programs_by_id[prog_id]
+                existing["version"] += prog.get("version", 0)
+                for month_key, month_data in prog.get("months", {}).items():
+                    if month_key not in existing["months"]:
+                        existing["months"][month_key] = month_data
+                    else:
+                        # Merge: prefer non-empty values from this base
+                        existing_month = existing["months"][month_key]
+                        for field in ["plan", "actual", "wpts_id", "plan_date", "impl_date", "pic_name", "pic_manager", "pic_email", "pic_manager_email"]:
+                            if month_data.get(field) and not existing_month.get(field):
+                                existing_month[field] = month_data[field]
+    return {"year": year or 2026, "category": category, "region": region, "version": version,
+            "programs": list(programs_by_id.values())}
 
 def save_matrix_data(category: str, region: str, data: dict, base: str = None):
     """Save matrix data for a specific category, region, and base."""
-    file_path = get_matrix_file_path(category, region, base)
-    file_path.parent.mkdir(parents=True, exist_ok=True)
-    with open(file_path, "w") as f:
-        json.dump(data, f, indent=2)
-
-def calculate_matrix_progress(program: dict) -> int:
-    """Calculate progress based on plan vs actual."""
-    total_plan = 0
-    total_actual = 0
-    for month_data in program.get("months", {}).values():
-        total_plan += month_data.get("plan", 0)
-        total_actual += month_data.get("actual", 0)
-    if total_plan == 0:
-        return 0
-    return min(100, int((total_actual / total_plan) * 100))
+    write_json(get_matrix_file_path(category, region, base), data, indent=2)
+    reindex_store(matrix_store_key(category, region, base), data)
+
 
 class MatrixMonthUpdate(BaseModel):
     plan: int
@@ -1500,28 +2117,49 @@ class MatrixProgramUpdate(BaseModel):
     due_date: Optional[str] = None
 
 @app.get("/matrix")
-def get_matrix_programs(category: str = "audit", region: str = "indonesia", base: str = None):
-    """Get all matrix programs for a specific category, region, and base."""
+def get_matrix_programs(request: Request, category: str = "audit", region: str = "indonesia", base: str = None,
+                        fields: Optional[str] = None, months: Optional[str] = None):
+    """Get all matrix programs for a specific category, region, and base (fields= / months= as for /otp)."""
+    projection = projection_param(fields, months)
     valid_categories = ["audit", "training", "drill", "meeting"]
     valid_regions = ["indonesia", "asia"]
     if category not in valid_categories:
         raise HTTPException(status_code=400, detail=f"Invalid category. Must be one of: {valid_categories}")
     if region not in valid_regions:
         raise HTTPException(status_code=400, detail=f"Invalid region. Must be one of: {valid_regions}")
-    return load_matrix_data(category, region, base)
+    return response_cache.respond(request, projected_key(("matrix", category, region, base), projection),
+                                  files_signature(matrix_source_files(category, region, base)), build_matrix_data,
+                                  category, region, base, projection)
+
+
+def build_matrix_data(category: str, region: str, base: str = None, projection: Projection = None):
+    if region == "indonesia" and base == "all":
+        # As for OTP, the merge may be shared with an older request
+        signature, data = flights.do(("matrix", category, region, "all"), merged_matrix_snapshot, category, region)
+        return Snapshot(signature, projection.document(data) if projection else data)
+    data = load_matrix_data(category, region, base)
+    return projection.document(data) if projection else data
 
 @app.get("/matrix/{program_id}")
-def get_matrix_program(program_id: int, category: str = "audit", region: str = "indonesia", base: str = None):
-    """Get a specific matrix program by ID."""
+def get_matrix_program(program_id: int, response: Response, category: str = "audit", region: str = "indonesia", base: str = None,
+                       fields: Optional[str] = None, months: Optional[str] = None):
+    """Get a specific matrix program by ID (fields= / months= as for /otp)."""
+    projection = projection_param(fields, months)
     data = load_matrix_data(category, region, base)
     for prog in data.get("programs", []):
         if prog.get("id") == program_id:
-            return prog
+            response.headers["ETag"] = etag(prog.get("version", 0))
+            return projection.program(prog) if projection else prog
     raise HTTPException(status_code=404, detail="Matrix program not found")
 
 @app.put("/matrix/{program_id}/month/{month}")
-def update_matrix_month(program_id: int, month: str, update: MatrixMonthUpdate, category: str = "audit", region: str = "indonesia", base: str = None):
-    """Update monthly plan/actual values for a matrix program."""
+def update_matrix_month(program_id: int, month: str, update: MatrixMonthUpdate, response: Response,
+                        category: str = "audit", region: str = "indonesia", base: str = None,
+                        if_match: Optional[str] = Header(None)):
+    """Update monthly plan/actual values for a matrix program.
+
+    Send If-Match with the program's version to detect conflicting edits (412).
+    """
     valid_months = ["jan", "feb", "mar", "apr", "may", "jun", "jul", "aug", "sep", "oct", "nov", "dec"]
     if month.lower() not in valid_months:
         raise HTTPException(status_code=400, detail=f"Invalid month. Must be one of: {valid_months}")
@@ -1538,92 +2176,1099 @@ def update_matrix_month(program_id: int, month: str, update: MatrixMonthUpdate,
         "pic_manager_email": update.pic_manager_email or ""
     }
     
-    # If base is 'all', update ALL 3 bases
+    # If base is 'all', update ALL bases
     if base == "all":
-        bases_to_update = ["narogong", "duri", "balikpapan"]
-        updated_prog = None
-        for b in bases_to_update:
-            data = load_matrix_data(category, region, b)
-            for prog in data.get("programs", []):
-                if prog.get("id") == program_id:
-                    if "months" not in prog:
-                        prog["months"] = {}
-                    prog["months"][month.lower()] = month_data
-                    prog["progress"] = calculate_matrix_progress(prog)
-                    updated_prog = prog
-                    break
-            save_matrix_data(category, region, data, b)
-        if updated_prog:
-            return {"message": "Matrix month updated in all bases", "program": updated_prog}
-        raise HTTPException(status_code=404, detail="Matrix program not found")
+        bases_to_update = get_bases()
+        with locked_documents(*[get_matrix_file_path(category, region, b) for b in bases_to_update]):
+            found = []
+            for b in bases_to_update:
+                data = load_matrix_data(category, region, b)
+                for prog in data.get("programs", []):
+                    if prog.get("id") == program_id:
+                        found.append((b, data, prog))
+                        break
+            if not found:
+                raise HTTPException(status_code=404, detail="Matrix program not found")
+            check_if_match(if_match, sum(p.get("version", 0) for _, _, p in found), f"Matrix program {program_id}")
+            
+            for b, data, prog in found:
+                if "months" not in prog:
+                    prog["months"] = {}
+                prog["months"][month.lower()] = dict(month_data)
+                prog["progress"] = calculate_matrix_progress(prog)
+                bump_version(prog)
+                bump_version(data)
+                save_matrix_data(category, region, data, b)
+                change_log.record(matrix_store_key(category, region, b), program_id, month.lower(), month_data)
+        
+        updated_prog = dict(found[-1][2], version=sum(p["version"] for _, _, p in found))
+        response.headers["ETag"] = etag(updated_prog["version"])
+        return {"message": "Matrix month updated in all bases", "program": updated_prog}
     
     # Update single base
-    data = load_matrix_data(category, region, base)
-    for prog in data.get("programs", []):
-        if prog.get("id") == program_id:
-            if "months" not in prog:
-                prog["months"] = {}
-            prog["months"][month.lower()] = month_data
-            prog["progress"] = calculate_matrix_progress(prog)
-            save_matrix_data(category, region, data, base)
-            return {"message": "Matrix month updated", "program": prog}
+    with document_lock(get_matrix_file_path(category, region, base)):
+        data = load_matrix_data(category, region, base)
+        for prog in data.get("programs", []):
+            if prog.get("id") == program_id:
+                check_if_match(if_match, prog.get("version", 0), f"Matrix program {program_id}")
+                if "months" not in prog:
+                    prog["months"] = {}
+                prog["months"][month.lower()] = month_data
+                prog["progress"] = calculate_matrix_progress(prog)
+                response.headers["ETag"] = etag(bump_version(prog))
+                bump_version(data)
+                save_matrix_data(category, region, data, base)
+                change_log.record(matrix_store_key(category, region, base), program_id, month.lower(), month_data)
+                return {"message": "Matrix month updated", "program": prog}
     raise HTTPException(status_code=404, detail="Matrix program not found")
 
 @app.post("/matrix")
 def create_matrix_program(program: MatrixProgramCreate, category: str = "audit", region: str = "indonesia"):
     """Create a new matrix program."""
-    data = load_matrix_data(category, region)
-    new_id = max([p.get("id", 0) for p in data.get("programs", [])] + [0]) + 1
-    new_program = {
-        "id": new_id,
-        "name": program.name,
-        "reference": program.reference or "",
-        "plan_type": program.plan_type or "Monthly",
-        "due_date": program.due_date,
-        "months": {m: {"plan": 0, "actual": 0, "wpts_id": ""} for m in ["jan", "feb", "mar", "apr", "may", "jun", "jul", "aug", "sep", "oct", "nov", "dec"]},
-        "progress": 0
-    }
-    data["programs"].append(new_program)
-    save_matrix_data(category, region, data)
+    with document_lock(get_matrix_file_path(category, region)):
+        data = load_matrix_data(category, region)
+        new_id = max([p.get("id", 0) for p in data.get("programs", [])] + [0]) + 1
+        new_program = {
+            "id": new_id,
+            "name": program.name,
+            "reference": program.reference or "",
+            "plan_type": program.plan_type or "Monthly",
+            "due_date": program.due_date,
+            "months": {m: {"plan": 0, "actual": 0, "wpts_id": ""} for m in ["jan", "feb", "mar", "apr", "may", "jun", "jul", "aug", "sep", "oct", "nov", "dec"]},
+            "progress": 0
+        }
+        data["programs"].append(new_program)
+        bump_version(data)
+        save_matrix_data(category, region, data)
+        change_log.record(matrix_store_key(category, region), new_id, program=new_program)
     return {"message": "Matrix program created", "program": new_program}
 
 @app.put("/matrix/{program_id}")
-def update_matrix_program(program_id: int, update: MatrixProgramUpdate, category: str = "audit", region: str = "indonesia"):
+def update_matrix_program(program_id: int, update: MatrixProgramUpdate, response: Response,
+                          category: str = "audit", region: str = "indonesia", if_match: Optional[str] = Header(None)):
     """Update matrix program metadata."""
-    data = load_matrix_data(category, region)
-    for prog in data.get("programs", []):
-        if prog.get("id") == program_id:
-            if update.name is not None:
-                prog["name"] = update.name
-            if update.reference is not None:
-                prog["reference"] = update.reference
-            if update.plan_type is not None:
-                prog["plan_type"] = update.plan_type
-            if update.due_date is not None:
-                prog["due_date"] = update.due_date
-            save_matrix_data(category, region, data)
-            return {"message": "Matrix program updated", "program": prog}
+    with document_lock(get_matrix_file_path(category, region)):
+        data = load_matrix_data(category, region)
+        for prog in data.get("programs", []):
+            if prog.get("id") == program_id:
+                check_if_match(if_match, prog.get("version", 0), f"Matrix program {program_id}")
+                if update.name is not None:
+                    prog["name"] = update.name
+                if update.reference is not None:
+                    prog["reference"] = update.reference
+                if update.plan_type is not None:
+                    prog["plan_type"] = update.plan_type
+                if update.due_date is not None:
+                    prog["due_date"] = update.due_date
+                response.headers["ETag"] = etag(bump_version(prog))
+                bump_version(data)
+                save_matrix_data(category, region, data)
+                change_log.record(matrix_store_key(category, region), program_id, program=update.model_dump(exclude_none=True))
+                return {"message": "Matrix program updated", "program": prog}
     raise HTTPException(status_code=404, detail="Matrix program not found")
 
 @app.delete("/matrix/{program_id}")
-def delete_matrix_program(program_id: int, category: str = "audit", region: str = "indonesia"):
+def delete_matrix_program(program_id: int, category: str = "audit", region: str = "indonesia",
+                          if_match: Optional[str] = Header(None)):
     """Delete a matrix program."""
-    data = load_matrix_data(category, region)
-    original_count = len(data.get("programs", []))
-    data["programs"] = [p for p in data.get("programs", []) if p.get("id") != program_id]
-    if len(data["programs"]) == original_count:
-        raise HTTPException(status_code=404, detail="Matrix program not found")
-    save_matrix_data(category, region, data)
+    with document_lock(get_matrix_file_path(category, region)):
+        data = load_matrix_data(category, region)
+        for prog in data.get("programs", []):
+            if prog.get("id") == program_id:
+                check_if_match(if_match, prog.get("version", 0), f"Matrix program {program_id}")
+                break
+        else:
+            raise HTTPException(status_code=404, detail="Matrix program not found")
+        data["programs"] = [p for p in data.get("programs", []) if p.get("id") != program_id]
+        bump_version(data)
+        save_matrix_data(category, region, data)
+        change_log.record(matrix_store_key(category, region), program_id, deleted=True)
     return {"message": f"Matrix program {program_id} deleted successfully"}
 
 
+# ===== SEARCH API =====
+PROGRAMS_SEARCH_SOURCE = ("programs",)
+
+
+def search_json_sources() -> dict:
+    """Search source key -> (file, payload defaults) for every OTP / Matrix document."""
+    bases = get_bases()
+    sources = {}
+    for base in [None] + bases:
+        sources[otp_store_key(base)] = (get_otp_file_path(base),
+                                        {"source": "otp", "region": "indonesia", "base": base, "category": None})
+    sources[("otp-asia",)] = (OTP_ASIA_DATA_FILE, {"source": "otp-asia", "region": "asia", "base": None, "category": None})
+    for category in ["audit", "training", "drill", "meeting"]:
+        for base in [None] + bases:
+            sources[matrix_store_key(category, "indonesia", base)] = (
+                get_matrix_file_path(category, "indonesia", base),
+                {"source": "matrix", "region": "indonesia", "base": base, "category": category})
+    return sources
+
+
+def item_json_sources() -> dict:
+    """search_json_sources() for per-item views (/my-items, /overdue, /at-risk).
+
+    Once bases are registered, the 'default' Indonesia documents mirror the
+    per-base ones (a new base starts as a copy), so they are left out and
+    each program month is listed once, under the base it belongs to.
+    """
+    sources = search_json_sources()
+    if get_bases():
+        sources = {key: source for key, source in sources.items() if key[-1] != "default"}
+    return sources
+
+
+def index_json_source(source_key, defaults: dict, data: dict, signature=()):
+    documents = []
+    for prog in data.get("programs", []):
+        payload = dict(defaults, id=prog.get("id"), title=prog.get("name", ""), plan_type=prog.get("plan_type", ""))
+        documents.append((source_key + (prog.get("id"),), program_fields(prog), payload))
+    search_index.replace_source(source_key, documents, signature)
+
+
+def reindex_search_source(source_key, data: dict):
+    """Re-index a document right after it was saved (once the index exists)."""
+    if not search_index.has_source(source_key):
+        return
+    path, defaults = search_json_sources().get(source_key, (None, None))
+    if path is not None:
+        index_json_source(source_key, defaults, data, files_signature([path]))
+
+
+def hse_program_document(program: HSEProgram):
+    payload = {
+        "source": "program",
+        "id": program.id,
+        "title": program.title,
+        "program_type": program.program_type,
+        "status": program.status,
+        "planned_date": program.planned_date.isoformat() if program.planned_date else None,
+        "pic_name": program.pic_name,
+    }
+    fields = [(program.title, 3.0), (program.program_type, 1.0), (program.pic_name, 1.5),
+              (program.manager_email, 1.5), (program.wpts_number, 1.5), (program.status, 1.0)]
+    return PROGRAMS_SEARCH_SOURCE + (program.id,), fields, payload
+
+
+@event.listens_for(HSEProgram, "after_insert")
+@event.listens_for(HSEProgram, "after_update")
+def _index_hse_program(mapper, connection, target):
+    if search_index.has_source(PROGRAMS_SEARCH_SOURCE):
+        search_index.put(PROGRAMS_SEARCH_SOURCE, *hse_program_document(target))
+
+
+@event.listens_for(HSEProgram, "after_delete")
+def _unindex_hse_program(mapper, connection, target):
+    search_index.delete(PROGRAMS_SEARCH_SOURCE, PROGRAMS_SEARCH_SOURCE + (target.id,))
+
+
+def refresh_search_index():
+    """Index sources that are new or whose files changed (e.g. written by another process)."""
+    for source_key, (path, defaults) in search_json_sources().items():
+        # Signature first: a write racing with the read just triggers another refresh
+        signature = files_signature([path])
+        if signature != search_index.signature(source_key):
+            index_json_source(source_key, defaults, read_json(path, dict), signature)
+    if not search_index.has_source(PROGRAMS_SEARCH_SOURCE):
+        with Session(engine) as session:
+            programs = session.exec(select(HSEProgram)).all()
+            search_index.replace_source(PROGRAMS_SEARCH_SOURCE, [hse_program_document(p) for p in programs])
+
+
+@app.get("/search")
+def search(q: str = Query(..., min_length=1), limit: int = Query(20, ge=1, le=100), source: Optional[str] = None):
+    """Full-text search over HSE programs and all OTP / Matrix programs.
+
+    Every word must match (the last one as a prefix); results are ranked by
+    relevance. ``source`` filters by comma-separated program, otp, otp-asia
+    or matrix.
+    """
+    flights.do(("search-refresh",), refresh_search_index)
+    sources = {s.strip() for s in source.split(",")} if source else None
+    total, hits = search_index.search(q, limit, sources)
+    return {"query": q, "total": total, "hits": hits}
+
+
+# ===== MY ITEMS API =====
+PEOPLE_TASKS_SOURCE = ("tasks",)
+
+
+def index_people_source(source_key, defaults: dict, data: dict, signature=()):
+    items = [(source_key + suffix, item) for suffix, item in month_items(data, defaults)]
+    people_index.replace_source(source_key, items, signature)
+
+
+def reindex_store(source_key, data: dict):
+    """Refresh the in-memory indexes of a document right after it was saved."""
+    reindex_search_source(source_key, data)
+    path, defaults = search_json_sources().get(source_key, (None, None))
+    if path is None:
+        return
+    signature = files_signature([path])
+    if people_index.has_source(source_key):
+        index_people_source(source_key, defaults, data, signature)
+    if exception_tracker.has_source(source_key):
+        exception_tracker.replace_source(source_key, defaults, data, signature)
+    if calendar_feeds.has_source(source_key):
+        calendar_feeds.replace_source(source_key, defaults, data, signature, file_modified(signature))
+
+
+def hse_program_item(program: HSEProgram):
+    item = {
+        "source": "program",
+        "program_id": program.id,
+        "program": program.title,
+        "program_type": program.program_type,
+        "status": program.status,
+        "date": program.planned_date.isoformat()[:10] if program.planned_date else None,
+        "pic_name": program.pic_name,
+        "pic_manager_email": program.manager_email,
+        "open": is_open_status(program.status),
+    }
+    return PROGRAMS_SEARCH_SOURCE + (program.id,), item
+
+
+def task_item(task: dict):
+    item = {
+        "source": "task",
+        "task_id": task["id"],
+        "project_id": task.get("project_id"),
+        "program": task.get("title", ""),
+        "code": task.get("code"),
+        "status": task.get("status"),
+        "date": task.get("implementation_date"),
+        "pic_name": task.get("pic_name"),
+        "pic_email": task.get("pic_email"),
+        "open": is_open_status(task.get("status")),
+    }
+    return PEOPLE_TASKS_SOURCE + (task["id"],), item
+
+
+def reindex_task(task: dict):
+    if people_index.has_source(PEOPLE_TASKS_SOURCE):
+        people_index.put(PEOPLE_TASKS_SOURCE, *task_item(task))
+
+
+@event.listens_for(HSEProgram, "after_insert")
+@event.listens_for(HSEProgram, "after_update")
+def _index_hse_program_people(mapper, connection, target):
+    if people_index.has_source(PROGRAMS_SEARCH_SOURCE):
+        people_index.put(PROGRAMS_SEARCH_SOURCE, *hse_program_item(target))
+
+
+@event.listens_for(HSEProgram, "after_delete")
+def _unindex_hse_program_people(mapper, connection, target):
+    people_index.delete(PROGRAMS_SEARCH_SOURCE, PROGRAMS_SEARCH_SOURCE + (target.id,))
+
+
+def refresh_people_index():
+    """Index sources that are new or whose files changed (e.g. written by another process)."""
+    sources = item_json_sources()
+    people_index.retain(list(sources) + [PROGRAMS_SEARCH_SOURCE, PEOPLE_TASKS_SOURCE])
+    for source_key, (path, defaults) in sources.items():
+        signature = files_signature([path])
+        if signature != people_index.signature(source_key):
+            index_people_source(source_key, defaults, read_json(path, dict), signature)
+    if not people_index.has_source(PROGRAMS_SEARCH_SOURCE):
+        with Session(engine) as session:
+            programs = session.exec(select(HSEProgram)).all()
+            people_index.replace_source(PROGRAMS_SEARCH_SOURCE, [hse_program_item(p) for p in programs])
+    if not people_index.has_source(PEOPLE_TASKS_SOURCE):
+        people_index.replace_source(PEOPLE_TASKS_SOURCE, [task_item(t) for t in tasks_storage])
+
+
+@app.get("/my-items")
+def my_items(email: Optional[str] = None, name: Optional[str] = None, status: str = "open",
+             role: Optional[str] = None, limit: int = Query(200, ge=1, le=1000)):
+    """Items where a person is PIC or manager, sorted by date.
+
+    Covers OTP / Matrix program months (by pic_email, pic_manager_email,
+    pic_name, pic_manager), HSE programs (pic_name, manager_email) and tasks
+    (pic_email, pic_name); OTP / Matrix months come from the per-base
+    documents when bases exist (see item_json_sources). ``status=open``
+    (default) keeps months with actual < plan and programs / tasks not
+    closed; ``status=all`` keeps everything. ``role`` filters by pic or
+    manager.
+    """
+    if not (email or "").strip() and not (name or "").strip():
+        raise HTTPException(status_code=400, detail="Give email or name")
+    if status not in ("open", "all"):
+        raise HTTPException(status_code=400, detail="status must be open or all")
+    if role not in (None, "pic", "manager"):
+        raise HTTPException(status_code=400, detail="role must be pic or manager")
+    flights.do(("people-refresh",), refresh_people_index)
+    items = people_index.lookup(email=email, name=name, open_only=status == "open", role=role, limit=limit)
+    return {"email": email, "name": name, "status": status, "count": len(items), "items": items}
+
+
+# ===== OVERDUE & AT-RISK API =====
+EXCEPTION_SOURCES = ["otp", "otp-asia", "matrix"]
+
+
+def refresh_exception_tracker():
+    """Track sources that are new or whose files changed, and catch up with the date."""
+    exception_tracker.roll()
+    sources = item_json_sources()
+    exception_tracker.retain(sources)
+    for source_key, (path, defaults) in sources.items():
+        signature = files_signature([path])
+        if signature != exception_tracker.signature(source_key):
+            exception_tracker.replace_source(source_key, defaults, read_json(path, dict), signature)
+
+
+def roll_exception_date():
+    """Daily job: move months that just became due into the overdue set."""
+    result = exception_tracker.roll()
+    log.info("%s: %d months became overdue", result["date"], result["newly_overdue"],
+             extra={"event": "overdue.rollover"})
+    return result
+
+
+SCHEDULED_JOBS["daily_exception_rollover"] = roll_exception_date
+
+
+def exception_filters(source: Optional[str], base: Optional[str], category: Optional[str]) -> dict:
+    return {
+        "sources": set(_split_param(source, EXCEPTION_SOURCES, "source")) if source else None,
+        "bases": set(_split_param(base, ["default"] + get_bases(), "base")) if base else None,
+        "categories": set(_split_param(category, MATRIX_CATEGORIES, "category")) if category else None,
+    }
+
+
+@app.get("/overdue")
+def get_overdue(source: Optional[str] = None, base: Optional[str] = None, category: Optional[str] = None,
+                pic: Optional[str] = None, limit: int = Query(500, ge=1, le=5000)):
+    """OTP / Matrix months past their plan_date (or month end) with actual < plan.
+
+    Filters take comma-separated values; ``pic`` matches a PIC or manager
+    name or email. Oldest due date first. Months come from the per-base
+    documents when bases exist (see item_json_sources).
+    """
+    filters = exception_filters(source, base, category)
+    flights.do(("exceptions-refresh",), refresh_exception_tracker)
+    items = exception_tracker.overdue(pic=pic, limit=limit, **filters)
+    return {"date": exception_tracker.today.isoformat(), "count": len(items), "items": items}
+
+
+@app.get("/at-risk")
+def get_at_risk(source: Optional[str] = None, base: Optional[str] = None, category: Optional[str] = None,
+                pic: Optional[str] = None, limit: int = Query(500, ge=1, le=5000)):
+    """Programs behind pace: actual so far below the plan of the months already over.
+
+    Same filters as /overdue. Largest gap first.
+    """
+    filters = exception_filters(source, base, category)
+    flights.do(("exceptions-refresh",), refresh_exception_tracker)
+    items = exception_tracker.at_risk(pic=pic, limit=limit, **filters)
+    return {"date": exception_tracker.today.isoformat(), "count": len(items), "items": items}
+
+
+# ===== YEARS & ARCHIVE API =====
+# The live documents hold each store's current year. Closed years are kept
+# in read-only, memory-mapped archives (see archive.py), one per year.
+MATRIX_CATEGORIES = ["audit", "training", "drill", "meeting"]
+
+
+def archive_key(store_key: tuple) -> str:
+    return "/".join(store_key)
+
+
+def program_stores() -> list:
+    """(store key, path, progress function) of every live OTP / Matrix document."""
+    stores = [(otp_store_key(), get_otp_file_path(), calculate_progress)]
+    stores += [(otp_store_key(b), get_otp_file_path(b), calculate_progress) for b in get_bases()]
+    stores.append((("otp-asia",), OTP_ASIA_DATA_FILE, calculate_progress_asia))
+    for category in MATRIX_CATEGORIES:
+        stores.append((matrix_store_key(category, "indonesia"), get_matrix_file_path(category, "indonesia"),
+                       calculate_matrix_progress))
+        stores += [(matrix_store_key(category, "indonesia", b), get_matrix_file_path(category, "indonesia", b),
+                    calculate_matrix_progress) for b in get_bases()]
+        if document_exists(get_matrix_file_path(category, "asia")):
+            stores.append((matrix_store_key(category, "asia"), get_matrix_file_path(category, "asia"),
+                           calculate_matrix_progress))
+    return stores
+
+
+def archived_document(year: int, store_key: tuple):
+    """A store's document for an archived year, or None."""
+    year_archive = archive.open_archive(year)
+    return year_archive.document(archive_key(store_key)) if year_archive else None
+
+
+def archive_before_relabel(store_key: tuple, data: dict, year: int, whole: bool = False):
+    """Keep a store's current year in the archive before its year field is changed."""
+    old_year = data.get("year")
+    if old_year is None or old_year == year:
+        return
+    if whole:
+        archive.write_archive(old_year, documents={archive_key(store_key): data})
+    elif data.get("programs"):
+        archive.write_archive(old_year, stores={archive_key(store_key): data})
+
+
+def shift_year(value, years: int):
+    """Move an ISO date string by whole years (Feb 29 becomes Feb 28)."""
+    if not value or not years:
+        return value
+    try:
+        day = date.fromisoformat(str(value)[:10])
+    except ValueError:
+        return value
+    try:
+        return day.replace(year=day.year + years).isoformat()
+    except ValueError:
+        return day.replace(year=day.year + years, day=28).isoformat()
+
+
+def clone_for_year(data: dict, year: int, progress_fn, keep_plan: bool) -> dict:
+    """A store document for a new year: same programs, actuals and month details cleared."""
+    shift = year - data.get("year", year)
+    programs = []
+    for prog in data.get("programs", []):
+        new_prog = {k: v for k, v in prog.items() if k not in ("months", "progress")}
+        if new_prog.get("due_date"):
+            new_prog["due_date"] = shift_year(new_prog["due_date"], shift)
+        new_prog["months"] = {m: {"plan": (prog.get("months", {}).get(m) or {}).get("plan", 0) if keep_plan else 0,
+                                  "actual": 0} for m in EVIDENCE_MONTHS}
+        new_prog["progress"] = progress_fn(new_prog)
+        bump_version(new_prog)
+        programs.append(new_prog)
+    new_data = {k: v for k, v in data.items() if k != "programs"}
+    new_data["year"] = year
+    new_data["programs"] = programs
+    bump_version(new_data)
+    return new_data
+
+
+def clone_ll_for_year(data: dict, year: int) -> dict:
+    new_data = {k: v for k, v in data.items() if k not in ("lagging", "leading")}
+    for kind in ("lagging", "leading"):
+        new_data[kind] = [dict(ind, actual="0") for ind in data.get(kind, [])]
+        for ind in new_data[kind]:
+            bump_version(ind)
+    new_data["year"] = year
+    bump_version(new_data)
+    return new_data
+
+
+@app.get("/years")
+def get_years():
+    """The live year of every store and the archived years."""
+    live = {}
+    for key, path, _ in program_stores():
+        data = read_json(path)
+        if data is not None:
+            live[archive_key(key)] = data.get("year")
+    live["ll-indicator"] = load_ll_data().get("year")
+    return {"live": live, "archived": archive.archived_years()}
+
+
+@app.post("/years/rollover")
+def rollover_year(to_year: Optional[int] = None, keep_plan: bool = True, dry_run: bool = False):
+    """Start a new year for every OTP / Matrix store and the LL indicator, in one batch.
+
+    Each store's current year is archived, then its programs are cloned into
+    to_year (default: the latest live year + 1) with actuals and month
+    details cleared; plan values are kept unless keep_plan=false. Stores
+    already at or past to_year are left alone. All live documents are
+    written together, or none are.
+    """
+    stores = program_stores()
+    paths = [path for _, path, _ in stores] + [LL_DATA_FILE]
+    with locked_documents(*paths):
+        current = [(key, path, progress_fn, read_json(path)) for key, path, progress_fn in stores]
+        ll_data = load_ll_data()
+        years = [data.get("year") for *_, data in current if data] + [ll_data.get("year")]
+        to_year = to_year or max(y for y in years if y) + 1
+
+        to_archive = {}  # year -> (stores, documents)
+        writes, rolled = [], []
+        for key, path, progress_fn, data in current:
+            if data is None or data.get("year", to_year) >= to_year:
+                continue
+            to_archive.setdefault(data["year"], ({}, {}))[0][archive_key(key)] = data
+            writes.append((path, clone_for_year(data, to_year, progress_fn, keep_plan), data))
+            rolled.append(key)
+        if ll_data.get("year", to_year) < to_year:
+            to_archive.setdefault(ll_data["year"], ({}, {}))[1]["ll-indicator"] = ll_data
+            writes.append((LL_DATA_FILE, clone_ll_for_year(ll_data, to_year), ll_data))
+            rolled.append(("ll-indicator",))
+        summary = {"to_year": to_year, "dry_run": dry_run, "archived_years": sorted(to_archive),
+                   "stores": [archive_key(k) for k in rolled],
+                   "programs": sum(len(new.get("programs", [])) for _, new, _ in writes)}
+        if dry_run:
+            return summary
+
+        # Archive first: if writing the live documents fails, the archive
+        # only holds an extra copy of data that is still live
+        for year, (year_stores, year_documents) in to_archive.items():
+            archive.write_archive(year, year_stores, year_documents)
+        write_json_batch([(path, new, old, 4 if path == LL_DATA_FILE else 2) for path, new, old in writes])
+        # Every program changed, so the base overlays now hold whole documents
+        summary["repacked"] = [r["family"] for r in repack_grown(DATA_DIR, paths)]
+        for key, (path, new, _) in zip(rolled, writes):
+            if key != ("ll-indicator",):
+                reindex_store(key, new)
+            change_log.record(key, document=new)
+    log.info("Rolled %d stores over to %s", len(rolled), to_year, extra={"event": "years.rollover"})
+    return summary
+
+
+@app.get("/archive/{year}")
+def get_archive(year: int):
+    """List the stores held in a year's archive."""
+    year_archive = archive.open_archive(year)
+    if year_archive is None:
+        raise HTTPException(status_code=404, detail=f"No archive for {year}")
+    return {"year": year, "stores": year_archive.store_keys() + list(year_archive.documents),
+            "programs": year_archive.rows}
+
+
+@app.get("/archive/{year}/{source}")
+def get_archived_document(year: int, source: str, base: Optional[str] = None, category: str = "audit",
+                          region: str = "indonesia"):
+    """Read-only OTP / OTP ASIA / Matrix / LL indicator document of an archived year."""
+    if source == "otp":
+        key = otp_store_key(base)
+    elif source == "otp-asia":
+        key = ("otp-asia",)
+    elif source == "matrix":
+        key = matrix_store_key(category, region, base)
+    elif source == "ll-indicator":
+        key = ("ll-indicator",)
+    else:
+        raise HTTPException(status_code=404, detail="Unknown source. Must be one of: otp, otp-asia, matrix, ll-indicator")
+    data = archived_document(year, key)
+    if data is None:
+        raise HTTPException(status_code=404, detail=f"{archive_key(key)} is not archived for {year}")
+    return data
+
+
+def trend_store_keys(source: str, category: str, base: Optional[str]) -> list:
+    if source == "otp-asia":
+        return [("otp-asia",)]
+    bases = get_bases() if base == "all" else [base]
+    if source == "otp":
+        return [otp_store_key(b) for b in bases]
+    return [matrix_store_key(category, "indonesia", b) for b in bases]
+
+
+@app.get("/trends")
+def get_trends(source: str = "otp", base: Optional[str] = None, category: str = "audit",
+               from_year: Optional[int] = None, to_year: Optional[int] = None):
+    """Plan, actual and completion per program and year.
+
+    Only the years in [from_year, to_year] are read: live documents for
+    their current year, and the memory-mapped plan/actual grid of the
+    archive for older years. base=all sums the bases; programs are matched
+    across years by name.
+    """
+    if source not in ("otp", "otp-asia", "matrix"):
+        raise HTTPException(status_code=400, detail="Invalid source. Must be one of: otp, otp-asia, matrix")
+    if source == "matrix" and category not in MATRIX_CATEGORIES:
+        raise HTTPException(status_code=400, detail=f"Invalid category. Must be one of: {MATRIX_CATEGORIES}")
+    progress_fn = {"otp": calculate_progress, "otp-asia": calculate_progress_asia}.get(source, calculate_matrix_progress)
+    keys = trend_store_keys(source, category, base)
+    path_of = {key: path for key, path, _ in program_stores()}
+
+    cells_by_year = {}  # year -> {program name: [[plan, actual] * 12]}
+    names = {}
+
+    def add(year, name, cells):
+        if (from_year and year < from_year) or (to_year and year > to_year):
+            return
+        key = name.strip().lower()
+        names.setdefault(key, name)
+        totals = cells_by_year.setdefault(year, {}).setdefault(key, [[0, 0] for _ in EVIDENCE_MONTHS])
+        for total, (plan, actual) in zip(totals, cells):
+            total[0] += plan
+            total[1] += actual
+
+    live_years = set()
+    for key in keys:
+        data = read_json(path_of[key]) if key in path_of else None
+        if data is None:
+            continue
+        live_years.add(data.get("year"))
+        for prog in data.get("programs", []):
+            months = prog.get("months", {})
+            add(data.get("year"), prog.get("name", ""),
+                [((months.get(m) or {}).get("plan", 0), (months.get(m) or {}).get("actual", 0)) for m in EVIDENCE_MONTHS])
+    for year in archive.archived_years():
+        if year in live_years or (from_year and year < from_year) or (to_year and year > to_year):
+            continue
+        year_archive = archive.open_archive(year)
+        for key in keys:
+            for _, name, _, cells in year_archive.totals(archive_key(key)):
+                add(year, name, cells)
+
+    years = sorted(cells_by_year)
+    programs = []
+    for key, name in names.items():
+        entry = {"name": name, "years": {}}
+        for year in years:
+            cells = cells_by_year[year].get(key)
+            if cells is None:
+                continue
+            prog = {"months": {m: {"plan": p, "actual": a} for m, (p, a) in zip(EVIDENCE_MONTHS, cells)}}
+            entry["years"][str(year)] = {"plan": sum(p for p, _ in cells), "actual": sum(a for _, a in cells),
+                                         "progress": progress_fn(prog)}
+        programs.append(entry)
+    summary = {}
+    for year in years:
+        plan = sum(p for cells in cells_by_year[year].values() for p, _ in cells)
+        actual = sum(a for cells in cells_by_year[year].values() for _, a in cells)
+        summary[str(year)] = {"programs": len(cells_by_year[year]), "plan": plan, "actual": actual,
+                              "progress": min(100, round(actual / plan * 100)) if plan else 0}
+    return {"source": source, "base": base, "category": category if source == "matrix" else None,
+            "years": years, "summary": summary, "programs": programs}
+
+
+# ===== ATTACHMENTS API =====
+# Evidence files for HSE programs, tasks and OTP / Matrix months. Uploads
+# are the raw request body (name in ?filename=), streamed into the
+# content-addressed blob store; the Attachment table maps owners to blobs.
+EVIDENCE_MONTHS = ["jan", "feb", "mar", "apr", "may", "jun", "jul", "aug", "sep", "oct", "nov", "dec"]
+
+
+def attachment_info(record: Attachment) -> dict:
+    return {
+        "id": record.id,
+        "owner": record.owner,
+        "filename": record.filename,
+        "content_type": record.content_type,
+        "size": record.size,
+        "sha256": record.sha256,
+        "created_at": record.created_at.isoformat(),
+        "url": f"/attachments/{record.id}",
+    }
+
+
+def find_program_in(data: dict, program_id: int):
+    for prog in data.get("programs", []):
+        if prog.get("id") == program_id:
+            return prog
+    return None
+
+
+def evidence_owner(kind: str, program_id, month: str = None, base: str = None, category: str = None) -> str:
+    """Validate the owner of an upload and return its owner key."""
+    if kind == "program":
+        with Session(engine) as session:
+            if not session.get(HSEProgram, program_id):
+                raise HTTPException(status_code=404, detail="Program not found")
+        return f"program:{program_id}"
+    if kind == "task":
+        if not any(task["id"] == program_id for task in tasks_storage):
+            raise HTTPException(status_code=404, detail="Task not found")
+        return f"task:{program_id}"
+
+    month = (month or "").lower()
+    if month not in EVIDENCE_MONTHS:
+        raise HTTPException(status_code=400, detail=f"Invalid month. Must be one of: {EVIDENCE_MONTHS}")
+    if base == "all":
+        raise HTTPException(status_code=400, detail="Attach evidence to one base at a time")
+    if kind == "otp":
+        if not find_program_in(load_otp_data(base), program_id):
+            raise HTTPException(status_code=404, detail="OTP program not found")
+        return f"otp:{base or 'default'}:{program_id}:{month}"
+    if kind == "otp-asia":
+        if not find_program_in(load_otp_asia_data(), program_id):
+            raise HTTPException(status_code=404, detail="OTP ASIA program not found")
+        return f"otp-asia:{program_id}:{month}"
+    if category not in ["audit", "training", "drill", "meeting"]:
+        raise HTTPException(status_code=400, detail="Invalid category. Must be one of: ['audit', 'training', 'drill', 'meeting']")
+    if not find_program_in(load_matrix_data(category, "indonesia", base), program_id):
+        raise HTTPException(status_code=404, detail="Matrix program not found")
+    return f"matrix:{category}:{base or 'default'}:{program_id}:{month}"
+
+
+def save_attachment(record: Attachment) -> dict:
+    with Session(engine) as session:
+        session.add(record)
+        if record.owner.startswith("program:"):
+            # The first evidence file becomes the program's evidence link
+            program = session.get(HSEProgram, int(record.owner.split(":")[1]))
+            session.flush()
+            if program is not None and not program.evidence_link:
+                program.evidence_link = f"/attachments/{record.id}"
+                session.add(program)
+        session.commit()
+        session.refresh(record)
+        info = attachment_info(record)
+    if record.owner.startswith("task:"):
+        for task in tasks_storage:
+            if task["id"] == record.owner.split(":", 1)[1]:
+                task.setdefault("attachments", []).append(info)
+    return info
+
+
+async def receive_upload(request: Request, owner: str, filename: Optional[str]) -> dict:
+    """Stream the request body into the blob store and record the attachment."""
+    writer = await run_in_threadpool(attachments.BlobWriter)
+    try:
+        async for chunk in request.stream():
+            if chunk:
+                await run_in_threadpool(writer.write, chunk)
+        sha256, size = await run_in_threadpool(writer.commit)
+    except attachments.TooLarge as e:
+        writer.abort()
+        raise HTTPException(status_code=413, detail=str(e))
+    except BaseException:
+        writer.abort()
+        raise
+    filename = attachments.safe_filename(filename)
+    content_type = request.headers.get("content-type") or mimetypes.guess_type(filename)[0] or "application/octet-stream"
+    record = Attachment(owner=owner, sha256=sha256, size=size, filename=filename, content_type=content_type)
+    return await run_in_threadpool(save_attachment, record)
+
+
+@app.post("/programs/{program_id}/evidence")
+async def upload_program_evidence(program_id: int, request: Request, filename: Optional[str] = None):
+    """Upload an evidence file for an HSE program (raw request body)."""
+    owner = await run_in_threadpool(evidence_owner, "program", program_id)
+    return await receive_upload(request, owner, filename)
+
+
+@app.post("/tasks/{task_id}/attachments")
+async def upload_task_attachment(task_id: str, request: Request, filename: Optional[str] = None):
+    """Upload an attachment for a task (raw request body)."""
+    owner = evidence_owner("task", task_id)
+    return await receive_upload(request, owner, filename)
+
+
+@app.post("/otp/{program_id}/month/{month}/evidence")
+async def upload_otp_evidence(program_id: int, month: str, request: Request, base: Optional[str] = None,
+                              filename: Optional[str] = None):
+    """Upload evidence for one month of an OTP program in a base."""
+    owner = await run_in_threadpool(evidence_owner, "otp", program_id, month, base)
+    return await receive_upload(request, owner, filename)
+
+
+@app.post("/otp-asia/{program_id}/month/{month}/evidence")
+async def upload_otp_asia_evidence(program_id: int, month: str, request: Request, filename: Optional[str] = None):
+    """Upload evidence for one month of an OTP ASIA program."""
+    owner = await run_in_threadpool(evidence_owner, "otp-asia", program_id, month)
+    return await receive_upload(request, owner, filename)
+
+
+@app.post("/matrix/{program_id}/month/{month}/evidence")
+async def upload_matrix_evidence(program_id: int, month: str, request: Request, category: str = "audit",
+                                 base: Optional[str] = None, filename: Optional[str] = None):
+    """Upload evidence for one month of a Matrix program in a base."""
+    owner = await run_in_threadpool(evidence_owner, "matrix", program_id, month, base, category)
+    return await receive_upload(request, owner, filename)
+
+
+@app.get("/attachments")
+def list_attachments(owner: str = Query(..., description="Owner key or prefix, e.g. otp:duri:5:jan or otp:duri"),
+                     session: Session = Depends(get_session)):
+    """List attachments of an owner; a prefix ending at a ':' boundary lists all below it."""
+    query = select(Attachment).where((Attachment.owner == owner) | Attachment.owner.startswith(owner + ":"))
+    return [attachment_info(a) for a in session.exec(query.order_by(Attachment.id)).all()]
+
+
+@app.get("/attachments/{attachment_id}")
+def download_attachment(attachment_id: int, request: Request, session: Session = Depends(get_session)):
+    """Download an attachment. Supports Range requests and If-None-Match (the ETag is the sha256)."""
+    record = session.get(Attachment, attachment_id)
+    if not record:
+        raise HTTPException(status_code=404, detail="Attachment not found")
+    path = attachments.blob_path(record.sha256)
+    if not path.exists():
+        raise HTTPException(status_code=404, detail="Attachment content is missing")
+    headers = {"ETag": f'"{record.sha256}"', "Cache-Control": "private, max-age=86400"}
+    if etag_matches(request.headers.get("if-none-match"), {headers["ETag"]}):
+        return Response(status_code=304, headers=headers)
+    # FileResponse serves single and multi-range requests (206) and If-Range
+    return FileResponse(path, media_type=record.content_type, filename=record.filename,
+                        content_disposition_type="inline", headers=headers)
+
+
+@app.delete("/attachments/{attachment_id}")
+def delete_attachment(attachment_id: int, session: Session = Depends(get_session)):
+    """Delete an attachment; its blob is removed by the next GC pass if nothing else uses it."""
+    record = session.get(Attachment, attachment_id)
+    if not record:
+        raise HTTPException(status_code=404, detail="Attachment not found")
+    url = f"/attachments/{attachment_id}"
+    if record.owner.startswith("program:"):
+        program = session.get(HSEProgram, int(record.owner.split(":")[1]))
+        if program is not None and program.evidence_link == url:
+            program.evidence_link = None
+            session.add(program)
+    session.delete(record)
+    session.commit()
+    for task in tasks_storage:
+        task["attachments"] = [a for a in task.get("attachments", []) if a.get("id") != attachment_id]
+    return {"message": f"Attachment {attachment_id} deleted"}
+
+
+def collect_attachment_garbage(dry_run: bool = False) -> dict:
+    """Remove blobs no attachment refers to (after the grace period)."""
+    with Session(engine) as session:
+        referenced = set(session.exec(select(Attachment.sha256).distinct()).all())
+    stats = attachments.collect_garbage(referenced, dry_run=dry_run)
+    log.info("Attachment GC: %d of %d blobs (%d bytes) %sremoved", stats["removed"], stats["blobs"],
+             stats["removed_bytes"], "would be " if dry_run else "", extra={"event": "attachments.gc"})
+    return stats
+
+
+SCHEDULED_JOBS["daily_attachment_gc"] = collect_attachment_garbage
+
+
+@app.post("/admin/attachments/gc")
+def attachment_gc(dry_run: bool = False):
+    """Run the blob garbage collection now."""
+    return collect_attachment_garbage(dry_run)
+
+
+# ===== EXPORT API =====
+EXPORT_FORMATS = {
+    "csv": "text/csv; charset=utf-8",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+
+
+def export_documents(sources: list, categories: list, bases: list):
+    """Yield (source, region, base, category, store key, path, progress function) per selected document."""
+    for source in sources:
+        if source == "otp":
+            for b in bases:
+                yield "otp", "indonesia", b, "", otp_store_key(b), get_otp_file_path(b), calculate_progress
+        elif source == "otp-asia":
+            yield "otp-asia", "asia", "", "", ("otp-asia",), OTP_ASIA_DATA_FILE, calculate_progress_asia
+        elif source == "matrix":
+            for category in categories:
+                for b in bases:
+                    yield "matrix", "indonesia", b, category, matrix_store_key(category, "indonesia", b), \
+                        get_matrix_file_path(category, "indonesia", b), calculate_matrix_progress
+
+
+def export_rows(sources: list, categories: list, bases: list, years: set, layout: str):
+    """Rows for the selection, reading one document at a time.
+
+    Without a year selection only the live documents are exported; selected
+    years that are not live are read from their archives.
+    """
+    for source, region, b, category, key, path, progress_fn in export_documents(sources, categories, bases):
+        live = read_json(path)
+        live_year = live.get("year") if live else None
+        documents = [live] if live is not None and (not years or live_year in years) else []
+        for year in sorted(years - {live_year}):
+            documents.append(archived_document(year, key))
+        for data in documents:
+            if data is None:
+                continue
+            prefix = [source, region, b, category, data.get("year", "")]
+            for prog in data.get("programs", []):
+                yield from export.program_rows(prog, prefix, layout, progress_fn)
+
+
+def _split_param(value: str, allowed: list, what: str) -> list:
+    items = [v.strip() for v in value.split(",") if v.strip()]
+    invalid = [v for v in items if v not in allowed]
+    if invalid or not items:
+        raise HTTPException(status_code=400, detail=f"Invalid {what}: {', '.join(invalid) or value!r}. Must be from: {allowed}")
+    return items
+
+
+@app.get("/export/{fmt}")
+def export_grid(fmt: str, source: str = "otp,otp-asia,matrix", category: str = "audit,training,drill,meeting",
+                base: str = "all", year: Optional[str] = None, layout: str = "grid"):
+    """Stream OTP / Matrix data as CSV or XLSX.
+
+    All selectors take comma-separated values; base=all means every
+    registered base. layout=grid gives one row per program with Plan/Actual
+    per month, layout=months one row per program-month with dates and PICs.
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise HTTPException(status_code=404, detail=f"Unknown export format. Must be one of: {list(EXPORT_FORMATS)}")
+    if layout not in export.LAYOUTS:
+        raise HTTPException(status_code=400, detail=f"Invalid layout. Must be one of: {list(export.LAYOUTS)}")
+    sources = _split_param(source, ["otp", "otp-asia", "matrix"], "source")
+    categories = _split_param(category, ["audit", "training", "drill", "meeting"], "category")
+    bases = get_bases() if base == "all" else _split_param(base, get_bases(), "base")
+    try:
+        years = {int(y) for y in year.split(",") if y.strip()} if year else set()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="year must be a comma-separated list of years")
+
+    rows = export_rows(sources, categories, bases, years, layout)
+    header = export.LAYOUTS[layout]
+    body = export.csv_stream(header, rows) if fmt == "csv" else export.xlsx_stream(header, rows, "HSE " + layout)
+    filename = f"hse-{'-'.join(sources)}-{layout}-{date.today().isoformat()}.{fmt}"
+    return StreamingResponse(body, media_type=EXPORT_FORMATS[fmt],
+                             headers={"Content-Disposition": f'attachment; filename="{filename}"'})
+
+
+# ===== IMPORT API =====
+IMPORT_MAX_BYTES = int(os.getenv("HSE_IMPORT_MAX_BYTES", str(5 * 1024 * 1024)))
+
+
+def imported_store_key(target: str, base: str = None):
+    if target == "otp":
+        return otp_store_key(base)
+    if target == "otp-asia":
+        return ("otp-asia",)
+    return matrix_store_key(target, "indonesia", base)
+
+
+@app.post("/import/{target}")
+async def import_spreadsheet(target: str, request: Request, base: Optional[str] = None, year: Optional[int] = None,
+                             overwrite: bool = False, register_name: Optional[str] = None, dry_run: bool = False):
+    """Import a tab-separated spreadsheet export (the request body) into one store.
+
+    target is otp, otp-asia or a matrix category. The body is parsed while it
+    streams in; any validation error rejects the whole sheet with 422 and the
+    line-numbered issues. Programs are matched to existing ones by name, so
+    ids and month PIC details are kept. Use dry_run=true to only validate.
+    """
+    if target not in importer.TARGETS:
+        raise HTTPException(status_code=404, detail=f"Unknown import target. Must be one of: {importer.TARGETS}")
+    if base == "all":
+        raise HTTPException(status_code=400, detail="Import into one base at a time")
+    if target == "otp-asia":
+        base = None
+
+    parser = importer.SheetParser(target)
+    async for chunk in request.stream():
+        parser.feed(chunk)
+        if parser.bytes > IMPORT_MAX_BYTES:
+            raise HTTPException(status_code=413, detail=f"Import larger than {IMPORT_MAX_BYTES} bytes")
+    parser.close()
+
+    def saved(store_target, document):
+        key = imported_store_key(store_target, base)
+        reindex_store(key, document)
+        change_log.record(key, document=document)
+
+    try:
+        results = await run_in_threadpool(importer.load, [parser], base=base, year=year, data_dir=DATA_DIR,
+                                          overwrite=overwrite, register_name=register_name, dry_run=dry_run,
+                                          saved=saved)
+    except importer.ImportFailed as e:
+        raise HTTPException(status_code=422, detail={"message": str(e), "issues": e.issues})
+    return dict(results[0], base=base, dry_run=dry_run, warnings=parser.issues)
+
+
+# ===== DELTA SYNC API =====
+
+def store_file(store_key: tuple) -> Path:
+    """File of a change-log store."""
+    if store_key == ("kpi",):
+        return KPI_DATA_FILE
+    if store_key == ("ll-indicator",):
+        return LL_DATA_FILE
+    if store_key == ("otp-asia",):
+        return OTP_ASIA_DATA_FILE
+    base = None if store_key[-1] == "default" else store_key[-1]
+    if store_key[0] == "otp":
+        return get_otp_file_path(base)
+    return get_matrix_file_path(store_key[1], store_key[2], base)
+
+
+change_log.store_file = store_file
+
+
+def sync_source_files():
+    """Every file the sync snapshot is read from."""
+    return [BASES_FILE, KPI_DATA_FILE, LL_DATA_FILE] + [path for _, path, _ in program_stores()]
+
+
+def build_sync_snapshot():
+    """Full snapshot of every synced store, keyed the same way as deltas."""
+    matrix = {}
+    for category in ["audit", "training", "drill", "meeting"]:
+        indonesia = {"default": load_matrix_data(category, "indonesia")}
+        for base in get_bases():
+            indonesia[base] = load_matrix_data(category, "indonesia", base)
+        matrix[category] = {"indonesia": indonesia}
+        if document_exists(get_matrix_file_path(category, "asia")):
+            matrix[category]["asia"] = {"default": load_matrix_data(category, "asia")}
+
+    otp = {"default": load_otp_data()}
+    for base in get_bases():
+        otp[base] = load_otp_data(base)
+
+    return {
+        "otp": otp,
+        "otp-asia": load_otp_asia_data(),
+        "matrix": matrix,
+        "kpi": load_kpi_data(),
+        "ll-indicator": load_ll_data(),
+    }
+
+
+@app.get("/sync")
+def sync_changes(since: Optional[int] = Query(None, description="Last version seen by the client")):
+    """Return changed OTP/Matrix cells since a version, or a full snapshot if it is too old.
+
+    A file written by another process (e.g. the importer CLI) also forces a
+    full snapshot, as that write never reached the change log.
+    """
+    change_log.check_files(sync_source_files())
+    if since is not None:
+        version, changes = change_log.since(since)
+        if changes is not None:
+            return {"version": version, "full": False, "changes": collapse_changes(changes)}
+
+    # Read the version before the snapshot so edits racing with it are
+    # re-sent on the next call instead of being skipped.
+    version = change_log.version
+    return {"version": version, "full": True, "snapshot": build_sync_snapshot()}
+
+
 @app.post("/test-reminder")
 def test_reminder():
     """Manually trigger reminder check (for testing)."""
-    check_and_send_reminders()
+    check_and_send_reminders(dedupe=False)
     return {"message": "Reminder check executed"}
 
 
+# ===== WARM-UP =====
+# Run in the background after startup when HSE_WARMUP=1: reads every data
+# file once (filling the OS page cache and the lazily-imported code paths)
+# and builds the dashboard aggregates so the first visitors don't pay for it.
+@startup.register_warmup("otp")
+def warm_otp():
+    for base in get_bases() + ["all", None]:
+        get_otp_data(None, base)
+    get_otp_asia_data(None)
+
+
+@startup.register_warmup("matrix")
+def warm_matrix():
+    for category in ["audit", "training", "drill", "meeting"]:
+        for base in get_bases() + ["all", None]:
+            get_matrix_programs(None, category, "indonesia", base)
+
+
+@startup.register_warmup("kpi_ll")
+def warm_kpi_ll():
+    kpi_rollups.get(files_signature([KPI_DATA_FILE]), load_kpi_data)
+    load_ll_data()
+
+
+@startup.register_warmup("search")
+def warm_search():
+    refresh_search_index()
+
+
+@startup.register_warmup("statistics")
+def warm_statistics():
+    build_statistics()
+
+
+@startup.register_warmup("calendar")
+def warm_calendar():
+    get_calendar_events(None)
+
+
+startup.mark("imports")
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=7860)
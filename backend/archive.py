@@ -0,0 +1,225 @@
+"""Read-only, memory-mapped archives of past OTP / Matrix years.
+
+The live JSON documents hold the current year. When a year is closed, every
+store's document for it goes into ``archive/<year>.hsea``, one immutable
+file per year:
+
+    b"HSEARCH1" | header length (u64) | header JSON | padding to 8
+    | plan/actual grid | zlib(month details JSON)
+
+- The header lists the stores, each with its document fields (year,
+  version, ...) and its range of rows. It also holds the program columns:
+  ``id``, ``name`` and ``meta`` (the other program fields).
+- The grid is rows x 12 months x (plan, actual) as uint32, so per-program
+  totals come straight from the mapped file without parsing anything.
+- Month details (PIC, WPTS id, dates) are only decompressed when a whole
+  document is requested.
+- Stores without programs (the LL indicator) are kept whole in the header.
+
+Archives are replaced atomically, and an open ``Archive`` is cached until
+its file changes. A query across years therefore maps only the years it
+asks for.
+"""
+import json
+import mmap
+import os
+import struct
+import sys
+import tempfile
+import threading
+import zlib
+from array import array
+from pathlib import Path
+
+from store import DATA_DIR, document_lock, replace_file
+
+ARCHIVE_DIR = DATA_DIR / "archive"
+MAGIC = b"HSEARCH1"
+FORMAT_VERSION = 1
+MONTHS = ["jan", "feb", "mar", "apr", "may", "jun", "jul", "aug", "sep", "oct", "nov", "dec"]
+ROW_VALUES = len(MONTHS) * 2
+ROW_BYTES = ROW_VALUES * 4
+COUNT_MAX = 2 ** 32 - 1
+
+
+def archive_path(year: int) -> Path:
+    return ARCHIVE_DIR / f"{int(year)}.hsea"
+
+
+def archived_years() -> list:
+    if not ARCHIVE_DIR.exists():
+        return []
+    return sorted(int(p.stem) for p in ARCHIVE_DIR.glob("*.hsea") if p.stem.isdigit())
+
+
+def _count(value) -> int:
+    try:
+        return min(max(int(value or 0), 0), COUNT_MAX)
+    except (TypeError, ValueError):
+        return 0
+
+
+def _encode(year: int, stores: dict, documents: dict) -> bytes:
+    header_stores, ids, names, metas, details = [], [], [], [], []
+    grid = array("I")
+    for key in sorted(stores):
+        document = stores[key]
+        programs = document.get("programs", [])
+        header_stores.append({"key": key, "document": {k: v for k, v in document.items() if k != "programs"},
+                              "first": len(ids), "count": len(programs)})
+        for prog in programs:
+            ids.append(prog.get("id"))
+            names.append(prog.get("name", ""))
+            metas.append({k: v for k, v in prog.items() if k not in ("id", "name", "months")})
+            months = prog.get("months") or {}
+            row_details = {}
+            for month in MONTHS:
+                cell = months.get(month) or {}
+                grid.append(_count(cell.get("plan")))
+                grid.append(_count(cell.get("actual")))
+                extra = {k: v for k, v in cell.items() if k not in ("plan", "actual")}
+                if extra:
+                    row_details[month] = extra
+            details.append(row_details)
+
+    header = json.dumps({
+        "format": FORMAT_VERSION, "year": int(year), "byteorder": sys.byteorder, "rows": len(ids),
+        "stores": header_stores, "documents": documents,
+        "columns": {"id": ids, "name": names, "meta": metas},
+    }, separators=(",", ":")).encode("utf-8")
+    detail_bytes = zlib.compress(json.dumps(details, separators=(",", ":")).encode("utf-8"), 6)
+    prefix = MAGIC + struct.pack("<Q", len(header)) + header
+    padding = b"\0" * (-len(prefix) % 8)
+    return prefix + padding + grid.tobytes() + detail_bytes
+
+
+def write_archive(year: int, stores: dict = None, documents: dict = None) -> Path:
+    """Add or replace stores in the archive of ``year``.
+
+    ``stores`` maps a store key ("otp/duri", "matrix/audit/indonesia/duri")
+    to its program document; ``documents`` maps keys to whole documents.
+    Stores already archived for the year and not given are kept.
+    """
+    path = archive_path(year)
+    with document_lock(path):
+        return _write_archive(path, year, dict(stores or {}), dict(documents or {}))
+
+
+def _write_archive(path: Path, year: int, stores: dict, documents: dict) -> Path:
+    existing = open_archive(year)
+    if existing is not None:
+        for key in existing.store_keys():
+            stores.setdefault(key, existing.document(key))
+        for key, document in existing.documents.items():
+            documents.setdefault(key, document)
+    data = _encode(year, stores, documents)
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(prefix=f".{path.name}.", suffix=".tmp", dir=str(path.parent))
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        replace_file(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except FileNotFoundError:
+            pass
+        raise
+    return path
+
+
+class Archive:
+    """One year's archive, memory-mapped."""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        with open(self.path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mmap[:8] != MAGIC:
+            raise ValueError(f"{self.path.name} is not an HSE archive")
+        (header_length,) = struct.unpack("<Q", self._mmap[8:16])
+        header = json.loads(self._mmap[16:16 + header_length])
+        if header.get("format") != FORMAT_VERSION:
+            raise ValueError(f"{self.path.name}: unsupported archive format {header.get('format')}")
+        self.year = header["year"]
+        self.rows = header["rows"]
+        self.documents = header["documents"]
+        self._stores = {s["key"]: s for s in header["stores"]}
+        self._columns = header["columns"]
+        self._grid_offset = 16 + header_length + (-(16 + header_length) % 8)
+        self._details_offset = self._grid_offset + self.rows * ROW_BYTES
+        grid = memoryview(self._mmap)[self._grid_offset:self._details_offset]
+        if header["byteorder"] == sys.byteorder:
+            self._grid = grid.cast("I")
+        else:
+            swapped = array("I", grid)
+            swapped.byteswap()
+            self._grid = swapped
+        self._details = None
+
+    def store_keys(self) -> list:
+        return list(self._stores)
+
+    def has_store(self, key: str) -> bool:
+        return key in self._stores
+
+    def _row_cells(self, row: int) -> list:
+        values = self._grid[row * ROW_VALUES:(row + 1) * ROW_VALUES]
+        return [(values[2 * i], values[2 * i + 1]) for i in range(len(MONTHS))]
+
+    def totals(self, key: str):
+        """Yield (id, name, meta, [(plan, actual)] * 12) for each program of a store, from the grid only."""
+        store = self._stores.get(key)
+        if store is None:
+            return
+        for row in range(store["first"], store["first"] + store["count"]):
+            yield (self._columns["id"][row], self._columns["name"][row], self._columns["meta"][row],
+                   self._row_cells(row))
+
+    def document(self, key: str):
+        """Rebuild the full JSON document of a store (None if not archived)."""
+        if key in self.documents:
+            return self.documents[key]
+        store = self._stores.get(key)
+        if store is None:
+            return None
+        if self._details is None:
+            self._details = json.loads(zlib.decompress(self._mmap[self._details_offset:]))
+        programs = []
+        for row in range(store["first"], store["first"] + store["count"]):
+            months = {}
+            for month, (plan, actual) in zip(MONTHS, self._row_cells(row)):
+                months[month] = dict({"plan": plan, "actual": actual}, **self._details[row].get(month, {}))
+            programs.append(dict({"id": self._columns["id"][row], "name": self._columns["name"][row]},
+                                 **self._columns["meta"][row], months=months))
+        return dict(store["document"], programs=programs)
+
+    def close(self):
+        if isinstance(self._grid, memoryview):
+            self._grid.release()
+        self._mmap.close()
+
+
+_open = {}
+_open_lock = threading.Lock()
+
+
+def open_archive(year: int):
+    """Return the Archive of ``year`` (None if there is none), reopening it when the file changes."""
+    path = archive_path(year)
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        return None
+    signature = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+    with _open_lock:
+        cached = _open.get(path)
+        if cached is not None and cached[0] == signature:
+            return cached[1]
+        # A replaced archive's old mapping stays valid for readers holding it
+        archive = Archive(path)
+        _open[path] = (signature, archive)
+        return archive
@@ -0,0 +1,105 @@
+"""Pre-compressed, fingerprinted serving of the single-page frontend.
+
+``static/index.html`` carries ~500 KB of inline CSS and JavaScript. At
+startup it is split into a small HTML shell plus ``app.<hash>.css`` and
+``app.<hash>.js`` bundles. Each part is compressed once with gzip (and
+brotli when the ``brotli`` package is installed) and then served by
+Accept-Encoding negotiation with a strong ETag:
+
+- the bundles are content-addressed, so they are cached for a year as
+  ``immutable`` and never revalidated;
+- the HTML shell is ``no-cache``, so browsers revalidate it and get a
+  bodyless 304 when nothing changed.
+
+A repeat visit therefore costs one small conditional request. The bundle
+is rebuilt automatically when index.html changes on disk.
+"""
+import gzip
+import hashlib
+import re
+import threading
+from pathlib import Path
+
+import compress
+
+try:
+    import brotli
+except ImportError:  # gzip only
+    brotli = None
+
+
+INDEX_PATH = Path(__file__).parent / "static" / "index.html"
+ASSET_PREFIX = "/assets/"
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+BROTLI_QUALITY = 11
+
+_STYLE_RE = re.compile(r"<style>(.*?)</style>", re.S)
+_SCRIPT_RE = re.compile(r"<script>(.*?)</script>", re.S)
+
+
+class Asset:
+    """One static resource with its precompressed representations."""
+
+    def __init__(self, body: bytes, content_type: str, cache_control: str):
+        self.content_type = content_type
+        self.cache_control = cache_control
+        self.digest = hashlib.sha256(body).hexdigest()[:16]
+        self.encodings = {"identity": body, "gzip": gzip.compress(body, 9, mtime=0)}
+        if brotli is not None:
+            self.encodings["br"] = brotli.compress(body, quality=BROTLI_QUALITY)
+
+    def etag(self, encoding: str) -> str:
+        return compress.encoded_etag(f'"{self.digest}"', encoding)
+
+    def etags(self) -> set:
+        return {self.etag(encoding) for encoding in self.encodings}
+
+
+class Bundle:
+    """The HTML shell and its fingerprinted CSS/JS bundles."""
+
+    def __init__(self, html: str):
+        self.assets = {}
+        html = self._extract(html, _STYLE_RE, "css", "text/css; charset=utf-8",
+                             lambda url: f'<link rel="stylesheet" href="{url}">')
+        html = self._extract(html, _SCRIPT_RE, "js", "application/javascript; charset=utf-8",
+                             lambda url: f'<script src="{url}"></script>')
+        self.index = Asset(html.encode("utf-8"), "text/html; charset=utf-8", REVALIDATE)
+
+    def _extract(self, html: str, pattern, extension: str, content_type: str, tag):
+        # Inline blocks are concatenated in document order into one bundle
+        # that is referenced where the first block was
+        blocks = pattern.findall(html)
+        if not blocks:
+            return html
+        asset = Asset("\n".join(blocks).encode("utf-8"), content_type, IMMUTABLE)
+        name = f"app.{asset.digest}.{extension}"
+        self.assets[name] = asset
+        first = pattern.search(html)
+        html = html[:first.start()] + tag(ASSET_PREFIX + name) + pattern.sub("", html[first.end():])
+        return html
+
+
+_cache = {"mtime": None, "bundle": None}
+_lock = threading.Lock()
+
+
+def get_bundle():
+    """Return the current Bundle (None if there is no index.html), rebuilding on change."""
+    try:
+        mtime = INDEX_PATH.stat().st_mtime_ns
+    except FileNotFoundError:
+        return None
+    if _cache["mtime"] == mtime:
+        return _cache["bundle"]
+    with _lock:
+        if _cache["mtime"] != mtime:
+            _cache["bundle"] = Bundle(INDEX_PATH.read_text(encoding="utf-8"))
+            _cache["mtime"] = mtime
+    return _cache["bundle"]
+
+
+def negotiate(accept_encoding: str, available) -> str:
+    """Pick br, then gzip, then identity according to an Accept-Encoding header."""
+    return compress.negotiate(accept_encoding, available, ("br", "gzip"))
@@ -0,0 +1,115 @@
+"""Content-addressed blob storage for evidence and attachment files.
+
+Uploads are written to a temp file chunk by chunk while being hashed, then
+renamed to ``blobs/<first two hex digits>/<sha256>``. Identical files (the
+same evidence attached in several bases) are stored once; uploading an
+existing blob only refreshes its mtime.
+
+Which attachment points at which blob is kept in the ``Attachment`` table.
+``collect_garbage`` removes blobs that no attachment refers to. Blobs
+younger than the grace period are kept, so an upload that has stored its
+blob but not yet committed its row is never collected.
+"""
+import hashlib
+import os
+import re
+import tempfile
+import time
+from pathlib import Path
+
+from store import DATA_DIR, replace_file
+
+BLOB_DIR = Path(os.getenv("HSE_BLOB_DIR", str(DATA_DIR / "blobs")))
+MAX_BYTES = int(os.getenv("HSE_ATTACHMENT_MAX_BYTES", str(50 * 1024 * 1024)))
+GC_GRACE_SECONDS = int(os.getenv("HSE_BLOB_GC_GRACE", "3600"))
+
+_SHA256_RE = re.compile(r"^[0-9a-f]{64}$")
+_UNSAFE_FILENAME_RE = re.compile(r'[\x00-\x1f"\\/]+')
+
+
+class TooLarge(Exception):
+    """The upload exceeded the size limit."""
+
+
+def blob_path(sha256: str) -> Path:
+    if not _SHA256_RE.match(sha256):
+        raise ValueError(f"not a sha256 digest: {sha256!r}")
+    return BLOB_DIR / sha256[:2] / sha256
+
+
+def safe_filename(name: str, default: str = "evidence") -> str:
+    """Strip path parts and characters that break a Content-Disposition header."""
+    name = _UNSAFE_FILENAME_RE.sub("_", (name or "").replace("\\", "/").rsplit("/", 1)[-1]).strip(" .")
+    return name[:200] or default
+
+
+class BlobWriter:
+    """Stream one upload into the blob store."""
+
+    def __init__(self, max_bytes: int = MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._hash = hashlib.sha256()
+        tmp_dir = BLOB_DIR / "tmp"
+        tmp_dir.mkdir(parents=True, exist_ok=True)
+        fd, self._tmp_path = tempfile.mkstemp(prefix="upload.", suffix=".tmp", dir=str(tmp_dir))
+        self._file = os.fdopen(fd, "wb")
+
+    def write(self, chunk: bytes):
+        self.size += len(chunk)
+        if self.size > self.max_bytes:
+            raise TooLarge(f"upload larger than {self.max_bytes} bytes")
+        self._hash.update(chunk)
+        self._file.write(chunk)
+
+    def commit(self) -> tuple:
+        """Move the upload into place and return (sha256, size)."""
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        sha256 = self._hash.hexdigest()
+        path = blob_path(sha256)
+        if path.exists():
+            os.unlink(self._tmp_path)
+            os.utime(path)  # restart the GC grace period
+        else:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            replace_file(self._tmp_path, path)
+        return sha256, self.size
+
+    def abort(self):
+        self._file.close()
+        try:
+            os.unlink(self._tmp_path)
+        except FileNotFoundError:
+            pass
+
+
+def collect_garbage(referenced: set, grace_seconds: int = GC_GRACE_SECONDS, dry_run: bool = False) -> dict:
+    """Delete blobs not in ``referenced`` and stale temp files; return counts."""
+    cutoff = time.time() - grace_seconds
+    stats = {"blobs": 0, "bytes": 0, "removed": 0, "removed_bytes": 0, "temp_removed": 0}
+    if not BLOB_DIR.exists():
+        return stats
+    for path in BLOB_DIR.glob("??/*"):
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            continue
+        stats["blobs"] += 1
+        stats["bytes"] += stat.st_size
+        if path.name in referenced or stat.st_mtime > cutoff:
+            continue
+        stats["removed"] += 1
+        stats["removed_bytes"] += stat.st_size
+        if not dry_run:
+            path.unlink(missing_ok=True)
+    for path in (BLOB_DIR / "tmp").glob("upload.*.tmp"):
+        try:
+            if path.stat().st_mtime <= cutoff:
+                stats["temp_removed"] += 1
+                if not dry_run:
+                    path.unlink(missing_ok=True)
+        except FileNotFoundError:
+            continue
+    return stats
@@ -0,0 +1,59 @@
+"""Registry of the Indonesian bases (sites) that have their own OTP / Matrix files.
+
+The list lives in ``data/bases.json`` so a new site can be added without code
+changes. Multi-base reads fan out over a shared thread pool.
+"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from store import DATA_DIR, read_json
+
+
+BASES_FILE = DATA_DIR / "bases.json"
+DEFAULT_BASES = [
+    {"id": "narogong", "name": "Narogong"},
+    {"id": "duri", "name": "Duri"},
+    {"id": "balikpapan", "name": "Balikpapan"},
+]
+
+# File reads release the GIL, so a small pool is enough to overlap them
+load_executor = ThreadPoolExecutor(max_workers=int(os.getenv("LOAD_WORKERS", "8")), thread_name_prefix="load")
+
+_cache = {"mtime": None, "bases": DEFAULT_BASES}
+_cache_lock = threading.Lock()
+
+
+def get_base_registry() -> list:
+    """Return the configured bases as [{"id", "name"}], reloading on file change."""
+    try:
+        mtime = BASES_FILE.stat().st_mtime_ns
+    except FileNotFoundError:
+        return DEFAULT_BASES
+    with _cache_lock:
+        if _cache["mtime"] != mtime:
+            data = read_json(BASES_FILE, lambda: {"bases": DEFAULT_BASES})
+            _cache["bases"] = data.get("bases", DEFAULT_BASES)
+            _cache["mtime"] = mtime
+        return _cache["bases"]
+
+
+def get_bases() -> list:
+    """Return the configured base ids in display order."""
+    return [b["id"] for b in get_base_registry()]
+
+
+def get_base_name(base: str) -> str:
+    """Return the display name of a base."""
+    for b in get_base_registry():
+        if b["id"] == base:
+            return b.get("name", base.title())
+    return base.title()
+
+
+def load_all(loader, items) -> list:
+    """Call ``loader`` on every item concurrently, returning results in order."""
+    items = list(items)
+    if len(items) <= 1:
+        return [loader(item) for item in items]
+    return list(load_executor.map(loader, items))
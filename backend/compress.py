@@ -0,0 +1,332 @@
+"""Response compression: a streaming ASGI middleware and a precompressed cache.
+
+``CompressionMiddleware`` compresses responses of compressible types that
+are at least ``HSE_COMPRESS_MIN_BYTES`` long. The encoding is negotiated
+from Accept-Encoding: zstd, br or gzip (zstd and br only when the
+``zstandard`` / ``brotli`` packages are installed). Body chunks are
+compressed as they pass through, so streamed responses are never buffered
+whole. Responses that already carry a Content-Encoding are left alone, and
+so are partial (206) responses, whose byte ranges refer to the identity body.
+
+``ResponseCache`` keeps serialized JSON for hot read endpoints together
+with each compressed form (added on first demand), valid while a signature
+of its source files is unchanged. A cache hit skips loading, serializing
+and compressing, and carries a strong ETag so clients can revalidate.
+
+Both record raw and sent byte counts and the compression ratio per route.
+"""
+import hashlib
+import json
+import os
+import re
+import threading
+import zlib
+from collections import OrderedDict
+from typing import Any, NamedTuple
+
+from starlette.datastructures import MutableHeaders
+from starlette.responses import Response
+
+from metrics import response_bytes, compression_ratio
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+MINIMUM_SIZE = int(os.getenv("HSE_COMPRESS_MIN_BYTES", "1024"))
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 4
+ZSTD_LEVEL = 3
+COMPRESSIBLE_TYPES = ("application/json", "application/javascript", "text/", "image/svg+xml", "text/calendar")
+
+# Dynamic responses: zstd and brotli-4 are both faster than gzip-6 and smaller
+DYNAMIC_PREFERENCE = ("zstd", "br", "gzip")
+
+
+class _GzipEncoder:
+    def __init__(self):
+        self._z = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._z.compress(data)
+
+    def finish(self) -> bytes:
+        return self._z.flush()
+
+
+class _BrotliEncoder:
+    def __init__(self):
+        self._c = brotli.Compressor(quality=BROTLI_QUALITY)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._c.process(data)
+
+    def finish(self) -> bytes:
+        return self._c.finish()
+
+
+class _ZstdEncoder:
+    def __init__(self):
+        self._c = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compressobj()
+
+    def compress(self, data: bytes) -> bytes:
+        return self._c.compress(data)
+
+    def finish(self) -> bytes:
+        return self._c.flush()
+
+
+ENCODERS = {"gzip": _GzipEncoder}
+if brotli is not None:
+    ENCODERS["br"] = _BrotliEncoder
+if zstandard is not None:
+    ENCODERS["zstd"] = _ZstdEncoder
+
+
+def encode(encoding: str, data: bytes) -> bytes:
+    """Compress a complete body with one of ENCODERS."""
+    encoder = ENCODERS[encoding]()
+    return encoder.compress(data) + encoder.finish()
+
+
+def negotiate(accept_encoding: str, available, preference=DYNAMIC_PREFERENCE) -> str:
+    """Pick the first acceptable coding in ``preference`` that is available, else identity."""
+    accepted = {}
+    for item in (accept_encoding or "").split(","):
+        coding, _, params = item.strip().partition(";")
+        q = 1.0
+        match = re.search(r"q=([0-9.]+)", params)
+        if match:
+            try:
+                q = float(match.group(1))
+            except ValueError:
+                q = 0.0
+        if coding:
+            accepted[coding.strip().lower()] = q
+    for coding in preference:
+        q = accepted.get(coding, accepted.get("*", 0.0))
+        if coding in available and q > 0:
+            return coding
+    return "identity"
+
+
+def _route(scope) -> str:
+    return getattr(scope.get("route"), "path", None) or "unmatched"
+
+
+def record(route: str, encoding: str, raw: int, sent: int):
+    response_bytes.inc(raw, route=route, encoding=encoding, stage="raw")
+    response_bytes.inc(sent, route=route, encoding=encoding, stage="sent")
+    if sent:
+        compression_ratio.observe(raw / sent, route=route, encoding=encoding)
+
+
+class CompressionMiddleware:
+    """ASGI middleware compressing responses chunk by chunk."""
+
+    def __init__(self, app, minimum_size: int = MINIMUM_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        accept = ""
+        for name, value in scope.get("headers", []):
+            if name == b"accept-encoding":
+                accept = value.decode("latin-1")
+                break
+        encoding = negotiate(accept, ENCODERS)
+        if encoding == "identity":
+            await self.app(scope, receive, send)
+            return
+
+        state = {"start": None, "encoder": None, "passthrough": False, "raw": 0, "sent": 0}
+
+        async def send_compressed(message):
+            if message["type"] == "http.response.start":
+                # Held back until the first body chunk shows how big the response is
+                state["start"] = message
+                return
+            if message["type"] != "http.response.body" or state["passthrough"]:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            start = state.pop("start", None)
+            if start is not None:
+                headers = MutableHeaders(raw=start["headers"])
+                content_type = headers.get("content-type", "")
+                length = headers.get("content-length")
+                compressible = content_type.startswith(COMPRESSIBLE_TYPES)
+                too_small = (not more_body and len(body) < self.minimum_size) or (
+                    length is not None and int(length) < self.minimum_size)
+                vary = {v.strip().lower() for v in headers.get("vary", "").split(",")}
+                if compressible and "accept-encoding" not in vary:
+                    headers.add_vary_header("Accept-Encoding")
+                if (not compressible or too_small or "content-encoding" in headers
+                        or start["status"] in (204, 206, 304) or scope["method"] == "HEAD"):
+                    state["passthrough"] = True
+                    await send(start)
+                    await send(message)
+                    return
+                del headers["content-length"]
+                headers["content-encoding"] = encoding
+                # A strong validator can't be shared by two encodings of a body
+                current_etag = headers.get("etag")
+                if current_etag and not current_etag.startswith("W/"):
+                    headers["etag"] = "W/" + current_etag
+                state["encoder"] = ENCODERS[encoding]()
+                await send(start)
+
+            chunk = state["encoder"].compress(body)
+            if not more_body:
+                chunk += state["encoder"].finish()
+            state["raw"] += len(body)
+            state["sent"] += len(chunk)
+            if chunk or not more_body:
+                await send({"type": "http.response.body", "body": chunk, "more_body": more_body})
+            if not more_body:
+                record(_route(scope), encoding, state["raw"], state["sent"])
+
+        await self.app(scope, receive, send_compressed)
+
+
+def _dump(data) -> bytes:
+    # Same serialization as FastAPI's JSONResponse
+    return json.dumps(data, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode("utf-8")
+
+
+class Snapshot(NamedTuple):
+    """A built document and the signature of the sources it was read from.
+
+    A builder whose result may come from a build that started before the
+    caller took its signature (e.g. one shared through single-flight)
+    returns this, taking the signature inside the build before reading.
+    """
+    signature: Any
+    data: Any
+
+
+def encoded_etag(etag: str, encoding: str) -> str:
+    # Strong validators must differ per content-coding
+    return etag if encoding == "identity" else f'{etag[:-1]}-{encoding}"'
+
+
+def etag_matches(if_none_match: str, etags) -> bool:
+    """Whether an If-None-Match header matches any of ``etags`` (weak comparison)."""
+    if not if_none_match:
+        return False
+    tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return "*" in tags or not tags.isdisjoint(etags)
+
+
+class CachedBody:
+    """A rendered body with a strong ETag; each compressed form is made on first demand."""
+    __slots__ = ("etag", "bodies", "lock")
+
+    def __init__(self, body: bytes):
+        self.etag = f'"{hashlib.sha256(body).hexdigest()[:20]}"'
+        self.bodies = {"identity": body}
+        self.lock = threading.Lock()
+
+    def etag_for(self, encoding: str) -> str:
+        return encoded_etag(self.etag, encoding)
+
+    def etags(self) -> set:
+        return {self.etag_for(encoding) for encoding in self.bodies}
+
+    def body(self, encoding: str) -> bytes:
+        body = self.bodies.get(encoding)
+        if body is None:
+            with self.lock:
+                body = self.bodies.get(encoding)
+                if body is None:
+                    body = self.bodies[encoding] = encode(encoding, self.bodies["identity"])
+        return body
+
+
+class _Entry(CachedBody):
+    __slots__ = ("signature",)
+
+    def __init__(self, signature, body: bytes):
+        super().__init__(body)
+        self.signature = signature
+
+
+class ResponseCache:
+    """Serialized, precompressed JSON responses keyed by request and source-file signature."""
+
+    def __init__(self, max_entries: int = 256, minimum_size: int = MINIMUM_SIZE):
+        self.max_entries = max_entries
+        self.minimum_size = minimum_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _entry(self, key, signature, build, args) -> _Entry:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.signature == signature:
+                self._entries.move_to_end(key)
+                return entry
+        # The signature is taken before the sources are read, so a write that
+        # lands during the build only causes an extra rebuild, never stale data
+        result = build(*args)
+        if isinstance(result, Snapshot) and result.signature != signature:
+            # Joined a build that may predate this request's signature; the
+            # next one starts after it, so it reads at least what we saw
+            result = build(*args)
+        if isinstance(result, Snapshot):
+            signature, result = result
+        entry = _Entry(signature, _dump(result))
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry
+
+    def respond(self, request, key, signature, build, *args) -> Response:
+        """Return the cached response for ``key``, rebuilding with ``build(*args)`` if ``signature`` changed.
+
+        ``build`` returns the document, or a ``Snapshot`` whose signature is
+        the one the entry is kept under.
+
+        ``request`` may be None (e.g. warm-up); the cache is filled but the
+        response is sent uncompressed.
+        """
+        entry = self._entry(key, signature, build, args)
+        if request is None:
+            return Response(entry.bodies["identity"], media_type="application/json",
+                            headers={"ETag": entry.etag, "Vary": "Accept-Encoding"})
+
+        raw = entry.bodies["identity"]
+        encoding = "identity"
+        if len(raw) >= self.minimum_size:
+            encoding = negotiate(request.headers.get("accept-encoding"), ENCODERS)
+        headers = {"ETag": entry.etag_for(encoding), "Vary": "Accept-Encoding"}
+
+        if etag_matches(request.headers.get("if-none-match"), entry.etags()):
+            return Response(status_code=304, headers=headers)
+
+        body = entry.body(encoding)
+        if encoding != "identity":
+            headers["Content-Encoding"] = encoding
+            record(_route(request.scope), encoding, len(raw), len(body))
+        return Response(body, media_type="application/json", headers=headers)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+response_cache = ResponseCache()
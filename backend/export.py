@@ -0,0 +1,162 @@
+"""Streaming CSV / XLSX export of OTP and Matrix grids.
+
+Rows are produced by generators and written into a small buffer that is
+handed to the response every ``CHUNK_SIZE`` bytes, so memory stays bounded
+by one source document plus one chunk however much is selected, and the
+first bytes go out before later documents are even read.
+
+XLSX files are written with ``zipfile`` onto a non-seekable sink (entries
+use data descriptors) and the sheet uses inline strings, so there is no
+shared-string table to hold in memory.
+"""
+import csv
+import io
+import re
+import zipfile
+from xml.sax.saxutils import escape
+
+MONTHS = ["jan", "feb", "mar", "apr", "may", "jun", "jul", "aug", "sep", "oct", "nov", "dec"]
+CHUNK_SIZE = 64 * 1024
+
+GRID_HEADER = (["Source", "Region", "Base", "Category", "Year", "No", "Program", "Reference", "Plan Type", "Due Date"]
+               + [f"{m.title()} {kind}" for m in MONTHS for kind in ("Plan", "Actual")]
+               + ["Total Plan", "Total Actual", "Progress %"])
+MONTHS_HEADER = ["Source", "Region", "Base", "Category", "Year", "No", "Program", "Month", "Plan", "Actual",
+                 "WPTS ID", "Plan Date", "Impl Date", "PIC", "PIC Manager", "PIC Email", "PIC Manager Email"]
+LAYOUTS = {"grid": GRID_HEADER, "months": MONTHS_HEADER}
+
+_ILLEGAL_XML = re.compile(r"[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+
+def program_rows(prog: dict, prefix: list, layout: str, progress_fn):
+    """Rows for one program: one grid row, or one row per month."""
+    months = prog.get("months") or {}
+    if layout == "grid":
+        row = prefix + [prog.get("id"), prog.get("name", ""), prog.get("reference", ""),
+                        prog.get("plan_type", ""), prog.get("due_date") or ""]
+        total_plan = total_actual = 0
+        for m in MONTHS:
+            cell = months.get(m) or {}
+            plan, actual = cell.get("plan", 0), cell.get("actual", 0)
+            total_plan += plan
+            total_actual += actual
+            row += [plan, actual]
+        yield row + [total_plan, total_actual, progress_fn(prog)]
+        return
+    for m in MONTHS:
+        cell = months.get(m) or {}
+        yield prefix + [prog.get("id"), prog.get("name", ""), m, cell.get("plan", 0), cell.get("actual", 0),
+                        cell.get("wpts_id", ""), cell.get("plan_date", ""), cell.get("impl_date", ""),
+                        cell.get("pic_name", ""), cell.get("pic_manager", ""), cell.get("pic_email", ""),
+                        cell.get("pic_manager_email", "")]
+
+
+def csv_stream(header: list, rows):
+    """Yield CSV bytes (UTF-8 with BOM, so Excel detects the encoding)."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    buffer.write("\ufeff")
+    writer.writerow(header)
+    for row in rows:
+        writer.writerow(row)
+        if buffer.tell() >= CHUNK_SIZE:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode("utf-8")
+
+
+class _Sink:
+    """Write-only file object collecting zip output until it is drained."""
+
+    def __init__(self):
+        self._chunks = []
+        self.size = 0
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self.size += len(data)
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        self.size = 0
+        return data
+
+
+def _column(index: int) -> str:
+    name = ""
+    index += 1
+    while index:
+        index, rem = divmod(index - 1, 26)
+        name = chr(65 + rem) + name
+    return name
+
+
+def _cell(ref: str, value) -> str:
+    if isinstance(value, bool) or value is None:
+        value = "" if value is None else str(value)
+    if isinstance(value, (int, float)):
+        return f'<c r="{ref}"><v>{value}</v></c>'
+    text = escape(_ILLEGAL_XML.sub("", str(value)))
+    return f'<c r="{ref}" t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>'
+
+
+_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/worksheets/sheet1.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+    '</Types>')
+_ROOT_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="xl/workbook.xml"/></Relationships>')
+_WORKBOOK_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+    'Target="worksheets/sheet1.xml"/></Relationships>')
+
+
+def _workbook(sheet_name: str) -> str:
+    return ('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+            'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+            f'<sheets><sheet name="{escape(sheet_name[:31])}" sheetId="1" r:id="rId1"/></sheets></workbook>')
+
+
+def xlsx_stream(header: list, rows, sheet_name: str = "Export"):
+    """Yield the bytes of a single-sheet XLSX workbook."""
+    sink = _Sink()
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr("[Content_Types].xml", _CONTENT_TYPES)
+        zf.writestr("_rels/.rels", _ROOT_RELS)
+        zf.writestr("xl/workbook.xml", _workbook(sheet_name))
+        zf.writestr("xl/_rels/workbook.xml.rels", _WORKBOOK_RELS)
+        columns = [_column(i) for i in range(len(header))]
+        with zf.open("xl/worksheets/sheet1.xml", "w") as sheet:
+            sheet.write(b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                        b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+                        b'<sheetViews><sheetView workbookViewId="0"><pane ySplit="1" topLeftCell="A2" '
+                        b'activePane="bottomLeft" state="frozen"/></sheetView></sheetViews><sheetData>')
+            header_cells = "".join(_cell(f"{columns[i]}1", v) for i, v in enumerate(header))
+            sheet.write(f'<row r="1">{header_cells}</row>'.encode("utf-8"))
+            for number, row in enumerate(rows, start=2):
+                cells = "".join(_cell(f"{columns[i]}{number}", v) for i, v in enumerate(row))
+                sheet.write(f'<row r="{number}">{cells}</row>'.encode("utf-8"))
+                if sink.size >= CHUNK_SIZE:
+                    yield sink.drain()
+            sheet.write(b"</sheetData></worksheet>")
+    yield sink.drain()
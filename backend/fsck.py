@@ -0,0 +1,355 @@
+"""Integrity checker for the JSON data files.
+
+Validates the structure of every document in DATA_DIR, recomputes program
+progress and reports drift, duplicate ids, leftover temp files from
+interrupted writes, unreadable year archives and base files that do not
+match the registry. Packed documents (overlay.py) are checked as the
+document their template and overlay resolve to.
+
+    python fsck.py                # check, exit status 1 if there are errors
+    python fsck.py --fix          # also rewrite drifted progress values
+    python fsck.py --json         # machine-readable report
+    python fsck.py --data-dir /path/to/data
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import time
+from datetime import date
+from pathlib import Path
+
+MONTHS = ["jan", "feb", "mar", "apr", "may", "jun", "jul", "aug", "sep", "oct", "nov", "dec"]
+CELL_TEXT_FIELDS = ["wpts_id", "pic_name", "pic_manager", "pic_email", "pic_manager_email"]
+CELL_DATE_FIELDS = ["plan_date", "impl_date"]
+KPI_METRICS = ["fatality", "trir", "pvir", "environment", "fire", "firstaid", "occupational"]
+MATRIX_FILE_RE = re.compile(r"^matrix_(?P<category>[a-z0-9]+)_(?P<region>[a-z0-9]+)(?:_(?P<base>[a-z0-9_-]+))?\.json$")
+OTP_BASE_FILE_RE = re.compile(r"^otp_indonesia_(?P<base>[a-z0-9_-]+)\.json$")
+
+
+class Report:
+    """Issues found in one run, grouped by file."""
+
+    def __init__(self):
+        self.issues = []
+        self.files = 0
+        self.programs = 0
+        self.fixed = []
+
+    def add(self, level: str, file: str, where: str, message: str, **extra):
+        self.issues.append(dict(level=level, file=file, where=where, message=message, **extra))
+
+    def count(self, level: str) -> int:
+        return sum(1 for issue in self.issues if issue["level"] == level)
+
+
+def _is_int(value) -> bool:
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def _check_version(report, name, where, obj):
+    if "version" in obj and not (_is_int(obj["version"]) and obj["version"] >= 0):
+        report.add("error", name, where, f"version must be a non-negative integer, got {obj['version']!r}")
+
+
+def _check_cell(report, name, where, cell):
+    if not isinstance(cell, dict):
+        report.add("error", name, where, "month cell is not an object")
+        return
+    for field in ("plan", "actual"):
+        value = cell.get(field, 0)
+        if not _is_int(value) or value < 0:
+            report.add("error", name, f"{where}.{field}", f"must be a non-negative integer, got {value!r}")
+    for field in CELL_TEXT_FIELDS:
+        if cell.get(field) is not None and not isinstance(cell[field], str):
+            report.add("error", name, f"{where}.{field}", f"must be a string, got {cell[field]!r}")
+    for field in CELL_DATE_FIELDS:
+        value = cell.get(field)
+        if value:
+            try:
+                date.fromisoformat(str(value)[:10])
+            except ValueError:
+                report.add("warning", name, f"{where}.{field}", f"not an ISO date: {value!r}")
+
+
+def _check_programs(report, name, data, progress_fn):
+    programs = data.get("programs")
+    if not isinstance(programs, list):
+        report.add("error", name, "programs", "missing or not a list")
+        return
+    seen = set()
+    for index, prog in enumerate(programs):
+        where = f"programs[{index}]"
+        if not isinstance(prog, dict):
+            report.add("error", name, where, "program is not an object")
+            continue
+        report.programs += 1
+        prog_id = prog.get("id")
+        if not _is_int(prog_id):
+            report.add("error", name, f"{where}.id", f"missing or not an integer: {prog_id!r}")
+        elif prog_id in seen:
+            report.add("error", name, f"{where}.id", f"duplicate program id {prog_id}")
+        seen.add(prog_id)
+        if not isinstance(prog.get("name"), str):
+            report.add("error", name, f"{where}.name", "missing or not a string")
+        _check_version(report, name, where, prog)
+
+        months = prog.get("months", {})
+        if not isinstance(months, dict):
+            report.add("error", name, f"{where}.months", "not an object")
+            continue
+        for month_key, cell in months.items():
+            if month_key not in MONTHS:
+                report.add("error", name, f"{where}.months.{month_key}", "unknown month key")
+            _check_cell(report, name, f"{where}.months.{month_key}", cell)
+        missing = [m for m in MONTHS if m not in months]
+        if missing:
+            report.add("warning", name, f"{where}.months", f"missing months: {', '.join(missing)}")
+
+        if "progress" in prog and all(isinstance(c, dict) for c in months.values()):
+            try:
+                expected = progress_fn(prog)
+            except TypeError:
+                continue  # bad plan/actual values, already reported
+            if prog["progress"] != expected:
+                report.add("drift", name, f"{where}.progress",
+                           f"stored {prog['progress']!r}, recomputed {expected}",
+                           program_id=prog_id, stored=prog["progress"], expected=expected)
+
+
+def _check_kpi(report, name, data):
+    man_hours = data.get("man_hours")
+    kpi = data.get("kpi")
+    if not isinstance(man_hours, dict):
+        report.add("error", name, "man_hours", "missing or not an object")
+    else:
+        for year, hours in man_hours.items():
+            if not isinstance(hours, (int, float)) or isinstance(hours, bool) or hours < 0:
+                report.add("error", name, f"man_hours.{year}", f"must be a non-negative number, got {hours!r}")
+    if not isinstance(kpi, dict):
+        report.add("error", name, "kpi", "missing or not an object")
+        return
+    for year, metrics in kpi.items():
+        if not isinstance(metrics, dict):
+            report.add("error", name, f"kpi.{year}", "not an object")
+            continue
+        for metric in KPI_METRICS:
+            entry = metrics.get(metric)
+            if not isinstance(entry, dict):
+                report.add("warning", name, f"kpi.{year}.{metric}", "missing metric")
+                continue
+            for field in ("target", "result"):
+                value = entry.get(field)
+                if not isinstance(value, (int, float)) or isinstance(value, bool):
+                    report.add("error", name, f"kpi.{year}.{metric}.{field}", f"must be a number, got {value!r}")
+    versions = data.get("versions", {})
+    if not isinstance(versions, dict) or not all(_is_int(v) and v >= 0 for v in versions.values()):
+        report.add("error", name, "versions", "must map years to non-negative integers")
+
+
+def _check_ll(report, name, data):
+    for indicator_type in ("lagging", "leading"):
+        indicators = data.get(indicator_type)
+        if not isinstance(indicators, list):
+            report.add("error", name, indicator_type, "missing or not a list")
+            continue
+        seen = set()
+        for index, indicator in enumerate(indicators):
+            where = f"{indicator_type}[{index}]"
+            if not isinstance(indicator, dict):
+                report.add("error", name, where, "indicator is not an object")
+                continue
+            if not _is_int(indicator.get("id")):
+                report.add("error", name, f"{where}.id", "missing or not an integer")
+            elif indicator["id"] in seen:
+                report.add("error", name, f"{where}.id", f"duplicate indicator id {indicator['id']}")
+            seen.add(indicator.get("id"))
+            if not isinstance(indicator.get("name"), str):
+                report.add("error", name, f"{where}.name", "missing or not a string")
+            _check_version(report, name, where, indicator)
+
+
+def _check_bases(report, name, data):
+    bases = data.get("bases")
+    if not isinstance(bases, list):
+        report.add("error", name, "bases", "missing or not a list")
+        return []
+    ids = []
+    for index, base in enumerate(bases):
+        if not isinstance(base, dict) or not isinstance(base.get("id"), str) or not base["id"]:
+            report.add("error", name, f"bases[{index}]", "each base needs a string id")
+            continue
+        if base["id"] in ids:
+            report.add("error", name, f"bases[{index}].id", f"duplicate base id {base['id']}")
+        ids.append(base["id"])
+    return ids
+
+
+def _check_archives(report, archive_dir: Path):
+    from archive import Archive
+
+    for leftover in sorted(archive_dir.glob(".*.tmp")):
+        report.add("warning", f"archive/{leftover.name}", "", "temporary file left by an interrupted write")
+    for path in sorted(archive_dir.glob("*.hsea")):
+        name = f"archive/{path.name}"
+        report.files += 1
+        try:
+            year_archive = Archive(path)
+        except Exception as e:  # any damage to the header surfaces here
+            report.add("error", name, "", f"unreadable archive: {e}")
+            continue
+        try:
+            if str(year_archive.year) != path.stem:
+                report.add("error", name, "year", f"holds {year_archive.year}, but the file name says {path.stem}")
+            for key in year_archive.store_keys():
+                year_archive.document(key)
+            report.programs += year_archive.rows
+        except Exception as e:  # truncated grid or details
+            report.add("error", name, "", f"corrupt archive: {e}")
+        finally:
+            year_archive.close()
+
+
+def check(data_dir: Path) -> Report:
+    """Check every data file under ``data_dir``."""
+    from progress import calculate_progress, calculate_progress_asia, calculate_matrix_progress
+    from overlay import OVERLAY_SUFFIX, document_path
+    from store import document_exists, read_json
+
+    report = Report()
+    for leftover in sorted(data_dir.glob(".*.tmp")):
+        report.add("warning", leftover.name, "", "temporary file left by an interrupted write")
+
+    registry = None
+    bases_file = data_dir / "bases.json"
+    seen_bases = set()
+    for path in sorted(data_dir.glob("*.json")):
+        packed = path.name.endswith(OVERLAY_SUFFIX)
+        if packed:
+            # Checked as the document it resolves to (template + patch)
+            if document_path(path).exists():
+                report.add("warning", path.name, "", f"ignored: {document_path(path).name} exists as a plain file")
+                continue
+            path = document_path(path)
+        name = path.name
+        report.files += 1
+        try:
+            if packed:
+                data = read_json(path)
+            else:
+                with open(path) as f:
+                    data = json.load(f)
+        except ValueError as e:
+            report.add("error", name, "", f"invalid JSON (truncated or corrupt): {e}")
+            continue
+        except (FileNotFoundError, KeyError) as e:
+            report.add("error", name, "", f"overlay cannot be resolved (missing template?): {e}")
+            continue
+        if not isinstance(data, dict):
+            report.add("error", name, "", "top level is not an object")
+            continue
+        _check_version(report, name, "", data)
+
+        matrix = MATRIX_FILE_RE.match(name)
+        otp_base = OTP_BASE_FILE_RE.match(name)
+        if path == bases_file:
+            registry = _check_bases(report, name, data)
+        elif name == "kpi_data.json":
+            _check_kpi(report, name, data)
+        elif name == "ll_indicator.json":
+            _check_ll(report, name, data)
+        elif name in ("otp_data.json", "otp_asia_data.json") or otp_base:
+            fn = calculate_progress_asia if name == "otp_asia_data.json" else calculate_progress
+            _check_programs(report, name, data, fn)
+            if otp_base:
+                seen_bases.add(otp_base.group("base"))
+        elif matrix:
+            for field in ("category", "region"):
+                if field in data and data[field] != matrix.group(field):
+                    report.add("error", name, field, f"is {data[field]!r} but the file name says {matrix.group(field)!r}")
+            _check_programs(report, name, data, calculate_matrix_progress)
+            if matrix.group("base"):
+                seen_bases.add(matrix.group("base"))
+        else:
+            report.add("warning", name, "", "unrecognised data file")
+
+    _check_archives(report, data_dir / "archive")
+
+    if registry is not None:
+        for base in sorted(seen_bases - set(registry)):
+            report.add("warning", "bases.json", "", f"data files exist for base {base!r}, which is not registered")
+        for base in registry:
+            if not document_exists(data_dir / f"otp_indonesia_{base}.json"):
+                report.add("warning", "bases.json", "", f"registered base {base!r} has no OTP file")
+    return report
+
+
+def fix_progress(data_dir: Path, report: Report):
+    """Rewrite drifted progress values in place, under the document locks."""
+    from progress import calculate_progress, calculate_progress_asia, calculate_matrix_progress
+    from store import document_lock, read_json, write_json
+
+    for name in sorted({issue["file"] for issue in report.issues if issue["level"] == "drift"}):
+        path = data_dir / name
+        if name.startswith("matrix_"):
+            fn = calculate_matrix_progress
+        elif name == "otp_asia_data.json":
+            fn = calculate_progress_asia
+        else:
+            fn = calculate_progress
+        with document_lock(path):
+            data = read_json(path)
+            changed = 0
+            for prog in data.get("programs", []):
+                if "progress" in prog and prog["progress"] != fn(prog):
+                    prog["progress"] = fn(prog)
+                    changed += 1
+            if changed:
+                write_json(path, data, indent=2)
+                report.fixed.append({"file": name, "programs": changed})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the HSE JSON data files for corruption and drift.")
+    parser.add_argument("--data-dir", type=Path, default=None, help="Defaults to DATA_DIR or backend/data")
+    parser.add_argument("--fix", action="store_true", help="Rewrite drifted progress values")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    args = parser.parse_args()
+
+    if args.data_dir:
+        os.environ["DATA_DIR"] = str(args.data_dir)
+    sys.path.insert(0, str(Path(__file__).resolve().parent))
+    data_dir = args.data_dir or Path(os.getenv("DATA_DIR", Path(__file__).parent / "data"))
+
+    start = time.perf_counter()
+    report = check(data_dir)
+    if args.fix:
+        fix_progress(data_dir, report)
+    elapsed_ms = round((time.perf_counter() - start) * 1000, 1)
+
+    summary = {
+        "data_dir": str(data_dir),
+        "files": report.files,
+        "programs": report.programs,
+        "errors": report.count("error"),
+        "warnings": report.count("warning"),
+        "drift": report.count("drift"),
+        "fixed": report.fixed,
+        "elapsed_ms": elapsed_ms,
+    }
+    if args.json:
+        print(json.dumps(dict(summary, issues=report.issues), indent=2))
+    else:
+        for issue in report.issues:
+            where = f" {issue['where']}" if issue["where"] else ""
+            print(f"{issue['level'].upper():<8} {issue['file']}{where}: {issue['message']}")
+        for fixed in report.fixed:
+            print(f"FIXED    {fixed['file']}: progress rewritten for {fixed['programs']} programs")
+        print(f"{report.files} files, {report.programs} programs checked in {elapsed_ms} ms: "
+              f"{summary['errors']} errors, {summary['warnings']} warnings, {summary['drift']} drifted progress values")
+    sys.exit(1 if summary["errors"] else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,256 @@
+"""iCalendar (.ics) subscription feeds of OTP / Matrix plan and implementation dates.
+
+Each source document is reduced to its calendar rows (program, month, date,
+PIC). A fingerprint of those rows decides whether the document's events are
+rendered again: saving counts or other fields that never reach a calendar
+leaves the rendered VEVENTs, and every feed built from them, untouched.
+
+A feed (everything, one base, one category or one PIC email) is kept as a
+rendered body, with each compressed form added on first demand. It is
+rebuilt only when the fingerprint of a source it covers changed, and it
+carries a strong ETag and a Last-Modified, so a calendar client polling
+every few minutes mostly gets a 304 after a few stat() calls.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+
+from starlette.responses import Response
+
+import metrics
+from compress import ENCODERS, MINIMUM_SIZE, CachedBody, etag_matches, negotiate
+
+MONTHS = ["jan", "feb", "mar", "apr", "may", "jun", "jul", "aug", "sep", "oct", "nov", "dec"]
+PRODID = "-//HSE Dashboard//OTP and Matrix plan dates//EN"
+UID_DOMAIN = "hse-dashboard"
+REFRESH_INTERVAL = "PT1H"
+MEDIA_TYPE = "text/calendar; charset=utf-8"
+
+feed_builds = metrics.Counter("hse_ics_feed_builds_total", "iCalendar feed bodies rendered", ("feed",))
+source_renders = metrics.Counter("hse_ics_source_renders_total",
+                                 "Source documents whose calendar events were rendered again")
+
+
+def escape(text) -> str:
+    """TEXT value escaping (RFC 5545 3.3.11)."""
+    return (str(text).replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,")
+            .replace("\r\n", "\\n").replace("\n", "\\n").replace("\r", ""))
+
+
+def fold(line: str) -> str:
+    """Fold a content line at 75 octets without splitting a UTF-8 sequence."""
+    data = line.encode("utf-8")
+    if len(data) <= 75:
+        return line
+    parts, start, limit = [], 0, 75
+    while start < len(data):
+        end = min(start + limit, len(data))
+        while end < len(data) and data[end] & 0xC0 == 0x80:
+            end -= 1
+        parts.append(data[start:end].decode("utf-8"))
+        start, limit = end, 74  # continuation lines start with a space
+    return "\r\n ".join(parts)
+
+
+def _date(value):
+    try:
+        return datetime.strptime(str(value)[:10], "%Y-%m-%d").date()
+    except ValueError:
+        return None
+
+
+def category_label(defaults: dict) -> str:
+    return defaults.get("category") or "otp"
+
+
+def calendar_rows(data: dict) -> tuple:
+    """Everything of a document that reaches its calendar events, one row per dated month."""
+    rows = []
+    for prog in data.get("programs", []):
+        months = prog.get("months") or {}
+        for month in MONTHS:
+            cell = months.get(month) or {}
+            for kind in ("plan", "impl"):
+                day = _date(cell.get(f"{kind}_date")) if cell.get(f"{kind}_date") else None
+                if day is None:
+                    continue
+                rows.append((prog.get("id"), prog.get("name", "Unknown"), prog.get("plan_type", ""), month, kind,
+                             day, cell.get("pic_name", ""), cell.get("pic_email", ""), cell.get("pic_manager", ""),
+                             cell.get("pic_manager_email", "")))
+    return tuple(rows)
+
+
+def render_event(source_key, defaults: dict, row: tuple, stamp: datetime) -> str:
+    program_id, name, plan_type, month, kind, day, pic_name, pic_email, manager, manager_email = row
+    where = defaults.get("base") or defaults.get("region", "")
+    label = category_label(defaults)
+    summary = f"[{label.upper()} {where.title()}] {name}" + (" (implemented)" if kind == "impl" else "")
+    description = [f"Program: {name}", f"Month: {month.title()}"]
+    if plan_type:
+        description.append(f"Plan type: {plan_type}")
+    if pic_name or pic_email:
+        description.append(f"PIC: {' '.join(p for p in (pic_name, f'<{pic_email}>' if pic_email else '') if p)}")
+    if manager or manager_email:
+        description.append(f"Manager: {' '.join(p for p in (manager, f'<{manager_email}>' if manager_email else '') if p)}")
+    uid = "-".join(str(part) for part in source_key + (program_id, month, kind))
+    lines = [
+        "BEGIN:VEVENT",
+        f"UID:{uid}@{UID_DOMAIN}",
+        f"DTSTAMP:{stamp.strftime('%Y%m%dT%H%M%SZ')}",
+        f"DTSTART;VALUE=DATE:{day.strftime('%Y%m%d')}",
+        f"DTEND;VALUE=DATE:{(day + timedelta(days=1)).strftime('%Y%m%d')}",
+        f"SUMMARY:{escape(summary)}",
+        f"DESCRIPTION:{escape(chr(10).join(description))}",
+        f"CATEGORIES:{escape(label)}",
+        "TRANSP:TRANSPARENT",
+        "END:VEVENT",
+    ]
+    return "\r\n".join(fold(line) for line in lines) + "\r\n"
+
+
+def calendar_body(name: str, events) -> bytes:
+    head = ["BEGIN:VCALENDAR", "VERSION:2.0", f"PRODID:{PRODID}", "CALSCALE:GREGORIAN", "METHOD:PUBLISH",
+            f"X-WR-CALNAME:{escape(name)}", f"REFRESH-INTERVAL;VALUE=DURATION:{REFRESH_INTERVAL}",
+            f"X-PUBLISHED-TTL:{REFRESH_INTERVAL}"]
+    return ("\r\n".join(fold(line) for line in head) + "\r\n" + "".join(events) + "END:VCALENDAR\r\n").encode("utf-8")
+
+
+class _Source:
+    __slots__ = ("signature", "fingerprint", "stamp", "defaults", "events")
+
+    def __init__(self, signature, fingerprint, stamp, defaults, events):
+        self.signature = signature
+        self.fingerprint = fingerprint
+        self.stamp = stamp
+        self.defaults = defaults
+        self.events = events  # [(base, category, people, VEVENT text)]
+
+
+class _Feed(CachedBody):
+    __slots__ = ("version", "last_modified")
+
+    def __init__(self, version, body: bytes, last_modified: datetime):
+        super().__init__(body)
+        self.version = version
+        self.last_modified = last_modified
+
+
+def _covers(selector: tuple, defaults: dict) -> bool:
+    """Whether a source can contribute events to a feed."""
+    if selector[0] == "base":
+        return defaults.get("base") == selector[1]
+    if selector[0] == "category":
+        return category_label(defaults) == selector[1]
+    return True
+
+
+class CalendarFeeds:
+    """Rendered events per source and rendered feeds per selector (LRU for the per-PIC ones)."""
+
+    def __init__(self, max_feeds: int = 512):
+        self.max_feeds = max_feeds
+        self._lock = threading.RLock()
+        self._sources = {}
+        self._feeds = OrderedDict()
+
+    def signature(self, source_key):
+        with self._lock:
+            source = self._sources.get(source_key)
+            return source.signature if source else ()
+
+    def has_source(self, source_key) -> bool:
+        with self._lock:
+            return source_key in self._sources
+
+    def retain(self, source_keys):
+        """Forget sources that no longer exist (e.g. a removed base)."""
+        with self._lock:
+            for source_key in set(self._sources) - set(source_keys):
+                del self._sources[source_key]
+
+    def replace_source(self, source_key, defaults: dict, data: dict, signature=(), modified: float = None) -> bool:
+        """Take a saved document; returns whether its events changed.
+
+        ``modified`` (the file's mtime) becomes the DTSTAMP and Last-Modified
+        of the new events, so a restart renders the same bytes again.
+        """
+        rows = calendar_rows(data)
+        fingerprint = hashlib.sha1(repr((sorted(defaults.items(), key=str), rows)).encode("utf-8")).hexdigest()
+        with self._lock:
+            current = self._sources.get(source_key)
+            if current is not None and current.fingerprint == fingerprint:
+                current.signature = signature
+                return False
+        stamp = datetime.fromtimestamp(modified, timezone.utc) if modified else datetime.now(timezone.utc)
+        stamp = stamp.replace(microsecond=0)
+        events = []
+        for row in rows:
+            people = {p.strip().lower() for p in (row[7], row[9]) if p and p.strip()}
+            events.append((defaults.get("base"), category_label(defaults), people,
+                           render_event(source_key, defaults, row, stamp)))
+        source_renders.inc()
+        with self._lock:
+            self._sources[source_key] = _Source(signature, fingerprint, stamp, defaults, events)
+        return True
+
+    def feed(self, selector: tuple, name: str) -> _Feed:
+        """The feed for ``("all",)``, ``("base", b)``, ``("category", c)`` or ``("pic", email)``."""
+        with self._lock:
+            covered = [(key, source) for key, source in sorted(self._sources.items(), key=lambda s: str(s[0]))
+                       if _covers(selector, source.defaults)]
+            version = tuple((key, source.fingerprint) for key, source in covered)
+            current = self._feeds.get(selector)
+            if current is not None and current.version == version:
+                self._feeds.move_to_end(selector)
+                return current
+        pic = selector[1] if selector[0] == "pic" else None
+        events = [text for _, source in covered for _, _, people, text in source.events
+                  if pic is None or pic in people]
+        feed = _Feed(version, calendar_body(name, events),
+                     max((source.stamp for _, source in covered), default=datetime(1970, 1, 1, tzinfo=timezone.utc)))
+        if current is not None and current.etag == feed.etag:
+            # A covered source changed elsewhere; this feed's content did not
+            feed.last_modified = current.last_modified
+        feed_builds.inc(feed=selector[0])
+        with self._lock:
+            self._feeds[selector] = feed
+            self._feeds.move_to_end(selector)
+            while len(self._feeds) > self.max_feeds:
+                self._feeds.popitem(last=False)
+        return feed
+
+    def respond(self, request, selector: tuple, name: str) -> Response:
+        feed = self.feed(selector, name)
+        raw = feed.bodies["identity"]
+        encoding = "identity"
+        if len(raw) >= MINIMUM_SIZE:
+            encoding = negotiate(request.headers.get("accept-encoding"), ENCODERS)
+        headers = {"ETag": feed.etag_for(encoding), "Last-Modified": format_datetime(feed.last_modified, usegmt=True),
+                   "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match:
+            if etag_matches(if_none_match, feed.etags()):
+                return Response(status_code=304, headers=headers)
+        elif request.headers.get("if-modified-since"):
+            try:
+                since = parsedate_to_datetime(request.headers["if-modified-since"])
+            except (TypeError, ValueError):
+                since = None
+            if since is not None and since.tzinfo is not None and feed.last_modified <= since:
+                return Response(status_code=304, headers=headers)
+
+        body = feed.body(encoding)
+        if encoding != "identity":
+            headers["Content-Encoding"] = encoding
+        return Response(body, media_type=MEDIA_TYPE, headers=headers)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"sources": len(self._sources), "events": sum(len(s.events) for s in self._sources.values()),
+                    "feeds": len(self._feeds)}
+
+
+calendar_feeds = CalendarFeeds()
@@ -0,0 +1,512 @@
+"""Bulk importer for the tab-separated OTP / Matrix spreadsheet exports.
+
+The spreadsheets (``2026 HSE OTP.TXT``, ``AUDIT.TXT``, ``Training.txt`` ...)
+are exported as tab-separated text with:
+
+- a header block of two or three rows, where quoted cells may span lines
+  (``"DUE\\nDATE"``, ``"PROGRESS \\n(%)"``) and the last row labels the
+  interleaved PLAN / ACTUAL column of each month;
+- leading columns for the name and, depending on the sheet, reference /
+  guidance, plan type and due date (``31-Dec-25``);
+- an optional ``92%`` progress column;
+- further header blocks starting new sections (Training has
+  "Certification" and "Training Modules").
+
+Input is parsed incrementally as bytes arrive, so an upload is validated
+while it streams in. ``load`` then writes every parsed sheet for one base and
+year under the document locks, all or nothing.
+
+    python importer.py --base duri --year 2026 "2026 HSE OTP.TXT" AUDIT.TXT Training.txt
+    python importer.py --base newsite --register "New Site" --year 2027 *.TXT
+    python importer.py --dry-run training=Training.txt
+"""
+import argparse
+import codecs
+import json
+import re
+import sys
+from datetime import date, datetime
+from pathlib import Path
+
+from progress import calculate_progress, calculate_progress_asia, calculate_matrix_progress
+from store import DATA_DIR, bump_version, locked_documents, read_json, write_json_batch
+
+MONTHS = ["jan", "feb", "mar", "apr", "may", "jun", "jul", "aug", "sep", "oct", "nov", "dec"]
+MATRIX_CATEGORIES = ["audit", "training", "drill", "meeting"]
+TARGETS = ["otp", "otp-asia"] + MATRIX_CATEGORIES
+CELL_DETAIL_FIELDS = ["wpts_id", "plan_date", "impl_date", "pic_name", "pic_manager", "pic_email", "pic_manager_email"]
+DATE_FORMATS = ["%d-%b-%y", "%d-%b-%Y", "%Y-%m-%d", "%d/%m/%Y"]
+BASE_ID_RE = re.compile(r"^[a-z0-9_-]+$")
+READ_SIZE = 64 * 1024
+
+# Filename keywords used to guess a target, most specific first
+TARGET_KEYWORDS = [("asia", "otp-asia"), ("otp", "otp"), ("audit", "audit"), ("training", "training"),
+                   ("drill", "drill"), ("meeting", "meeting")]
+
+
+class ImportFailed(Exception):
+    """Raised when a sheet does not validate or cannot be loaded."""
+
+    def __init__(self, message: str, issues: list = None):
+        super().__init__(message)
+        self.issues = issues or []
+
+
+def guess_target(filename: str):
+    """Guess the import target from a spreadsheet file name, or None."""
+    name = Path(filename).name.lower()
+    for keyword, target in TARGET_KEYWORDS:
+        if keyword in name:
+            return target
+    return None
+
+
+def document_path(target: str, base: str = None, data_dir: Path = DATA_DIR) -> Path:
+    """Data file for a target (same naming as the API's store files)."""
+    if target == "otp-asia":
+        return Path(data_dir) / "otp_asia_data.json"
+    if target == "otp":
+        return Path(data_dir) / (f"otp_indonesia_{base}.json" if base else "otp_data.json")
+    suffix = f"_{base}" if base else ""
+    return Path(data_dir) / f"matrix_{target}_indonesia{suffix}.json"
+
+
+def progress_function(target: str):
+    if target == "otp":
+        return calculate_progress
+    if target == "otp-asia":
+        return calculate_progress_asia
+    return calculate_matrix_progress
+
+
+class TsvReader:
+    """Incremental tab-separated reader with spreadsheet-style quoting.
+
+    ``feed`` takes decoded text in arbitrary pieces and yields complete
+    records as ``(line_number, cells)``; a quoted cell may contain tabs,
+    newlines and doubled quotes.
+    """
+
+    def __init__(self):
+        self._cells = []
+        self._cell = []
+        self._quoted = False
+        self._at_cell_start = True
+        self._pending_quote = False
+        self._line = 1
+        self._record_line = 1
+
+    def _end_cell(self):
+        self._cells.append("".join(self._cell))
+        self._cell = []
+        self._at_cell_start = True
+
+    def _end_record(self):
+        self._end_cell()
+        record, self._cells = self._cells, []
+        return self._record_line, record
+
+    def feed(self, text: str):
+        for ch in text:
+            if self._pending_quote:
+                # A quote inside a quoted cell: doubled means a literal quote
+                self._pending_quote = False
+                if ch == '"':
+                    self._cell.append('"')
+                    continue
+                self._quoted = False
+            if self._quoted:
+                if ch == '"':
+                    self._pending_quote = True
+                    continue
+                if ch == "\n":
+                    self._line += 1
+                self._cell.append(ch)
+                continue
+            if ch == '"' and self._at_cell_start:
+                self._quoted = True
+                self._at_cell_start = False
+            elif ch == "\t":
+                self._end_cell()
+            elif ch == "\n":
+                self._line += 1
+                yield self._end_record()
+                self._record_line = self._line
+            elif ch != "\r":
+                self._cell.append(ch)
+                self._at_cell_start = False
+
+    def close(self):
+        """Yield the last record if the input did not end with a newline."""
+        if self._pending_quote:
+            self._pending_quote = self._quoted = False
+        if self._cells or self._cell:
+            yield self._end_record()
+
+
+def _label(cell: str) -> str:
+    return " ".join(cell.split()).upper()
+
+
+def _parse_count(value: str):
+    value = value.strip()
+    if not value:
+        return 0
+    try:
+        number = float(value.replace(",", ""))
+    except ValueError:
+        return None
+    if number < 0 or number != int(number):
+        return None
+    return int(number)
+
+
+def _parse_date(value: str):
+    value = value.strip()
+    if not value:
+        return None
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, fmt).date().isoformat()
+        except ValueError:
+            continue
+    return False
+
+
+def _parse_percent(value: str):
+    value = value.strip().rstrip("%").strip()
+    if not value:
+        return None
+    try:
+        return round(float(value))
+    except ValueError:
+        return False
+
+
+class _Section:
+    """Column layout of one header block."""
+
+    def __init__(self, title: str, labels: list, plan_row: list):
+        self.title = title
+        plan_columns = [i for i, cell in enumerate(plan_row) if _label(cell) == "PLAN"]
+        actual_columns = [i for i, cell in enumerate(plan_row) if _label(cell) == "ACTUAL"]
+        if len(plan_columns) != 12 or len(actual_columns) != 12:
+            raise ValueError(f"expected 12 PLAN/ACTUAL column pairs, found {len(plan_columns)}/{len(actual_columns)}")
+        self.months = list(zip(MONTHS, plan_columns, actual_columns))
+        for month, plan_col, actual_col in self.months:
+            label = labels[plan_col] if plan_col < len(labels) else ""
+            if month.upper() not in label.split() or actual_col != plan_col + 1:
+                raise ValueError(f"PLAN/ACTUAL columns out of order at {month.upper()}")
+        self.reference = self.plan_type = self.due_date = self.progress = None
+        for i, label in enumerate(labels[1:plan_columns[0]], start=1):
+            if "REFERENCE" in label or "GUIDANCE" in label:
+                self.reference = i
+            elif "DUE" in label:
+                self.due_date = i
+            elif label == "PLAN":
+                self.plan_type = i
+        for i in range(actual_columns[-1] + 1, len(labels)):
+            if "PROGRESS" in labels[i]:
+                self.progress = i
+
+
+class SheetParser:
+    """Parse one spreadsheet export as it is fed bytes.
+
+    ``programs`` holds the parsed rows in order; ``issues`` holds
+    ``{"level", "line", "message"}`` dicts, where errors make the sheet
+    unloadable and warnings are informational.
+    """
+
+    def __init__(self, target: str):
+        if target not in TARGETS:
+            raise ValueError(f"Unknown import target {target!r}. Must be one of: {TARGETS}")
+        self.target = target
+        self.programs = []
+        self.issues = []
+        self.sections = []
+        self.bytes = 0
+        self._decoder = codecs.getincrementaldecoder("utf-8-sig")(errors="replace")
+        self._reader = TsvReader()
+        self._header = None
+        self._progress_fn = progress_function(target)
+
+    @property
+    def errors(self) -> list:
+        return [issue for issue in self.issues if issue["level"] == "error"]
+
+    def _issue(self, level: str, line: int, message: str):
+        self.issues.append({"level": level, "line": line, "message": message})
+
+    def feed(self, data: bytes):
+        self.bytes += len(data)
+        for line, cells in self._reader.feed(self._decoder.decode(data)):
+            self._record(line, cells)
+
+    def close(self):
+        for line, cells in self._reader.close():
+            self._record(line, cells)
+        if self._header is not None:
+            self._issue("error", self._header[0][0], "header block is not followed by a PLAN/ACTUAL row")
+        if not self.sections:
+            self._issue("error", 1, "no header row with month columns found")
+        elif not self.programs:
+            self._issue("warning", 1, "no program rows found")
+        return self
+
+    def _record(self, line: int, cells: list):
+        labels = [_label(cell) for cell in cells]
+        if self._header is not None:
+            self._header.append((line, cells))
+            if "PLAN" in labels and "ACTUAL" in labels:
+                self._start_section()
+            return
+        if "JAN" in labels:
+            self._header = [(line, cells)]
+            return
+        if not any(cell.strip() for cell in cells):
+            return
+        if not self.sections:
+            self._issue("warning", line, "row before the first header skipped")
+            return
+        self._program(line, cells)
+
+    def _start_section(self):
+        rows = [cells for _, cells in self._header]
+        line = self._header[0][0]
+        self._header = None
+        width = max(len(cells) for cells in rows)
+        labels = [" ".join(_label(cells[i]) for cells in rows[:-1] if i < len(cells) and cells[i].strip())
+                  for i in range(width)]
+        try:
+            section = _Section(rows[0][0].strip(), labels, rows[-1])
+        except ValueError as e:
+            self._issue("error", line, f"unrecognised header: {e}")
+            section = None
+        self.sections.append(section)
+
+    def _program(self, line: int, cells: list):
+        section = self.sections[-1]
+        if section is None:
+            return  # header already reported
+        def cell(index):
+            return cells[index] if index is not None and index < len(cells) else ""
+
+        name = " ".join(cell(0).split())
+        months = {}
+        for month, plan_col, actual_col in section.months:
+            values = {}
+            for field, column in (("plan", plan_col), ("actual", actual_col)):
+                value = _parse_count(cell(column))
+                if value is None:
+                    self._issue("error", line, f"{month.upper()} {field}: expected a non-negative whole number, "
+                                               f"got {cell(column)!r}")
+                    value = 0
+                values[field] = value
+            months[month] = values
+        if not name:
+            if any(c["plan"] or c["actual"] for c in months.values()):
+                self._issue("warning", line, "row without a program name skipped")
+            return
+
+        program = {"name": name, "reference": " ".join(cell(section.reference).split()),
+                   "plan_type": cell(section.plan_type).strip(), "months": months, "section": section.title}
+        if self.target in ("otp", "otp-asia"):
+            due_date = _parse_date(cell(section.due_date))
+            if due_date is False:
+                self._issue("error", line, f"due date: unrecognised date {cell(section.due_date)!r}")
+                due_date = None
+            program["due_date"] = due_date
+        program["progress"] = self._progress_fn(program)
+        sheet_progress = _parse_percent(cell(section.progress))
+        if sheet_progress is False:
+            self._issue("warning", line, f"progress: not a percentage {cell(section.progress)!r}")
+        elif sheet_progress is not None and abs(sheet_progress - program["progress"]) > 1:
+            self._issue("warning", line, f"{name}: sheet says {sheet_progress}%, "
+                                         f"plan/actual give {program['progress']}%")
+        program["line"] = line
+        self.programs.append(program)
+
+
+def parse_file(path, target: str = None) -> SheetParser:
+    """Parse a spreadsheet export from disk, guessing the target from its name if not given."""
+    target = target or guess_target(path)
+    if target is None:
+        raise ImportFailed(f"{path}: cannot tell the target from the file name; use <target>=<path>")
+    parser = SheetParser(target)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(READ_SIZE), b""):
+            parser.feed(chunk)
+    return parser.close()
+
+
+def build_document(parser: SheetParser, existing: dict, year: int) -> tuple:
+    """Merge parsed programs into a store document, returning (document, stats).
+
+    Programs are matched to existing ones by name (case-insensitive), which
+    keeps their id, plan type and the per-month WPTS / PIC details; plan and
+    actual always come from the sheet. Existing programs missing from the
+    sheet are dropped.
+    """
+    existing = existing or {}
+    by_name = {p.get("name", "").strip().lower(): p for p in existing.get("programs", [])}
+    next_id = max([p.get("id", 0) for p in existing.get("programs", [])], default=0) + 1
+    # Without a Reference column, multi-section sheets use the section title
+    section_reference = len(parser.sections) > 1
+    programs, created, updated = [], 0, 0
+    seen = set()
+    for parsed in parser.programs:
+        key = parsed["name"].lower()
+        if key in seen:
+            continue  # duplicates were reported by validate()
+        seen.add(key)
+        old = by_name.get(key)
+        months = {}
+        for month in MONTHS:
+            cell = dict(parsed["months"][month])
+            old_cell = ((old or {}).get("months") or {}).get(month) or {}
+            cell.update({f: old_cell[f] for f in CELL_DETAIL_FIELDS if old_cell.get(f)})
+            months[month] = cell
+        program = {"id": old["id"] if old else next_id, "name": parsed["name"]}
+        if parser.target != "otp":
+            program["reference"] = parsed["reference"] or (parsed["section"] if section_reference else "") \
+                or (old or {}).get("reference", "")
+        program["plan_type"] = parsed["plan_type"] or (old or {}).get("plan_type") or "Monthly"
+        if "due_date" in parsed:
+            program["due_date"] = parsed["due_date"]
+        program["months"] = months
+        program["progress"] = parsed["progress"]
+        if old:
+            program["version"] = old.get("version", 0)
+            updated += 1
+        else:
+            next_id += 1
+            created += 1
+        bump_version(program)
+        programs.append(program)
+
+    document = {key: value for key, value in existing.items() if key != "programs"}
+    document["year"] = year
+    if parser.target in MATRIX_CATEGORIES:
+        document.update(category=parser.target, region="indonesia")
+    document["programs"] = programs
+    bump_version(document)
+    return document, {"programs": len(programs), "created": created, "updated": updated,
+                      "removed": len(by_name.keys() - seen)}
+
+
+def validate(parser: SheetParser):
+    """Add cross-row checks to a parsed sheet; raise ImportFailed on errors."""
+    seen = {}
+    for program in parser.programs:
+        key = program["name"].lower()
+        if key in seen:
+            parser._issue("error", program["line"], f"duplicate program {program['name']!r} (first on line {seen[key]})")
+        else:
+            seen[key] = program["line"]
+    errors = parser.errors
+    if errors:
+        raise ImportFailed(f"{parser.target}: {len(errors)} error(s)", parser.issues)
+
+
+def load(sheets: list, base: str = None, year: int = None, data_dir: Path = DATA_DIR, overwrite: bool = False,
+         register_name: str = None, dry_run: bool = False, saved=None) -> list:
+    """Load parsed sheets into the stores of one base and year, all or nothing.
+
+    ``sheets`` are closed SheetParsers. OTP and Matrix sheets go to ``base``
+    (the shared default files when None); OTP Asia has no base. A store that
+    holds programs for a different year is only replaced with ``overwrite``.
+    An unregistered base is added to the registry when ``register_name`` is
+    given. ``saved(target, document)`` is called after everything is written,
+    while the document locks are still held.
+    """
+    data_dir = Path(data_dir)
+    year = year or date.today().year
+    for parser in sheets:
+        validate(parser)
+    targets = [p.target for p in sheets]
+    duplicates = sorted({t for t in targets if targets.count(t) > 1})
+    if duplicates:
+        raise ImportFailed(f"more than one sheet for {', '.join(duplicates)}")
+
+    bases_file = data_dir / "bases.json"
+    paths = [document_path(p.target, base, data_dir) for p in sheets]
+    with locked_documents(*paths, bases_file):
+        registry = read_json(bases_file)
+        register = None
+        if base is not None:
+            if not BASE_ID_RE.match(base):
+                raise ImportFailed(f"invalid base id {base!r}: use lowercase letters, digits, '-' and '_'")
+            known = [b["id"] for b in (registry or {}).get("bases", [])] if registry else None
+            if known is not None and base not in known:
+                if not register_name:
+                    raise ImportFailed(f"unknown base {base!r}; pass a display name to register it")
+                register = dict(registry, bases=registry["bases"] + [{"id": base, "name": register_name}])
+
+        planned = []
+        for parser, path in zip(sheets, paths):
+            existing = read_json(path)
+            if existing and existing.get("programs") and existing.get("year") != year and not overwrite:
+                raise ImportFailed(f"{path.name} holds programs for {existing.get('year')}, not {year}; "
+                                   "pass overwrite to replace them")
+            document, stats = build_document(parser, existing, year)
+            planned.append((parser, path, existing, document, dict(stats, target=parser.target, file=path.name)))
+        results = [stats for _, _, _, _, stats in planned]
+        if dry_run:
+            return results
+
+        writes = [(bases_file, register, registry)] if register is not None else []
+        writes += [(path, document, existing) for _, path, existing, document, _ in planned]
+        write_json_batch(writes)
+        if saved is not None:
+            for parser, _, _, document, _ in planned:
+                saved(parser.target, document)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import tab-separated OTP / Matrix spreadsheet exports.")
+    parser.add_argument("files", nargs="+",
+                        help=f"[<target>=]<path>; target is one of {', '.join(TARGETS)} (guessed from the name if omitted)")
+    parser.add_argument("--base", default=None, help="base id to load into (default: the shared files)")
+    parser.add_argument("--year", type=int, default=None, help="programme year (default: this year)")
+    parser.add_argument("--register", metavar="NAME", default=None, help="register --base under this name if new")
+    parser.add_argument("--overwrite", action="store_true", help="replace stores that hold another year")
+    parser.add_argument("--dry-run", action="store_true", help="parse and validate only")
+    parser.add_argument("--data-dir", type=Path, default=DATA_DIR)
+    parser.add_argument("--json", action="store_true", help="machine-readable output")
+    args = parser.parse_args()
+
+    sheets = []
+    try:
+        for spec in args.files:
+            target, sep, path = spec.partition("=")
+            if not sep or target not in TARGETS:
+                target, path = None, spec
+            sheets.append(parse_file(path, target))
+        results = load(sheets, base=args.base, year=args.year, data_dir=args.data_dir, overwrite=args.overwrite,
+                       register_name=args.register, dry_run=args.dry_run)
+    except ImportFailed as e:
+        issues = e.issues
+        if args.json:
+            print(json.dumps({"error": str(e), "issues": issues}, indent=2))
+        else:
+            print(f"Import failed: {e}", file=sys.stderr)
+            for issue in issues:
+                print(f"  line {issue['line']}: {issue['level']}: {issue['message']}", file=sys.stderr)
+        sys.exit(1)
+
+    warnings = [dict(issue, target=s.target) for s in sheets for issue in s.issues]
+    if args.json:
+        print(json.dumps({"dry_run": args.dry_run, "results": results, "warnings": warnings}, indent=2))
+        return
+    for stats in results:
+        print(f"{'checked' if args.dry_run else 'loaded'} {stats['target']:<9} -> {stats['file']}: "
+              f"{stats['programs']} programs ({stats['created']} new, {stats['updated']} updated, "
+              f"{stats['removed']} removed)")
+    for issue in warnings:
+        print(f"  {issue['target']} line {issue['line']}: {issue['level']}: {issue['message']}")
+
+
+if __name__ == "__main__":
+    main()
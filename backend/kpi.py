@@ -0,0 +1,156 @@
+"""Derived KPI metrics: normalized rates, target attainment and year-over-year deltas.
+
+``kpi_data.json`` keeps what people enter: man-hours per year and a target
+and a result per metric. Most results are incident counts. TRIR and PVIR
+are entered as rates per 1,000,000 man-hours (the formula the dashboard
+shows), so their implied incident count is derived from the man-hours.
+Every metric is then expressed per 200,000 and per 1,000,000 man-hours.
+
+All metrics are "lower is better": a target is met when the result does
+not exceed it, and a year improved when its result went down.
+
+``KpiRollups`` holds the derived document for one version of the file. It
+is recomputed right after each write, so reads never compute anything.
+"""
+import threading
+
+RATE_BASES = {"rate_200k": 200_000, "rate_1m": 1_000_000}
+# Metrics whose stored result is already a rate, and per how many man-hours
+RATE_METRICS = {"trir": 1_000_000, "pvir": 1_000_000}
+METRICS = ["fatality", "trir", "pvir", "environment", "fire", "firstaid", "occupational"]
+
+
+def _number(value) -> float:
+    try:
+        return float(value or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _round(value, digits: int = 4):
+    return None if value is None else round(value, digits)
+
+
+def rates(metric: str, result: float, man_hours: float) -> dict:
+    """Implied incident count and the result per 200k / 1M man-hours (None without man-hours)."""
+    per = RATE_METRICS.get(metric)
+    if per:
+        incidents = result * man_hours / per if man_hours else None
+        normalized = {name: result * base / per for name, base in RATE_BASES.items()}
+    else:
+        incidents = result
+        normalized = {name: result * base / man_hours if man_hours else None for name, base in RATE_BASES.items()}
+    return dict({"incidents": _round(incidents, 2)}, **{name: _round(v) for name, v in normalized.items()})
+
+
+def attainment(target: float, result: float) -> dict:
+    """Target vs result; ``attainment`` is target / result in percent (100 or more = met)."""
+    if result == 0:
+        percent = 100.0
+    elif target <= 0:
+        percent = 0.0
+    else:
+        percent = round(target / result * 100, 1)
+    return {"met": result <= target, "variance": _round(result - target), "attainment": percent}
+
+
+def delta(current, previous) -> dict:
+    if current is None or previous is None:
+        return {"delta": None, "delta_pct": None}
+    change = current - previous
+    return {"delta": _round(change), "delta_pct": round(change / previous * 100, 1) if previous else None}
+
+
+def trend(current: float, previous: float) -> str:
+    if current < previous:
+        return "better"
+    if current > previous:
+        return "worse"
+    return "same"
+
+
+def derive_year(data: dict, year: str) -> dict:
+    man_hours = _number(data.get("man_hours", {}).get(year))
+    values = data.get("kpi", {}).get(year, {})
+    previous_year = str(int(year) - 1) if year.isdigit() else None
+    previous = data.get("kpi", {}).get(previous_year) if previous_year else None
+    previous_hours = _number(data.get("man_hours", {}).get(previous_year)) if previous is not None else None
+
+    metrics = {}
+    for metric in METRICS + sorted(set(values) - set(METRICS)):
+        if metric not in values:
+            continue
+        target, result = _number(values[metric].get("target")), _number(values[metric].get("result"))
+        entry = dict({"target": target, "result": result}, **rates(metric, result, man_hours), **attainment(target, result))
+        if previous is not None and metric in previous:
+            before = _number(previous[metric].get("result"))
+            before_rates = rates(metric, before, previous_hours)
+            entry["yoy"] = dict(delta(result, before), previous=before, trend=trend(result, before),
+                                rate_1m=delta(entry["rate_1m"], before_rates["rate_1m"])["delta"])
+        else:
+            entry["yoy"] = None
+        metrics[metric] = entry
+
+    return {
+        "year": year,
+        "version": data.get("versions", {}).get(year, 0),
+        "man_hours": man_hours,
+        "man_hours_yoy": delta(man_hours, previous_hours) if previous_hours is not None else None,
+        "targets_met": sum(1 for m in metrics.values() if m["met"]),
+        "metrics": metrics,
+    }
+
+
+def _has_data(year: dict) -> bool:
+    return bool(year["man_hours"]) or any(m["result"] or m["target"] for m in year["metrics"].values())
+
+
+def derive(data: dict) -> dict:
+    """Per-year slices and the multi-year summary of a KPI document."""
+    years = sorted(set(data.get("kpi", {})) | set(data.get("man_hours", {})), key=lambda y: (len(y), y))
+    derived = {year: derive_year(data, year) for year in years}
+    with_data = [year for year in years if _has_data(derived[year])]
+    latest = with_data[-1] if with_data else (years[-1] if years else None)
+
+    series = {}
+    for year in years:
+        for metric, entry in derived[year]["metrics"].items():
+            series.setdefault(metric, []).append({
+                "year": year, "target": entry["target"], "result": entry["result"], "rate_200k": entry["rate_200k"],
+                "rate_1m": entry["rate_1m"], "met": entry["met"], "attainment": entry["attainment"],
+            })
+    summary = {
+        "version": data.get("version", 0),
+        "years": years,
+        "latest": latest,
+        "man_hours": {year: derived[year]["man_hours"] for year in years},
+        "total_man_hours": sum(derived[year]["man_hours"] for year in years),
+        "latest_year": derived[latest] if latest else None,
+        "series": series,
+    }
+    return {"years": derived, "summary": summary}
+
+
+class KpiRollups:
+    """The derived KPI document for the current file signature."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._signature = None
+        self._derived = None
+
+    def update(self, signature, data: dict) -> dict:
+        derived = derive(data)
+        with self._lock:
+            self._signature, self._derived = signature, derived
+        return derived
+
+    def get(self, signature, load) -> dict:
+        """The derived document, recomputed from ``load()`` only if the file changed (e.g. in another worker)."""
+        with self._lock:
+            if self._signature == signature:
+                return self._derived
+        return self.update(signature, load())
+
+
+kpi_rollups = KpiRollups()
@@ -0,0 +1,204 @@
+"""Structured, non-blocking logging.
+
+Records go through a bounded in-memory queue: the calling thread (a request
+or a scheduled job) only formats the message and enqueues it. A single
+``QueueListener`` thread writes to stdout. When the queue is full, records
+are dropped and counted instead of blocking the caller.
+
+Every record carries the correlation id of the request or job it belongs to
+(``request_id``). It comes from the ``X-Request-ID`` request header when the
+client sends one, otherwise a new id is made; it is echoed in the response.
+Pass ``extra={"event": "...", ...}`` to give a record an event name and
+structured fields.
+
+Environment:
+
+- ``HSE_LOG_LEVEL``: root level (default INFO)
+- ``HSE_LOG_LEVELS``: per-logger levels, e.g. ``email=DEBUG,reminders=WARNING``
+- ``HSE_LOG_FORMAT``: ``json`` (default) or ``text``
+- ``HSE_LOG_SAMPLE``: keep only a fraction of high-volume events, e.g.
+  ``reminder.sent=0.1,email.sent=0.5``. Kept records carry ``sample_rate``
+  so counts can be scaled back up. Warnings and errors are never sampled.
+- ``HSE_LOG_QUEUE``: queue size (default 10000)
+"""
+import atexit
+import contextvars
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import re
+import sys
+import uuid
+from datetime import datetime, timezone
+
+import metrics
+
+LOG_LEVEL = os.getenv("HSE_LOG_LEVEL", "INFO").upper()
+LOG_LEVELS = os.getenv("HSE_LOG_LEVELS", "")
+LOG_FORMAT = os.getenv("HSE_LOG_FORMAT", "json").lower()
+LOG_SAMPLE = os.getenv("HSE_LOG_SAMPLE", "")
+QUEUE_SIZE = int(os.getenv("HSE_LOG_QUEUE", "10000"))
+
+request_id = contextvars.ContextVar("request_id", default=None)
+
+records_dropped = metrics.Counter("hse_log_records_dropped_total", "Log records dropped because the queue was full")
+records_sampled = metrics.Counter("hse_log_records_sampled_out_total", "Log records skipped by sampling", ("event",))
+
+# Attributes every LogRecord has; anything else came in through ``extra``
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "request_id"}
+_ID_RE = re.compile(r"^[A-Za-z0-9._:-]{1,64}$")
+_traceback = logging.Formatter()
+
+
+def _parse_pairs(value: str) -> dict:
+    pairs = {}
+    for part in value.split(","):
+        name, sep, setting = part.partition("=")
+        if sep and name.strip():
+            pairs[name.strip()] = setting.strip()
+    return pairs
+
+
+def new_id() -> str:
+    return uuid.uuid4().hex[:16]
+
+
+class ContextFilter(logging.Filter):
+    """Stamp the caller's correlation id (before the record changes thread) and apply sampling."""
+
+    def __init__(self, rates: dict):
+        super().__init__()
+        self.rates = rates
+
+    def filter(self, record) -> bool:
+        record.request_id = request_id.get()
+        event = getattr(record, "event", None)
+        rate = self.rates.get(event) if event else None
+        if rate is not None and record.levelno < logging.WARNING:
+            if random.random() >= rate:
+                records_sampled.inc(event=event)
+                return False
+            record.sample_rate = rate
+        return True
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record):
+        # Like QueueHandler.prepare, but keep the traceback out of the message
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = _traceback.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            records_dropped.inc()
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        if record.request_id:
+            entry["request_id"] = record.request_id
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS:
+                entry[key] = value
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s %(message)s")
+
+    def format(self, record) -> str:
+        line = super().format(record)
+        return f"{line} [{record.request_id}]" if record.request_id else line
+
+
+_listener = None
+
+
+def setup():
+    """Install the queue handler on the "hse" logger tree (once)."""
+    global _listener
+    if _listener is not None:
+        return
+    root = logging.getLogger("hse")
+    root.setLevel(LOG_LEVEL)
+    root.propagate = False
+    for name, level in _parse_pairs(LOG_LEVELS).items():
+        logging.getLogger(f"hse.{name}").setLevel(level.upper())
+
+    rates = {}
+    for event, rate in _parse_pairs(LOG_SAMPLE).items():
+        try:
+            rates[event] = min(max(float(rate), 0.0), 1.0)
+        except ValueError:
+            pass
+
+    output = logging.StreamHandler(sys.stdout)
+    output.setFormatter(TextFormatter() if LOG_FORMAT == "text" else JsonFormatter())
+    records = queue.Queue(QUEUE_SIZE)
+    handler = DroppingQueueHandler(records)
+    handler.addFilter(ContextFilter(rates))
+    root.addHandler(handler)
+    _listener = logging.handlers.QueueListener(records, output, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown)
+
+
+def shutdown():
+    """Flush queued records and stop the writer thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def get_logger(name: str) -> logging.Logger:
+    return logging.getLogger(f"hse.{name}")
+
+
+class CorrelationMiddleware:
+    """Bind a correlation id to each request and return it as X-Request-ID."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        rid = None
+        for name, value in scope["headers"]:
+            if name == b"x-request-id":
+                rid = value.decode("latin-1")
+                break
+        if not rid or not _ID_RE.match(rid):
+            rid = new_id()
+        token = request_id.set(rid)
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [(b"x-request-id", rid.encode("latin-1"))]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            request_id.reset(token)
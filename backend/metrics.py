@@ -0,0 +1,185 @@
+"""Minimal in-process Prometheus metrics.
+
+Counters, gauges and histograms with labels, rendered in the Prometheus text
+exposition format by ``render()``. No client library or external service is
+needed; every update is a dict operation under a lock.
+"""
+import threading
+import time
+from contextlib import contextmanager
+
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+RATIO_BUCKETS = (1, 1.5, 2, 3, 4, 6, 8, 12, 16, 24, 32, 64)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+_registry = []
+
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    escaped = []
+    for name, value in pairs:
+        value = str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        escaped.append(f'{name}="{value}"')
+    return "{" + ",".join(escaped) + "}"
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {value}" for key, value in items]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+        self._values = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                series = self._values[key] = [[0] * len(self.buckets), 0, 0.0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+            series[1] += 1
+            series[2] += value
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the duration of the block in seconds."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def _samples(self):
+        with self._lock:
+            items = [(key, (list(s[0]), s[1], s[2])) for key, s in self._values.items()]
+        lines = []
+        for key, (bucket_counts, count, total) in items:
+            for bound, bucket_count in zip(self.buckets, bucket_counts):
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, ('le', bound))} {bucket_count}")
+            lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, ('le', '+Inf'))} {count}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {total}")
+        return lines
+
+
+def render() -> str:
+    """Render every registered metric in the Prometheus text format."""
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# ----- Metrics shared across the backend -----
+
+http_request_duration = Histogram(
+    "hse_http_request_duration_seconds", "HTTP request latency by route template",
+    ("method", "route", "status"))
+http_requests_in_flight = Gauge("hse_http_requests_in_flight", "HTTP requests currently being served")
+response_bytes = Counter(
+    "hse_http_response_bytes_total", "Response body bytes before (raw) and after (sent) compression",
+    ("route", "encoding", "stage"))
+compression_ratio = Histogram(
+    "hse_http_compression_ratio", "Uncompressed / compressed response size", ("route", "encoding"), RATIO_BUCKETS)
+
+store_load_duration = Histogram("hse_store_load_duration_seconds", "JSON data file load duration", ("file",))
+store_save_duration = Histogram("hse_store_save_duration_seconds", "JSON data file save duration", ("file",))
+store_load_bytes = Histogram("hse_store_load_bytes", "JSON data file size on load", ("file",), SIZE_BUCKETS)
+store_save_bytes = Histogram("hse_store_save_bytes", "JSON data file size on save", ("file",), SIZE_BUCKETS)
+
+db_query_duration = Histogram("hse_db_query_duration_seconds", "SQLite statement duration", ("statement",))
+
+email_send_duration = Histogram("hse_email_send_duration_seconds", "Email provider call latency", ("outcome",))
+emails_total = Counter("hse_emails_total", "Email dispatch attempts by outcome", ("outcome",))
+
+job_duration = Histogram("hse_job_duration_seconds", "Scheduler job duration", ("job",))
+job_runs_total = Counter("hse_job_runs_total", "Scheduler job runs by outcome", ("job", "outcome"))
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording request latency per route template."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = {"code": 500}
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        http_requests_in_flight.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            http_requests_in_flight.dec()
+            # The router stores the matched route in the scope; using its
+            # template keeps path parameters out of the label values.
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            http_request_duration.observe(
+                time.perf_counter() - start, method=scope["method"], route=route, status=status["code"])
@@ -26,3 +26,32 @@ PROGRAM_TYPES = {
     "safety_training": {"label": "🎓 Safety Training", "color": "#3498db"},
     "inspection": {"label": "🔍 Inspection", "color": "#27ae60"},
 }
+
+
+class Attachment(SQLModel, table=True):
+    """An uploaded evidence file; the content lives in the blob store under its sha256."""
+    id: Optional[int] = Field(default=None, primary_key=True)
+    owner: str = Field(index=True)  # e.g. "program:12", "otp:duri:5:jan", "matrix:audit:duri:3:feb"
+    sha256: str = Field(index=True)
+    size: int
+    filename: str
+    content_type: str = Field(default="application/octet-stream")
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
+
+class OutboxMessage(SQLModel, table=True):
+    """An email waiting for (or done with) delivery by the outbox worker."""
+    id: Optional[int] = Field(default=None, primary_key=True)
+    to_email: str = Field(index=True)
+    subject: str
+    html_body: str
+    source: str = Field(default="", index=True)  # job or feature that queued it
+    dedupe_key: Optional[str] = Field(default=None, unique=True)
+    status: str = Field(default="pending", index=True)  # pending, sending, sent, skipped, dead
+    attempts: int = Field(default=0)
+    next_attempt_at: datetime = Field(default_factory=datetime.utcnow, index=True)
+    claim: Optional[str] = Field(default=None, index=True)
+    lease_until: Optional[datetime] = None
+    last_error: Optional[str] = None
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    sent_at: Optional[datetime] = None
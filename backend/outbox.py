@@ -0,0 +1,262 @@
+"""Transactional email outbox and its background delivery worker.
+
+Reminder jobs do not call the email provider while they scan. They
+``enqueue`` their messages into the ``OutboxMessage`` table in one
+transaction and return. A message whose ``dedupe_key`` is already in the
+table is skipped, so a job that runs twice on the same day (a retried or
+coalesced run, a manual trigger) does not send twice.
+
+``OutboxWorker`` drains the table from a background thread:
+
+- It claims up to ``BATCH_SIZE`` due messages with one UPDATE, under a
+  lease. If the worker dies mid-batch, its claims go back to the queue
+  when the lease expires.
+- It sends at most ``RECIPIENT_LIMIT`` messages per recipient per
+  ``RECIPIENT_WINDOW`` seconds. A message over the limit waits for the
+  window without counting as an attempt; a skipped message does not
+  count towards the limit.
+- A failed delivery is retried with exponential backoff. After
+  ``MAX_ATTEMPTS`` the message goes to ``dead``, where it is kept for
+  inspection and can be requeued.
+
+Messages that can never be delivered as configured (no API key) are marked
+``skipped`` instead of being retried.
+"""
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import defaultdict, deque
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, update
+from sqlalchemy.dialects.sqlite import insert
+from sqlmodel import Session, select
+
+from models import OutboxMessage
+
+BATCH_SIZE = int(os.getenv("HSE_OUTBOX_BATCH", "50"))
+POLL_SECONDS = float(os.getenv("HSE_OUTBOX_POLL", "5"))
+LEASE_SECONDS = int(os.getenv("HSE_OUTBOX_LEASE", "300"))
+MAX_ATTEMPTS = int(os.getenv("HSE_OUTBOX_MAX_ATTEMPTS", "6"))
+RETRY_BASE_SECONDS = int(os.getenv("HSE_OUTBOX_RETRY_BASE", "60"))
+RETRY_MAX_SECONDS = 6 * 3600
+RECIPIENT_LIMIT = int(os.getenv("HSE_OUTBOX_RECIPIENT_LIMIT", "20"))
+RECIPIENT_WINDOW = int(os.getenv("HSE_OUTBOX_RECIPIENT_WINDOW", "3600"))
+STATUSES = ["pending", "sending", "sent", "skipped", "dead"]
+
+log = logging.getLogger("hse.outbox")
+
+_worker = None
+
+
+def enqueue(engine, messages: list, source: str = "") -> int:
+    """Queue ``messages`` (dicts with to_email, subject, html_body and optional dedupe_key) in one transaction.
+
+    Returns how many were queued; messages without an address or with a
+    dedupe_key already queued are left out.
+    """
+    now = datetime.utcnow()
+    rows = [dict(to_email=m["to_email"].strip(), subject=m["subject"], html_body=m["html_body"],
+                 dedupe_key=m.get("dedupe_key"), source=source, status="pending", attempts=0,
+                 next_attempt_at=now, created_at=now)
+            for m in messages if (m.get("to_email") or "").strip()]
+    if not rows:
+        return 0
+    with Session(engine) as session:
+        # Core insert (not the ORM bulk path) so rowcount reports what was inserted
+        result = session.connection().execute(
+            insert(OutboxMessage).on_conflict_do_nothing(index_elements=["dedupe_key"]), rows)
+        session.commit()
+        queued = result.rowcount
+    if _worker is not None:
+        _worker.wake()
+    return queued
+
+
+def requeue(engine, message_id: int):
+    """Give a dead (or skipped) message a fresh set of attempts. Returns the message, or None."""
+    with Session(engine) as session:
+        message = session.get(OutboxMessage, message_id)
+        if message is None:
+            return None
+        message.status = "pending"
+        message.attempts = 0
+        message.next_attempt_at = datetime.utcnow()
+        message.claim = None
+        session.add(message)
+        session.commit()
+        session.refresh(message)
+    if _worker is not None:
+        _worker.wake()
+    return message
+
+
+def backoff(attempts: int) -> float:
+    return min(RETRY_BASE_SECONDS * 2 ** (attempts - 1), RETRY_MAX_SECONDS)
+
+
+class OutboxWorker:
+    """Background thread delivering queued messages with ``send(to, subject, html) -> (outcome, detail)``.
+
+    ``outcome`` is "sent", "skipped" (will never work as configured) or
+    anything else for a failure worth retrying.
+    """
+
+    def __init__(self, engine, send, batch_size: int = BATCH_SIZE, poll_seconds: float = POLL_SECONDS):
+        self.engine = engine
+        self.send = send
+        self.batch_size = batch_size
+        self.poll_seconds = poll_seconds
+        self._recent = defaultdict(deque)  # recipient -> monotonic send times within the window
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self.last_drain = None
+
+    def start(self):
+        global _worker
+        _worker = self
+        self._thread = threading.Thread(target=self._run, name="outbox", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 10):
+        global _worker
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        if _worker is self:
+            _worker = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def wake(self):
+        self._wake.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                claimed = self.drain_once()
+            except Exception:
+                log.exception("Outbox drain failed", extra={"event": "outbox.error"})
+                claimed = 0
+            if claimed < self.batch_size:
+                self._wake.wait(self.poll_seconds)
+                self._wake.clear()
+
+    def _claim(self, session, now: datetime) -> list:
+        token = uuid.uuid4().hex
+        # Claims of a worker that died mid-batch
+        session.exec(update(OutboxMessage)
+                     .where(OutboxMessage.status == "sending", OutboxMessage.lease_until < now)
+                     .values(status="pending", claim=None))
+        due = (select(OutboxMessage.id)
+               .where(OutboxMessage.status == "pending", OutboxMessage.next_attempt_at <= now)
+               .order_by(OutboxMessage.next_attempt_at, OutboxMessage.id)
+               .limit(self.batch_size))
+        session.exec(update(OutboxMessage)
+                     .where(OutboxMessage.id.in_(due.scalar_subquery()), OutboxMessage.status == "pending")
+                     .values(status="sending", claim=token, lease_until=now + timedelta(seconds=LEASE_SECONDS)),
+                     execution_options={"synchronize_session": False})
+        session.commit()
+        return session.exec(select(OutboxMessage).where(OutboxMessage.claim == token)
+                            .order_by(OutboxMessage.next_attempt_at, OutboxMessage.id)).all()
+
+    def _rate_wait(self, recipient: str) -> float:
+        """Seconds until ``recipient`` may get another message (0 = now)."""
+        sent = self._recent[recipient.lower()]
+        cutoff = time.monotonic() - RECIPIENT_WINDOW
+        while sent and sent[0] <= cutoff:
+            sent.popleft()
+        if len(sent) < RECIPIENT_LIMIT:
+            return 0
+        return sent[0] - cutoff
+
+    def drain_once(self) -> int:
+        """Claim and process one batch; returns how many messages were claimed."""
+        self.last_drain = datetime.utcnow()
+        with Session(self.engine) as session:
+            batch = self._claim(session, self.last_drain)
+            for message in batch:
+                self._deliver(session, message)
+        for recipient in [r for r, sent in self._recent.items() if not sent]:
+            del self._recent[recipient]
+        return len(batch)
+
+    def _deliver(self, session, message: OutboxMessage):
+        wait = self._rate_wait(message.to_email)
+        if wait:
+            message.status = "pending"
+            message.next_attempt_at = datetime.utcnow() + timedelta(seconds=wait)
+        else:
+            try:
+                outcome, detail = self.send(message.to_email, message.subject, message.html_body)
+            except Exception as e:
+                outcome, detail = "error", str(e)
+            if outcome != "skipped":
+                # Only messages that reached the provider count against the recipient's limit
+                self._recent[message.to_email.lower()].append(time.monotonic())
+            if outcome == "sent":
+                message.status = "sent"
+                message.sent_at = datetime.utcnow()
+                message.last_error = None
+                log.info("Delivered message %s to %s: %s", message.id, message.to_email, message.subject,
+                         extra={"event": "reminder.sent", "message_id": message.id, "source": message.source})
+            elif outcome == "skipped":
+                message.status = "skipped"
+                message.last_error = detail
+                log.info("Skipped message %s to %s: %s", message.id, message.to_email, detail,
+                         extra={"event": "reminder.skipped", "message_id": message.id, "source": message.source})
+            else:
+                message.attempts += 1
+                message.last_error = f"{outcome}: {detail}"[:1000]
+                if message.attempts >= MAX_ATTEMPTS:
+                    message.status = "dead"
+                    log.warning("Dead-lettered message %s to %s after %d attempts: %s", message.id,
+                                message.to_email, message.attempts, detail,
+                                extra={"event": "outbox.dead", "message_id": message.id})
+                else:
+                    message.status = "pending"
+                    message.next_attempt_at = datetime.utcnow() + timedelta(seconds=backoff(message.attempts))
+        message.claim = None
+        message.lease_until = None
+        session.add(message)
+        # One short transaction per message: a crash re-sends at most the message in flight
+        session.commit()
+
+
+def stats(engine, latency_window_hours: int = 24, dead_limit: int = 20) -> dict:
+    """Queue depth, delivery latency and the latest dead letters."""
+    now = datetime.utcnow()
+    with Session(engine) as session:
+        counts = dict(session.exec(select(OutboxMessage.status, func.count()).group_by(OutboxMessage.status)).all())
+        due = session.exec(select(func.count()).where(OutboxMessage.status == "pending",
+                                                      OutboxMessage.next_attempt_at <= now)).one()
+        oldest = session.exec(select(func.min(OutboxMessage.created_at))
+                              .where(OutboxMessage.status.in_(["pending", "sending"]))).one()
+        sent = session.exec(select(OutboxMessage.created_at, OutboxMessage.sent_at)
+                            .where(OutboxMessage.status == "sent",
+                                   OutboxMessage.sent_at >= now - timedelta(hours=latency_window_hours))
+                            .order_by(OutboxMessage.sent_at.desc()).limit(1000)).all()
+        dead = session.exec(select(OutboxMessage).where(OutboxMessage.status == "dead")
+                            .order_by(OutboxMessage.id.desc()).limit(dead_limit)).all()
+    latencies = sorted((s - c).total_seconds() for c, s in sent)
+
+    def percentile(p):
+        return round(latencies[min(len(latencies) - 1, int(p * len(latencies)))], 3) if latencies else None
+
+    return {
+        "counts": {status: counts.get(status, 0) for status in STATUSES},
+        "queue_depth": counts.get("pending", 0) + counts.get("sending", 0),
+        "due_now": due,
+        "oldest_queued_age_seconds": round((now - oldest).total_seconds(), 1) if oldest else None,
+        "latency_seconds": {"window_hours": latency_window_hours, "count": len(latencies), "p50": percentile(0.5),
+                            "p95": percentile(0.95), "max": latencies[-1] if latencies else None},
+        "dead_letters": [{"id": m.id, "to_email": m.to_email, "subject": m.subject, "source": m.source,
+                          "attempts": m.attempts, "last_error": m.last_error, "created_at": m.created_at.isoformat()}
+                         for m in dead],
+    }
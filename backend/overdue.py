@@ -0,0 +1,219 @@
+"""Overdue months and behind-pace programs, kept up to date incrementally.
+
+A program month is open while actual < plan. Its due date is its
+plan_date, or the last day of the month when it has none. Open months wait
+in a list ordered by due date; when the date rolls over, the months now
+past due move from the front of that list into the overdue set. A query
+therefore only walks the exceptions, never the whole data.
+
+A program is at risk when the actual count so far (through the current
+month) is below the plan of the months already over. The current month is
+part of the state: at-risk flags are recomputed for every program when the
+month changes, and for one document when it is saved.
+
+Sources are replaced wholesale when a document is saved, like the search
+and people indexes.
+"""
+import bisect
+import calendar
+import threading
+from datetime import date, datetime
+
+MONTHS = ["jan", "feb", "mar", "apr", "may", "jun", "jul", "aug", "sep", "oct", "nov", "dec"]
+PEOPLE_FIELDS = ("pic_name", "pic_email", "pic_manager", "pic_manager_email")
+
+
+def due_date(year: int, month: str, plan_date=None) -> date:
+    if plan_date:
+        try:
+            return datetime.strptime(str(plan_date)[:10], "%Y-%m-%d").date()
+        except ValueError:
+            pass
+    number = MONTHS.index(month) + 1
+    return date(year, number, calendar.monthrange(year, number)[1])
+
+
+def _count(value) -> int:
+    try:
+        return int(value or 0)
+    except (TypeError, ValueError):
+        return 0
+
+
+def _people(values) -> set:
+    return {" ".join(str(v).split()).lower() for v in values if v}
+
+
+def pace(record: dict, today: date) -> dict:
+    """Plan due so far vs actual so far for one program record."""
+    if record["year"] < today.year:
+        elapsed = 12
+    elif record["year"] > today.year:
+        elapsed = 0
+    else:
+        elapsed = today.month - 1
+    expected = sum(record["plans"][:elapsed])
+    actual = sum(record["actuals"][:min(elapsed + 1, 12)])
+    return {
+        "expected_to_date": expected,
+        "actual_to_date": actual,
+        "gap": expected - actual,
+        "pace": round(actual / expected * 100, 1) if expected else None,
+        "total_plan": sum(record["plans"]),
+        "total_actual": sum(record["actuals"]),
+    }
+
+
+class ExceptionTracker:
+    """Thread-safe overdue / at-risk sets with per-source replacement."""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.today = date.today()
+        self._pending = []      # sorted [(due date, str(key), key)] of open months not yet due
+        self._overdue = {}      # key -> month item
+        self._months = {}       # key -> month item (every open month)
+        self._programs = {}     # key -> program record
+        self._at_risk = {}      # key -> program item
+        self._sources = {}      # source_key -> (month keys, program keys)
+        self._signatures = {}
+
+    def signature(self, source_key):
+        with self._lock:
+            return self._signatures.get(source_key, ())
+
+    def has_source(self, source_key) -> bool:
+        with self._lock:
+            return source_key in self._sources
+
+    def _remove_month(self, key):
+        item = self._months.pop(key, None)
+        if item is None:
+            return
+        if self._overdue.pop(key, None) is None:
+            entry = (item["due"], str(key), key)
+            i = bisect.bisect_left(self._pending, entry)
+            if i < len(self._pending) and self._pending[i] == entry:
+                self._pending.pop(i)
+
+    def _add_month(self, key, item):
+        self._months[key] = item
+        if item["due"] < self.today:
+            self._overdue[key] = item
+        else:
+            bisect.insort(self._pending, (item["due"], str(key), key))
+
+    def _assess(self, key):
+        record = self._programs[key]
+        status = pace(record, self.today)
+        if status["gap"] > 0:
+            self._at_risk[key] = dict(record["item"], **status)
+        else:
+            self._at_risk.pop(key, None)
+
+    def _drop(self, source_key):
+        month_keys, program_keys = self._sources.pop(source_key, (set(), set()))
+        for key in month_keys:
+            self._remove_month(key)
+        for key in program_keys:
+            self._programs.pop(key, None)
+            self._at_risk.pop(key, None)
+
+    def retain(self, source_keys):
+        """Forget sources not in ``source_keys`` (e.g. documents no longer tracked)."""
+        with self._lock:
+            for source_key in set(self._sources) - set(source_keys):
+                self._drop(source_key)
+                self._signatures.pop(source_key, None)
+
+    def replace_source(self, source_key, defaults: dict, data: dict, signature=()):
+        """Replace the months and programs of one document."""
+        year = data.get("year") or self.today.year
+        with self._lock:
+            self._drop(source_key)
+            month_keys, program_keys = set(), set()
+            for prog in data.get("programs", []):
+                months = prog.get("months") or {}
+                program = dict(defaults, program_id=prog.get("id"), program=prog.get("name", ""), year=year)
+                plans, actuals, people = [], [], set()
+                for month in MONTHS:
+                    cell = months.get(month) or {}
+                    plan, actual = _count(cell.get("plan")), _count(cell.get("actual"))
+                    plans.append(plan)
+                    actuals.append(actual)
+                    people |= _people(cell.get(f) for f in PEOPLE_FIELDS)
+                    if actual >= plan:
+                        continue
+                    key = source_key + (prog.get("id"), month)
+                    item = dict(program, month=month, plan=plan, actual=actual,
+                                due=due_date(year, month, cell.get("plan_date")),
+                                **{f: cell.get(f, "") for f in ("plan_date", "wpts_id") + PEOPLE_FIELDS})
+                    item["people"] = _people(item[f] for f in PEOPLE_FIELDS)
+                    self._remove_month(key)
+                    self._add_month(key, item)
+                    month_keys.add(key)
+                key = source_key + (prog.get("id"),)
+                self._programs[key] = {"year": year, "plans": plans, "actuals": actuals,
+                                       "item": dict(program, people=people)}
+                self._assess(key)
+                program_keys.add(key)
+            self._sources[source_key] = (month_keys, program_keys)
+            self._signatures[source_key] = signature
+
+    def roll(self, today: date = None) -> dict:
+        """Advance to ``today``: move newly due months to overdue, re-assess pace on a new month."""
+        today = today or date.today()
+        with self._lock:
+            if today == self.today:
+                return {"date": today.isoformat(), "newly_overdue": 0}
+            if today < self.today:
+                # Clock went back: split the open months again from scratch
+                months = self._months
+                self._months, self._overdue, self._pending = {}, {}, []
+                self.today = today
+                for key, item in months.items():
+                    self._add_month(key, item)
+                moved = 0
+            else:
+                self.today = today
+                cut = bisect.bisect_left(self._pending, (today,))
+                for _, _, key in self._pending[:cut]:
+                    self._overdue[key] = self._months[key]
+                del self._pending[:cut]
+                moved = cut
+            for key in self._programs:
+                self._assess(key)
+            return {"date": today.isoformat(), "newly_overdue": moved}
+
+    @staticmethod
+    def _matches(item, sources, bases, categories, pic) -> bool:
+        return ((sources is None or item["source"] in sources)
+                and (bases is None or (item["base"] or "default") in bases)
+                and (categories is None or item["category"] in categories)
+                and (pic is None or pic in item["people"]))
+
+    def overdue(self, sources=None, bases=None, categories=None, pic=None, limit=None) -> list:
+        """Overdue months, oldest due date first."""
+        pic = " ".join(pic.split()).lower() if pic else None
+        with self._lock:
+            items = [item for item in self._overdue.values() if self._matches(item, sources, bases, categories, pic)]
+            today = self.today
+        items.sort(key=lambda i: (i["due"], str(i["program_id"]), MONTHS.index(i["month"])))
+        return [dict({k: v for k, v in i.items() if k != "people"}, due=i["due"].isoformat(),
+                     days_overdue=(today - i["due"]).days) for i in items[:limit]]
+
+    def at_risk(self, sources=None, bases=None, categories=None, pic=None, limit=None) -> list:
+        """Programs behind pace, largest gap first."""
+        pic = " ".join(pic.split()).lower() if pic else None
+        with self._lock:
+            items = [item for item in self._at_risk.values() if self._matches(item, sources, bases, categories, pic)]
+        items.sort(key=lambda i: (-i["gap"], str(i["program_id"])))
+        return [{k: v for k, v in i.items() if k != "people"} for i in items[:limit]]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"date": self.today.isoformat(), "open_months": len(self._months), "overdue": len(self._overdue),
+                    "programs": len(self._programs), "at_risk": len(self._at_risk)}
+
+
+exception_tracker = ExceptionTracker()
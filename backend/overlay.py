@@ -0,0 +1,421 @@
+"""Copy-on-write base overlays: per-base documents stored as a shared template plus a sparse patch.
+
+The per-base OTP and Matrix documents start as copies of one another and
+stay mostly identical. A packed document ``<name>.json`` is stored as
+``<name>.overlay.json``::
+
+    {"template": "templates/otp_indonesia.3f2a9c01b7de.json", "patch": {...}}
+
+The template is a full document whose file name carries a hash of its
+content, so it never changes in place; re-packing writes a new template
+and points the overlays at it. The patch holds only what differs from the
+template:
+
+- a dict patch maps changed keys to their new value (or, for a dict, to a
+  nested patch) and lists removed keys under ``"$delete"``;
+- a list of objects that all have a unique ``id`` (``programs``) is
+  patched per item: ``"$items"`` maps ``str(id)`` to an item patch (or a
+  whole new item), ``"$delete"`` lists removed ids and ``"$order"`` gives
+  the id order when it is not "template order, then new items".
+
+``store.read_json`` / ``write_json`` / ``files_signature`` resolve overlays
+transparently, so callers keep using the plain ``<name>.json`` path. Plain
+files and overlays can be mixed; a plain file wins if both exist.
+
+A write that changes every program (a year rollover) leaves each overlay
+holding almost a whole document, so the rollover re-packs the families
+whose overlays outgrew ``REPACK_RATIO`` of their template; ``status``
+reports each family's largest overlay / template ratio.
+
+Command line (run from backend/)::
+
+    python overlay.py status            # packed and plain documents, bytes on disk
+    python overlay.py pack [--dry-run]  # store every base family as template + overlays
+    python overlay.py unpack            # write every overlay back as a plain file
+    python overlay.py add-base ID NAME  # register a base whose documents are empty overlays
+"""
+import argparse
+import hashlib
+import json
+import re
+import sys
+from collections import Counter
+from pathlib import Path
+
+OVERLAY_SUFFIX = ".overlay.json"
+TEMPLATE_DIR = "templates"
+DELETE = "$delete"
+ITEMS = "$items"
+ORDER = "$order"
+LIST_PATCH_KEYS = {DELETE, ITEMS, ORDER}
+
+# Documents sharing a template: the default store and one document per base
+FAMILY_RES = [
+    re.compile(r"^(?P<family>otp_indonesia)_(?P<base>[a-z0-9_-]+)\.json$"),
+    re.compile(r"^(?P<family>matrix_(?:audit|training|drill|meeting)_indonesia)(?:_(?P<base>[a-z0-9_-]+))?\.json$"),
+]
+FAMILY_DEFAULTS = {"otp_indonesia": "otp_data.json"}
+
+# A family is re-packed once one of its overlays is larger than this share of the template
+REPACK_RATIO = 0.5
+
+
+def overlay_path(path: Path) -> Path:
+    path = Path(path)
+    return path.with_name(path.name[:-len(".json")] + OVERLAY_SUFFIX)
+
+
+def document_path(overlay: Path) -> Path:
+    overlay = Path(overlay)
+    return overlay.with_name(overlay.name[:-len(OVERLAY_SUFFIX)] + ".json")
+
+
+def _keyed(items) -> dict:
+    """{str(id): item} for a list of objects with unique ids, else None."""
+    if not isinstance(items, list) or not items:
+        return None
+    keyed = {}
+    for item in items:
+        if not isinstance(item, dict) or "id" not in item:
+            return None
+        keyed[str(item["id"])] = item
+    return keyed if len(keyed) == len(items) else None
+
+
+def diff(base, new):
+    """Patch turning ``base`` into ``new`` (both dicts); {} when they are equal."""
+    patch = {}
+    for key, value in new.items():
+        if key not in base:
+            patch[key] = value
+            continue
+        old = base[key]
+        if value == old:
+            continue
+        if isinstance(value, dict) and isinstance(old, dict):
+            patch[key] = diff(old, value)
+        elif isinstance(value, list) and _keyed(old) is not None and _keyed(value) is not None:
+            patch[key] = _diff_items(old, value)
+        else:
+            patch[key] = value
+    removed = [key for key in base if key not in new]
+    if removed:
+        patch[DELETE] = removed
+    return patch
+
+
+def _diff_items(base: list, new: list) -> dict:
+    old_items, new_items = _keyed(base), _keyed(new)
+    patch = {}
+    items = {}
+    for key, item in new_items.items():
+        if key not in old_items:
+            items[key] = item
+        elif item != old_items[key]:
+            items[key] = diff(old_items[key], item)
+    if items:
+        patch[ITEMS] = items
+    removed = [item["id"] for key, item in old_items.items() if key not in new_items]
+    if removed:
+        patch[DELETE] = removed
+    expected = [key for key in old_items if key in new_items] + [key for key in new_items if key not in old_items]
+    if expected != list(new_items):
+        patch[ORDER] = [item["id"] for item in new]
+    return patch
+
+
+def apply(base, patch: dict):
+    """The document ``patch`` describes on top of ``base``; untouched values are shared with ``base``."""
+    if not patch:
+        return base
+    out = dict(base)
+    for key in patch.get(DELETE, ()):
+        out.pop(key, None)
+    for key, value in patch.items():
+        if key == DELETE:
+            continue
+        old = out.get(key)
+        if isinstance(value, dict) and isinstance(old, dict):
+            out[key] = apply(old, value)
+        elif isinstance(value, dict) and isinstance(old, list) and value and set(value) <= LIST_PATCH_KEYS:
+            out[key] = _apply_items(old, value)
+        else:
+            out[key] = value
+    return out
+
+
+def _apply_items(base: list, patch: dict) -> list:
+    items = dict(_keyed(base) or {})
+    for item_id in patch.get(DELETE, ()):
+        items.pop(str(item_id), None)
+    for key, value in patch.get(ITEMS, {}).items():
+        items[key] = apply(items[key], value) if key in items else value
+    if ORDER in patch:
+        return [items[str(item_id)] for item_id in patch[ORDER] if str(item_id) in items]
+    return list(items.values())
+
+
+def patch_cells(patch: dict) -> int:
+    """Number of leaf values a patch sets or removes (its size in cells)."""
+    count = 0
+    for key, value in patch.items():
+        if key in (DELETE, ORDER):
+            count += len(value)
+        elif isinstance(value, dict):
+            count += patch_cells(value)
+        else:
+            count += 1
+    return count
+
+
+def merge_overlays(template: dict, patches: list, program_keys: dict, month_fields: list):
+    """Merge the base views of one template the way the "all bases" read does, touching only patched programs.
+
+    ``program_keys`` maps the merged program's attributes (in order, with
+    ``"months"``) to their defaults. Returns (version, programs), or None
+    when a patch adds, removes or reorders programs (use the full merge).
+    """
+    item_patches = []
+    for patch in patches:
+        programs = patch.get("programs", {})
+        if "programs" in patch.get(DELETE, ()) or not isinstance(programs, dict) or set(programs) - {ITEMS}:
+            return None
+        item_patches.append(programs.get(ITEMS, {}))
+    template_ids = {str(prog.get("id")) for prog in template.get("programs", [])}
+    if any(key not in template_ids for items in item_patches for key in items):
+        return None
+
+    version = 0
+    for patch in patches:
+        version += 0 if "version" in patch.get(DELETE, ()) else patch.get("version", template.get("version", 0))
+
+    merged = []
+    for prog in template.get("programs", []):
+        key = str(prog.get("id"))
+        touched = any(key in items for items in item_patches)
+        views = [apply(prog, items[key]) if key in items else prog for items in item_patches]
+        first = views[0]
+        out = {"id": prog.get("id")}
+        for name, default in program_keys.items():
+            if name == "months" and touched:
+                out["months"] = {month: dict(cell) for month, cell in first.get("months", {}).items()}
+            elif name == "months":
+                # Every base holds the template's cells: share them (the merged document is read-only)
+                out["months"] = dict(first.get("months", {}))
+            elif name == "version":
+                out["version"] = sum(view.get("version", 0) for view in views)
+            else:
+                out[name] = first.get(name, default)
+        if touched:
+            # Same rule as the full merge: the first non-empty value of each month field wins
+            months = out["months"]
+            for view in views[1:]:
+                for month, cell in view.get("months", {}).items():
+                    if month not in months:
+                        months[month] = dict(cell)
+                        continue
+                    for field in month_fields:
+                        if cell.get(field) and not months[month].get(field):
+                            months[month][field] = cell[field]
+        merged.append(out)
+    return version, merged
+
+
+# ===== PACKING (command line) =====
+
+def families(data_dir: Path) -> dict:
+    """family -> [document paths] for every default / per-base document, packed or plain."""
+    found = {}
+    names = {p.name for p in data_dir.glob("*.json") if not p.name.endswith(OVERLAY_SUFFIX)}
+    names |= {document_path(p).name for p in data_dir.glob("*" + OVERLAY_SUFFIX)}
+    for family, default in FAMILY_DEFAULTS.items():
+        if default in names:
+            found.setdefault(family, set()).add(data_dir / default)
+    for name in names:
+        for pattern in FAMILY_RES:
+            match = pattern.match(name)
+            if match:
+                found.setdefault(match.group("family"), set()).add(data_dir / name)
+    return {family: sorted(paths) for family, paths in sorted(found.items())}
+
+
+def _canonical(data) -> str:
+    return json.dumps(data, sort_keys=True, separators=(",", ":"))
+
+
+def _disk_bytes(path: Path) -> int:
+    for candidate in (path, overlay_path(path)):
+        try:
+            return candidate.stat().st_size
+        except FileNotFoundError:
+            continue
+    return 0
+
+
+def _template_name(family: str, data: dict) -> str:
+    digest = hashlib.sha256(_canonical(data).encode("utf-8")).hexdigest()[:12]
+    return f"{TEMPLATE_DIR}/{family}.{digest}.json"
+
+
+def _remove_unreferenced_templates(data_dir: Path, family: str):
+    from store import read_json
+
+    referenced = {read_json(path, dict).get("template") for path in data_dir.glob("*" + OVERLAY_SUFFIX)}
+    for template in (data_dir / TEMPLATE_DIR).glob(f"{family}.*.json"):
+        if f"{TEMPLATE_DIR}/{template.name}" not in referenced:
+            template.unlink()
+
+
+def _pack_family(data_dir: Path, family: str, paths: list, dry_run: bool = False) -> dict:
+    """Pack one family; the caller holds the locks of its documents."""
+    from store import read_json, write_file
+
+    documents = [read_json(path) for path in paths]
+    counts = Counter(_canonical(doc) for doc in documents)
+    template = max(documents, key=lambda doc: counts[_canonical(doc)])
+    name = _template_name(family, template)
+    patches = [diff(template, doc) for doc in documents]
+    before = sum(_disk_bytes(path) for path in paths)
+    result = {"family": family, "template": name, "documents": len(paths), "bytes_before": before,
+              "patch_cells": {path.name: patch_cells(patch) for path, patch in zip(paths, patches)}}
+    if not dry_run:
+        if not (data_dir / name).exists():
+            write_file(data_dir / name, template, indent=None)
+        for path, patch in zip(paths, patches):
+            write_file(overlay_path(path), {"template": name, "patch": patch}, indent=2)
+            path.unlink(missing_ok=True)
+        _remove_unreferenced_templates(data_dir, family)
+        result["bytes_after"] = sum(_disk_bytes(path) for path in paths) + (data_dir / name).stat().st_size
+    return result
+
+
+def pack(data_dir: Path, dry_run: bool = False) -> list:
+    """Store every family as one template (its most common document) plus an overlay per document."""
+    from store import locked_documents
+
+    results = []
+    for family, paths in families(data_dir).items():
+        with locked_documents(*paths):
+            results.append(_pack_family(data_dir, family, paths, dry_run))
+    return results
+
+
+def _patch_ratio(data_dir: Path, paths: list) -> float:
+    """Size of a family's largest overlay relative to its template (0 when nothing is packed)."""
+    from store import read_json
+
+    ratio = 0.0
+    for path in paths:
+        overlay = overlay_path(path)
+        if path.exists() or not overlay.exists():
+            continue
+        template = data_dir / read_json(overlay, dict).get("template", "")
+        try:
+            ratio = max(ratio, overlay.stat().st_size / max(template.stat().st_size, 1))
+        except FileNotFoundError:
+            continue
+    return ratio
+
+
+def repack_grown(data_dir: Path, locked, ratio: float = REPACK_RATIO) -> list:
+    """Re-pack the packed families whose overlays have outgrown their template.
+
+    A write that changes every program (a year rollover) leaves each overlay
+    holding nearly a whole document. ``locked`` are the documents whose locks
+    the caller holds; only families made up entirely of them are re-packed.
+    """
+    locked = {Path(p).resolve() for p in locked}
+    results = []
+    for family, paths in families(Path(data_dir)).items():
+        if not {p.resolve() for p in paths} <= locked or _patch_ratio(Path(data_dir), paths) <= ratio:
+            continue
+        results.append(_pack_family(Path(data_dir), family, paths))
+    return results
+
+
+def unpack(data_dir: Path) -> list:
+    """Write every overlay back as a plain document."""
+    from store import document_lock, read_json, write_file
+
+    unpacked = []
+    for overlay in sorted(data_dir.glob("*" + OVERLAY_SUFFIX)):
+        path = document_path(overlay)
+        with document_lock(path):
+            write_file(path, read_json(path), indent=2)
+            overlay.unlink()
+        unpacked.append(path.name)
+    for family in families(data_dir):
+        _remove_unreferenced_templates(data_dir, family)
+    return unpacked
+
+
+def add_base(data_dir: Path, base: str, name: str) -> list:
+    """Register ``base`` with an empty overlay on each packed family's template."""
+    from store import locked_documents, read_json, write_file
+
+    if not re.match(r"^[a-z0-9_-]+$", base):
+        raise ValueError(f"invalid base id {base!r}: use lowercase letters, digits, '-' and '_'")
+    bases_file = data_dir / "bases.json"
+    created = []
+    with locked_documents(bases_file):
+        registry = read_json(bases_file, lambda: {"bases": []})
+        if any(b["id"] == base for b in registry.get("bases", [])):
+            raise ValueError(f"base {base!r} is already registered")
+        for family, paths in families(data_dir).items():
+            packed = [read_json(overlay_path(p)) for p in paths if overlay_path(p).exists()]
+            if not packed:
+                continue
+            path = data_dir / f"{family}_{base}.json"
+            if path.exists() or overlay_path(path).exists():
+                continue
+            write_file(overlay_path(path), {"template": packed[0]["template"], "patch": {}}, indent=2)
+            created.append(overlay_path(path).name)
+        write_file(bases_file, dict(registry, bases=registry.get("bases", []) + [{"id": base, "name": name}]),
+                   indent=2)
+    return created
+
+
+def status(data_dir: Path) -> dict:
+    report = {}
+    for family, paths in families(data_dir).items():
+        packed = [p.name for p in paths if not p.exists() and overlay_path(p).exists()]
+        report[family] = {"documents": len(paths), "packed": len(packed),
+                          "bytes": sum(_disk_bytes(p) for p in paths),
+                          "patch_ratio": round(_patch_ratio(data_dir, paths), 3),
+                          "templates": sorted(t.name for t in (data_dir / TEMPLATE_DIR).glob(f"{family}.*.json"))}
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pack per-base OTP / Matrix documents into templates and overlays.")
+    parser.add_argument("--data-dir", type=Path, default=None, help="Defaults to DATA_DIR or backend/data")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("status")
+    pack_parser = commands.add_parser("pack")
+    pack_parser.add_argument("--dry-run", action="store_true")
+    commands.add_parser("unpack")
+    add_parser = commands.add_parser("add-base")
+    add_parser.add_argument("base")
+    add_parser.add_argument("name")
+    args = parser.parse_args()
+
+    from store import DATA_DIR
+    data_dir = args.data_dir or DATA_DIR
+    try:
+        if args.command == "status":
+            result = status(data_dir)
+        elif args.command == "pack":
+            result = pack(data_dir, dry_run=args.dry_run)
+        elif args.command == "unpack":
+            result = unpack(data_dir)
+        else:
+            result = add_base(data_dir, args.base, args.name)
+    except ValueError as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 1
+    print(json.dumps(result, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
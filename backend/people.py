@@ -0,0 +1,176 @@
+"""Secondary index from people (PIC / manager email and name) to their items.
+
+Items are OTP / Matrix program months, HSE programs and tasks. Every item
+is filed under each person it names: pic_email and pic_manager_email by
+email, pic_name and pic_manager by name (both case-insensitive). Each
+person keeps their items in a list sorted by date, so a lookup costs time
+proportional to the result rather than to the data.
+
+As with the search index, items are grouped by source (one JSON document,
+the HSEProgram table or the task list). A source is replaced wholesale when
+it is saved and remembers the file signature it was built from.
+"""
+import bisect
+import threading
+
+MONTHS = ["jan", "feb", "mar", "apr", "may", "jun", "jul", "aug", "sep", "oct", "nov", "dec"]
+CLOSED_STATUSES = {"closed", "completed", "canceled", "cancelled"}
+
+# (item field, kind of key, role)
+PERSON_FIELDS = [("pic_email", "email", "pic"), ("pic_manager_email", "email", "manager"),
+                 ("pic_name", "name", "pic"), ("pic_manager", "name", "manager")]
+
+
+def person_key(kind: str, value) -> tuple:
+    return kind, " ".join(str(value).split()).lower()
+
+
+def month_date(year, month: str, plan_date=None) -> str:
+    """The date a month item is due: its plan date, else the first of the month."""
+    if plan_date:
+        return str(plan_date)[:10]
+    return f"{year or 0:04d}-{MONTHS.index(month) + 1:02d}-01"
+
+
+def month_items(data: dict, defaults: dict) -> list:
+    """(item key suffix, item) for every program month that names a person."""
+    items = []
+    year = data.get("year")
+    for prog in data.get("programs", []):
+        for month, cell in (prog.get("months") or {}).items():
+            if month not in MONTHS or not isinstance(cell, dict):
+                continue
+            if not any(cell.get(field) for field, _, _ in PERSON_FIELDS):
+                continue
+            plan, actual = cell.get("plan", 0) or 0, cell.get("actual", 0) or 0
+            item = dict(defaults, program_id=prog.get("id"), program=prog.get("name", ""), month=month, year=year,
+                        plan=plan, actual=actual, date=month_date(year, month, cell.get("plan_date")),
+                        open=actual < plan)
+            for field in ("plan_date", "impl_date", "wpts_id", "pic_name", "pic_email", "pic_manager",
+                          "pic_manager_email"):
+                item[field] = cell.get(field, "")
+            items.append(((prog.get("id"), month), item))
+    return items
+
+
+def is_open_status(status) -> bool:
+    return str(status or "").strip().lower() not in CLOSED_STATUSES
+
+
+class PeopleIndex:
+    """Thread-safe person -> items index with per-source replacement."""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._items = {}         # item_key -> (sort key, item, person keys)
+        self._people = {}        # person key -> sorted [(sort key, item_key)]
+        self._sources = {}       # source_key -> set of item_keys
+        self._signatures = {}    # source_key -> signature it was indexed from
+
+    def signature(self, source_key):
+        with self._lock:
+            return self._signatures.get(source_key, ())
+
+    def has_source(self, source_key) -> bool:
+        with self._lock:
+            return source_key in self._sources
+
+    def _remove(self, item_key):
+        entry = self._items.pop(item_key, None)
+        if entry is None:
+            return
+        sort_key, _, people = entry
+        for person in people:
+            entries = self._people.get(person)
+            if entries is None:
+                continue
+            i = bisect.bisect_left(entries, (sort_key, item_key))
+            if i < len(entries) and entries[i] == (sort_key, item_key):
+                entries.pop(i)
+            if not entries:
+                del self._people[person]
+
+    def _add(self, item_key, item):
+        people = set()
+        for field, kind, _ in PERSON_FIELDS:
+            if item.get(field):
+                people.add(person_key(kind, item[field]))
+        if not people:
+            return
+        # str() keeps keys comparable whatever mix of ids they contain
+        sort_key = (item.get("date") or "9999-12-31", str(item_key))
+        self._items[item_key] = (sort_key, item, people)
+        for person in people:
+            bisect.insort(self._people.setdefault(person, []), (sort_key, item_key))
+
+    def put(self, source_key, item_key, item):
+        """Add or replace one item."""
+        with self._lock:
+            self._remove(item_key)
+            self._add(item_key, item)
+            self._sources.setdefault(source_key, set()).add(item_key)
+
+    def delete(self, source_key, item_key):
+        with self._lock:
+            self._remove(item_key)
+            self._sources.get(source_key, set()).discard(item_key)
+
+    def retain(self, source_keys):
+        """Forget sources not in ``source_keys`` (e.g. documents no longer indexed)."""
+        with self._lock:
+            for source_key in set(self._sources) - set(source_keys):
+                for item_key in self._sources.pop(source_key):
+                    self._remove(item_key)
+                self._signatures.pop(source_key, None)
+
+    def replace_source(self, source_key, items, signature=()):
+        """Replace every item of a source with ``(item_key, item)`` pairs."""
+        with self._lock:
+            for item_key in self._sources.pop(source_key, ()):
+                self._remove(item_key)
+            keys = set()
+            for item_key, item in items:
+                self._remove(item_key)
+                self._add(item_key, item)
+                keys.add(item_key)
+            self._sources[source_key] = keys
+            self._signatures[source_key] = signature
+
+    def lookup(self, email: str = None, name: str = None, open_only: bool = True, role: str = None,
+               limit: int = None) -> list:
+        """Items naming a person by email and/or name, sorted by date.
+
+        Each result carries ``roles``: how the person appears on it (pic,
+        manager or both).
+        """
+        wanted = []
+        if email:
+            wanted.append(person_key("email", email))
+        if name:
+            wanted.append(person_key("name", name))
+        with self._lock:
+            entries = []
+            for person in wanted:
+                entries.extend(self._people.get(person, ()))
+            if len(wanted) > 1:
+                entries = sorted(set(entries))
+            results = []
+            for _, item_key in entries:
+                _, item, _ = self._items[item_key]
+                if open_only and not item.get("open"):
+                    continue
+                roles = sorted({r for field, kind, r in PERSON_FIELDS
+                                if item.get(field) and person_key(kind, item[field]) in wanted})
+                if role and role not in roles:
+                    continue
+                results.append(dict(item, roles=roles))
+                if limit and len(results) >= limit:
+                    break
+        return results
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"items": len(self._items), "people": len(self._people), "sources": len(self._sources)}
+
+
+people_index = PeopleIndex()
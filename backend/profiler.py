@@ -0,0 +1,208 @@
+"""Opt-in sampling profiler for individual requests.
+
+Enable with ``HSE_PROFILE=1``. A request is profiled when it carries an
+``X-Profile: 1`` header or is picked by ``HSE_PROFILE_SAMPLE_RATE`` (0..1).
+While it runs, a background thread samples the Python stacks of the other
+threads every ``HSE_PROFILE_INTERVAL_MS`` milliseconds. When the request
+finishes, the samples are written to ``HSE_PROFILE_DIR`` as a speedscope
+JSON file and as collapsed stacks (for flamegraph.pl / inferno). Only the
+newest ``HSE_PROFILE_KEEP`` profiles, up to ``HSE_PROFILE_MAX_MB`` in all,
+are kept on disk.
+
+When HSE_PROFILE is unset the middleware is not installed at all.
+"""
+import asyncio
+import json
+import os
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter, deque
+from datetime import datetime
+from pathlib import Path
+
+
+PROFILE_ENABLED = os.getenv("HSE_PROFILE", "") in ("1", "true", "yes")
+PROFILE_SAMPLE_RATE = float(os.getenv("HSE_PROFILE_SAMPLE_RATE", "0"))
+PROFILE_INTERVAL = float(os.getenv("HSE_PROFILE_INTERVAL_MS", "5")) / 1000
+PROFILE_DIR = Path(os.getenv("HSE_PROFILE_DIR", Path(tempfile.gettempdir()) / "hse-profiles"))
+PROFILE_KEEP = int(os.getenv("HSE_PROFILE_KEEP", "200"))
+PROFILE_MAX_BYTES = int(float(os.getenv("HSE_PROFILE_MAX_MB", "256")) * 1024 * 1024)
+PROFILE_HEADER = b"x-profile"
+
+# Leaf frames that mean "this thread is parked", not doing request work
+_IDLE_FILES = ("threading.py", "selectors.py", "queue.py", "base_events.py", "thread.py")
+
+recent_profiles = deque(maxlen=50)
+
+
+class StackSampler:
+    """Collect collapsed stacks of every other thread at a fixed interval."""
+
+    def __init__(self, interval: float = PROFILE_INTERVAL):
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        own_id = threading.get_ident()
+        names = {}
+        while not self._stop.wait(self.interval):
+            self.samples += 1
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id or frame.f_code.co_filename.endswith(_IDLE_FILES):
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({Path(code.co_filename).name}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                if thread_id not in names:
+                    names = {t.ident: t.name for t in threading.enumerate()}
+                stack.append(names.get(thread_id, str(thread_id)))
+                self.stacks[tuple(reversed(stack))] += 1
+
+
+def write_profile(profile_id: str, sampler: StackSampler, meta: dict) -> dict:
+    """Write speedscope and collapsed-stack files; return the index entry."""
+    PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+    interval_ms = sampler.interval * 1000
+
+    collapsed_path = PROFILE_DIR / f"{profile_id}.collapsed.txt"
+    with open(collapsed_path, "w") as f:
+        for stack, count in sampler.stacks.most_common():
+            f.write(";".join(stack) + f" {count}\n")
+
+    frames, frame_index, samples, weights = [], {}, [], []
+    for stack, count in sampler.stacks.items():
+        indices = []
+        for name in stack:
+            if name not in frame_index:
+                frame_index[name] = len(frames)
+                frames.append({"name": name})
+            indices.append(frame_index[name])
+        samples.append(indices)
+        weights.append(count * interval_ms)
+    speedscope = {
+        "$schema": "https://www.speedscope.app/file-format-schema.json",
+        "name": f"{meta['method']} {meta['path']}",
+        "exporter": "hse-profiler",
+        "shared": {"frames": frames},
+        "profiles": [{
+            "type": "sampled",
+            "name": f"{meta['method']} {meta['path']}",
+            "unit": "milliseconds",
+            "startValue": 0,
+            "endValue": sum(weights),
+            "samples": samples,
+            "weights": weights,
+        }],
+    }
+    speedscope_path = PROFILE_DIR / f"{profile_id}.speedscope.json"
+    with open(speedscope_path, "w") as f:
+        json.dump(speedscope, f)
+
+    entry = dict(meta, id=profile_id, samples=sampler.samples,
+                 files=[speedscope_path.name, collapsed_path.name])
+    recent_profiles.appendleft(entry)
+    prune_profiles()
+    return entry
+
+
+def prune_profiles(keep: int = None, max_bytes: int = None) -> list:
+    """Delete the oldest profiles beyond ``keep`` profiles or ``max_bytes`` on disk; return their ids."""
+    keep = PROFILE_KEEP if keep is None else keep
+    max_bytes = PROFILE_MAX_BYTES if max_bytes is None else max_bytes
+    profiles = []
+    for path in PROFILE_DIR.glob("*.speedscope.json"):
+        profile_id = path.name[:-len(".speedscope.json")]
+        files = [path, PROFILE_DIR / f"{profile_id}.collapsed.txt"]
+        try:
+            stats = [f.stat() for f in files if f.exists()]
+        except FileNotFoundError:
+            continue
+        profiles.append((max(s.st_mtime for s in stats), profile_id, sum(s.st_size for s in stats), files))
+
+    removed, total = [], 0
+    for kept, (_, profile_id, size, files) in enumerate(sorted(profiles, reverse=True)):
+        total += size
+        if kept < keep and total <= max_bytes:
+            continue
+        for f in files:
+            f.unlink(missing_ok=True)
+        removed.append(profile_id)
+    return removed
+
+
+def list_profiles() -> list:
+    """Recent profiles, newest first (files on disk, described when known)."""
+    known = {entry["id"]: entry for entry in recent_profiles}
+    if not PROFILE_DIR.exists():
+        return []
+    results = []
+    for path in sorted(PROFILE_DIR.glob("*.speedscope.json"), key=lambda p: p.stat().st_mtime, reverse=True):
+        profile_id = path.name[:-len(".speedscope.json")]
+        results.append(known.get(profile_id, {"id": profile_id, "files": [path.name, f"{profile_id}.collapsed.txt"]}))
+    return results[:recent_profiles.maxlen]
+
+
+class ProfilerMiddleware:
+    """ASGI middleware profiling requests selected by header or sample rate."""
+
+    def __init__(self, app):
+        self.app = app
+        # One profile at a time: the sampler sees every thread, so overlapping
+        # profiles would attribute each other's work.
+        self._busy = threading.Lock()
+
+    def _wanted(self, scope) -> bool:
+        for name, value in scope.get("headers", []):
+            if name == PROFILE_HEADER:
+                return value.strip() in (b"1", b"true", b"yes")
+        return PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self._wanted(scope) or not self._busy.acquire(blocking=False):
+            await self.app(scope, receive, send)
+            return
+
+        started = datetime.now()
+        slug = re.sub(r"[^A-Za-z0-9]+", "-", scope["path"]).strip("-") or "root"
+        profile_id = f"{started.strftime('%Y%m%d-%H%M%S-%f')}-{scope['method'].lower()}-{slug[:60]}"
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                message.setdefault("headers", [])
+                message["headers"] = list(message["headers"]) + [(b"x-profile-id", profile_id.encode())]
+            await send(message)
+
+        sampler = StackSampler()
+        start = time.perf_counter()
+        sampler.start()
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            sampler.stop()
+            duration_ms = (time.perf_counter() - start) * 1000
+            self._busy.release()
+            meta = {
+                "method": scope["method"],
+                "path": scope["path"],
+                "query": scope.get("query_string", b"").decode("latin-1"),
+                "route": getattr(scope.get("route"), "path", None),
+                "started_at": started.isoformat(),
+                "duration_ms": round(duration_ms, 2),
+            }
+            await asyncio.get_running_loop().run_in_executor(None, write_profile, profile_id, sampler, meta)
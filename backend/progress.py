@@ -0,0 +1,41 @@
+"""Progress percentages for OTP, OTP Asia and Matrix programs.
+
+Shared by the API (which stores ``progress`` on every write) and by fsck
+(which recomputes it to detect drift).
+"""
+
+
+def calculate_progress(program):
+    """Calculate progress percentage for an OTP program."""
+    total_plan = 0
+    total_actual = 0
+    for month_data in program.get("months", {}).values():
+        total_plan += month_data.get("plan", 0)
+        total_actual += month_data.get("actual", 0)
+    if total_plan == 0:
+        return 100 if total_actual >= 0 else 0
+    return min(100, round((total_actual / total_plan) * 100))
+
+
+def calculate_progress_asia(program):
+    """Calculate progress percentage for an OTP ASIA program."""
+    total_plan = 0
+    total_actual = 0
+    for month_data in program.get("months", {}).values():
+        total_plan += month_data.get("plan", 0)
+        total_actual += month_data.get("actual", 0)
+    if total_plan == 0:
+        return 100 if total_actual >= 0 else 0
+    return min(100, round((total_actual / total_plan) * 100))
+
+
+def calculate_matrix_progress(program: dict) -> int:
+    """Calculate progress based on plan vs actual."""
+    total_plan = 0
+    total_actual = 0
+    for month_data in program.get("months", {}).values():
+        total_plan += month_data.get("plan", 0)
+        total_actual += month_data.get("actual", 0)
+    if total_plan == 0:
+        return 0
+    return min(100, int((total_actual / total_plan) * 100))
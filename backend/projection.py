@@ -0,0 +1,83 @@
+"""Sparse field selection and month-range projection for OTP / Matrix reads.
+
+``fields`` is a comma-separated list of names. Month fields (plan, actual,
+wpts_id, ...) limit what each month cell carries, and any other names limit
+the program attributes; ``id`` and ``months`` are always kept. A group with
+no names in the list is returned whole.
+
+``months`` selects months by name (``jan,feb``), by range (``jan-mar``) or
+by quarter (``q2``).
+
+Programs are projected straight from the stored documents, so no full
+response is built only to be thrown away.
+"""
+MONTHS = ["jan", "feb", "mar", "apr", "may", "jun", "jul", "aug", "sep", "oct", "nov", "dec"]
+MONTH_FIELDS = ["plan", "actual", "wpts_id", "plan_date", "impl_date", "pic_name", "pic_manager", "pic_email",
+                "pic_manager_email"]
+QUARTERS = {f"q{i + 1}": MONTHS[3 * i:3 * i + 3] for i in range(4)}
+
+
+def parse_months(value: str) -> tuple:
+    selected = set()
+    for part in value.lower().split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if part in QUARTERS:
+            selected.update(QUARTERS[part])
+        elif "-" in part:
+            first, _, last = (p.strip() for p in part.partition("-"))
+            if first not in MONTHS or last not in MONTHS or MONTHS.index(first) > MONTHS.index(last):
+                raise ValueError(f"Invalid month range: {part!r}")
+            selected.update(MONTHS[MONTHS.index(first):MONTHS.index(last) + 1])
+        elif part in MONTHS:
+            selected.add(part)
+        else:
+            raise ValueError(f"Invalid month: {part!r}. Use month names, ranges like jan-mar or q1..q4")
+    if not selected:
+        raise ValueError("months selects nothing")
+    return tuple(m for m in MONTHS if m in selected)
+
+
+class Projection:
+    """A parsed fields= / months= selection; ``key`` identifies it in caches."""
+
+    def __init__(self, fields: str = None, months: str = None):
+        names = [f.strip() for f in (fields or "").split(",") if f.strip()]
+        if fields is not None and not names:
+            raise ValueError("fields selects nothing")
+        month_fields = [f for f in MONTH_FIELDS if f in names]
+        program_fields = sorted(set(names) - set(MONTH_FIELDS))
+        self.cell_fields = tuple(month_fields) or None
+        self.program_fields = frozenset(program_fields + ["id", "months"]) if program_fields else None
+        self.months = parse_months(months) if months is not None else None
+        self.key = (self.cell_fields, tuple(program_fields) or None, self.months)
+
+    def __bool__(self):
+        return self.key != (None, None, None)
+
+    def cell(self, cell: dict) -> dict:
+        if self.cell_fields is None:
+            return cell
+        return {f: cell[f] for f in self.cell_fields if f in cell}
+
+    def program(self, prog: dict, **extra) -> dict:
+        """Project one program; ``extra`` attributes (e.g. progress) are added before projecting."""
+        out = {}
+        for key, value in prog.items():
+            if key == "months" or (self.program_fields is not None and key not in self.program_fields):
+                continue
+            out[key] = value
+        for key, value in extra.items():
+            if self.program_fields is None or key in self.program_fields:
+                out[key] = value
+        months = prog.get("months")
+        if months is not None:
+            selected = self.months or months
+            out["months"] = {m: self.cell(months[m]) for m in selected if m in months}
+        return out
+
+    def document(self, data: dict, extra=None) -> dict:
+        """Project every program of a document; ``extra(prog)`` gives per-program attributes."""
+        programs = [self.program(prog, **(extra(prog) if extra else {})) for prog in data.get("programs", [])]
+        return dict(data, programs=programs)
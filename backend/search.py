@@ -0,0 +1,188 @@
+"""In-process full-text search over HSE programs and OTP / Matrix programs.
+
+An inverted index maps each token to the documents containing it, with a
+field-weighted term frequency. Queries match every token, and the last one
+may be a prefix (so typeahead works). Results are ranked by BM25.
+
+Documents are grouped by source (one JSON document, or the HSEProgram
+table), so a source can be re-indexed wholesale when it is saved. Each
+source also remembers the file signature it was indexed from, which lets
+the caller cheaply detect changes made by other processes.
+"""
+import bisect
+import math
+import re
+import threading
+
+
+TOKEN_RE = re.compile(r"[\w@.+-]+", re.UNICODE)
+SPLIT_RE = re.compile(r"[\W_]+", re.UNICODE)
+K1 = 1.2
+B = 0.75
+PREFIX_PENALTY = 0.8
+MAX_PREFIX_EXPANSION = 50
+
+# Field weights for program-like documents
+NAME_WEIGHT = 3.0
+REFERENCE_WEIGHT = 2.0
+PEOPLE_WEIGHT = 1.5
+OTHER_WEIGHT = 1.0
+
+PEOPLE_FIELDS = ("pic_name", "pic_manager", "pic_email", "pic_manager_email", "wpts_id")
+
+
+def tokenize(text) -> list:
+    """Lowercased word tokens; emails and ids are kept whole and also split."""
+    if not text:
+        return []
+    tokens = []
+    for raw in TOKEN_RE.findall(str(text).lower()):
+        parts = [p for p in SPLIT_RE.split(raw) if p]
+        whole = raw.strip(".-+@")
+        if len(parts) > 1 and whole:
+            tokens.append(whole)
+        tokens.extend(parts)
+    return [t for t in tokens if t]
+
+
+def program_fields(program: dict) -> list:
+    """(text, weight) pairs for an OTP / Matrix program."""
+    fields = [(program.get("name"), NAME_WEIGHT), (program.get("reference"), REFERENCE_WEIGHT),
+              (program.get("plan_type"), OTHER_WEIGHT)]
+    people = set()
+    for cell in (program.get("months") or {}).values():
+        if isinstance(cell, dict):
+            people.update(str(cell[f]) for f in PEOPLE_FIELDS if cell.get(f))
+    fields.extend((value, PEOPLE_WEIGHT) for value in sorted(people))
+    return fields
+
+
+class SearchIndex:
+    """Thread-safe inverted index with per-source replacement."""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._postings = {}      # token -> {doc_key: weighted tf}
+        self._docs = {}          # doc_key -> (length, payload, tokens)
+        self._sources = {}       # source_key -> set of doc_keys
+        self._signatures = {}    # source_key -> signature it was indexed from
+        self._total_length = 0.0
+        self._sorted_tokens = None
+
+    def signature(self, source_key):
+        with self._lock:
+            return self._signatures.get(source_key, ())
+
+    def has_source(self, source_key) -> bool:
+        with self._lock:
+            return source_key in self._sources
+
+    def _remove(self, doc_key):
+        doc = self._docs.pop(doc_key, None)
+        if doc is None:
+            return
+        length, _, tokens = doc
+        self._total_length -= length
+        for token in tokens:
+            posting = self._postings.get(token)
+            if posting is not None:
+                posting.pop(doc_key, None)
+                if not posting:
+                    del self._postings[token]
+                    self._sorted_tokens = None
+
+    def _add(self, doc_key, fields, payload):
+        counts = {}
+        for text, weight in fields:
+            for token in tokenize(text):
+                counts[token] = counts.get(token, 0.0) + weight
+        length = sum(counts.values())
+        for token, tf in counts.items():
+            posting = self._postings.get(token)
+            if posting is None:
+                posting = self._postings[token] = {}
+                self._sorted_tokens = None
+            posting[doc_key] = tf
+        self._docs[doc_key] = (length, payload, tuple(counts))
+        self._total_length += length
+
+    def put(self, source_key, doc_key, fields, payload):
+        """Add or replace one document."""
+        with self._lock:
+            self._remove(doc_key)
+            self._add(doc_key, fields, payload)
+            self._sources.setdefault(source_key, set()).add(doc_key)
+
+    def delete(self, source_key, doc_key):
+        with self._lock:
+            self._remove(doc_key)
+            self._sources.get(source_key, set()).discard(doc_key)
+
+    def replace_source(self, source_key, documents, signature=()):
+        """Replace every document of a source with ``(doc_key, fields, payload)`` items."""
+        with self._lock:
+            for doc_key in self._sources.pop(source_key, ()):
+                self._remove(doc_key)
+            keys = set()
+            for doc_key, fields, payload in documents:
+                self._remove(doc_key)
+                self._add(doc_key, fields, payload)
+                keys.add(doc_key)
+            self._sources[source_key] = keys
+            self._signatures[source_key] = signature
+
+    def _expand(self, prefix: str) -> list:
+        if self._sorted_tokens is None:
+            self._sorted_tokens = sorted(self._postings)
+        tokens = self._sorted_tokens
+        start = bisect.bisect_left(tokens, prefix)
+        matches = []
+        for token in tokens[start:start + MAX_PREFIX_EXPANSION]:
+            if not token.startswith(prefix):
+                break
+            matches.append(token)
+        return matches
+
+    def search(self, query: str, limit: int = 20, sources=None):
+        """Return (total, hits) for documents matching every query token."""
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return 0, []
+        with self._lock:
+            doc_count = len(self._docs) or 1
+            avg_length = self._total_length / doc_count or 1.0
+            scores = None
+            for i, term in enumerate(terms):
+                # The last term may be a prefix, earlier ones must be whole words
+                candidates = [(term, 1.0)]
+                if i == len(terms) - 1:
+                    candidates += [(t, PREFIX_PENALTY) for t in self._expand(term) if t != term]
+                term_scores = {}
+                for token, factor in candidates:
+                    posting = self._postings.get(token)
+                    if not posting:
+                        continue
+                    idf = math.log(1 + (doc_count - len(posting) + 0.5) / (len(posting) + 0.5))
+                    for doc_key, tf in posting.items():
+                        length = self._docs[doc_key][0]
+                        score = idf * tf * (K1 + 1) / (tf + K1 * (1 - B + B * length / avg_length)) * factor
+                        if score > term_scores.get(doc_key, 0.0):
+                            term_scores[doc_key] = score
+                if scores is None:
+                    scores = term_scores
+                else:
+                    scores = {k: s + term_scores[k] for k, s in scores.items() if k in term_scores}
+                if not scores:
+                    return 0, []
+            if sources:
+                scores = {k: s for k, s in scores.items() if self._docs[k][1].get("source") in sources}
+            ranked = sorted(scores.items(), key=lambda item: (-item[1], str(item[0])))
+            hits = [dict(self._docs[k][1], score=round(s, 4)) for k, s in ranked[:limit]]
+        return len(ranked), hits
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"documents": len(self._docs), "tokens": len(self._postings), "sources": len(self._sources)}
+
+
+search_index = SearchIndex()
@@ -0,0 +1,134 @@
+"""Startup phase timing and the optional background warm-up.
+
+Imported first by app.py so the "imports" phase covers FastAPI, SQLModel
+and the app module itself. Phases are reported at ``/admin/startup`` and
+logged once the server is ready:
+
+- imports: from this module's import to the end of app.py
+- database: ``create_all``
+- ready: lifespan startup finished, the server accepts requests
+- first_byte: the first response started (time to first byte)
+- scheduler: APScheduler imported and started (deferred, see app.py)
+- warmup: each registered warm-up task (``HSE_WARMUP=1``)
+
+Times are seconds since the process started (from /proc when available,
+otherwise since this module was imported).
+"""
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+
+log = logging.getLogger("hse.startup")
+
+WARMUP_ENABLED = os.getenv("HSE_WARMUP", "") in ("1", "true", "yes")
+
+_t0 = time.perf_counter()
+
+
+def _process_age() -> float:
+    """Seconds since the process was created, 0 if unknown."""
+    try:
+        with open("/proc/self/stat") as f:
+            start_ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+        return max(0.0, uptime - start_ticks / os.sysconf("SC_CLK_TCK"))
+    except (OSError, ValueError, IndexError):
+        return 0.0
+
+
+_offset = _process_age()
+_phases = {}
+_lock = threading.Lock()
+
+# (name, fn) pairs run by warm_up(), in registration order
+warmup_tasks = []
+warmup_state = {"status": "disabled" if not WARMUP_ENABLED else "pending"}
+
+
+def now() -> float:
+    """Seconds since process start."""
+    return round(_offset + time.perf_counter() - _t0, 4)
+
+
+def mark(name: str, **extra):
+    """Record that a phase finished now."""
+    with _lock:
+        _phases.setdefault(name, dict(at=now(), **extra))
+
+
+@contextmanager
+def phase(name: str):
+    """Record the start, end and duration of a phase."""
+    start = now()
+    try:
+        yield
+    finally:
+        end = now()
+        with _lock:
+            _phases[name] = {"start": start, "at": end, "duration": round(end - start, 4)}
+
+
+def report() -> dict:
+    with _lock:
+        phases = dict(_phases)
+    return {"phases": phases, "warmup": dict(warmup_state), "uptime": now()}
+
+
+def summary() -> str:
+    parts = [f"{name} {info['at']:.3f}s" for name, info in report()["phases"].items()]
+    return ", ".join(parts)
+
+
+def register_warmup(name: str):
+    """Decorator adding a function to the background warm-up."""
+    def decorator(fn):
+        warmup_tasks.append((name, fn))
+        return fn
+    return decorator
+
+
+def warm_up():
+    """Run every warm-up task, timing each one; errors are reported, not raised."""
+    warmup_state.update(status="running", started_at=now(), tasks={})
+    for name, fn in warmup_tasks:
+        start = time.perf_counter()
+        try:
+            fn()
+            result = "ok"
+        except Exception as e:
+            result = f"error: {e}"
+        warmup_state["tasks"][name] = {"duration": round(time.perf_counter() - start, 4), "result": result}
+    warmup_state.update(status="done", finished_at=now())
+    mark("warmup", duration=round(warmup_state["finished_at"] - warmup_state["started_at"], 4))
+    log.info("Warm-up finished in %.3fs", _phases["warmup"]["duration"])
+
+
+def start_warm_up():
+    if WARMUP_ENABLED:
+        threading.Thread(target=warm_up, name="warmup", daemon=True).start()
+
+
+class FirstByteMiddleware:
+    """ASGI middleware recording when the first response started."""
+
+    def __init__(self, app):
+        self.app = app
+        self.seen = False
+
+    async def __call__(self, scope, receive, send):
+        if self.seen or scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_mark(message):
+            if message["type"] == "http.response.start" and not self.seen:
+                self.seen = True
+                mark("first_byte", path=scope["path"])
+                log.info("First response after %.3fs (%s)", _phases["first_byte"]["at"], scope["path"])
+            await send(message)
+
+        await self.app(scope, receive, send_with_mark)
@@ -0,0 +1,324 @@
+"""JSON document storage helpers shared by the OTP, Matrix, KPI and LL stores.
+
+Writes go to a temporary file that is atomically renamed over the target, so
+readers never need a lock: they always see either the old or the new
+document, never a truncated one. Writers take a per-document lock around
+their load-modify-save cycle and use version numbers for optimistic
+concurrency checks.
+
+A document may be stored as a template plus an overlay (see overlay.py).
+``read_json``, ``write_json`` and ``files_signature`` resolve that from the
+plain document path. Templates are parsed once and kept pickled; a read
+unpickles a private copy and applies the overlay's patch, so each packed
+document costs its patch in memory, not a whole copy.
+"""
+import json
+import os
+import pickle
+import tempfile
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows: in-process locking only
+    fcntl = None
+
+import overlay
+from metrics import store_load_duration, store_load_bytes, store_save_duration, store_save_bytes
+
+
+DATA_DIR = Path(os.getenv("DATA_DIR", Path(__file__).parent / "data"))
+# mkstemp creates 0600 files; new documents get this mode instead
+FILE_MODE = 0o644
+
+_locks = {}
+_locks_guard = threading.Lock()
+
+
+class DocumentLock:
+    """Exclusive write lock for one document, across threads and processes."""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.lock_path = self.path.parent / f".{self.path.name}.lock"
+        self._thread_lock = threading.Lock()
+        self._fd = None
+
+    def __enter__(self):
+        self._thread_lock.acquire()
+        if fcntl is None:
+            return self
+        try:
+            self.lock_path.parent.mkdir(parents=True, exist_ok=True)
+            fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+            except BaseException:
+                os.close(fd)
+                raise
+        except BaseException:
+            self._thread_lock.release()
+            raise
+        self._fd = fd
+        return self
+
+    def __exit__(self, *exc):
+        if self._fd is not None:
+            fd, self._fd = self._fd, None
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
+        self._thread_lock.release()
+
+
+def document_lock(path: Path) -> DocumentLock:
+    """Return the write lock for one document file."""
+    key = str(Path(path).resolve())
+    with _locks_guard:
+        lock = _locks.get(key)
+        if lock is None:
+            lock = _locks[key] = DocumentLock(key)
+        return lock
+
+
+@contextmanager
+def locked_documents(*paths):
+    """Hold the write locks of several documents, acquired in a fixed order."""
+    keys = sorted({str(Path(p).resolve()) for p in paths})
+    with ExitStack() as stack:
+        for key in keys:
+            stack.enter_context(document_lock(key))
+        yield
+
+
+def read_json(path: Path, default=None):
+    """Load a JSON document, or return ``default()`` if the file is missing."""
+    start = time.perf_counter()
+    try:
+        with open(path, "r") as f:
+            data = json.load(f)
+            size = f.tell()
+    except FileNotFoundError:
+        resolved = _read_overlay(Path(path))
+        if resolved is None:
+            return default() if default is not None else None
+        data, size = resolved
+    name = Path(path).name
+    store_load_duration.observe(time.perf_counter() - start, file=name)
+    store_load_bytes.observe(size, file=name)
+    return data
+
+
+# Parsed files that change rarely: overlay path -> (stat, overlay document),
+# template path -> (stat, read-only parsed template, pickled template)
+_overlays = {}
+_templates = {}
+_file_cache_lock = threading.Lock()
+
+
+def _stat_key(path: Path):
+    stat = os.stat(path)
+    return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+
+def _cached_overlay(path: Path) -> dict:
+    key = _stat_key(path)
+    with _file_cache_lock:
+        cached = _overlays.get(path)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+    with open(path, "r") as f:
+        document = json.load(f)
+    with _file_cache_lock:
+        _overlays[path] = (key, document)
+    return document
+
+
+def _cached_template(path: Path) -> tuple:
+    key = _stat_key(path)
+    with _file_cache_lock:
+        cached = _templates.get(path)
+        if cached is not None and cached[0] == key:
+            return cached
+    with open(path, "r") as f:
+        template = json.load(f)
+    cached = (key, template, pickle.dumps(template, protocol=pickle.HIGHEST_PROTOCOL))
+    with _file_cache_lock:
+        _templates[path] = cached
+    return cached
+
+
+def _overlay_parts(path: Path):
+    """(overlay size, template path, patch) of a packed document, or None if it has no overlay."""
+    overlay_file = overlay.overlay_path(path)
+    for attempt in range(2):
+        try:
+            document = _cached_overlay(overlay_file)
+            template_path = overlay_file.parent / document["template"]
+            _cached_template(template_path)
+            return _stat_key(overlay_file)[2], template_path, document["patch"]
+        except FileNotFoundError:
+            if not overlay_file.exists():
+                return None
+            if attempt:
+                raise
+            # Re-packed between reading the overlay and its old template: read again
+
+
+def _read_overlay(path: Path):
+    parts = _overlay_parts(path)
+    if parts is None:
+        return None
+    size, template_path, patch = parts
+    _, _, pickled = _cached_template(template_path)
+    return overlay.apply(pickle.loads(pickled), patch), size
+
+
+def document_exists(path: Path) -> bool:
+    """Whether a document is stored, as a plain file or as an overlay."""
+    return Path(path).exists() or overlay.overlay_path(path).exists()
+
+
+def overlay_views(paths):
+    """(template, patches) when every document is an overlay of the same template, else None.
+
+    The template is shared and must not be mutated.
+    """
+    template_path, patches = None, []
+    for path in paths:
+        if Path(path).exists():
+            return None
+        parts = _overlay_parts(Path(path))
+        if parts is None or (template_path is not None and parts[1] != template_path):
+            return None
+        template_path = parts[1]
+        patches.append(parts[2])
+    if template_path is None:
+        return None
+    return _cached_template(template_path)[1], patches
+
+
+def write_json(path: Path, data, indent: int = 2):
+    """Atomically replace a JSON document on disk (its overlay, if it is stored as one)."""
+    path = Path(path)
+    overlay_file = overlay.overlay_path(path)
+    if not path.exists() and overlay_file.exists():
+        start = time.perf_counter()
+        document = _cached_overlay(overlay_file)
+        _, template, _ = _cached_template(overlay_file.parent / document["template"])
+        size = write_file(overlay_file, {"template": document["template"], "patch": overlay.diff(template, data)},
+                          indent)
+        store_save_duration.observe(time.perf_counter() - start, file=path.name)
+        store_save_bytes.observe(size, file=path.name)
+        return
+    start = time.perf_counter()
+    size = write_file(path, data, indent)
+    store_save_duration.observe(time.perf_counter() - start, file=path.name)
+    store_save_bytes.observe(size, file=path.name)
+
+
+def replace_file(tmp_path, path: Path):
+    """Move a finished temp file over ``path``, keeping the mode of the file it replaces."""
+    try:
+        mode = os.stat(path).st_mode & 0o7777
+    except FileNotFoundError:
+        mode = FILE_MODE
+    os.chmod(tmp_path, mode)
+    os.replace(tmp_path, path)
+
+
+def write_file(path: Path, data, indent: int = 2) -> int:
+    """Atomically replace one JSON file; returns its size."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(prefix=f".{path.name}.", suffix=".tmp", dir=str(path.parent))
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(data, f, indent=indent)
+            f.flush()
+            os.fsync(f.fileno())
+            size = f.tell()
+        replace_file(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except FileNotFoundError:
+            pass
+        raise
+    return size
+
+
+def write_json_batch(writes, indent: int = 2):
+    """Write several documents, all or nothing.
+
+    ``writes`` is a list of (path, data, previous[, indent]) where
+    ``previous`` is the current content (None if the file does not exist).
+    If any write fails, the documents already written are restored. Callers
+    hold the documents' locks.
+    """
+    written = []
+    try:
+        for path, data, previous, *options in writes:
+            file_indent = options[0] if options else indent
+            write_json(path, data, indent=file_indent)
+            written.append((Path(path), previous, file_indent))
+    except BaseException:
+        for path, previous, file_indent in reversed(written):
+            if previous is None:
+                path.unlink(missing_ok=True)
+            else:
+                write_json(path, previous, indent=file_indent)
+        raise
+
+
+def files_signature(paths) -> tuple:
+    """Cheap change detector for a set of documents.
+
+    Every save replaces the file, so (inode, mtime, size) changes on each
+    write, including writes from other processes. A packed document is
+    represented by its overlay file (its template never changes in place).
+    """
+    signature = []
+    for path in paths:
+        try:
+            signature.append(_stat_key(path))
+        except FileNotFoundError:
+            try:
+                signature.append(_stat_key(overlay.overlay_path(path)))
+            except FileNotFoundError:
+                signature.append(None)
+    return tuple(signature)
+
+
+def bump_version(obj: dict) -> int:
+    """Increment and return the ``version`` field of a document or program."""
+    obj["version"] = obj.get("version", 0) + 1
+    return obj["version"]
+
+
+def parse_if_match(header: str):
+    """Parse an If-Match header into a set of versions.
+
+    Returns None for a missing header or ``*`` (no precondition). Entity tags
+    may be quoted and/or weak, e.g. ``"3"``, ``W/"3"`` or plain ``3``.
+    """
+    if header is None or header.strip() == "*":
+        return None
+    versions = set()
+    for tag in header.split(","):
+        tag = tag.strip()
+        if tag.startswith("W/"):
+            tag = tag[2:]
+        tag = tag.strip('"')
+        try:
+            versions.add(int(tag))
+        except ValueError:
+            continue
+    return versions
+
+
+def etag(version: int) -> str:
+    """Entity tag for a version number."""
+    return f'"{version}"'
@@ -0,0 +1,147 @@
+"""Delta-sync change log for the OTP / Matrix stores.
+
+Every write to a store bumps one process-wide, monotonic version and appends
+the changed cells to a bounded ring. Clients remember the version they last
+saw and ask ``/sync?since=<version>`` for just what changed after it.
+
+Writes made by other processes (the importer CLI, ``fsck.py --fix``,
+``overlay.py``) never reach the ring. Each recorded store's file is
+stamped with its signature, and ``check_files`` starts a new epoch when a
+file changed without a recorded change, so every client gets a full
+snapshot.
+"""
+import os
+import threading
+import time
+from collections import deque
+
+from store import files_signature
+
+
+SYNC_RING_SIZE = int(os.getenv("SYNC_RING_SIZE", "1000"))
+
+
+class ChangeLog:
+    """Monotonic version counter plus a ring of recent store changes."""
+
+    def __init__(self, capacity: int = SYNC_RING_SIZE):
+        self._lock = threading.Lock()
+        self._changes = deque(maxlen=capacity)
+        # Start from the boot time so versions handed out by a previous
+        # process are always older than anything this process can answer.
+        self._version = int(time.time() * 1000)
+        self._floor = self._version
+        self._store_versions = {}
+        # store -> its file, and file -> signature as of the last change known to the log
+        self.store_file = None
+        self._stamps = {}
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    def record(self, store: tuple, program_id=None, month: str = None, cell: dict = None,
+               program: dict = None, deleted: bool = False, meta: dict = None,
+               document: dict = None) -> int:
+        """Record one change to a store and return the new version.
+
+        ``store`` is the store address, e.g. ("otp", "narogong") or
+        ("matrix", "audit", "indonesia", "duri"). A change carries either a
+        month ``cell``, program metadata, a deletion flag, store-level
+        ``meta`` (e.g. the year) or a whole ``document`` (for small stores
+        such as KPI). Callers record while still holding the document lock,
+        so the stamp taken here belongs to their own write.
+        """
+        path = self.store_file(store) if self.store_file is not None else None
+        stamp = files_signature([path])[0] if path is not None else None
+        with self._lock:
+            if path is not None:
+                self._stamps[str(path)] = stamp
+            self._version += 1
+            if len(self._changes) == self._changes.maxlen:
+                # The evicted change is no longer answerable; clients must be
+                # at least at its version to receive a delta.
+                self._floor = self._changes[0]["version"]
+            self._changes.append({
+                "version": self._version,
+                "store": store,
+                "program_id": program_id,
+                "month": month,
+                "cell": dict(cell) if cell is not None else None,
+                "program": dict(program) if program is not None else None,
+                "deleted": deleted,
+                "meta": dict(meta) if meta is not None else None,
+                "document": document,
+            })
+            self._store_versions[store] = self._version
+            return self._version
+
+    def store_version(self, store: tuple) -> int:
+        """Version of the last change to a store (0 if unchanged since boot)."""
+        return self._store_versions.get(store, 0)
+
+    def check_files(self, paths) -> bool:
+        """Start a new epoch if any file changed without a recorded change; return whether it did.
+
+        The first check of a file only takes its stamp. After a new epoch,
+        every earlier version needs a full snapshot.
+        """
+        paths = [str(p) for p in paths]
+        signature = files_signature(paths)
+        with self._lock:
+            changed = False
+            for path, stamp in zip(paths, signature):
+                if self._stamps.setdefault(path, stamp) != stamp:
+                    self._stamps[path] = stamp
+                    changed = True
+            if changed:
+                self._version += 1
+                self._floor = self._version
+            return changed
+
+    def since(self, version: int):
+        """Return (current_version, changes) after ``version``.
+
+        ``changes`` is None when the version cannot be answered from the ring
+        (too old, or from a different process) and the client needs a full
+        snapshot.
+        """
+        with self._lock:
+            current = self._version
+            if version < self._floor or version > current:
+                return current, None
+            return current, [c for c in self._changes if c["version"] > version]
+
+
+def collapse_changes(changes: list) -> dict:
+    """Fold a list of changes into {source: ...: {program_id: delta}}.
+
+    Later changes to the same cell overwrite earlier ones, so the result
+    holds only the latest value of every touched cell.
+    """
+    result = {}
+    for change in changes:
+        node = result
+        for key in change["store"]:
+            node = node.setdefault(key, {})
+        if change["document"] is not None:
+            node.clear()
+            node["document"] = change["document"]
+            continue
+        if change["meta"] is not None:
+            node.setdefault("meta", {}).update(change["meta"])
+            continue
+        entry = node.setdefault(str(change["program_id"]), {})
+        if change["deleted"]:
+            entry.clear()
+            entry["deleted"] = True
+            continue
+        entry.pop("deleted", None)
+        if change["program"] is not None:
+            entry.setdefault("program", {}).update(change["program"])
+        if change["cell"] is not None:
+            entry.setdefault("months", {})[change["month"]] = change["cell"]
+    return result
+
+
+change_log = ChangeLog()
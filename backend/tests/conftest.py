@@ -0,0 +1,45 @@
+"""Shared test setup.
+
+The backend reads DATA_DIR and DATABASE_URL at import time, so they are
+pointed at a scratch copy of the sample data before any test imports it.
+Run from the repository root with ``python -m pytest backend/tests``.
+"""
+import os
+import shutil
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+SCRATCH_DIR = Path(tempfile.mkdtemp(prefix="hse-tests-"))
+
+shutil.copytree(BACKEND_DIR / "data", SCRATCH_DIR / "data", ignore=shutil.ignore_patterns(".*"))
+os.environ["DATA_DIR"] = str(SCRATCH_DIR / "data")
+os.environ["DATABASE_URL"] = f"sqlite:///{SCRATCH_DIR / 'test.db'}"
+os.environ["BREVO_API_KEY"] = ""
+sys.path.insert(0, str(BACKEND_DIR))
+
+
+def pytest_sessionfinish(session, exitstatus):
+    shutil.rmtree(SCRATCH_DIR, ignore_errors=True)
+
+
+@pytest.fixture(scope="session")
+def client():
+    """The app with its startup and shutdown hooks, shared by the whole session."""
+    from fastapi.testclient import TestClient
+    import app
+
+    with TestClient(app.app) as test_client:
+        yield test_client
+
+
+@pytest.fixture
+def otp_program(client):
+    """(base, program id) of an OTP program to edit."""
+    from bases import get_bases
+
+    base = get_bases()[0]
+    return base, client.get(f"/otp?base={base}").json()["programs"][0]["id"]
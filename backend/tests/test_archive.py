@@ -0,0 +1,95 @@
+import pytest
+
+import archive
+
+
+@pytest.fixture
+def archive_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(archive, "ARCHIVE_DIR", tmp_path / "archive")
+    return tmp_path / "archive"
+
+
+def otp_document(year=2024):
+    return {"year": year, "version": 7, "programs": [
+        {"id": 1, "name": "Fire drill", "plan_type": "Monthly", "progress": 50,
+         "months": {"jan": {"plan": 2, "actual": 1, "pic_name": "Andi"}, "dec": {"plan": 1, "actual": 0}}},
+        {"id": 2, "name": "Toolbox talk", "months": {}},
+    ]}
+
+
+def full_months(months: dict) -> dict:
+    return {m: dict({"plan": 0, "actual": 0}, **months.get(m, {})) for m in archive.MONTHS}
+
+
+def test_write_and_read_back(archive_dir):
+    ll = {"year": 2024, "rows": [{"label": "LTI", "value": 0}]}
+    archive.write_archive(2024, stores={"otp/duri": otp_document()}, documents={"ll-indicator": ll})
+    assert archive.archived_years() == [2024]
+
+    year_archive = archive.open_archive(2024)
+    assert year_archive.rows == 2
+    assert sorted(year_archive.store_keys()) == ["otp/duri"]
+    assert year_archive.document("ll-indicator") == ll
+    document = year_archive.document("otp/duri")
+    expected = otp_document()
+    for prog in expected["programs"]:
+        prog["months"] = full_months(prog["months"])
+    assert document == expected
+    assert year_archive.document("otp/pdsi") is None
+
+
+def test_totals_come_from_the_grid(archive_dir):
+    archive.write_archive(2024, stores={"otp/duri": otp_document()})
+    [first, second] = archive.open_archive(2024).totals("otp/duri")
+    assert first[:3] == (1, "Fire drill", {"plan_type": "Monthly", "progress": 50})
+    assert first[3][0] == (2, 1) and first[3][11] == (1, 0)
+    assert second[3] == [(0, 0)] * 12
+    assert list(archive.open_archive(2024).totals("missing")) == []
+
+
+def test_counts_are_clamped(archive_dir):
+    document = {"year": 2024, "programs": [{"id": 1, "name": "x", "months": {
+        "jan": {"plan": -3, "actual": "n/a"}, "feb": {"plan": 2 ** 40, "actual": "4"}}}]}
+    archive.write_archive(2024, stores={"otp/duri": document})
+    [(_, _, _, cells)] = archive.open_archive(2024).totals("otp/duri")
+    assert cells[:2] == [(0, 0), (archive.COUNT_MAX, 4)]
+
+
+def test_adding_stores_keeps_existing_ones_and_reopens(archive_dir):
+    archive.write_archive(2024, stores={"otp/duri": otp_document()})
+    before = archive.open_archive(2024)
+    assert archive.open_archive(2024) is before
+
+    changed = otp_document()
+    changed["programs"][0]["name"] = "Fire drill (night)"
+    archive.write_archive(2024, stores={"otp/pdsi": changed})
+    after = archive.open_archive(2024)
+    assert after is not before
+    assert sorted(after.store_keys()) == ["otp/duri", "otp/pdsi"]
+    assert after.document("otp/duri")["programs"][0]["name"] == "Fire drill"
+    assert after.document("otp/pdsi")["programs"][0]["name"] == "Fire drill (night)"
+    # The replaced file's mapping stays readable
+    assert before.document("otp/duri")["version"] == 7
+
+
+def test_rejects_other_files(archive_dir):
+    archive_dir.mkdir()
+    archive.archive_path(2020).write_bytes(b"not an archive at all")
+    with pytest.raises(ValueError, match="not an HSE archive"):
+        archive.open_archive(2020)
+
+
+def test_archive_endpoints(client, otp_program):
+    base, _ = otp_program
+    path = archive.write_archive(1990, stores={f"otp/{base}": otp_document(1990)})
+    try:
+        assert client.get("/archive/1990").json() == {"year": 1990, "stores": [f"otp/{base}"], "programs": 2}
+        data = client.get(f"/archive/1990/otp?base={base}").json()
+        assert [p["name"] for p in data["programs"]] == ["Fire drill", "Toolbox talk"]
+        assert client.get("/archive/1990/otp?base=nowhere").status_code == 404
+        trends = client.get(f"/trends?source=otp&base={base}&to_year=1990").json()
+        assert trends["years"] == [1990]
+        assert trends["summary"]["1990"] == {"programs": 2, "plan": 3, "actual": 1, "progress": 33}
+    finally:
+        path.unlink()
+    assert client.get("/archive/1990").status_code == 404
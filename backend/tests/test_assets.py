@@ -0,0 +1,46 @@
+import gzip
+
+import assets
+
+PAGE = "<html><head><style>a{}</style></head><body><script>one()</script><style>b{}</style><script>two()</script></body></html>"
+
+
+def test_bundle_splits_inline_blocks():
+    bundle = assets.Bundle(PAGE)
+    names = sorted(bundle.assets)
+    assert [name.rsplit(".", 1)[1] for name in names] == ["css", "js"]
+    css, js = (bundle.assets[name] for name in names)
+    assert css.encodings["identity"] == b"a{}\nb{}"
+    assert js.encodings["identity"] == b"one()\ntwo()"
+    assert gzip.decompress(js.encodings["gzip"]) == b"one()\ntwo()"
+    assert css.cache_control == assets.IMMUTABLE
+
+    shell = bundle.index.encodings["identity"].decode()
+    assert "<style>" not in shell and "<script>" not in shell
+    assert shell.count(f'href="/assets/{names[0]}"') == 1 and shell.count(f'src="/assets/{names[1]}"') == 1
+    assert bundle.index.cache_control == assets.REVALIDATE
+
+
+def test_asset_names_follow_content():
+    first = assets.Bundle(PAGE)
+    assert sorted(assets.Bundle(PAGE).assets) == sorted(first.assets)
+    assert sorted(assets.Bundle(PAGE.replace("two()", "three()")).assets) != sorted(first.assets)
+
+
+def test_etags_differ_per_encoding():
+    asset = assets.Asset(b"x" * 1000, "text/css", assets.IMMUTABLE)
+    assert asset.etag("identity") == f'"{asset.digest}"'
+    assert asset.etag("gzip") == f'"{asset.digest}-gzip"'
+    assert asset.etags() == {asset.etag(e) for e in asset.encodings}
+
+
+def test_served_shell_and_bundles(client):
+    shell = client.get("/", headers={"accept-encoding": "gzip"})
+    assert shell.status_code == 200 and shell.headers["cache-control"] == assets.REVALIDATE
+    assert client.get("/", headers={"accept-encoding": "gzip", "if-none-match": shell.headers["etag"]}).status_code == 304
+
+    bundle = assets.get_bundle()
+    for name in bundle.assets:
+        response = client.get(f"/assets/{name}")
+        assert response.status_code == 200 and "immutable" in response.headers["cache-control"]
+    assert client.get("/assets/app.missing.js").status_code == 404
@@ -0,0 +1,111 @@
+import hashlib
+import os
+import stat
+import time
+
+import pytest
+
+import attachments
+
+
+@pytest.fixture
+def blob_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(attachments, "BLOB_DIR", tmp_path / "blobs")
+    return tmp_path / "blobs"
+
+
+def store(data: bytes, max_bytes: int = attachments.MAX_BYTES):
+    writer = attachments.BlobWriter(max_bytes)
+    for i in range(0, len(data), 4):
+        writer.write(data[i:i + 4])
+    return writer.commit()
+
+
+@pytest.mark.parametrize("name, safe", [
+    ("report.pdf", "report.pdf"),
+    ("C:\\Users\\andi\\photo.jpg", "photo.jpg"),
+    ("../../etc/passwd", "passwd"),
+    ('say "hi"\n.txt', "say _hi_.txt"),
+    ("..", "evidence"),
+    (None, "evidence"),
+])
+def test_safe_filename(name, safe):
+    assert attachments.safe_filename(name) == safe
+
+
+def test_blob_path_rejects_non_digests(blob_dir):
+    with pytest.raises(ValueError):
+        attachments.blob_path("../secret")
+
+
+def test_identical_uploads_share_one_blob(blob_dir):
+    data = b"evidence photo bytes"
+    sha256, size = store(data)
+    assert (sha256, size) == (hashlib.sha256(data).hexdigest(), len(data))
+    path = attachments.blob_path(sha256)
+    assert path.read_bytes() == data
+    assert stat.S_IMODE(path.stat().st_mode) == 0o644
+
+    os.utime(path, (0, 0))
+    assert store(data) == (sha256, size)
+    assert path.stat().st_mtime > 0
+    assert list(blob_dir.glob("??/*")) == [path]
+    assert list((blob_dir / "tmp").iterdir()) == []
+
+
+def test_too_large_upload_is_rejected(blob_dir):
+    writer = attachments.BlobWriter(max_bytes=5)
+    writer.write(b"12345")
+    with pytest.raises(attachments.TooLarge):
+        writer.write(b"6")
+    writer.abort()
+    assert list((blob_dir / "tmp").iterdir()) == []
+
+
+def test_collect_garbage_keeps_referenced_and_young_blobs(blob_dir):
+    kept, _ = store(b"kept")
+    orphan, _ = store(b"orphan")
+    young, _ = store(b"young")
+    old = time.time() - 7200
+    for sha256 in (kept, orphan):
+        os.utime(attachments.blob_path(sha256), (old, old))
+    stale = blob_dir / "tmp" / "upload.abc.tmp"
+    stale.write_bytes(b"partial")
+    os.utime(stale, (old, old))
+
+    stats = attachments.collect_garbage({kept}, grace_seconds=3600, dry_run=True)
+    assert (stats["blobs"], stats["removed"], stats["temp_removed"]) == (3, 1, 1)
+    assert attachments.blob_path(orphan).exists()
+
+    attachments.collect_garbage({kept}, grace_seconds=3600)
+    assert attachments.blob_path(kept).exists() and attachments.blob_path(young).exists()
+    assert not attachments.blob_path(orphan).exists() and not stale.exists()
+
+
+def test_upload_and_download_evidence(client, otp_program):
+    base, program_id = otp_program
+    data = bytes(range(256)) * 4
+    response = client.post(f"/otp/{program_id}/month/jan/evidence?base={base}&filename=../scan.pdf", content=data,
+                           headers={"content-type": "application/pdf"})
+    assert response.status_code == 200
+    info = response.json()
+    assert (info["filename"], info["size"], info["owner"]) == ("scan.pdf", len(data), f"otp:{base}:{program_id}:jan")
+
+    listed = client.get(f"/attachments?owner=otp:{base}").json()
+    assert info["id"] in [a["id"] for a in listed]
+
+    response = client.get(info["url"])
+    assert response.content == data and response.headers["etag"] == f'"{info["sha256"]}"'
+    assert client.get(info["url"], headers={"if-none-match": response.headers["etag"]}).status_code == 304
+    response = client.get(info["url"], headers={"range": "bytes=10-19"})
+    assert response.status_code == 206 and response.content == data[10:20]
+
+    assert client.delete(info["url"]).status_code == 200
+    assert client.get(info["url"]).status_code == 404
+
+
+def test_upload_validates_owner(client, otp_program):
+    base, program_id = otp_program
+    assert client.post(f"/otp/{program_id}/month/smarch/evidence?base={base}", content=b"x").status_code == 400
+    assert client.post(f"/otp/999999/month/jan/evidence?base={base}", content=b"x").status_code == 404
+    assert client.post(f"/otp/{program_id}/month/jan/evidence?base=all", content=b"x").status_code == 400
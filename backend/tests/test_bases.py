@@ -0,0 +1,42 @@
+import json
+import os
+import threading
+
+import bases
+
+
+def test_registry_follows_the_bases_file(tmp_path, monkeypatch):
+    registry = tmp_path / "bases.json"
+    monkeypatch.setattr(bases, "BASES_FILE", registry)
+    monkeypatch.setattr(bases, "_cache", {"mtime": None, "bases": bases.DEFAULT_BASES})
+    assert bases.get_bases() == [b["id"] for b in bases.DEFAULT_BASES]
+
+    registry.write_text(json.dumps({"bases": [{"id": "tuban", "name": "Tuban"}]}))
+    assert bases.get_bases() == ["tuban"]
+    assert bases.get_base_name("tuban") == "Tuban"
+    assert bases.get_base_name("unknown") == "Unknown"
+
+    registry.write_text(json.dumps({"bases": [{"id": "tuban"}, {"id": "cilegon", "name": "Cilegon"}]}))
+    os.utime(registry, ns=(1, 1))  # a new mtime even within the clock resolution
+    assert bases.get_bases() == ["tuban", "cilegon"]
+    assert bases.get_base_name("tuban") == "Tuban"
+
+
+def test_load_all_keeps_order_and_runs_concurrently():
+    barrier = threading.Barrier(3, timeout=5)
+
+    def loader(item):
+        barrier.wait()  # deadlocks (BrokenBarrierError) unless all three run at once
+        return item * 2
+
+    assert bases.load_all(loader, [3, 1, 2]) == [6, 2, 4]
+    assert bases.load_all(lambda item: item, ["only"]) == ["only"]
+
+
+def test_bases_endpoint_and_all_view(client):
+    registered = [b["id"] for b in client.get("/bases").json()["bases"]]
+    assert registered == bases.get_bases()
+
+    merged = client.get("/otp?base=all").json()["programs"]
+    per_base = [client.get(f"/otp?base={base}").json()["programs"] for base in registered]
+    assert {p["id"] for p in merged} == {p["id"] for programs in per_base for p in programs}
@@ -0,0 +1,67 @@
+import hashlib
+import json
+import random
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "benchmarks"))
+
+import datagen  # noqa: E402
+import run  # noqa: E402
+from progress import calculate_matrix_progress, calculate_progress  # noqa: E402
+
+
+def digest(directory: Path) -> dict:
+    return {p.name: hashlib.sha256(p.read_bytes()).hexdigest() for p in sorted(directory.iterdir())}
+
+
+def test_datagen_is_reproducible(tmp_path):
+    scale = datagen.Scale(programs=5, bases=2, categories=2)
+    first = datagen.generate_data_dir(tmp_path / "a", scale)
+    datagen.generate_data_dir(tmp_path / "b", scale)
+    datagen.generate_data_dir(tmp_path / "c", datagen.Scale(programs=5, bases=2, categories=2, seed=2))
+
+    assert first == ["site01", "site02"]
+    assert digest(tmp_path / "a") == digest(tmp_path / "b")
+    assert digest(tmp_path / "a") != digest(tmp_path / "c")
+    assert len(digest(tmp_path / "a")) == 2 + 1 + 2 + 2 * 3 + 2  # bases, otp, otp per base, matrix, kpi/ll
+
+
+def test_datagen_progress_matches_the_backend(tmp_path):
+    datagen.generate_data_dir(tmp_path, datagen.Scale(programs=8, bases=1, categories=1))
+    otp = json.loads((tmp_path / "otp_indonesia_site01.json").read_text())
+    matrix = json.loads((tmp_path / "matrix_audit_indonesia_site01.json").read_text())
+    assert all(p["progress"] == calculate_progress(p) for p in otp["programs"])
+    assert all(p["progress"] == calculate_matrix_progress(p) for p in matrix["programs"])
+
+
+def test_plan_requests_respects_write_share():
+    reads = run.plan_requests(random.Random(1), 0.0, 200)
+    writes = run.plan_requests(random.Random(1), 1.0, 200)
+    assert {op[2] for op in reads} == {"read"}
+    assert {op[2] for op in writes} == {"write"}
+
+
+def profile_result(overall_p95, endpoint_p95, count=50):
+    return {"profiles": {"mixed": {"latency_ms": {"p95": overall_p95},
+                                   "endpoints": {"otp": {"count": count, "p95": endpoint_p95}}}}}
+
+
+@pytest.mark.parametrize("current, expected", [
+    (profile_result(10, 5), []),
+    (profile_result(12, 5), []),
+    (profile_result(13, 5), ["overall"]),
+    (profile_result(10, 7), ["otp"]),
+    (profile_result(10, 7, count=5), []),
+])
+def test_compare_flags_p95_regressions(current, expected):
+    regressions = run.compare(current, profile_result(10, 5), 0.25)
+    assert [r["endpoint"] for r in regressions] == expected
+
+
+def test_benchmark_covers_every_route(client):
+    import app
+
+    assert run.uncovered_routes(app.app) == []
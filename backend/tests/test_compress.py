@@ -0,0 +1,181 @@
+import gzip
+import json
+
+import pytest
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+import compress
+from compress import CompressionMiddleware, ResponseCache, Snapshot, etag_matches, negotiate
+
+
+@pytest.mark.parametrize("header, expected", [
+    (None, "identity"),
+    ("gzip", "gzip"),
+    ("gzip;q=0, identity", "identity"),
+    ("GZIP ; q=0.5", "gzip"),
+    ("*", "gzip"),
+    ("*, gzip;q=0", "identity"),
+    ("deflate", "identity"),
+])
+def test_negotiate(header, expected):
+    assert negotiate(header, {"gzip": None}) == expected
+
+
+@pytest.mark.parametrize("header, matches", [
+    (None, False),
+    ('"a"', True),
+    ('W/"a"', True),
+    ('"b", "a-gzip"', True),
+    ('"b"', False),
+    ("*", True),
+])
+def test_etag_matches(header, matches):
+    assert etag_matches(header, {'"a"', '"a-gzip"'}) is matches
+
+
+def test_cached_body_compresses_once_per_encoding():
+    body = compress.CachedBody(b"x" * 2000)
+    assert body.etag_for("gzip") == body.etag[:-1] + '-gzip"'
+    first = body.body("gzip")
+    assert body.body("gzip") is first and gzip.decompress(first) == b"x" * 2000
+    assert body.etags() == {body.etag, body.etag_for("gzip")}
+
+
+def make_app():
+    big = {"rows": ["value %d" % i for i in range(500)]}
+
+    async def stream(request):
+        async def chunks():
+            for i in range(50):
+                yield b"line %d\n" % i * 20
+        return StreamingResponse(chunks(), media_type="text/plain")
+
+    routes = [
+        Route("/big", lambda request: JSONResponse(big)),
+        Route("/small", lambda request: JSONResponse({"ok": True})),
+        Route("/png", lambda request: Response(b"\0" * 5000, media_type="image/png")),
+        Route("/stream", stream),
+        Route("/tagged", lambda request: JSONResponse(big, headers={"ETag": '"v1"'})),
+        Route("/varied", lambda request: JSONResponse(big, headers={"Vary": "accept-encoding, Origin"})),
+    ]
+    app = Starlette(routes=routes)
+    app.add_middleware(CompressionMiddleware, minimum_size=1024)
+    return app, big
+
+
+def test_middleware_compresses_large_compressible_responses():
+    app, big = make_app()
+    with TestClient(app) as client:
+        response = client.get("/big", headers={"accept-encoding": "gzip"})
+        assert response.headers["content-encoding"] == "gzip"
+        assert response.json() == big
+        assert "accept-encoding" in response.headers["vary"].lower()
+
+        assert "content-encoding" not in client.get("/small", headers={"accept-encoding": "gzip"}).headers
+        assert "content-encoding" not in client.get("/png", headers={"accept-encoding": "gzip"}).headers
+        assert "content-encoding" not in client.get("/big", headers={"accept-encoding": "identity"}).headers
+
+        streamed = client.get("/stream", headers={"accept-encoding": "gzip"})
+        assert streamed.headers["content-encoding"] == "gzip"
+        assert streamed.text == "".join("line %d\n" % i * 20 for i in range(50))
+
+        # A strong validator becomes weak once the body is re-encoded
+        assert client.get("/tagged", headers={"accept-encoding": "gzip"}).headers["etag"] == 'W/"v1"'
+        assert client.get("/varied", headers={"accept-encoding": "gzip"}).headers["vary"] == "accept-encoding, Origin"
+
+
+def request(headers=None):
+    raw = [(k.lower().encode(), v.encode()) for k, v in (headers or {}).items()]
+    return Request({"type": "http", "method": "GET", "path": "/x", "headers": raw, "query_string": b""})
+
+
+def test_response_cache_rebuilds_only_on_signature_change():
+    cache = ResponseCache(max_entries=2, minimum_size=10)
+    builds = []
+
+    def build(value):
+        builds.append(value)
+        return {"value": value, "padding": "x" * 100}
+
+    first = cache.respond(request(), "k", ("sig", 1), build, 1)
+    assert json.loads(first.body)["value"] == 1
+    cache.respond(request(), "k", ("sig", 1), build, 2)
+    assert builds == [1]
+    assert json.loads(cache.respond(request(), "k", ("sig", 2), build, 3).body)["value"] == 3
+
+    etag = first.headers["etag"]
+    zipped = cache.respond(request({"accept-encoding": "gzip"}), "k", ("sig", 2), build, 4)
+    assert zipped.headers["content-encoding"] == "gzip" and zipped.headers["etag"] != etag
+    assert json.loads(gzip.decompress(zipped.body))["value"] == 3
+    not_modified = cache.respond(request({"if-none-match": zipped.headers["etag"]}), "k", ("sig", 2), build, 5)
+    assert not_modified.status_code == 304
+    assert builds == [1, 3]
+
+
+def test_response_cache_evicts_least_recently_used():
+    cache = ResponseCache(max_entries=2)
+    builds = []
+    for key in ("a", "b", "a", "c", "a", "b"):
+        cache.respond(None, key, 1, lambda k=key: builds.append(k) or {})
+    assert builds == ["a", "b", "c", "b"]
+
+
+def test_snapshot_is_cached_under_the_signature_it_was_read_at():
+    cache = ResponseCache()
+    snapshots = iter([Snapshot("old", {"v": "old"}), Snapshot("new", {"v": "new"})])
+
+    # The first build started before the caller's signature was taken
+    response = cache.respond(None, "k", "new", lambda: next(snapshots))
+    assert json.loads(response.body) == {"v": "new"}
+    assert json.loads(cache.respond(None, "k", "new", lambda: pytest.fail("rebuilt")).body) == {"v": "new"}
+
+    # A build that read newer sources than the caller saw is kept as is
+    response = cache.respond(None, "k", "newer", lambda: Snapshot("newest", {"v": "newest"}))
+    response = cache.respond(None, "k", "newest", lambda: pytest.fail("rebuilt"))
+    assert json.loads(response.body) == {"v": "newest"}
+
+
+def test_merge_started_before_a_write_is_not_served_as_current(client, otp_program, monkeypatch):
+    import threading
+    import time
+
+    import app
+
+    base, program_id = otp_program
+    merge = app.merge_otp_bases
+    entered, release = threading.Event(), threading.Event()
+
+    def slow_merge():
+        data = merge()
+        entered.set()
+        release.wait(5)
+        return data
+
+    def jan_wpts(response):
+        return next(p for p in response.json()["programs"] if p["id"] == program_id)["months"]["jan"].get("wpts_id")
+
+    # Make sure the early request misses the cache, whatever ran before
+    assert client.put(f"/otp/{program_id}/month/jan?base={base}", json={"wpts_id": "RACE-0"}).status_code == 200
+    monkeypatch.setattr(app, "merge_otp_bases", slow_merge)
+    responses = {}
+    early = threading.Thread(target=lambda: responses.setdefault("early", client.get("/otp?base=all")))
+    early.start()
+    assert entered.wait(5)
+    entered.clear()
+    assert client.put(f"/otp/{program_id}/month/jan?base={base}",
+                      json={"plan": 1, "actual": 0, "wpts_id": "RACE-1"}).status_code == 200
+    # Joins the merge that started before the write
+    late = threading.Thread(target=lambda: responses.setdefault("late", client.get("/otp?base=all")))
+    late.start()
+    time.sleep(0.2)
+    release.set()
+    early.join(5)
+    late.join(5)
+    monkeypatch.setattr(app, "merge_otp_bases", merge)
+
+    assert jan_wpts(responses["late"]) == "RACE-1"
+    assert jan_wpts(client.get("/otp?base=all")) == "RACE-1"
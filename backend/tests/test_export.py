@@ -0,0 +1,81 @@
+import csv
+import io
+import zipfile
+
+import export
+
+
+def program():
+    return {"id": 7, "name": "Fire drill", "reference": "HSE-1", "plan_type": "Monthly",
+            "months": {"jan": {"plan": 2, "actual": 1, "pic_name": "Andi"}, "feb": {"plan": 1, "actual": 1}}}
+
+
+def test_grid_row_has_month_pairs_and_totals():
+    rows = list(export.program_rows(program(), ["otp", "indonesia", "duri", "drill", 2025], "grid", lambda p: 66.7))
+    assert len(rows) == 1
+    row = rows[0]
+    assert len(row) == len(export.GRID_HEADER)
+    assert row[10:14] == [2, 1, 1, 1]
+    assert row[-3:] == [3, 2, 66.7]
+
+
+def test_months_layout_yields_one_row_per_month():
+    rows = list(export.program_rows(program(), ["otp", "indonesia", "duri", "drill", 2025], "months", None))
+    assert [row[7] for row in rows] == export.MONTHS
+    assert all(len(row) == len(export.MONTHS_HEADER) for row in rows)
+    assert rows[0][8:10] == [2, 1] and rows[0][13] == "Andi"
+    assert rows[11][8:10] == [0, 0]
+
+
+def test_csv_stream_starts_with_bom_and_round_trips():
+    rows = [["a", 1], ["b, with comma", 2]] * 3000
+    chunks = list(export.csv_stream(["Name", "Count"], iter(rows)))
+    assert len(chunks) > 1
+    text = b"".join(chunks).decode("utf-8")
+    assert text.startswith("\ufeff")
+    parsed = list(csv.reader(io.StringIO(text[1:])))
+    assert parsed[0] == ["Name", "Count"]
+    assert parsed[2] == ["b, with comma", "2"]
+    assert len(parsed) == len(rows) + 1
+
+
+def test_column_names():
+    assert [export._column(i) for i in (0, 25, 26, 701, 702)] == ["A", "Z", "AA", "ZZ", "AAA"]
+
+
+def test_cell_types_and_escaping():
+    assert export._cell("A1", 3) == '<c r="A1"><v>3</v></c>'
+    assert "<v>" not in export._cell("A1", True)
+    assert export._cell("A1", None).endswith('<t xml:space="preserve"></t></is></c>')
+    assert "&lt;b&gt; &amp;" in export._cell("A1", "<b> &\x01")
+
+
+def test_xlsx_stream_is_a_valid_workbook():
+    data = b"".join(export.xlsx_stream(["Name", "Count"], iter([["Fire & drill", 2]]), sheet_name="HSE grid"))
+    with zipfile.ZipFile(io.BytesIO(data)) as zf:
+        assert zf.testzip() is None
+        assert {"[Content_Types].xml", "xl/workbook.xml", "xl/worksheets/sheet1.xml"} <= set(zf.namelist())
+        assert 'name="HSE grid"' in zf.read("xl/workbook.xml").decode()
+        sheet = zf.read("xl/worksheets/sheet1.xml").decode()
+    assert '<row r="2"><c r="A2" t="inlineStr"><is><t xml:space="preserve">Fire &amp; drill</t></is></c>' in sheet
+    assert '<c r="B2"><v>2</v></c>' in sheet
+
+
+def test_export_endpoint_streams_csv_and_xlsx(client):
+    response = client.get("/export/csv?source=otp&layout=months")
+    assert response.status_code == 200
+    assert response.headers["content-disposition"].startswith('attachment; filename="hse-otp-months-')
+    rows = list(csv.reader(io.StringIO(response.content.decode("utf-8-sig"))))
+    assert rows[0] == export.MONTHS_HEADER
+    assert len(rows) > 1 and (len(rows) - 1) % 12 == 0
+
+    response = client.get("/export/xlsx?source=otp,matrix")
+    assert response.status_code == 200
+    with zipfile.ZipFile(io.BytesIO(response.content)) as zf:
+        assert zf.testzip() is None
+
+
+def test_export_endpoint_rejects_bad_selectors(client):
+    assert client.get("/export/pdf").status_code == 404
+    assert client.get("/export/csv?layout=wide").status_code == 400
+    assert client.get("/export/csv?year=next").status_code == 400
@@ -0,0 +1,68 @@
+import json
+
+import fsck
+from progress import calculate_matrix_progress, calculate_progress
+
+MONTHS = fsck.MONTHS
+
+
+def program(program_id, plan=1, actual=0, progress=None):
+    prog = {"id": program_id, "name": f"Program {program_id}", "plan_type": "Monthly",
+            "months": {m: {"plan": plan, "actual": actual} for m in MONTHS}}
+    prog["progress"] = calculate_progress(prog) if progress is None else progress
+    return prog
+
+
+def write(path, data):
+    path.write_text(json.dumps(data))
+
+
+def issues(report, level):
+    return [(i["file"], i["message"]) for i in report.issues if i["level"] == level]
+
+
+def test_progress_functions():
+    half = {"months": {"jan": {"plan": 2, "actual": 1}, "feb": {"plan": 1, "actual": 0}}}
+    assert calculate_progress(half) == 33
+    assert calculate_progress({"months": {}}) == 100
+    assert calculate_matrix_progress({"months": {}}) == 0
+    assert calculate_matrix_progress({"months": {"jan": {"plan": 3, "actual": 2}}}) == 66
+    assert calculate_progress({"months": {"jan": {"plan": 1, "actual": 5}}}) == 100
+
+
+def test_clean_directory_has_no_issues(tmp_path):
+    write(tmp_path / "bases.json", {"bases": [{"id": "duri", "name": "Duri"}]})
+    write(tmp_path / "otp_indonesia_duri.json", {"year": 2026, "programs": [program(1), program(2)]})
+    report = fsck.check(tmp_path)
+    assert report.issues == []
+    assert (report.files, report.programs) == (2, 2)
+
+
+def test_reports_corruption_duplicates_and_registry_mismatch(tmp_path):
+    write(tmp_path / "bases.json", {"bases": [{"id": "duri", "name": "Duri"}, {"id": "tuban", "name": "Tuban"}]})
+    write(tmp_path / "otp_indonesia_duri.json", {"programs": [program(1), program(1)]})
+    write(tmp_path / "matrix_audit_indonesia_cilegon.json", {"category": "drill", "programs": []})
+    (tmp_path / "otp_data.json").write_text('{"programs": [')
+    (tmp_path / ".otp_data.json.abc.tmp").write_text("")
+
+    report = fsck.check(tmp_path)
+    errors = issues(report, "error")
+    warnings = issues(report, "warning")
+    assert ("otp_indonesia_duri.json", "duplicate program id 1") in errors
+    assert any(f == "otp_data.json" and m.startswith("invalid JSON") for f, m in errors)
+    assert ("matrix_audit_indonesia_cilegon.json", "is 'drill' but the file name says 'audit'") in errors
+    assert ("bases.json", "data files exist for base 'cilegon', which is not registered") in warnings
+    assert ("bases.json", "registered base 'tuban' has no OTP file") in warnings
+    assert any(f.endswith(".tmp") for f, _ in warnings)
+
+
+def test_fix_rewrites_drifted_progress(tmp_path):
+    path = tmp_path / "otp_indonesia_duri.json"
+    write(path, {"programs": [program(1, plan=2, actual=1, progress=80), program(2)]})
+
+    report = fsck.check(tmp_path)
+    assert [i["program_id"] for i in report.issues if i["level"] == "drift"] == [1]
+    fsck.fix_progress(tmp_path, report)
+    assert report.fixed == [{"file": "otp_indonesia_duri.json", "programs": 1}]
+    assert json.loads(path.read_text())["programs"][0]["progress"] == 50
+    assert fsck.check(tmp_path).issues == []
@@ -0,0 +1,148 @@
+from datetime import date
+from types import SimpleNamespace
+
+import pytest
+
+import ics
+
+
+def request(**headers):
+    return SimpleNamespace(headers={k.replace("_", "-"): v for k, v in headers.items()})
+
+
+DEFAULTS = {"source": "otp", "region": "indonesia", "base": "duri", "category": None}
+
+
+def document(pic_email="andi@example.com"):
+    return {"year": 2025, "programs": [{"id": 1, "name": "Fire drill, night; shift", "plan_type": "Monthly", "months": {
+        "jan": {"plan": 1, "actual": 0, "plan_date": "2025-01-15", "pic_name": "Andi", "pic_email": pic_email},
+        "feb": {"plan": 1, "actual": 1, "plan_date": "2025-02-10", "impl_date": "2025-02-12"},
+        "mar": {"plan": 1, "actual": 0, "plan_date": "not a date"},
+    }}]}
+
+
+@pytest.mark.parametrize("text, escaped", [
+    ("a,b;c", r"a\,b\;c"),
+    ("back\\slash", "back\\\\slash"),
+    ("line1\r\nline2\nline3\r", "line1\\nline2\\nline3"),
+])
+def test_escape(text, escaped):
+    assert ics.escape(text) == escaped
+
+
+def test_fold_at_75_octets_keeps_utf8_whole():
+    assert ics.fold("SUMMARY:short") == "SUMMARY:short"
+    line = "SUMMARY:" + "é" * 100
+    folded = ics.fold(line)
+    parts = folded.split("\r\n ")
+    assert len(parts) > 2
+    assert all(len(part.encode("utf-8")) <= (75 if i == 0 else 74) for i, part in enumerate(parts))
+    assert "".join(parts) == line
+
+
+def test_calendar_rows_keep_dated_months_only():
+    rows = ics.calendar_rows(document())
+    assert [(r[3], r[4], r[5]) for r in rows] == [("jan", "plan", date(2025, 1, 15)), ("feb", "plan", date(2025, 2, 10)),
+                                                   ("feb", "impl", date(2025, 2, 12))]
+
+
+def test_rendered_event():
+    feeds = ics.CalendarFeeds()
+    feeds.replace_source(("otp", "duri"), DEFAULTS, document(), modified=1736899200)
+    body = feeds.feed(("all",), "HSE").bodies["identity"].decode("utf-8")
+    assert body.startswith("BEGIN:VCALENDAR\r\n") and body.endswith("END:VCALENDAR\r\n")
+    assert body.count("BEGIN:VEVENT") == 3
+    assert "UID:otp-duri-1-jan-plan@hse-dashboard\r\n" in body
+    assert "DTSTAMP:20250115T000000Z\r\nDTSTART;VALUE=DATE:20250115\r\nDTEND;VALUE=DATE:20250116\r\n" in body
+    assert r"SUMMARY:[OTP Duri] Fire drill\, night\; shift" + "\r\n" in body
+    assert "PIC: Andi <andi@example.com>" in body.replace("\r\n ", "")
+
+
+def test_selectors_and_pic_feeds():
+    feeds = ics.CalendarFeeds()
+    feeds.replace_source(("otp", "duri"), DEFAULTS, document())
+    feeds.replace_source(("matrix", "audit", "pdsi"), dict(DEFAULTS, source="matrix", base="pdsi", category="audit"),
+                         document("budi@example.com"))
+
+    def count(selector):
+        return feeds.feed(selector, "HSE").bodies["identity"].count(b"BEGIN:VEVENT")
+
+    assert count(("all",)) == 6
+    assert count(("base", "duri")) == 3
+    assert count(("category", "audit")) == 3
+    assert count(("pic", "budi@example.com")) == 1
+    assert count(("pic", "nobody@example.com")) == 0
+
+
+def test_counts_only_change_keeps_the_feed():
+    feeds = ics.CalendarFeeds()
+    assert feeds.replace_source(("otp", "duri"), DEFAULTS, document(), signature=("a",))
+    feed = feeds.feed(("all",), "HSE")
+
+    counts_only = document()
+    counts_only["programs"][0]["months"]["jan"]["actual"] = 1
+    assert not feeds.replace_source(("otp", "duri"), DEFAULTS, counts_only, signature=("b",))
+    assert feeds.signature(("otp", "duri")) == ("b",)
+    assert feeds.feed(("all",), "HSE") is feed
+
+    moved = document()
+    moved["programs"][0]["months"]["jan"]["plan_date"] = "2025-01-20"
+    assert feeds.replace_source(("otp", "duri"), DEFAULTS, moved)
+    assert feeds.feed(("all",), "HSE").etag != feed.etag
+
+
+def test_unchanged_feed_keeps_last_modified():
+    feeds = ics.CalendarFeeds()
+    feeds.replace_source(("otp", "duri"), DEFAULTS, document(), modified=1000)
+    feeds.replace_source(("otp", "pdsi"), dict(DEFAULTS, base="pdsi"), document(), modified=1000)
+    before = feeds.feed(("base", "duri"), "HSE")
+    changed = document()
+    changed["programs"][0]["name"] = "Renamed"
+    feeds.replace_source(("otp", "pdsi"), dict(DEFAULTS, base="pdsi"), changed, modified=5000)
+    assert feeds.feed(("base", "duri"), "HSE").last_modified == before.last_modified
+
+
+def test_respond_conditional_requests():
+    feeds = ics.CalendarFeeds()
+    feeds.replace_source(("otp", "duri"), DEFAULTS, document(), modified=1736899200)
+    response = feeds.respond(request(), ("all",), "HSE")
+    assert response.status_code == 200 and response.media_type == ics.MEDIA_TYPE
+    etag, last_modified = response.headers["etag"], response.headers["last-modified"]
+    assert last_modified == "Wed, 15 Jan 2025 00:00:00 GMT"
+
+    assert feeds.respond(request(if_none_match=etag), ("all",), "HSE").status_code == 304
+    assert feeds.respond(request(if_none_match='"other"'), ("all",), "HSE").status_code == 200
+    assert feeds.respond(request(if_modified_since=last_modified), ("all",), "HSE").status_code == 304
+    assert feeds.respond(request(if_modified_since="Tue, 14 Jan 2025 00:00:00 GMT"), ("all",), "HSE").status_code == 200
+    assert feeds.respond(request(if_modified_since="garbage"), ("all",), "HSE").status_code == 200
+
+
+def test_feed_lru_is_bounded():
+    feeds = ics.CalendarFeeds(max_feeds=2)
+    feeds.replace_source(("otp", "duri"), DEFAULTS, document())
+    for email in ("a@x.com", "b@x.com", "c@x.com"):
+        feeds.feed(("pic", email), "HSE")
+    assert feeds.stats() == {"sources": 1, "events": 3, "feeds": 2}
+
+
+def test_calendar_endpoints(client, otp_program):
+    base, program_id = otp_program
+    email = "ics.test@example.com"
+    cell = {"plan": 1, "actual": 0, "plan_date": "2025-09-09", "pic_email": email}
+    assert client.put(f"/otp/{program_id}/month/sep?base={base}", json=cell).status_code == 200
+
+    response = client.get(f"/calendar/pic/{email.upper()}.ics")
+    assert response.status_code == 200 and response.text.count("BEGIN:VEVENT") == 1
+    assert "DTSTART;VALUE=DATE:20250909" in response.text
+    etag = response.headers["etag"]
+
+    # Saving a count only does not touch the feed
+    assert client.put(f"/otp/{program_id}/month/sep?base={base}", json={"actual": 1}).status_code == 200
+    assert client.get(f"/calendar/pic/{email}.ics", headers={"if-none-match": etag}).status_code == 304
+
+    assert client.get(f"/calendar/base/{base}.ics").status_code == 200
+    assert client.get("/calendar/base/nowhere.ics").status_code == 404
+    assert client.get("/calendar/category/budget.ics").status_code == 404
+    assert client.get("/calendar/pic/not-an-email.ics").status_code == 400
+    vary = client.get("/calendar.ics", headers={"accept-encoding": "gzip"}).headers["vary"]
+    assert vary.lower().count("accept-encoding") == 1
@@ -0,0 +1,126 @@
+import json
+
+import pytest
+
+import importer
+
+MONTHS = [m.upper() for m in importer.MONTHS]
+
+
+def sheet(*rows):
+    """A tab-separated OTP export; its quoted header cells span lines 1-4, so programs start on line 5."""
+    lead = ["PROGRAM", '"DUE\nDATE"']
+    header = lead + [cell for m in MONTHS for cell in (m, "")] + ['"PROGRESS\n(%)"']
+    labels = [""] * len(lead) + ["PLAN", "ACTUAL"] * 12 + [""]
+    lines = ["\t".join(header), "\t".join(labels)] + ["\t".join(row) for row in rows]
+    return ("\r\n".join(lines) + "\r\n").encode("utf-8")
+
+
+def program_row(name, due="31-Dec-25", jan=("1", "1"), progress="100%"):
+    return [name, due] + list(jan) + ["0", "0"] * 11 + [progress]
+
+
+def parse(data: bytes, target="otp", piece=7):
+    parser = importer.SheetParser(target)
+    for i in range(0, len(data), piece):
+        parser.feed(data[i:i + piece])
+    return parser.close()
+
+
+def test_tsv_reader_handles_quotes_split_across_feeds():
+    text = 'a\t"multi\nline"\t"say ""hi"""\r\nb\t\tc'
+    reader = importer.TsvReader()
+    records = [record for ch in text for record in reader.feed(ch)]
+    records += list(reader.close())
+    assert records == [(1, ["a", "multi\nline", 'say "hi"']), (3, ["b", "", "c"])]
+
+
+@pytest.mark.parametrize("filename, target", [
+    ("2026 HSE OTP.TXT", "otp"), ("otp_asia.txt", "otp-asia"), ("AUDIT.TXT", "audit"),
+    ("Training.txt", "training"), ("notes.txt", None),
+])
+def test_guess_target(filename, target):
+    assert importer.guess_target(filename) == target
+
+
+def test_document_path(tmp_path):
+    assert importer.document_path("otp", "duri", tmp_path) == tmp_path / "otp_indonesia_duri.json"
+    assert importer.document_path("otp", None, tmp_path) == tmp_path / "otp_data.json"
+    assert importer.document_path("otp-asia", "duri", tmp_path) == tmp_path / "otp_asia_data.json"
+    assert importer.document_path("audit", "duri", tmp_path) == tmp_path / "matrix_audit_indonesia_duri.json"
+
+
+def test_sheet_parser_reads_programs_and_dates():
+    parser = parse(sheet(program_row("Fire drill"), program_row("Toolbox talk", due="", jan=("2", "1"), progress="50%")))
+    assert parser.errors == []
+    assert [p["name"] for p in parser.programs] == ["Fire drill", "Toolbox talk"]
+    first, second = parser.programs
+    assert first["due_date"] == "2025-12-31" and first["months"]["jan"] == {"plan": 1, "actual": 1}
+    assert second["due_date"] is None and second["line"] == 6
+
+
+def test_sheet_parser_reports_bad_cells_with_line_numbers():
+    parser = parse(sheet(program_row("Fire drill", due="someday", jan=("x", "1"))))
+    messages = [(issue["line"], issue["message"]) for issue in parser.errors]
+    assert any(line == 5 and msg.startswith("JAN plan") for line, msg in messages)
+    assert any(line == 5 and msg.startswith("due date") for line, msg in messages)
+
+
+def test_sheet_without_header_is_an_error():
+    parser = parse(b"just\ttext\n")
+    assert [issue["message"] for issue in parser.errors] == ["no header row with month columns found"]
+
+
+def test_load_merges_by_name_and_keeps_details(tmp_path):
+    path = tmp_path / "otp_indonesia_duri.json"
+    (tmp_path / "bases.json").write_text(json.dumps({"bases": [{"id": "duri", "name": "Duri"}]}))
+    path.write_text(json.dumps({"year": 2025, "programs": [
+        {"id": 4, "name": "fire DRILL", "version": 2, "months": {"jan": {"plan": 9, "pic_name": "Andi"}}},
+        {"id": 5, "name": "Retired program", "months": {}},
+    ]}))
+    parser = parse(sheet(program_row("Fire drill"), program_row("Toolbox talk")))
+    [stats] = importer.load([parser], base="duri", year=2025, data_dir=tmp_path)
+    assert stats == {"programs": 2, "created": 1, "updated": 1, "removed": 1, "target": "otp",
+                     "file": path.name}
+
+    document = json.loads(path.read_text())
+    fire, toolbox = document["programs"]
+    assert (fire["id"], fire["version"], toolbox["id"]) == (4, 3, 6)
+    assert fire["months"]["jan"] == {"plan": 1, "actual": 1, "pic_name": "Andi"}
+
+
+def test_load_refuses_other_year_and_unknown_base(tmp_path):
+    (tmp_path / "bases.json").write_text(json.dumps({"bases": [{"id": "duri", "name": "Duri"}]}))
+    (tmp_path / "otp_indonesia_duri.json").write_text(json.dumps({"year": 2024, "programs": [{"id": 1, "name": "a"}]}))
+    with pytest.raises(importer.ImportFailed, match="holds programs for 2024"):
+        importer.load([parse(sheet(program_row("a")))], base="duri", year=2025, data_dir=tmp_path)
+    with pytest.raises(importer.ImportFailed, match="unknown base"):
+        importer.load([parse(sheet(program_row("a")))], base="newsite", year=2025, data_dir=tmp_path)
+
+    importer.load([parse(sheet(program_row("a")))], base="newsite", year=2025, data_dir=tmp_path,
+                  register_name="New Site")
+    bases = json.loads((tmp_path / "bases.json").read_text())["bases"]
+    assert bases[-1] == {"id": "newsite", "name": "New Site"}
+
+
+def test_duplicate_programs_fail_validation(tmp_path):
+    parser = parse(sheet(program_row("Fire drill"), program_row("fire drill")))
+    with pytest.raises(importer.ImportFailed) as failure:
+        importer.load([parser], year=2025, data_dir=tmp_path)
+    assert "duplicate program" in failure.value.issues[-1]["message"]
+    assert not (tmp_path / "otp_data.json").exists()
+
+
+def test_import_endpoint(client, otp_program):
+    base, _ = otp_program
+    response = client.post(f"/import/otp?base={base}&dry_run=true", content=sheet(program_row("Fire drill")))
+    assert response.status_code == 200
+    assert response.json()["dry_run"] is True and response.json()["programs"] == 1
+
+    response = client.post(f"/import/otp?base={base}&dry_run=true",
+                           content=sheet(program_row("Fire drill", jan=("-1", "0"))))
+    assert response.status_code == 422
+    assert response.json()["detail"]["issues"][0]["line"] == 5
+
+    assert client.post("/import/budget", content=b"").status_code == 404
+    assert client.post("/import/otp?base=all", content=b"").status_code == 400
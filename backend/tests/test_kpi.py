@@ -0,0 +1,96 @@
+import pytest
+
+import kpi
+
+
+def test_rates_of_counts_and_of_entered_rates():
+    assert kpi.rates("firstaid", 3, 600_000) == {"incidents": 3, "rate_200k": 1.0, "rate_1m": 5.0}
+    # TRIR is entered per 1M man-hours: the count comes from the man-hours
+    assert kpi.rates("trir", 2.5, 400_000) == {"incidents": 1.0, "rate_200k": 0.5, "rate_1m": 2.5}
+    assert kpi.rates("fire", 1, 0) == {"incidents": 1, "rate_200k": None, "rate_1m": None}
+    assert kpi.rates("trir", 2.5, 0)["incidents"] is None
+
+
+@pytest.mark.parametrize("target, result, expected", [
+    (2, 1, {"met": True, "variance": -1, "attainment": 200.0}),
+    (2, 4, {"met": False, "variance": 2, "attainment": 50.0}),
+    (0, 0, {"met": True, "variance": 0, "attainment": 100.0}),
+    (0, 3, {"met": False, "variance": 3, "attainment": 0.0}),
+])
+def test_attainment(target, result, expected):
+    assert kpi.attainment(target, result) == expected
+
+
+def test_delta_and_trend():
+    assert kpi.delta(3, 4) == {"delta": -1, "delta_pct": -25.0}
+    assert kpi.delta(3, 0) == {"delta": 3, "delta_pct": None}
+    assert kpi.delta(None, 4) == {"delta": None, "delta_pct": None}
+    assert [kpi.trend(1, 2), kpi.trend(2, 1), kpi.trend(1, 1)] == ["better", "worse", "same"]
+
+
+def document():
+    return {
+        "version": 5,
+        "versions": {"2024": 2},
+        "man_hours": {"2023": 400_000, "2024": 500_000, "2025": 0},
+        "kpi": {
+            "2023": {"firstaid": {"target": 2, "result": 4}, "trir": {"target": 1, "result": 2.5}},
+            "2024": {"firstaid": {"target": 2, "result": 1}, "trir": {"target": 1, "result": "bad"},
+                     "custom": {"target": 1, "result": 0}},
+            "2025": {"firstaid": {"target": 0, "result": 0}},
+        },
+    }
+
+
+def test_derive_year_with_year_over_year():
+    year = kpi.derive_year(document(), "2024")
+    assert (year["version"], year["man_hours"], year["targets_met"]) == (2, 500_000, 3)
+    assert year["man_hours_yoy"] == {"delta": 100_000, "delta_pct": 25.0}
+    firstaid = year["metrics"]["firstaid"]
+    assert (firstaid["rate_200k"], firstaid["met"]) == (0.4, True)
+    assert firstaid["yoy"] == {"delta": -3, "delta_pct": -75.0, "previous": 4, "trend": "better", "rate_1m": -8.0}
+    assert year["metrics"]["trir"]["result"] == 0
+    assert list(year["metrics"]) == ["trir", "firstaid", "custom"]
+    assert year["metrics"]["custom"]["yoy"] is None
+    assert kpi.derive_year(document(), "2023")["man_hours_yoy"] is None
+
+
+def test_derive_summary_picks_latest_year_with_data():
+    summary = kpi.derive(document())["summary"]
+    assert summary["years"] == ["2023", "2024", "2025"]
+    assert summary["latest"] == "2024"
+    assert summary["total_man_hours"] == 900_000
+    assert [point["year"] for point in summary["series"]["firstaid"]] == ["2023", "2024", "2025"]
+    assert kpi.derive({})["summary"]["latest"] is None
+
+
+def test_rollups_recompute_only_on_a_new_signature():
+    rollups = kpi.KpiRollups()
+    loads = []
+
+    def load():
+        loads.append(1)
+        return document()
+
+    first = rollups.get(("sig", 1), load)
+    assert rollups.get(("sig", 1), load) is first
+    assert len(loads) == 1
+    updated = rollups.update(("sig", 2), dict(document(), version=6))
+    assert rollups.get(("sig", 2), load) is updated and len(loads) == 1
+    rollups.get(("sig", 3), load)
+    assert len(loads) == 2
+
+
+def test_kpi_endpoints(client):
+    update = {"man_hours": 500_000, "firstaid_target": 3, "firstaid_result": 2}
+    response = client.put("/kpi/1999", json=update)
+    assert response.status_code == 200
+    version = response.headers["etag"]
+
+    year = client.get("/kpi/1999").json()
+    assert year["metrics"]["firstaid"]["rate_200k"] == 0.8 and year["metrics"]["firstaid"]["met"]
+    assert "1999" in client.get("/kpi/summary").json()["years"]
+    assert client.put("/kpi/1999", json=update, headers={"if-match": '"0"'}).status_code == 412
+    assert client.put("/kpi/1999", json={"firstaid_result": 4}, headers={"if-match": version}).status_code == 200
+    assert client.get("/kpi/1999").json()["metrics"]["firstaid"]["met"] is False
+    assert client.get("/kpi/1800").status_code == 404
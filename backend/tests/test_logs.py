@@ -0,0 +1,94 @@
+import json
+import logging
+import queue
+import sys
+
+import logs
+
+
+def make_record(msg="hello %s", args=("world",), level=logging.INFO, **extra):
+    record = logging.LogRecord("hse.test", level, __file__, 1, msg, args, None)
+    for key, value in extra.items():
+        setattr(record, key, value)
+    return record
+
+
+def sample_value(metric, sample: str) -> float:
+    for line in metric.render():
+        if line.startswith(sample + " "):
+            return float(line.rsplit(" ", 1)[1])
+    return 0
+
+
+def test_parse_pairs():
+    assert logs._parse_pairs("email=DEBUG, reminders = WARNING,bad,=x,") == {"email": "DEBUG", "reminders": "WARNING"}
+
+
+def test_filter_stamps_request_id():
+    token = logs.request_id.set("abc123")
+    try:
+        record = make_record()
+        assert logs.ContextFilter({}).filter(record)
+    finally:
+        logs.request_id.reset(token)
+    assert record.request_id == "abc123"
+
+
+def test_sampling_never_drops_warnings():
+    log_filter = logs.ContextFilter({"test.noisy": 0.0, "test.kept": 1.0})
+    sample = 'hse_log_records_sampled_out_total{event="test.noisy"}'
+    before = sample_value(logs.records_sampled, sample)
+    assert not log_filter.filter(make_record(event="test.noisy"))
+    assert sample_value(logs.records_sampled, sample) == before + 1
+
+    kept = make_record(event="test.kept")
+    assert log_filter.filter(kept) and kept.sample_rate == 1.0
+    warning = make_record(level=logging.WARNING, event="test.noisy")
+    assert log_filter.filter(warning) and not hasattr(warning, "sample_rate")
+    assert log_filter.filter(make_record(event="test.other"))
+
+
+def test_full_queue_drops_instead_of_blocking():
+    handler = logs.DroppingQueueHandler(queue.Queue(1))
+    before = sample_value(logs.records_dropped, "hse_log_records_dropped_total")
+    handler.emit(make_record())
+    handler.emit(make_record())
+    assert handler.queue.qsize() == 1
+    assert sample_value(logs.records_dropped, "hse_log_records_dropped_total") == before + 1
+    assert handler.queue.get_nowait().msg == "hello world"
+
+
+def test_queued_record_keeps_traceback_out_of_message():
+    handler = logs.DroppingQueueHandler(queue.Queue())
+    try:
+        raise ValueError("boom")
+    except ValueError:
+        record = make_record(msg="failed", args=())
+        record.exc_info = sys.exc_info()
+    handler.emit(record)
+    queued = handler.queue.get_nowait()
+    assert queued.msg == "failed" and queued.exc_info is None
+    assert "ValueError: boom" in queued.exc_text
+
+
+def test_json_formatter_includes_extra_fields():
+    record = make_record(event="otp.saved", base="duri", request_id="r1")
+    record.exc_text = None
+    entry = json.loads(logs.JsonFormatter().format(record))
+    assert entry["msg"] == "hello world" and entry["level"] == "INFO" and entry["logger"] == "hse.test"
+    assert (entry["request_id"], entry["event"], entry["base"]) == ("r1", "otp.saved", "duri")
+    assert entry["ts"].endswith("+00:00")
+
+
+def test_text_formatter_appends_request_id():
+    record = make_record(request_id="r2")
+    assert logs.TextFormatter().format(record).endswith("INFO hse.test hello world [r2]")
+    record = make_record(request_id=None)
+    assert logs.TextFormatter().format(record).endswith("hello world")
+
+
+def test_request_id_is_echoed_or_generated(client):
+    assert client.get("/bases", headers={"X-Request-ID": "trace-42"}).headers["x-request-id"] == "trace-42"
+    generated = client.get("/bases", headers={"X-Request-ID": "bad id with spaces"}).headers["x-request-id"]
+    assert generated != "bad id with spaces" and len(generated) == 16
+    assert client.get("/bases").headers["x-request-id"] != client.get("/bases").headers["x-request-id"]
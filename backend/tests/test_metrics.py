@@ -0,0 +1,60 @@
+import pytest
+
+import metrics
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    """A private registry, so test metrics don't show up in the app's /metrics."""
+    monkeypatch.setattr(metrics, "_registry", [])
+    return metrics._registry
+
+
+def test_counter_and_gauge_samples(registry):
+    counter = metrics.Counter("test_events_total", "Events", ("kind",))
+    counter.inc(kind="a")
+    counter.inc(2, kind="a")
+    counter.inc(kind='quote"and\\slash')
+    lines = counter.render()
+
+    assert lines[:2] == ["# HELP test_events_total Events", "# TYPE test_events_total counter"]
+    assert 'test_events_total{kind="a"} 3' in lines
+    assert 'test_events_total{kind="quote\\"and\\\\slash"} 1' in lines
+
+    gauge = metrics.Gauge("test_in_flight", "In flight")
+    gauge.inc()
+    gauge.inc()
+    gauge.dec()
+    assert "test_in_flight 1" in gauge.render()
+    gauge.set(7)
+    assert "test_in_flight 7" in gauge.render()
+
+
+def test_histogram_buckets_are_cumulative(registry):
+    histogram = metrics.Histogram("test_duration_seconds", "Duration", ("route",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 5):
+        histogram.observe(value, route="/x")
+    lines = histogram.render()
+
+    assert 'test_duration_seconds_bucket{route="/x",le="0.1"} 1' in lines
+    assert 'test_duration_seconds_bucket{route="/x",le="1.0"} 2' in lines
+    assert 'test_duration_seconds_bucket{route="/x",le="+Inf"} 3' in lines
+    assert 'test_duration_seconds_count{route="/x"} 3' in lines
+    assert 'test_duration_seconds_sum{route="/x"} 5.55' in lines
+
+    with histogram.time(route="/y"):
+        pass
+    assert 'test_duration_seconds_count{route="/y"} 1' in histogram.render()
+    assert registry == [histogram]
+
+
+def test_metrics_endpoint_reports_route_templates(client, otp_program):
+    base, program_id = otp_program
+    client.get(f"/otp/{program_id}?base={base}")
+    body = client.get("/metrics").text
+
+    assert "# TYPE hse_http_request_duration_seconds histogram" in body
+    assert 'route="/otp/{program_id}"' in body
+    assert f'route="/otp/{program_id}"' not in body
+    assert "hse_store_load_duration_seconds_count" in body
+    assert "test_" not in body
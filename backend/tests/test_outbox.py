@@ -0,0 +1,127 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import update
+from sqlmodel import Session, SQLModel, create_engine, select
+
+import app
+import outbox
+from models import OutboxMessage
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'outbox.db'}")
+    SQLModel.metadata.create_all(engine)
+    return engine
+
+
+class Sender:
+    """Records deliveries; subjects starting with an outcome ("skipped: ...") get that outcome."""
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, to, subject, html):
+        self.calls.append((to, subject))
+        outcome = subject.split(":", 1)[0]
+        return (outcome, "detail") if outcome in ("skipped", "error") else ("sent", "ok")
+
+
+def message(to="andi@example.com", subject="Reminder", dedupe_key=None):
+    return {"to_email": to, "subject": subject, "html_body": "<p>hi</p>", "dedupe_key": dedupe_key}
+
+
+def messages(engine) -> dict:
+    with Session(engine) as session:
+        return {m.subject: m for m in session.exec(select(OutboxMessage)).all()}
+
+
+def make_due(engine):
+    with Session(engine) as session:
+        session.exec(update(OutboxMessage).values(next_attempt_at=datetime.utcnow() - timedelta(seconds=1)))
+        session.commit()
+
+
+def test_enqueue_dedupes_and_skips_blank_addresses(engine):
+    batch = [message(dedupe_key="r1:andi:2025-01-01"), message(to="  "), message(subject="No key")]
+    assert outbox.enqueue(engine, batch, source="test") == 2
+    assert outbox.enqueue(engine, batch, source="test") == 1
+    assert outbox.stats(engine)["counts"]["pending"] == 3
+
+
+def test_drain_delivers_and_records(engine):
+    outbox.enqueue(engine, [message(" andi@example.com ")], source="test")
+    sender = Sender()
+    assert outbox.OutboxWorker(engine, sender).drain_once() == 1
+    assert sender.calls == [("andi@example.com", "Reminder")]
+    sent = messages(engine)["Reminder"]
+    assert (sent.status, sent.claim, sent.attempts) == ("sent", None, 0) and sent.sent_at is not None
+    stats = outbox.stats(engine)
+    assert (stats["queue_depth"], stats["latency_seconds"]["count"]) == (0, 1)
+
+
+def test_rate_limit_defers_without_counting_an_attempt(engine, monkeypatch):
+    monkeypatch.setattr(outbox, "RECIPIENT_LIMIT", 2)
+    outbox.enqueue(engine, [message(to, f"m{i}") for i, to in
+                            enumerate(["andi@example.com", "ANDI@example.com", "andi@example.com", "budi@example.com"])])
+    sender = Sender()
+    outbox.OutboxWorker(engine, sender).drain_once()
+    assert [subject for _, subject in sender.calls] == ["m0", "m1", "m3"]
+    deferred = messages(engine)["m2"]
+    assert (deferred.status, deferred.attempts) == ("pending", 0)
+    assert deferred.next_attempt_at > datetime.utcnow() + timedelta(seconds=outbox.RECIPIENT_WINDOW - 60)
+
+
+def test_skipped_messages_do_not_count_towards_the_limit(engine, monkeypatch):
+    monkeypatch.setattr(outbox, "RECIPIENT_LIMIT", 2)
+    outbox.enqueue(engine, [message(subject=s) for s in ("skipped: 1", "skipped: 2", "a", "b")])
+    outbox.OutboxWorker(engine, Sender()).drain_once()
+    assert {s: m.status for s, m in messages(engine).items()} == {
+        "skipped: 1": "skipped", "skipped: 2": "skipped", "a": "sent", "b": "sent"}
+
+
+def test_backoff():
+    assert [outbox.backoff(n) for n in (1, 2, 3)] == [outbox.RETRY_BASE_SECONDS * f for f in (1, 2, 4)]
+    assert outbox.backoff(50) == outbox.RETRY_MAX_SECONDS
+
+
+def test_failures_back_off_then_go_dead_and_can_be_requeued(engine, monkeypatch):
+    monkeypatch.setattr(outbox, "MAX_ATTEMPTS", 2)
+    outbox.enqueue(engine, [message(subject="error: provider down")])
+    worker = outbox.OutboxWorker(engine, Sender())
+    worker.drain_once()
+    failed = messages(engine)["error: provider down"]
+    assert (failed.status, failed.attempts, failed.last_error) == ("pending", 1, "error: detail")
+    assert failed.next_attempt_at > datetime.utcnow()
+    assert worker.drain_once() == 0  # not due yet
+
+    make_due(engine)
+    worker.drain_once()
+    dead = messages(engine)["error: provider down"]
+    assert (dead.status, dead.attempts) == ("dead", 2)
+    assert [d["id"] for d in outbox.stats(engine)["dead_letters"]] == [dead.id]
+
+    requeued = outbox.requeue(engine, dead.id)
+    assert (requeued.status, requeued.attempts) == ("pending", 0)
+    assert outbox.requeue(engine, 999) is None
+
+
+def test_expired_lease_is_claimed_again(engine):
+    outbox.enqueue(engine, [message()])
+    with Session(engine) as session:
+        session.exec(update(OutboxMessage).values(status="sending", claim="dead-worker",
+                                                  lease_until=datetime.utcnow() - timedelta(seconds=1)))
+        session.commit()
+    assert outbox.OutboxWorker(engine, Sender()).drain_once() == 1
+    assert messages(engine)["Reminder"].status == "sent"
+
+
+def test_queue_reminders_dedupe_flag(client):
+    reminder = message(to="outbox.test@example.com", dedupe_key="outbox-test:2025-01-01")
+    assert app.queue_reminders([reminder], "test") == 1
+    assert app.queue_reminders([reminder], "test") == 0
+    assert app.queue_reminders([reminder], "test", dedupe=False) == 1
+    status = client.get("/admin/outbox").json()
+    assert status["worker_running"] and sum(status["counts"].values()) >= 2
+    assert client.post("/admin/outbox/999999/retry").status_code == 404
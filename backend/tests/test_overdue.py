@@ -0,0 +1,105 @@
+from datetime import date
+
+from overdue import ExceptionTracker, due_date, pace
+
+DEFAULTS = {"source": "otp", "region": "indonesia", "base": "duri", "category": None}
+
+
+def document():
+    return {"year": 2025, "programs": [
+        {"id": 1, "name": "Fire drill", "months": {
+            "jan": {"plan": 1, "actual": 0, "pic_email": "andi@example.com"},
+            "feb": {"plan": 1, "actual": 1},
+            "mar": {"plan": 2, "actual": 0, "plan_date": "2025-03-05"},
+            "apr": {"plan": 1, "actual": 0},
+        }},
+        {"id": 2, "name": "Toolbox talk", "months": {"jan": {"plan": 1, "actual": 1}, "feb": {"plan": 1, "actual": 2}}},
+    ]}
+
+
+def tracker_on(day: date) -> ExceptionTracker:
+    tracker = ExceptionTracker()
+    tracker.roll(day)
+    tracker.replace_source(("otp", "duri"), DEFAULTS, document(), signature=("sig",))
+    return tracker
+
+
+def months(items):
+    return [(item["program_id"], item["month"]) for item in items]
+
+
+def test_due_date():
+    assert due_date(2024, "feb") == date(2024, 2, 29)
+    assert due_date(2025, "feb", "2025-02-10T09:00") == date(2025, 2, 10)
+    assert due_date(2025, "feb", "soon") == date(2025, 2, 28)
+
+
+def test_pace():
+    record = {"year": 2025, "plans": [1, 1, 2] + [0] * 9, "actuals": [0, 1, 1] + [0] * 9}
+    assert pace(record, date(2025, 3, 15)) == {"expected_to_date": 2, "actual_to_date": 2, "gap": 0, "pace": 100.0,
+                                               "total_plan": 4, "total_actual": 2}
+    assert pace(record, date(2026, 1, 1))["gap"] == 2
+    assert pace(record, date(2024, 6, 1))["pace"] is None
+
+
+def test_overdue_months_oldest_first():
+    tracker = tracker_on(date(2025, 3, 10))
+    items = tracker.overdue()
+    assert months(items) == [(1, "jan"), (1, "mar")]
+    assert items[0]["due"] == "2025-01-31" and items[0]["days_overdue"] == 38
+    assert "people" not in items[0]
+    assert tracker.stats() == {"date": "2025-03-10", "open_months": 3, "overdue": 2, "programs": 2, "at_risk": 1}
+
+
+def test_filters():
+    tracker = tracker_on(date(2025, 3, 10))
+    assert months(tracker.overdue(pic=" ANDI@example.com ")) == [(1, "jan")]
+    assert tracker.overdue(bases={"pdsi"}) == []
+    assert tracker.overdue(sources={"matrix"}) == []
+    assert len(tracker.overdue(limit=1)) == 1
+
+
+def test_roll_moves_due_months_and_reassesses_pace():
+    tracker = tracker_on(date(2025, 1, 15))
+    assert tracker.overdue() == []
+    assert tracker.at_risk() == []
+
+    assert tracker.roll(date(2025, 5, 1)) == {"date": "2025-05-01", "newly_overdue": 3}
+    assert months(tracker.overdue()) == [(1, "jan"), (1, "mar"), (1, "apr")]
+    [risk] = tracker.at_risk()
+    assert (risk["program_id"], risk["gap"], risk["pace"]) == (1, 4, 20.0)
+
+    # Clock going back splits the open months again
+    assert tracker.roll(date(2025, 2, 1))["newly_overdue"] == 0
+    assert months(tracker.overdue()) == [(1, "jan")]
+    assert tracker.roll(date(2025, 2, 1))["newly_overdue"] == 0
+
+
+def test_replace_source_and_retain():
+    tracker = tracker_on(date(2025, 3, 10))
+    changed = document()
+    changed["programs"][0]["months"]["jan"]["actual"] = 1
+    tracker.replace_source(("otp", "duri"), DEFAULTS, changed)
+    assert months(tracker.overdue()) == [(1, "mar")]
+    assert tracker.signature(("otp", "duri")) == ()
+
+    tracker.replace_source(("otp", "pdsi"), dict(DEFAULTS, base="pdsi"), document())
+    assert len(tracker.overdue()) == 3
+    tracker.retain([("otp", "pdsi")])
+    assert not tracker.has_source(("otp", "duri"))
+    assert {item["base"] for item in tracker.overdue()} == {"pdsi"}
+    assert tracker.stats()["open_months"] == 3
+
+
+def test_overdue_lists_each_month_once(client, otp_program):
+    base, program_id = otp_program
+    cell = {"plan": 1, "actual": 0, "plan_date": "2000-01-10", "pic_email": "overdue.test@example.com"}
+    for query in (f"?base={base}", ""):
+        assert client.put(f"/otp/{program_id}/month/oct{query}", json=cell).status_code == 200
+
+    items = client.get("/overdue?pic=overdue.test@example.com").json()["items"]
+    assert [(i["base"], i["program_id"], i["month"], i["due"]) for i in items] == [
+        (base, program_id, "oct", "2000-01-10")]
+    assert client.get(f"/overdue?pic=overdue.test@example.com&base={base}&source=otp").json()["count"] == 1
+    assert client.get("/overdue?source=budget").status_code == 400
+    assert client.get("/at-risk").status_code == 200
@@ -0,0 +1,200 @@
+import copy
+import json
+
+import pytest
+
+import app
+import overlay
+import store
+
+MONTH_FIELDS = ["plan", "actual", "pic_name"]
+PROGRAM_KEYS = {"name": "", "months": None, "version": 0}
+
+
+def template():
+    return {"year": 2025, "version": 3, "programs": [
+        {"id": 1, "name": "Fire drill", "version": 1, "months": {"jan": {"plan": 1, "actual": 0}, "feb": {"plan": 1}}},
+        {"id": 2, "name": "Toolbox talk", "version": 1, "months": {"jan": {"plan": 2, "actual": 2}}},
+        {"id": 3, "name": "Audit", "version": 1, "months": {}},
+    ]}
+
+
+def edited(**changes):
+    document = copy.deepcopy(template())
+    for (program_id, month), cell in changes.get("cells", {}).items():
+        prog = next(p for p in document["programs"] if p["id"] == program_id)
+        prog["months"].setdefault(month, {}).update(cell)
+        prog["version"] += 1
+        document["version"] += 1
+    return document
+
+
+def full_merge(documents):
+    """The slow "all bases" merge, as done in app.merge_otp_bases."""
+    merged, version = {}, 0
+    for document in documents:
+        version += document.get("version", 0)
+        for prog in document["programs"]:
+            if prog["id"] not in merged:
+                merged[prog["id"]] = {"id": prog["id"], "name": prog.get("name", ""),
+                                      "months": copy.deepcopy(prog.get("months", {})), "version": prog.get("version", 0)}
+                continue
+            existing = merged[prog["id"]]
+            existing["version"] += prog.get("version", 0)
+            for month, cell in prog.get("months", {}).items():
+                target = existing["months"].setdefault(month, dict(cell))
+                for field in MONTH_FIELDS:
+                    if cell.get(field) and not target.get(field):
+                        target[field] = cell[field]
+    return version, list(merged.values())
+
+
+@pytest.mark.parametrize("new", [
+    template(),
+    edited(cells={(1, "jan"): {"actual": 1, "pic_name": "Andi"}}),
+    dict(template(), year=2026, note="added"),
+    {"version": 3, "programs": template()["programs"][::-1]},
+    {"year": 2025, "programs": template()["programs"][:1] + [{"id": 9, "name": "New", "months": {}}]},
+    {"year": 2025, "version": 3, "programs": []},
+])
+def test_diff_apply_round_trip(new):
+    base = template()
+    patch = overlay.diff(base, new)
+    assert overlay.apply(base, patch) == new
+    assert base == template()  # apply never mutates the template
+    if new == base:
+        assert patch == {}
+
+
+def test_patch_is_per_program():
+    patch = overlay.diff(template(), edited(cells={(2, "jan"): {"actual": 3}}))
+    assert patch == {"version": 4, "programs": {"$items": {"2": {"version": 2, "months": {"jan": {"actual": 3}}}}}}
+    assert overlay.patch_cells(patch) == 3
+    removed = overlay.diff(template(), dict(template(), programs=template()["programs"][1:]))
+    assert removed == {"programs": {"$delete": [1]}}
+
+
+def test_merge_overlays_matches_the_full_merge():
+    bases = [edited(cells={(1, "jan"): {"pic_name": "Andi"}}), template(),
+             edited(cells={(1, "jan"): {"actual": 1, "pic_name": "Budi"}, (3, "mar"): {"plan": 2}})]
+    shared = template()
+    patches = [overlay.diff(shared, document) for document in bases]
+    version, programs = overlay.merge_overlays(shared, patches, PROGRAM_KEYS, MONTH_FIELDS)
+    assert (version, programs) == full_merge(bases)
+    assert programs[0]["months"]["jan"] == {"plan": 1, "actual": 1, "pic_name": "Andi"}
+    # Untouched programs share the template's cells; touched ones get copies
+    assert programs[1]["months"]["jan"] is shared["programs"][1]["months"]["jan"]
+    assert programs[0]["months"]["feb"] is not shared["programs"][0]["months"]["feb"]
+    assert shared == template()
+
+
+def test_merge_overlays_defers_structural_changes():
+    reordered = dict(template(), programs=template()["programs"][::-1])
+    added = dict(template(), programs=template()["programs"] + [{"id": 9, "name": "New", "months": {}}])
+    for document in (reordered, added, dict(template(), programs=template()["programs"][:2])):
+        patches = [{}, overlay.diff(template(), document)]
+        assert overlay.merge_overlays(template(), patches, PROGRAM_KEYS, MONTH_FIELDS) is None
+
+
+def write(path, data):
+    path.write_text(json.dumps(data))
+
+
+def test_pack_add_base_and_unpack(tmp_path):
+    documents = {
+        "otp_data.json": template(),
+        "otp_indonesia_duri.json": template(),
+        "otp_indonesia_pdsi.json": edited(cells={(1, "feb"): {"actual": 1}}),
+        "matrix_audit_indonesia.json": dict(template(), category="audit"),
+    }
+    for name, document in documents.items():
+        write(tmp_path / name, document)
+    write(tmp_path / "bases.json", {"bases": [{"id": "duri", "name": "Duri"}, {"id": "pdsi", "name": "PDSI"}]})
+
+    assert {r["family"]: r["documents"] for r in overlay.pack(tmp_path, dry_run=True)} == {
+        "matrix_audit_indonesia": 1, "otp_indonesia": 3}
+    assert (tmp_path / "otp_data.json").exists()
+
+    results = {r["family"]: r for r in overlay.pack(tmp_path)}
+    assert results["otp_indonesia"]["patch_cells"] == {"otp_data.json": 0, "otp_indonesia_duri.json": 0,
+                                                       "otp_indonesia_pdsi.json": 3}
+    for name, document in documents.items():
+        assert not (tmp_path / name).exists()
+        assert store.read_json(tmp_path / name) == document
+    assert overlay.status(tmp_path)["otp_indonesia"]["packed"] == 3
+
+    # Writes go to the overlay; the template is never touched
+    changed = edited(cells={(2, "jan"): {"pic_name": "Andi"}})
+    store.write_json(tmp_path / "otp_indonesia_duri.json", changed)
+    assert store.read_json(tmp_path / "otp_indonesia_duri.json") == changed
+    assert store.read_json(tmp_path / "otp_data.json") == template()
+
+    assert overlay.add_base(tmp_path, "balikpapan", "Balikpapan") == [
+        "matrix_audit_indonesia_balikpapan.overlay.json", "otp_indonesia_balikpapan.overlay.json"]
+    assert store.read_json(tmp_path / "otp_indonesia_balikpapan.json") == template()
+    assert json.loads((tmp_path / "bases.json").read_text())["bases"][-1] == {"id": "balikpapan", "name": "Balikpapan"}
+    with pytest.raises(ValueError):
+        overlay.add_base(tmp_path, "balikpapan", "Again")
+    with pytest.raises(ValueError):
+        overlay.add_base(tmp_path, "Bad Id", "Bad")
+
+    assert "otp_indonesia_duri.json" in overlay.unpack(tmp_path)
+    assert json.loads((tmp_path / "otp_indonesia_duri.json").read_text()) == changed
+    assert json.loads((tmp_path / "otp_indonesia_pdsi.json").read_text()) == documents["otp_indonesia_pdsi.json"]
+    assert list(tmp_path.glob("*" + overlay.OVERLAY_SUFFIX)) == []
+    assert list((tmp_path / overlay.TEMPLATE_DIR).iterdir()) == []
+
+
+
+def test_overlays_that_outgrow_their_template_are_repacked(tmp_path):
+    names = ["otp_data.json", "otp_indonesia_duri.json", "otp_indonesia_pdsi.json"]
+    paths = [tmp_path / name for name in names]
+    for path in paths:
+        write(path, template())
+    overlay.pack(tmp_path)
+    assert overlay.repack_grown(tmp_path, paths) == []
+
+    # A rollover rewrites every program of every document
+    rolled = dict(template(), year=2026, programs=[dict(p, months={}, version=0) for p in template()["programs"]])
+    for path in paths:
+        store.write_json(path, rolled)
+    assert overlay.status(tmp_path)["otp_indonesia"]["patch_ratio"] > overlay.REPACK_RATIO
+
+    # Only families whose documents are all locked by the caller
+    assert overlay.repack_grown(tmp_path, paths[:2]) == []
+    assert [r["family"] for r in overlay.repack_grown(tmp_path, paths)] == ["otp_indonesia"]
+    assert overlay.status(tmp_path)["otp_indonesia"]["patch_ratio"] < overlay.REPACK_RATIO
+    assert all(store.read_json(path) == rolled for path in paths)
+    assert len(list((tmp_path / overlay.TEMPLATE_DIR).iterdir())) == 1
+
+
+def test_app_fast_merge_matches_full_merge(client, otp_program, monkeypatch):
+    base, program_id = otp_program
+    client.put(f"/otp/{program_id}/month/jul?base={base}", json={"plan": 4, "pic_name": "Overlay Test"})
+    assert app.overlay_views([app.get_otp_file_path(b) for b in app.get_bases()]) is not None
+    fast = [app.merge_otp_bases()] + [app.merge_matrix_bases(c, "indonesia") for c in ("audit", "training")]
+    monkeypatch.setattr(app, "overlay_views", lambda paths: None)
+    full = [app.merge_otp_bases()] + [app.merge_matrix_bases(c, "indonesia") for c in ("audit", "training")]
+    assert fast == full
+
+
+def test_merged_year_follows_the_base_documents(client, monkeypatch):
+    paths = [app.get_otp_file_path(b) for b in app.get_bases()]
+    paths += [app.get_matrix_file_path("audit", "indonesia", b) for b in app.get_bases()]
+    originals = [store.read_json(path) for path in paths]
+    try:
+        for path, document in zip(paths, originals):
+            store.write_json(path, dict(document, year=2031))
+        assert client.get("/otp?base=all").json()["year"] == 2031
+        assert client.get("/matrix?category=audit&region=indonesia&base=all").json()["year"] == 2031
+        monkeypatch.setattr(app, "overlay_views", lambda paths: None)
+        assert app.merge_otp_bases()["year"] == app.merge_matrix_bases("audit", "indonesia")["year"] == 2031
+    finally:
+        for path, document in zip(paths, originals):
+            store.write_json(path, document)
+
+
+def test_overlay_year():
+    assert app.overlay_year({"year": 2025}, [{}, {"year": 2030}]) == 2025
+    assert app.overlay_year({"year": 2025}, [{"year": 2026}]) == 2026
+    assert app.overlay_year({"year": 2025}, [{overlay.DELETE: ["year"]}]) is None
@@ -0,0 +1,99 @@
+from people import PeopleIndex, month_date, month_items
+
+
+def document():
+    return {"year": 2025, "programs": [
+        {"id": 1, "name": "Fire drill", "months": {
+            "jan": {"plan": 1, "actual": 0, "pic_name": "Andi  Saputra", "pic_email": "Andi@Example.com",
+                    "pic_manager_email": "boss@example.com"},
+            "mar": {"plan": 1, "actual": 1, "pic_email": "andi@example.com", "plan_date": "2025-03-20"},
+            "feb": {"plan": 1, "actual": 0},
+        }},
+        {"id": 2, "name": "Toolbox talk", "months": {
+            "feb": {"plan": 2, "actual": 1, "pic_manager": "andi saputra", "pic_manager_email": "andi@example.com"},
+        }},
+    ]}
+
+
+def index_with(*sources):
+    index = PeopleIndex()
+    for source_key, data in sources:
+        items = [(source_key + suffix, item) for suffix, item in month_items(data, {"base": source_key[-1]})]
+        index.replace_source(source_key, items, signature=("sig", source_key))
+    return index
+
+
+def keys(items):
+    return [(item["program_id"], item["month"]) for item in items]
+
+
+def test_month_date():
+    assert month_date(2025, "feb") == "2025-02-01"
+    assert month_date(2025, "feb", "2025-02-14T08:00") == "2025-02-14"
+
+
+def test_month_items_skip_months_without_people():
+    items = month_items(document(), {"source": "otp"})
+    assert [suffix for suffix, _ in items] == [(1, "jan"), (1, "mar"), (2, "feb")]
+    item = dict(items[0][1])
+    assert (item["open"], item["date"], item["source"]) == (True, "2025-01-01", "otp")
+
+
+def test_lookup_by_email_is_case_insensitive_and_sorted():
+    index = index_with((("otp", "duri"), document()))
+    assert keys(index.lookup(email="ANDI@example.com", open_only=False)) == [(1, "jan"), (2, "feb"), (1, "mar")]
+    assert keys(index.lookup(email="andi@example.com")) == [(1, "jan"), (2, "feb")]
+    assert keys(index.lookup(email="andi@example.com", limit=1)) == [(1, "jan")]
+
+
+def test_lookup_roles_combine_email_and_name():
+    index = index_with((("otp", "duri"), document()))
+    items = index.lookup(email="andi@example.com", name="ANDI saputra")
+    assert [(keys([i])[0], i["roles"]) for i in items] == [((1, "jan"), ["pic"]), ((2, "feb"), ["manager"])]
+    assert keys(index.lookup(email="andi@example.com", role="manager")) == [(2, "feb")]
+    assert keys(index.lookup(email="boss@example.com", role="manager")) == [(1, "jan")]
+
+
+def test_replace_source_and_retain():
+    other = {"year": 2025, "programs": [{"id": 9, "name": "Audit", "months": {
+        "may": {"plan": 1, "actual": 0, "pic_email": "andi@example.com"}}}]}
+    index = index_with((("otp", "duri"), document()), (("otp", "pdsi"), other))
+    assert index.signature(("otp", "pdsi")) == ("sig", ("otp", "pdsi"))
+    assert len(index.lookup(email="andi@example.com")) == 3
+
+    changed = document()
+    changed["programs"][0]["months"]["jan"]["pic_email"] = "budi@example.com"
+    index.replace_source(("otp", "duri"), [(("otp", "duri") + s, i) for s, i in month_items(changed, {})])
+    assert keys(index.lookup(email="andi@example.com")) == [(2, "feb"), (9, "may")]
+    assert keys(index.lookup(email="budi@example.com")) == [(1, "jan")]
+
+    index.retain([("otp", "duri")])
+    assert not index.has_source(("otp", "pdsi"))
+    assert index.signature(("otp", "pdsi")) == ()
+    assert keys(index.lookup(email="andi@example.com")) == [(2, "feb")]
+    assert index.stats() == {"items": 3, "people": 4, "sources": 1}
+
+
+def test_put_and_delete_single_items():
+    index = PeopleIndex()
+    index.put(("tasks",), ("tasks", "t1"), {"pic_email": "andi@example.com", "open": True, "date": "2025-05-01"})
+    assert len(index.lookup(email="andi@example.com")) == 1
+    index.put(("tasks",), ("tasks", "t1"), {"pic_email": "budi@example.com", "open": True})
+    assert index.lookup(email="andi@example.com") == []
+    index.delete(("tasks",), ("tasks", "t1"))
+    assert index.lookup(email="budi@example.com") == []
+
+
+def test_my_items_lists_each_month_once(client, otp_program):
+    base, program_id = otp_program
+    cell = {"plan": 2, "actual": 0, "pic_email": "people.test@example.com"}
+    # The shared default document mirrors the bases; it must not add a second copy
+    for query in (f"?base={base}", ""):
+        assert client.put(f"/otp/{program_id}/month/nov{query}", json=cell).status_code == 200
+
+    items = client.get("/my-items?email=People.Test@example.com").json()["items"]
+    assert [(i["base"], i["program_id"], i["month"]) for i in items] == [(base, program_id, "nov")]
+    assert items[0]["roles"] == ["pic"]
+
+    assert client.get("/my-items").status_code == 400
+    assert client.get("/my-items?email=a@example.com&role=boss").status_code == 400
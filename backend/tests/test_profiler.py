@@ -0,0 +1,77 @@
+import json
+import os
+import threading
+import time
+
+import pytest
+from starlette.applications import Starlette
+from starlette.responses import PlainTextResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+import profiler
+
+
+@pytest.fixture
+def profile_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(profiler, "PROFILE_DIR", tmp_path)
+    monkeypatch.setattr(profiler, "recent_profiles", profiler.deque(maxlen=50))
+    return tmp_path
+
+
+def spin(seconds):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+def test_sampler_collects_busy_stacks_and_writes_files(profile_dir):
+    worker = threading.Thread(target=spin, args=(0.2,), name="worker")
+    sampler = profiler.StackSampler(interval=0.005)
+    sampler.start()
+    worker.start()
+    worker.join()
+    sampler.stop()
+
+    stacks = [stack for stack in sampler.stacks if stack[0] == "worker"]
+    assert sampler.samples > 0 and stacks
+    assert any(frame.startswith("spin (test_profiler.py") for stack in stacks for frame in stack)
+
+    entry = profiler.write_profile("p1", sampler, {"method": "GET", "path": "/x"})
+    speedscope = json.loads((profile_dir / "p1.speedscope.json").read_text())
+    frames = speedscope["shared"]["frames"]
+    profile = speedscope["profiles"][0]
+    assert len(profile["samples"]) == len(profile["weights"]) == len(sampler.stacks)
+    assert all(0 <= i < len(frames) for sample in profile["samples"] for i in sample)
+    assert (profile_dir / "p1.collapsed.txt").read_text().count("\n") == len(sampler.stacks)
+    assert profiler.list_profiles() == [entry]
+
+
+def test_middleware_profiles_only_requested_requests(profile_dir):
+    def slow(request):
+        spin(0.05)
+        return PlainTextResponse("ok")
+
+    app = Starlette(routes=[Route("/slow", slow)])
+    app.add_middleware(profiler.ProfilerMiddleware)
+    with TestClient(app) as client:
+        assert "x-profile-id" not in client.get("/slow").headers
+        profile_id = client.get("/slow", headers={"X-Profile": "1"}).headers["x-profile-id"]
+
+    assert (profile_dir / f"{profile_id}.speedscope.json").exists()
+    assert [p["id"] for p in profiler.list_profiles()] == [profile_id]
+    assert profiler.list_profiles()[0]["path"] == "/slow"
+
+
+def test_old_profiles_are_pruned(profile_dir):
+    for i in range(5):
+        for suffix in (".speedscope.json", ".collapsed.txt"):
+            path = profile_dir / f"p{i}{suffix}"
+            path.write_text("x" * 100)
+            os.utime(path, (i, i))
+
+    assert profiler.prune_profiles(keep=3) == ["p1", "p0"]
+    assert profiler.prune_profiles(keep=3, max_bytes=450) == ["p2"]
+    assert sorted(p.name for p in profile_dir.iterdir()) == [
+        "p3.collapsed.txt", "p3.speedscope.json", "p4.collapsed.txt", "p4.speedscope.json"]
+    assert [p["id"] for p in profiler.list_profiles()] == ["p4", "p3"]
@@ -0,0 +1,76 @@
+import pytest
+
+from projection import MONTHS, Projection, parse_months
+
+
+@pytest.mark.parametrize("value, months", [
+    ("jan,feb", ("jan", "feb")),
+    ("MAR-may", ("mar", "apr", "may")),
+    ("q4,jan", ("jan", "oct", "nov", "dec")),
+    ("feb, feb ,", ("feb",)),
+])
+def test_parse_months(value, months):
+    assert parse_months(value) == months
+
+
+@pytest.mark.parametrize("value", ["mar-jan", "smarch", "jan-xyz", " , "])
+def test_parse_months_rejects(value):
+    with pytest.raises(ValueError):
+        parse_months(value)
+
+
+def program():
+    return {"id": 3, "name": "Fire drill", "plan_type": "Monthly", "version": 2,
+            "months": {m: {"plan": 1, "actual": 0, "pic_name": "Andi"} for m in MONTHS}}
+
+
+def test_empty_projection_returns_everything():
+    projection = Projection()
+    assert not projection
+    assert projection.program(program(), progress=10) == dict(program(), progress=10)
+
+
+def test_month_fields_and_range():
+    projection = Projection("plan,actual", "q1")
+    assert projection and projection.key == (("plan", "actual"), None, ("jan", "feb", "mar"))
+    out = projection.program(program(), progress=10)
+    assert out["name"] == "Fire drill" and out["progress"] == 10
+    assert out["months"] == {m: {"plan": 1, "actual": 0} for m in ("jan", "feb", "mar")}
+
+
+def test_program_fields_keep_id_and_months():
+    out = Projection("name,progress").program(program(), progress=10)
+    assert set(out) == {"id", "name", "progress", "months"}
+    assert out["months"]["jan"] == {"plan": 1, "actual": 0, "pic_name": "Andi"}
+    assert Projection("name").program(program(), progress=10).get("progress") is None
+
+
+def test_blank_fields_select_nothing():
+    with pytest.raises(ValueError):
+        Projection(" , ")
+
+
+def test_document_projects_every_program():
+    data = {"year": 2025, "programs": [program(), dict(program(), id=4)]}
+    out = Projection("plan", "dec").document(data, lambda prog: {"progress": prog["id"]})
+    assert out["year"] == 2025
+    assert [(p["id"], p["progress"], p["months"]) for p in out["programs"]] == [
+        (3, 3, {"dec": {"plan": 1}}), (4, 4, {"dec": {"plan": 1}})]
+    assert data["programs"][0]["months"]["dec"] == {"plan": 1, "actual": 0, "pic_name": "Andi"}
+
+
+def test_otp_endpoint_projection(client, otp_program):
+    base, program_id = otp_program
+    data = client.get(f"/otp?base={base}&fields=name,plan&months=q2").json()
+    prog = data["programs"][0]
+    assert set(prog) == {"id", "name", "months"}
+    assert list(prog["months"]) == ["apr", "may", "jun"]
+    assert all(set(cell) <= {"plan"} for cell in prog["months"].values())
+
+    # A projected read is cached separately from the full document
+    full = client.get(f"/otp?base={base}").json()["programs"][0]
+    assert "progress" in full and len(full["months"]) == 12
+
+    one = client.get(f"/otp/{program_id}?base={base}&fields=progress&months=jan").json()
+    assert set(one) == {"id", "progress", "months"}
+    assert client.get(f"/otp?base={base}&months=dec-jan").status_code == 400
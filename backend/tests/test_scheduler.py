@@ -0,0 +1,109 @@
+import json
+import os
+import subprocess
+import sys
+import textwrap
+from datetime import datetime, timezone
+from pathlib import Path
+
+from apscheduler.events import EVENT_JOB_EXECUTED, EVENT_JOB_MAX_INSTANCES, EVENT_JOB_MISSED, JobExecutionEvent
+
+import app
+
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+
+# Run as a script: the process pool spawns workers that re-import __main__
+SCHEDULER_SCRIPT = textwrap.dedent("""
+    import json, sys, time
+    from datetime import datetime, timedelta
+    from apscheduler.jobstores.sqlalchemy import SQLAlchemyJobStore
+    sys.path.insert(0, sys.argv[1])
+    import app
+
+
+    def wait_for(job_id):
+        deadline = time.time() + 60
+        while job_id not in app.job_history and time.time() < deadline:
+            time.sleep(0.1)
+
+
+    if __name__ == "__main__":
+        app.start_scheduler()
+        first = {job.id: job.next_run_time for job in app.scheduler.get_jobs()}
+        app.scheduler.add_job(app.run_scheduled_job, "date", run_date=datetime.now() + timedelta(seconds=1),
+                              id="gc-now", args=["daily_attachment_gc"], executor="processpool")
+        wait_for("gc-now")
+        app.scheduler.add_job(app.run_scheduled_job, "cron", hour=1, id="retired", args=["daily_attachment_gc"])
+        app.scheduler.shutdown()
+
+        # A run falls due while the server is down
+        store = SQLAlchemyJobStore(url=app.JOBSTORE_URL)
+        store.start(app.scheduler, "default")
+        job = store.lookup_job("daily_task_reminder_check")
+        job.next_run_time = datetime.now().astimezone() - timedelta(minutes=5)
+        store.update_job(job)
+        store.shutdown()
+
+        app.start_scheduler()
+        wait_for("daily_task_reminder_check")
+        second = {job.id: job.next_run_time for job in app.scheduler.get_jobs()}
+        app.scheduler.shutdown()
+        jobs = sorted(second)
+        for next_runs in (first, second):
+            del next_runs["daily_task_reminder_check"]
+        print(json.dumps({"history": app.job_history, "kept_next_runs": first == second, "jobs": jobs}))
+""")
+
+
+def event(code, job_id="test_job", retval=None):
+    when = datetime(2025, 1, 1, 8, 0, tzinfo=timezone.utc)
+    return JobExecutionEvent(code, job_id, "default", when, retval=retval)
+
+
+def test_run_scheduled_job_reports_outcome(monkeypatch):
+    monkeypatch.setitem(app.SCHEDULED_JOBS, "test_ok", lambda: {"sent": 2})
+    monkeypatch.setitem(app.SCHEDULED_JOBS, "test_fail", lambda: 1 / 0)
+    ok = app.run_scheduled_job("test_ok")
+    assert (ok["outcome"], ok["result"]) == ("success", {"sent": 2}) and ok["duration"] >= 0
+    failed = app.run_scheduled_job("test_fail")
+    assert failed["outcome"] == "error" and "division by zero" in failed["error"]
+
+
+def test_job_events_build_history(monkeypatch):
+    monkeypatch.setattr(app, "job_history", {})
+    app.record_job_event(event(EVENT_JOB_EXECUTED, retval={"outcome": "success", "duration": 0.123456}))
+    app.record_job_event(event(EVENT_JOB_MISSED))
+    app.record_job_event(event(EVENT_JOB_MAX_INSTANCES))
+    app.record_job_event(event(EVENT_JOB_EXECUTED, retval={"outcome": "error", "duration": 0.5, "error": "boom"}))
+
+    entry = app.job_history["test_job"]
+    assert entry["runs"] == 4
+    assert entry["last_success"]["duration"] == 0.1235
+    assert (entry["last"]["outcome"], entry["last"]["error"]) == ("error", "boom")
+    assert entry["last"]["scheduled_for"] == "2025-01-01T08:00:00+00:00"
+
+
+def test_admin_jobs_lists_the_schedule(client):
+    jobs = client.get("/admin/jobs").json()["jobs"]
+    assert [job["id"] for job in jobs] == list(app.JOB_SCHEDULE)
+    gc = next(job for job in jobs if job["id"] == "daily_attachment_gc")
+    assert (gc["schedule"], gc["executor"], gc["coalesce"], gc["max_instances"]) == ("daily 03:00", "processpool",
+                                                                                    True, 1)
+
+
+def test_persistent_store_and_process_pool(tmp_path):
+    script = tmp_path / "run_scheduler.py"
+    script.write_text(SCHEDULER_SCRIPT)
+    env = dict(os.environ, HSE_JOBSTORE_URL=f"sqlite:///{tmp_path / 'jobs.sqlite'}")
+    result = subprocess.run([sys.executable, str(script), str(BACKEND_DIR)], env=env, capture_output=True,
+                            text=True, timeout=180)
+    assert result.returncode == 0, result.stderr
+    summary = json.loads(result.stdout.strip().splitlines()[-1])
+
+    # Ran in a worker process, reported through the listener here
+    assert summary["history"]["gc-now"]["last"]["outcome"] == "success"
+    # The missed run was made on restart, within the misfire grace time
+    assert summary["history"]["daily_task_reminder_check"]["last"]["outcome"] == "success"
+    # Stored jobs were reconciled with JOB_SCHEDULE without resetting them
+    assert summary["jobs"] == sorted(app.JOB_SCHEDULE)
+    assert summary["kept_next_runs"]
@@ -0,0 +1,89 @@
+import pytest
+
+from search import NAME_WEIGHT, OTHER_WEIGHT, SearchIndex, program_fields, tokenize
+
+
+@pytest.mark.parametrize("text, tokens", [
+    ("Fire Drill", ["fire", "drill"]),
+    ("andi.s@example.com", ["andi.s@example.com", "andi", "s", "example", "com"]),
+    ("WPTS-1234", ["wpts-1234", "wpts", "1234"]),
+    (None, []),
+])
+def test_tokenize(text, tokens):
+    assert tokenize(text) == tokens
+
+
+def test_program_fields_include_people_once():
+    program = {"name": "Fire Drill", "plan_type": "Monthly",
+               "months": {"jan": {"pic_name": "Andi"}, "feb": {"pic_name": "Andi", "wpts_id": "W-1"}}}
+    fields = program_fields(program)
+    assert fields[0] == ("Fire Drill", NAME_WEIGHT)
+    assert ("Monthly", OTHER_WEIGHT) in fields
+    assert [text for text, _ in fields[3:]] == ["Andi", "W-1"]
+
+
+def build_index():
+    index = SearchIndex()
+    index.replace_source(("otp",), [
+        (("otp", 1), [("Fire drill", NAME_WEIGHT)], {"source": "otp", "id": 1}),
+        (("otp", 2), [("Fire extinguisher inspection", NAME_WEIGHT)], {"source": "otp", "id": 2}),
+        (("otp", 3), [("Driver training", NAME_WEIGHT), ("fire", OTHER_WEIGHT)], {"source": "otp", "id": 3}),
+    ], signature=("sig", 1))
+    index.replace_source(("programs",), [
+        (("programs", 1), [("Fire drill evaluation", NAME_WEIGHT)], {"source": "program", "id": 1}),
+    ])
+    return index
+
+
+def ids(hits):
+    return [(hit["source"], hit["id"]) for hit in hits]
+
+
+def test_every_word_must_match_and_last_is_a_prefix():
+    index = build_index()
+    total, hits = index.search("fire dril")
+    assert total == 2 and set(ids(hits)) == {("otp", 1), ("program", 1)}
+    assert set(ids(index.search("fire dri")[1])) == {("otp", 1), ("program", 1), ("otp", 3)}
+    assert index.search("fire dr training")[0] == 0  # earlier words must be whole
+    assert index.search("extinguish")[0] == 1
+    assert index.search("   ")[0] == 0
+
+
+def test_bm25_ranks_shorter_and_name_matches_first():
+    _, hits = build_index().search("fire")
+    # Same weighted tf: the shorter document wins; a low-weight field ranks last
+    assert ids(hits)[0] == ("otp", 1)
+    assert ids(hits)[-1] == ("otp", 3)
+    assert hits[0]["score"] > hits[-1]["score"]
+
+
+def test_source_filter_and_limit():
+    index = build_index()
+    assert ids(index.search("fire", sources={"program"})[1]) == [("program", 1)]
+    total, hits = index.search("fire", limit=1)
+    assert total == 4 and len(hits) == 1
+
+
+def test_replace_source_drops_old_documents():
+    index = build_index()
+    assert index.signature(("otp",)) == ("sig", 1)
+    index.replace_source(("otp",), [(("otp", 1), [("Gas test", NAME_WEIGHT)], {"source": "otp", "id": 1})], ("sig", 2))
+    assert ids(index.search("fire")[1]) == [("program", 1)]
+    assert ids(index.search("gas")[1]) == [("otp", 1)]
+    assert index.stats()["documents"] == 2
+
+    index.delete(("otp",), ("otp", 1))
+    assert index.search("gas")[0] == 0
+    index.put(("otp",), ("otp", 9), [("Gas leak", NAME_WEIGHT)], {"source": "otp", "id": 9})
+    assert ids(index.search("gas")[1]) == [("otp", 9)]
+
+
+def test_search_endpoint_sees_saved_changes(client, otp_program):
+    base, program_id = otp_program
+    response = client.put(f"/otp/{program_id}/month/may?base={base}",
+                          json={"plan": 1, "actual": 0, "pic_name": "Zulkarnaen Searchable"})
+    assert response.status_code == 200
+
+    hits = client.get("/search", params={"q": "zulkarnaen search"}).json()["hits"]
+    assert {(hit["source"], hit["id"], hit["base"]) for hit in hits} == {("otp", program_id, base)}
+    assert client.get("/search", params={"q": "zulkarnaen", "source": "matrix"}).json()["total"] == 0
@@ -0,0 +1,73 @@
+import threading
+import time
+
+import pytest
+
+from singleflight import SingleFlight
+
+
+def test_concurrent_callers_share_one_call():
+    flights = SingleFlight()
+    started, release = threading.Event(), threading.Event()
+    calls, results = [], []
+
+    def build():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return {"built": len(calls)}
+
+    leader = threading.Thread(target=lambda: results.append(flights.do("key", build)))
+    leader.start()
+    started.wait(5)
+    followers = [threading.Thread(target=lambda: results.append(flights.do("key", build))) for _ in range(3)]
+    for thread in followers:
+        thread.start()
+    time.sleep(0.2)  # let the followers block on the leader's call
+    assert flights.in_flight() == 1
+    release.set()
+    for thread in [leader] + followers:
+        thread.join(5)
+
+    assert len(calls) == 1
+    assert len(results) == 4 and all(r is results[0] for r in results)
+    assert flights.in_flight() == 0
+
+
+def test_later_calls_run_again():
+    flights = SingleFlight()
+    counter = iter(range(10))
+    assert flights.do("key", lambda: next(counter)) == 0
+    assert flights.do("key", lambda: next(counter)) == 1
+
+
+def test_errors_reach_every_caller_and_are_not_kept():
+    flights = SingleFlight()
+    started, release = threading.Event(), threading.Event()
+    errors = []
+
+    def fail():
+        started.set()
+        release.wait(5)
+        raise ValueError("boom")
+
+    def call():
+        try:
+            flights.do("key", fail)
+        except ValueError as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=call)]
+    threads[0].start()
+    started.wait(5)
+    threads.append(threading.Thread(target=call))
+    threads[1].start()
+    time.sleep(0.2)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert len(errors) == 2
+    assert flights.do("key", lambda: "ok") == "ok"
+    with pytest.raises(KeyError):
+        flights.do("other", lambda: {}["missing"])
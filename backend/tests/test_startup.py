@@ -0,0 +1,46 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import startup
+
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+
+
+def test_heavy_imports_are_deferred():
+    code = "import sys, app; print(sorted(m for m in ('apscheduler', 'requests') if m in sys.modules))"
+    result = subprocess.run([sys.executable, "-c", code], cwd=BACKEND_DIR, env=dict(os.environ),
+                            capture_output=True, text=True, timeout=120)
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip().splitlines()[-1] == "[]"
+
+
+def test_phases_are_reported(client):
+    assert client.get("/health").json()["status"] == "ok"
+    phases = client.get("/admin/startup").json()["phases"]
+    assert {"imports", "database", "ready", "first_byte"} <= set(phases)
+    assert phases["imports"]["at"] <= phases["database"]["at"] <= phases["ready"]["at"]
+
+
+def test_phase_records_duration_and_mark_keeps_first_time():
+    with startup.phase("test-phase"):
+        pass
+    startup.mark("test-mark")
+    first = startup.report()["phases"]["test-mark"]["at"]
+    startup.mark("test-mark")
+
+    phases = startup.report()["phases"]
+    assert phases["test-phase"]["duration"] >= 0
+    assert phases["test-mark"]["at"] == first
+
+
+def test_warm_up_runs_every_task(client, monkeypatch):
+    monkeypatch.setattr(startup, "warmup_state", {"status": "pending"})
+    monkeypatch.setattr(startup, "warmup_tasks", startup.warmup_tasks + [("failing", lambda: 1 / 0)])
+    startup.warm_up()
+
+    tasks = startup.warmup_state["tasks"]
+    assert startup.warmup_state["status"] == "done"
+    assert tasks.pop("failing")["result"].startswith("error:")
+    assert tasks and all(task["result"] == "ok" for task in tasks.values())
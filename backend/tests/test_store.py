@@ -0,0 +1,87 @@
+import os
+
+import pytest
+
+from store import (bump_version, document_lock, etag, files_signature, parse_if_match, read_json, write_file,
+                   write_json, write_json_batch)
+
+
+@pytest.mark.parametrize("header, expected", [
+    (None, None),
+    ("*", None),
+    (' * ', None),
+    ('"3"', {3}),
+    ('W/"3"', {3}),
+    ("3", {3}),
+    ('"1", W/"2", 3', {1, 2, 3}),
+    ('"abc"', set()),
+])
+def test_parse_if_match(header, expected):
+    assert parse_if_match(header) == expected
+
+
+def test_etag_round_trips_through_if_match():
+    assert parse_if_match(etag(7)) == {7}
+
+
+def test_bump_version():
+    doc = {}
+    assert bump_version(doc) == 1
+    assert bump_version(doc) == 2 and doc["version"] == 2
+
+
+def test_write_json_round_trip_and_signature(tmp_path):
+    path = tmp_path / "doc.json"
+    assert read_json(path, dict) == {}
+    assert files_signature([path]) == (None,)
+
+    write_json(path, {"a": 1})
+    before = files_signature([path])
+    assert read_json(path) == {"a": 1}
+    write_json(path, {"a": 2})
+    assert files_signature([path]) != before
+    assert read_json(path) == {"a": 2}
+    assert not [p for p in tmp_path.iterdir() if p.name.endswith(".tmp")]
+
+
+def test_write_file_keeps_mode(tmp_path):
+    path = tmp_path / "doc.json"
+    write_file(path, {"a": 1})
+    assert os.stat(path).st_mode & 0o777 == 0o644
+    os.chmod(path, 0o640)
+    write_file(path, {"a": 2})
+    assert os.stat(path).st_mode & 0o777 == 0o640
+
+
+def test_write_json_batch_restores_on_failure(tmp_path):
+    first, second = tmp_path / "first.json", tmp_path / "second.json"
+    write_json(first, {"v": 1})
+    blocker = tmp_path / "blocker"
+    blocker.write_text("not a directory")
+
+    with pytest.raises(OSError):
+        write_json_batch([(first, {"v": 2}, {"v": 1}), (second, {"v": 2}, None),
+                          (blocker / "third.json", {"v": 2}, None)])
+    assert read_json(first) == {"v": 1}
+    assert not second.exists()
+
+
+def test_document_lock_is_shared_per_file(tmp_path):
+    path = tmp_path / "doc.json"
+    assert document_lock(path) is document_lock(tmp_path / "." / "doc.json")
+    with document_lock(path):
+        assert (tmp_path / ".doc.json.lock").exists()
+
+
+def test_stale_if_match_is_rejected(client, otp_program):
+    base, program_id = otp_program
+    response = client.get(f"/otp/{program_id}?base={base}")
+    current = response.headers["etag"]
+
+    updated = client.put(f"/otp/{program_id}/month/apr?base={base}", json={"plan": 2, "actual": 0},
+                         headers={"If-Match": current})
+    assert updated.status_code == 200
+    stale = client.put(f"/otp/{program_id}/month/apr?base={base}", json={"plan": 3, "actual": 0},
+                       headers={"If-Match": current})
+    assert stale.status_code == 412
+    assert client.get(f"/otp/{program_id}?base={base}").json()["months"]["apr"]["plan"] == 2
@@ -0,0 +1,128 @@
+from sync import ChangeLog, collapse_changes
+
+
+def test_since_returns_changes_after_version():
+    log = ChangeLog(capacity=10)
+    start = log.version
+    first = log.record(("otp", "duri"), 1, "jan", {"plan": 1})
+    second = log.record(("otp", "duri"), 2, "feb", {"plan": 2})
+
+    assert second == first + 1 == start + 2
+    version, changes = log.since(first)
+    assert version == second
+    assert [c["program_id"] for c in changes] == [2]
+    assert log.since(second) == (second, [])
+
+
+def test_evicted_versions_need_a_full_snapshot():
+    log = ChangeLog(capacity=3)
+    start = log.version
+    versions = [log.record(("otp", "duri"), i, "jan", {"plan": i}) for i in range(5)]
+
+    # The ring holds the last three changes; the floor is the newest evicted one
+    assert log.since(start)[1] is None
+    assert log.since(versions[0])[1] is None
+    assert [c["program_id"] for c in log.since(versions[1])[1]] == [2, 3, 4]
+
+
+def test_versions_from_another_process_need_a_full_snapshot():
+    log = ChangeLog()
+    log.record(("otp", "duri"), 1, "jan", {"plan": 1})
+
+    assert log.since(log.version + 1)[1] is None
+    assert log.since(0)[1] is None
+
+
+def test_store_version_tracks_last_change():
+    log = ChangeLog()
+    assert log.store_version(("otp", "duri")) == 0
+    version = log.record(("otp", "duri"), 1, "jan", {"plan": 1})
+    log.record(("otp", "narogong"), 1, "jan", {"plan": 1})
+    assert log.store_version(("otp", "duri")) == version
+
+
+def test_collapse_keeps_latest_cell_values():
+    log = ChangeLog()
+    start = log.version
+    log.record(("otp", "duri"), 1, "jan", {"plan": 1})
+    log.record(("otp", "duri"), 1, "jan", {"plan": 5})
+    log.record(("otp", "duri"), 1, program={"name": "A"})
+    log.record(("otp", "duri"), 2, deleted=True)
+    log.record(("otp", "duri"), meta={"year": 2027})
+    log.record(("kpi",), document={"kpi": {}})
+
+    collapsed = collapse_changes(log.since(start)[1])
+    assert collapsed["otp"]["duri"]["1"] == {"months": {"jan": {"plan": 5}}, "program": {"name": "A"}}
+    assert collapsed["otp"]["duri"]["2"] == {"deleted": True}
+    assert collapsed["otp"]["duri"]["meta"] == {"year": 2027}
+    assert collapsed["kpi"] == {"document": {"kpi": {}}}
+
+
+def test_sync_endpoint_sends_delta_then_snapshot(client, otp_program):
+    base, program_id = otp_program
+    since = client.get("/sync").json()["version"]
+
+    response = client.put(f"/otp/{program_id}/month/mar?base={base}", json={"plan": 4, "actual": 1})
+    assert response.status_code == 200
+
+    delta = client.get(f"/sync?since={since}").json()
+    assert delta["full"] is False
+    assert delta["changes"]["otp"][base][str(program_id)]["months"]["mar"]["plan"] == 4
+    assert client.get("/sync?since=0").json()["full"] is True
+
+
+def test_writes_are_recorded_while_the_document_is_locked(client, monkeypatch):
+    import app
+    from store import document_lock
+
+    held = []
+    record = app.change_log.record
+    monkeypatch.setattr(app.change_log, "record", lambda store, *args, **kwargs: (
+        held.append(document_lock(app.KPI_DATA_FILE)._thread_lock.locked()), record(store, *args, **kwargs))[1])
+
+    assert client.put("/kpi/2026", json={"man_hours": 1000}).status_code == 200
+    assert held == [True]
+
+
+def test_files_changed_without_a_recorded_change_start_a_new_epoch(tmp_path):
+    import store
+
+    path = tmp_path / "otp.json"
+    store.write_json(path, {"programs": []})
+    log = ChangeLog()
+    log.store_file = lambda key: path
+    assert log.check_files([path]) is False
+
+    # A write recorded by this process is answered from the ring
+    store.write_json(path, {"programs": [{"id": 1}]})
+    version = log.record(("otp", "duri"), 1, program={"name": "A"})
+    assert log.check_files([path]) is False
+    assert log.since(version - 1)[1]
+
+    # A write from another process is not
+    store.write_json(path, {"programs": []})
+    assert log.check_files([path]) is True
+    assert log.since(version)[1] is None
+    assert log.since(log.version) == (log.version, [])
+
+
+def test_sync_endpoint_sends_a_snapshot_after_an_outside_write(client, otp_program):
+    import app
+    import store
+
+    base, program_id = otp_program
+    since = client.get("/sync").json()["version"]
+    assert client.get(f"/sync?since={since}").json()["full"] is False
+
+    path = app.get_otp_file_path(base)
+    document = store.read_json(path)
+    store.write_json(path, dict(document, note="written by the importer CLI"))
+    try:
+        response = client.get(f"/sync?since={since}").json()
+        assert response["full"] is True
+        assert response["snapshot"]["otp"][base]["note"] == "written by the importer CLI"
+        assert client.get(f"/sync?since={response['version']}").json()["full"] is False
+    finally:
+        with store.document_lock(path):
+            store.write_json(path, document)
+            app.change_log.record(app.otp_store_key(base), document=document)
@@ -0,0 +1,98 @@
+"""Latency of the multi-base read paths as the base registry grows.
+
+Copies the shipped Indonesia templates into a temporary data directory for
+3, 10 and 50 synthetic bases, then times ``/otp?base=all`` and
+``/calendar-events`` in-process.
+
+    python benchmarks/base_scaling.py [--scales 3 10 50] [--repeat 30]
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+TEMPLATE_DIR = BACKEND_DIR / "data"
+CATEGORIES = ["audit", "training", "drill", "meeting"]
+
+
+def _copy(source: Path, target: Path):
+    """Copy a shipped document as a plain file (the shipped ones may be overlays)."""
+    from store import read_json
+    with open(target, "w") as f:
+        json.dump(read_json(source), f)
+
+
+def build_data_dir(target: Path, n_bases: int):
+    """Write a data directory with ``n_bases`` copies of the base templates."""
+    import overlay
+    target.mkdir(parents=True, exist_ok=True)
+    for path in TEMPLATE_DIR.glob("*.json"):
+        if path.name.endswith(overlay.OVERLAY_SUFFIX):
+            path = overlay.document_path(path)
+        if "_indonesia_" not in path.name and path.name != "bases.json":
+            _copy(path, target / path.name)
+    bases = [{"id": f"site{i:02d}", "name": f"Site {i:02d}"} for i in range(1, n_bases + 1)]
+    for base in bases:
+        _copy(TEMPLATE_DIR / "otp_indonesia_narogong.json", target / f"otp_indonesia_{base['id']}.json")
+        for category in CATEGORIES:
+            _copy(TEMPLATE_DIR / f"matrix_{category}_indonesia_narogong.json",
+                  target / f"matrix_{category}_indonesia_{base['id']}.json")
+    with open(target / "bases.json", "w") as f:
+        json.dump({"bases": bases}, f)
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scales", type=int, nargs="+", default=[3, 10, 50])
+    parser.add_argument("--repeat", type=int, default=30)
+    args = parser.parse_args()
+
+    workdir = Path(tempfile.mkdtemp(prefix="hse-bench-"))
+    os.environ["DATA_DIR"] = str(workdir / "data")
+    os.environ["DATABASE_URL"] = f"sqlite:///{workdir / 'bench.db'}"
+    sys.path.insert(0, str(BACKEND_DIR))
+    from fastapi.testclient import TestClient
+    import app as hse_app
+
+    results = []
+    try:
+        with TestClient(hse_app.app) as client:
+            for n_bases in args.scales:
+                shutil.rmtree(workdir / "data", ignore_errors=True)
+                build_data_dir(workdir / "data", n_bases)
+                for route in ["/otp?base=all", "/calendar-events"]:
+                    client.get(route)  # warm-up
+                    samples = []
+                    for _ in range(args.repeat):
+                        start = time.perf_counter()
+                        response = client.get(route)
+                        samples.append((time.perf_counter() - start) * 1000)
+                        response.raise_for_status()
+                    results.append({
+                        "bases": n_bases,
+                        "route": route,
+                        "p50_ms": round(statistics.median(samples), 2),
+                        "p95_ms": round(percentile(samples, 95), 2),
+                        "bytes": len(response.content),
+                    })
+                    print(f"{n_bases:>3} bases  {route:<18} p50 {results[-1]['p50_ms']:>8.2f} ms"
+                          f"  p95 {results[-1]['p95_ms']:>8.2f} ms  {results[-1]['bytes']} B")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
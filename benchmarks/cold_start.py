@@ -0,0 +1,111 @@
+"""Cold-start timing for the backend server.
+
+Starts a fresh uvicorn process several times and measures:
+- time until /health answers (time to first byte after process spawn)
+- latency of the first dashboard requests (OTP, Matrix, statistics, calendar)
+- the server's own phase report from /admin/startup
+
+Each run is done with and without the background warm-up (HSE_WARMUP=1).
+In warm-up runs the dashboard requests are sent once warm-up has finished,
+so the numbers show what a visitor arriving a few seconds after a deploy
+sees.
+
+    python benchmarks/cold_start.py --runs 5
+"""
+import argparse
+import json
+import os
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+BACKEND_DIR = ROOT / "backend"
+FIRST_REQUESTS = ["/otp?base=all", "/matrix?category=audit&base=all", "/statistics", "/calendar-events"]
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def get(url: str, timeout: float = 30):
+    start = time.perf_counter()
+    with urllib.request.urlopen(url, timeout=timeout) as response:
+        body = response.read()
+    return time.perf_counter() - start, body
+
+
+def one_run(warmup: bool, workdir: Path) -> dict:
+    port = free_port()
+    env = dict(os.environ, DATABASE_URL=f"sqlite:///{workdir / 'cold.db'}", BREVO_API_KEY="",
+               HSE_WARMUP="1" if warmup else "0")
+    base_url = f"http://127.0.0.1:{port}"
+    spawned = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while True:
+            try:
+                get(f"{base_url}/health", timeout=1)
+                break
+            except OSError:
+                if process.poll() is not None:
+                    raise RuntimeError("server exited during startup")
+                time.sleep(0.005)
+        health_s = time.perf_counter() - spawned
+
+        if warmup:
+            while json.loads(get(f"{base_url}/health")[1])["warmup"] != "done":
+                time.sleep(0.02)
+        first = {path: round(get(base_url + path)[0] * 1000, 2) for path in FIRST_REQUESTS}
+        report = json.loads(get(f"{base_url}/admin/startup")[1])
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+    return {"health_ms": round(health_s * 1000, 1), "first_requests_ms": first, "phases": report["phases"],
+            "warmup": report["warmup"]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure server cold start, phase by phase.")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--output", type=Path, default=None)
+    args = parser.parse_args()
+
+    workdir = Path(tempfile.mkdtemp(prefix="hse-cold-"))
+    results = {}
+    try:
+        for warmup in (False, True):
+            runs = [one_run(warmup, workdir) for _ in range(args.runs)]
+            phase_names = runs[0]["phases"].keys()
+            results["warmup" if warmup else "no_warmup"] = {
+                "health_ms_median": statistics.median(r["health_ms"] for r in runs),
+                "first_requests_ms_median": {
+                    path: statistics.median(r["first_requests_ms"][path] for r in runs) for path in FIRST_REQUESTS},
+                "phase_at_s_median": {
+                    name: statistics.median(r["phases"][name]["at"] for r in runs if name in r["phases"])
+                    for name in phase_names},
+                "runs": runs,
+            }
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        args.output.write_text(output)
+    for mode, stats in results.items():
+        print(f"{mode:<10} /health after {stats['health_ms_median']} ms; phases {stats['phase_at_s_median']}")
+        print(f"{'':<10} first requests (ms): {stats['first_requests_ms_median']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+"""Synthetic data generator for the benchmark suite.
+
+Writes a complete ``data/`` directory (OTP per base, OTP Asia, Matrix per
+category and base, KPI, LL, bases.json) plus HSEProgram rows in a SQLite
+database, at a configurable scale. Generation is seeded, so the same
+parameters always produce byte-identical files.
+
+    python benchmarks/datagen.py --out /tmp/hse-data --programs 100 --bases 10
+"""
+import argparse
+import json
+import random
+import sys
+from dataclasses import asdict, dataclass
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+MONTHS = ["jan", "feb", "mar", "apr", "may", "jun", "jul", "aug", "sep", "oct", "nov", "dec"]
+CATEGORIES = ["audit", "training", "drill", "meeting"]
+PLAN_TYPES = ["Monthly", "Quarterly", "Annually", "4 report/Month", "Semester"]
+REFERENCES = ["Certification", "Internal", "Client Requirement", "Regulation", "Corporate"]
+WORDS = ["Safety", "Contractor", "Audit", "Emergency", "Drill", "Fire", "Inspection", "Driver",
+         "Training", "Meeting", "Review", "Permit", "Hazard", "Environmental", "Waste", "Report",
+         "Leadership", "Walkthrough", "First Aid", "H2S", "Rigging", "Lifting", "Confined Space"]
+PEOPLE = ["Andi", "Budi", "Citra", "Dewi", "Eko", "Fajar", "Gita", "Hadi", "Indra", "Joko",
+          "Kurnia", "Lestari", "Made", "Nina", "Oki", "Putri", "Rudi", "Sari", "Tono", "Wati"]
+PROGRAM_TYPES = ["hse_plan", "hse_committee", "spr", "hazid_hazop", "safety_training", "inspection"]
+
+
+@dataclass
+class Scale:
+    programs: int = 60        # programs per OTP / Matrix document
+    bases: int = 3            # Indonesian bases in the registry
+    categories: int = 4       # Matrix categories populated (of audit/training/drill/meeting)
+    years: int = 1            # KPI years (and year span of generated dates)
+    events: float = 0.25      # share of month cells with a plan date / PIC
+    hse_programs: int = 200   # HSEProgram rows in SQLite
+    seed: int = 1
+    year: int = 2026
+
+
+def _name(rng):
+    return " ".join(rng.sample(WORDS, rng.randint(2, 5)))
+
+
+def _person(rng):
+    first = rng.choice(PEOPLE)
+    return first, f"{first.lower()}{rng.randint(1, 99)}@example.com"
+
+
+def _month_cell(rng, scale: Scale, month_index: int):
+    plan = rng.choice([0, 0, 1, 1, 2, 4])
+    cell = {"plan": plan, "actual": rng.randint(0, plan) if plan else 0}
+    if rng.random() < scale.events:
+        pic_name, pic_email = _person(rng)
+        manager, manager_email = _person(rng)
+        day = rng.randint(1, 28)
+        cell.update({
+            "wpts_id": f"WPTS-{rng.randint(1000, 9999)}",
+            "plan_date": date(scale.year, month_index + 1, day).isoformat(),
+            "impl_date": date(scale.year, month_index + 1, min(28, day + rng.randint(0, 5))).isoformat()
+            if cell["actual"] else "",
+            "pic_name": pic_name,
+            "pic_manager": manager,
+            "pic_email": pic_email,
+            "pic_manager_email": manager_email,
+        })
+    return cell
+
+
+def _programs(rng, scale: Scale, with_reference: bool, progress_fn):
+    programs = []
+    for program_id in range(1, scale.programs + 1):
+        program = {"id": program_id, "name": _name(rng)}
+        if with_reference:
+            program["reference"] = rng.choice(REFERENCES)
+        program.update({
+            "plan_type": rng.choice(PLAN_TYPES),
+            "due_date": None,
+            "months": {m: _month_cell(rng, scale, i) for i, m in enumerate(MONTHS)},
+        })
+        program["progress"] = progress_fn(program)
+        programs.append(program)
+    return programs
+
+
+def _write(path: Path, data, indent=2):
+    with open(path, "w") as f:
+        json.dump(data, f, indent=indent)
+
+
+def generate_data_dir(out: Path, scale: Scale):
+    """Write a full synthetic data directory; return the base ids."""
+    from progress import calculate_progress, calculate_progress_asia, calculate_matrix_progress
+
+    rng = random.Random(scale.seed)
+    out.mkdir(parents=True, exist_ok=True)
+    bases = [{"id": f"site{i:02d}", "name": f"Site {i:02d}"} for i in range(1, scale.bases + 1)]
+    _write(out / "bases.json", {"bases": bases})
+
+    _write(out / "otp_data.json", {"year": scale.year, "programs": _programs(rng, scale, False, calculate_progress)})
+    _write(out / "otp_asia_data.json",
+           {"year": scale.year, "programs": _programs(rng, scale, False, calculate_progress_asia)})
+    for base in bases:
+        _write(out / f"otp_indonesia_{base['id']}.json",
+               {"year": scale.year, "programs": _programs(rng, scale, False, calculate_progress)})
+
+    for category in CATEGORIES[:scale.categories]:
+        header = {"year": scale.year, "category": category, "region": "indonesia"}
+        _write(out / f"matrix_{category}_indonesia.json",
+               dict(header, programs=_programs(rng, scale, True, calculate_matrix_progress)))
+        for base in bases:
+            _write(out / f"matrix_{category}_indonesia_{base['id']}.json",
+                   dict(header, programs=_programs(rng, scale, True, calculate_matrix_progress)))
+
+    years = [str(scale.year - i) for i in range(scale.years)]
+    metrics = ["fatality", "trir", "pvir", "environment", "fire", "firstaid", "occupational"]
+    _write(out / "kpi_data.json", {
+        "man_hours": {y: rng.randint(100000, 900000) for y in years},
+        "kpi": {y: {m: {"target": 0, "result": round(rng.random() * 2, 2)} for m in metrics} for y in years},
+    }, indent=4)
+    _write(out / "ll_indicator.json", {
+        "year": scale.year,
+        "lagging": [{"id": i, "name": _name(rng), "icon": "", "target": "0", "actual": str(rng.randint(0, 3)),
+                     "intent": ""} for i in range(1, 11)],
+        "leading": [{"id": i, "name": _name(rng), "icon": "", "target": "12", "actual": str(rng.randint(0, 12)),
+                     "intent": ""} for i in range(1, 16)],
+    }, indent=4)
+    return [b["id"] for b in bases]
+
+
+def generate_programs(database_url: str, scale: Scale):
+    """Insert HSEProgram rows into the database at ``database_url``."""
+    from sqlmodel import Session, SQLModel, create_engine
+    from models import HSEProgram
+
+    rng = random.Random(scale.seed + 1)
+    engine = create_engine(database_url)
+    SQLModel.metadata.create_all(engine)
+    start = datetime(scale.year - scale.years + 1, 1, 1)
+    span = 365 * scale.years
+    with Session(engine) as session:
+        for _ in range(scale.hse_programs):
+            pic_name, pic_email = _person(rng)
+            session.add(HSEProgram(
+                title=_name(rng),
+                program_type=rng.choice(PROGRAM_TYPES),
+                planned_date=start + timedelta(days=rng.randrange(span)),
+                status=rng.choice(["pending", "pending", "Closed"]),
+                pic_name=pic_name,
+                manager_email=pic_email,
+            ))
+        session.commit()
+    engine.dispose()
+
+
+def add_arguments(parser: argparse.ArgumentParser):
+    defaults = Scale()
+    for field, value in asdict(defaults).items():
+        parser.add_argument(f"--{field.replace('_', '-')}", type=type(value), default=value)
+
+
+def scale_from_args(args) -> Scale:
+    return Scale(**{field: getattr(args, field) for field in asdict(Scale())})
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--out", type=Path, required=True, help="Directory to write data files into")
+    parser.add_argument("--database-url", default=None, help="Also insert HSEProgram rows here")
+    add_arguments(parser)
+    args = parser.parse_args()
+    scale = scale_from_args(args)
+    generate_data_dir(args.out, scale)
+    if args.database_url:
+        generate_programs(args.database_url, scale)
+    print(f"Wrote synthetic data to {args.out}: {asdict(scale)}")
+
+
+if __name__ == "__main__":
+    main()
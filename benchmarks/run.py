@@ -0,0 +1,425 @@
+"""Reproducible load test for the backend API.
+
+Generates a synthetic data set (see datagen.py), starts the app in-process
+behind an ASGI test client and drives every endpoint with read-only, mixed
+and write-heavy profiles. Results (p50/p95/p99 latency per profile and per
+endpoint, throughput, peak RSS) are written as JSON so runs on different
+commits can be compared:
+
+    python benchmarks/run.py --output before.json
+    git checkout my-branch
+    python benchmarks/run.py --output after.json --baseline before.json
+
+With --baseline, any profile or endpoint whose p95 grew by more than
+--tolerance (default 25%) is reported and the exit status is 1.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import resource
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+BACKEND_DIR = ROOT / "backend"
+IMPORT_SHEET = BACKEND_DIR / "MEETING.TXT"
+sys.path.insert(0, str(BACKEND_DIR))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+import datagen  # noqa: E402
+
+MONTHS = datagen.MONTHS
+MIN_COMPARE_SAMPLES = 20
+# A few distinct evidence files, so repeated uploads exercise blob dedupe
+EVIDENCE_PAYLOADS = [random.Random(i).randbytes(64 * 1024) for i in range(4)]
+PROFILES = {
+    # profile: share of requests that are writes
+    "read": 0.0,
+    "mixed": 0.2,
+    "write": 0.8,
+}
+
+
+class Workload:
+    """Builds concrete requests for each operation from a seeded RNG."""
+
+    def __init__(self, rng: random.Random, scale: datagen.Scale, bases: list):
+        self.rng = rng
+        self.scale = scale
+        self.bases = bases
+        self.categories = datagen.CATEGORIES[:scale.categories]
+        self.created = {"otp": [], "otp-asia": [], "matrix": [], "programs": [], "projects": [], "attachments": []}
+        self.lock = threading.Lock()
+
+    def program_id(self):
+        return self.rng.randint(1, self.scale.programs)
+
+    def base(self, allow_all=True):
+        choices = self.bases + (["all"] if allow_all else [])
+        return self.rng.choice(choices)
+
+    def month(self):
+        return self.rng.choice(MONTHS)
+
+    def category(self):
+        return self.rng.choice(self.categories)
+
+    def db_id(self):
+        return self.rng.randint(1, max(1, self.scale.hse_programs))
+
+    def asset_name(self):
+        import assets
+        return self.rng.choice(sorted(assets.get_bundle().assets))
+
+    def evidence(self):
+        return self.rng.choice(EVIDENCE_PAYLOADS)
+
+    def attachment_id(self):
+        with self.lock:
+            return self.rng.choice(self.created["attachments"]) if self.created["attachments"] else 1
+
+    def month_patch(self):
+        return {"plan": self.rng.randint(0, 4), "actual": self.rng.randint(0, 4),
+                "pic_email": f"bench{self.rng.randint(1, 50)}@example.com"}
+
+    def remember(self, kind, response):
+        try:
+            body = response.json()
+        except ValueError:
+            return
+        new_id = body.get("program", {}).get("id") if isinstance(body.get("program"), dict) else body.get("id")
+        if new_id is not None:
+            with self.lock:
+                self.created[kind].append(new_id)
+
+    def take(self, kind):
+        with self.lock:
+            return self.created[kind].pop() if self.created[kind] else None
+
+
+# Each operation: (name, route template, kind, weight, build(workload) -> (method, url, kwargs[, remember]))
+# Weight 0 operations only run in the smoke pass that touches every endpoint once.
+OPERATIONS = [
+    ("index", "/", "read", 1, lambda w: ("GET", "/", {"headers": {"Accept-Encoding": "br, gzip"}})),
+    ("asset", "/assets/{name}", "read", 1,
+     lambda w: ("GET", f"/assets/{w.asset_name()}", {"headers": {"Accept-Encoding": "br, gzip"}})),
+    ("program_types", "/program-types", "read", 1, lambda w: ("GET", "/program-types", {})),
+    ("bases", "/bases", "read", 1, lambda w: ("GET", "/bases", {})),
+    ("health", "/health", "read", 1, lambda w: ("GET", "/health", {})),
+    ("admin_startup", "/admin/startup", "read", 0, lambda w: ("GET", "/admin/startup", {})),
+    ("metrics", "/metrics", "read", 1, lambda w: ("GET", "/metrics", {})),
+    ("admin_jobs", "/admin/jobs", "read", 0, lambda w: ("GET", "/admin/jobs", {})),
+    ("admin_outbox", "/admin/outbox", "read", 0, lambda w: ("GET", "/admin/outbox", {})),
+    ("admin_profiles", "/admin/profiles", "read", 0, lambda w: ("GET", "/admin/profiles", {})),
+    ("admin_profile_file", "/admin/profiles/{filename}", "read", 0,
+     lambda w: ("GET", "/admin/profiles/missing.speedscope.json", {})),
+    ("statistics", "/statistics", "read", 4, lambda w: ("GET", "/statistics", {})),
+    ("programs", "/programs", "read", 3, lambda w: ("GET", "/programs", {})),
+    ("program_get", "/programs/{program_id}", "read", 2, lambda w: ("GET", f"/programs/{w.db_id()}", {})),
+    ("projects", "/projects", "read", 2, lambda w: ("GET", "/projects", {})),
+    ("tasks", "/tasks", "read", 1, lambda w: ("GET", "/tasks", {})),
+    ("schedules", "/schedules", "read", 2, lambda w: ("GET", "/schedules", {})),
+    ("calendar_events", "/calendar-events", "read", 6, lambda w: ("GET", "/calendar-events", {})),
+    ("calendar_ics", "/calendar.ics", "read", 2, lambda w: ("GET", "/calendar.ics", {})),
+    ("calendar_base_ics", "/calendar/base/{base}.ics", "read", 2,
+     lambda w: ("GET", f"/calendar/base/{w.base(False)}.ics", {})),
+    ("calendar_category_ics", "/calendar/category/{category}.ics", "read", 1,
+     lambda w: ("GET", f"/calendar/category/{w.category()}.ics", {})),
+    ("calendar_pic_ics", "/calendar/pic/{email}.ics", "read", 2,
+     lambda w: ("GET", f"/calendar/pic/{w.rng.choice(datagen.PEOPLE).lower()}{w.rng.randint(1, 99)}@example.com.ics",
+                {})),
+    ("kpi", "/kpi", "read", 2, lambda w: ("GET", "/kpi", {})),
+    ("kpi_summary", "/kpi/summary", "read", 2, lambda w: ("GET", "/kpi/summary", {})),
+    ("kpi_year", "/kpi/{year}", "read", 2, lambda w: ("GET", f"/kpi/{w.scale.year}", {})),
+    ("ll_indicator", "/ll-indicator", "read", 2, lambda w: ("GET", "/ll-indicator", {})),
+    ("otp", "/otp", "read", 8, lambda w: ("GET", f"/otp?base={w.base()}", {})),
+    ("otp_projected", "/otp", "read", 3,
+     lambda w: ("GET", f"/otp?base={w.base()}&fields=plan,actual&months=q{w.rng.randint(1, 4)}", {})),
+    ("matrix_projected", "/matrix", "read", 3,
+     lambda w: ("GET", f"/matrix?category={w.category()}&base={w.base()}&fields=plan,actual&months=q{w.rng.randint(1, 4)}",
+                {})),
+    ("otp_program", "/otp/{program_id}", "read", 3, lambda w: ("GET", f"/otp/{w.program_id()}?base={w.base()}", {})),
+    ("otp_asia", "/otp-asia", "read", 3, lambda w: ("GET", "/otp-asia", {})),
+    ("otp_asia_program", "/otp-asia/{program_id}", "read", 1, lambda w: ("GET", f"/otp-asia/{w.program_id()}", {})),
+    ("matrix", "/matrix", "read", 8,
+     lambda w: ("GET", f"/matrix?category={w.category()}&base={w.base()}", {})),
+    ("matrix_program", "/matrix/{program_id}", "read", 2,
+     lambda w: ("GET", f"/matrix/{w.program_id()}?category={w.category()}&base={w.base()}", {})),
+    ("sync_full", "/sync", "read", 1, lambda w: ("GET", "/sync", {})),
+    ("search", "/search", "read", 2,
+     lambda w: ("GET", f"/search?q={w.rng.choice(datagen.WORDS).lower()[:5]}", {})),
+    ("my_items", "/my-items", "read", 2,
+     lambda w: ("GET", f"/my-items?email={w.rng.choice(datagen.PEOPLE).lower()}{w.rng.randint(1, 99)}@example.com",
+                {})),
+    ("overdue", "/overdue", "read", 2, lambda w: ("GET", f"/overdue?base={w.base(False)}", {})),
+    ("at_risk", "/at-risk", "read", 1, lambda w: ("GET", f"/at-risk?category={w.category()}", {})),
+    ("export", "/export/{fmt}", "read", 1,
+     lambda w: ("GET", f"/export/{w.rng.choice(['csv', 'xlsx'])}?base={w.base()}&layout={w.rng.choice(['grid', 'months'])}",
+                {})),
+    ("attachments_list", "/attachments", "read", 1, lambda w: ("GET", f"/attachments?owner=otp:{w.base(False)}", {})),
+    ("attachment_download", "/attachments/{attachment_id}", "read", 1,
+     lambda w: ("GET", f"/attachments/{w.attachment_id()}",
+                {"headers": {"Range": "bytes=0-4095"}} if w.rng.random() < 0.5 else {})),
+    ("years", "/years", "read", 1, lambda w: ("GET", "/years", {})),
+    ("trends", "/trends", "read", 2,
+     lambda w: ("GET", f"/trends?source=matrix&category={w.category()}&base={w.base()}", {})),
+    ("archive", "/archive/{year}", "read", 0, lambda w: ("GET", f"/archive/{w.scale.year}", {})),
+    ("archive_document", "/archive/{year}/{source}", "read", 0,
+     lambda w: ("GET", f"/archive/{w.scale.year}/otp?base={w.base(False)}", {})),
+    ("import_dry_run", "/import/{target}", "write", 0,
+     lambda w: ("POST", f"/import/meeting?base={w.base()}&dry_run=true", {"content": IMPORT_SHEET.read_bytes()})),
+
+    ("otp_month_update", "/otp/{program_id}/month/{month}", "write", 8,
+     lambda w: ("PUT", f"/otp/{w.program_id()}/month/{w.month()}?base={w.base()}", {"json": w.month_patch()})),
+    ("otp_asia_month_update", "/otp-asia/{program_id}/month/{month}", "write", 3,
+     lambda w: ("PUT", f"/otp-asia/{w.program_id()}/month/{w.month()}", {"json": w.month_patch()})),
+    ("matrix_month_update", "/matrix/{program_id}/month/{month}", "write", 8,
+     lambda w: ("PUT", f"/matrix/{w.program_id()}/month/{w.month()}?category={w.category()}&base={w.base()}",
+                {"json": w.month_patch()})),
+    ("kpi_update", "/kpi/{year}", "write", 1,
+     lambda w: ("PUT", f"/kpi/{w.scale.year}", {"json": {"trir_result": round(w.rng.random(), 2)}})),
+    ("ll_update", "/ll-indicator", "write", 1,
+     lambda w: ("PUT", "/ll-indicator", {"json": {"indicator_type": "leading", "indicator_id": w.rng.randint(1, 15),
+                                                  "actual": str(w.rng.randint(0, 12))}})),
+    ("ll_year", "/ll-indicator/year", "write", 0, lambda w: ("PUT", f"/ll-indicator/year?year={w.scale.year}", {})),
+    ("otp_create", "/otp", "write", 1, lambda w: ("POST", "/otp", {"json": {"name": "Bench program"}}, "otp")),
+    ("otp_program_update", "/otp/{program_id}", "write", 1,
+     lambda w: ("PUT", f"/otp/{w.program_id()}", {"json": {"plan_type": "Monthly"}})),
+    ("otp_delete", "/otp/{program_id}", "write", 1, lambda w: ("DELETE", f"/otp/{w.take('otp') or 0}", {})),
+    ("otp_year", "/otp/year/{year}", "write", 0, lambda w: ("PUT", f"/otp/year/{w.scale.year}", {})),
+    ("otp_asia_create", "/otp-asia", "write", 1,
+     lambda w: ("POST", "/otp-asia", {"json": {"name": "Bench program"}}, "otp-asia")),
+    ("otp_asia_program_update", "/otp-asia/{program_id}", "write", 1,
+     lambda w: ("PUT", f"/otp-asia/{w.program_id()}", {"json": {"plan_type": "Monthly"}})),
+    ("otp_asia_delete", "/otp-asia/{program_id}", "write", 1,
+     lambda w: ("DELETE", f"/otp-asia/{w.take('otp-asia') or 0}", {})),
+    ("otp_asia_year", "/otp-asia/year/{year}", "write", 0, lambda w: ("PUT", f"/otp-asia/year/{w.scale.year}", {})),
+    ("matrix_create", "/matrix", "write", 1,
+     lambda w: ("POST", "/matrix?category=audit", {"json": {"name": "Bench program"}}, "matrix")),
+    ("matrix_program_update", "/matrix/{program_id}", "write", 1,
+     lambda w: ("PUT", f"/matrix/{w.program_id()}?category=audit", {"json": {"reference": "Bench"}})),
+    ("matrix_delete", "/matrix/{program_id}", "write", 1,
+     lambda w: ("DELETE", f"/matrix/{w.take('matrix') or 0}?category=audit", {})),
+    ("program_create", "/programs", "write", 1,
+     lambda w: ("POST", "/programs", {"json": {"title": "Bench", "planned_date": f"{w.scale.year}-06-01T00:00:00"}},
+                "programs")),
+    ("program_status", "/update-program/{program_id}", "write", 1,
+     lambda w: ("POST", f"/update-program/{w.db_id()}",
+                {"json": {"actual_date": f"{w.scale.year}-06-02T00:00:00", "status": "Closed", "wpts_number": "W-1"}})),
+    ("program_update", "/programs/{program_id}", "write", 1,
+     lambda w: ("PUT", f"/programs/{w.db_id()}", {"json": {"pic_name": "Bench"}})),
+    ("program_delete", "/programs/{program_id}", "write", 1,
+     lambda w: ("DELETE", f"/programs/{w.take('programs') or 0}", {})),
+    ("project_create", "/projects", "write", 1,
+     lambda w: ("POST", "/projects", {"json": {"name": "Bench project"}}, "projects")),
+    ("project_delete", "/projects/{project_id}", "write", 1,
+     lambda w: ("DELETE", f"/projects/{w.take('projects') or 0}", {})),
+    ("task_create", "/tasks", "write", 1,
+     lambda w: ("POST", "/tasks", {"json": {"project_id": "1", "code": "B", "title": "Bench task"}})),
+    ("task_update", "/tasks/{task_id}", "write", 1,
+     lambda w: ("PUT", "/tasks/1", {"json": {"status": "InProgress"}})),
+    ("otp_evidence_upload", "/otp/{program_id}/month/{month}/evidence", "write", 2,
+     lambda w: ("POST", f"/otp/{w.program_id()}/month/{w.month()}/evidence?base={w.base(False)}&filename=evidence.pdf",
+                {"content": w.evidence()}, "attachments")),
+    ("otp_asia_evidence_upload", "/otp-asia/{program_id}/month/{month}/evidence", "write", 0,
+     lambda w: ("POST", f"/otp-asia/{w.program_id()}/month/{w.month()}/evidence?filename=evidence.pdf",
+                {"content": w.evidence()}, "attachments")),
+    ("matrix_evidence_upload", "/matrix/{program_id}/month/{month}/evidence", "write", 1,
+     lambda w: ("POST", f"/matrix/{w.program_id()}/month/{w.month()}/evidence?category={w.category()}"
+                        f"&base={w.base(False)}&filename=evidence.pdf", {"content": w.evidence()}, "attachments")),
+    ("program_evidence_upload", "/programs/{program_id}/evidence", "write", 0,
+     lambda w: ("POST", f"/programs/{w.db_id()}/evidence?filename=evidence.pdf", {"content": w.evidence()},
+                "attachments")),
+    ("task_attachment_upload", "/tasks/{task_id}/attachments", "write", 0,
+     lambda w: ("POST", "/tasks/1/attachments?filename=evidence.pdf", {"content": w.evidence()}, "attachments")),
+    ("attachment_delete", "/attachments/{attachment_id}", "write", 0,
+     lambda w: ("DELETE", f"/attachments/{w.take('attachments') or 0}", {})),
+    ("attachment_gc", "/admin/attachments/gc", "write", 0, lambda w: ("POST", "/admin/attachments/gc", {})),
+    ("outbox_retry", "/admin/outbox/{message_id}/retry", "write", 0,
+     lambda w: ("POST", "/admin/outbox/1/retry", {})),
+    ("year_rollover", "/years/rollover", "write", 0,
+     lambda w: ("POST", f"/years/rollover?to_year={w.scale.year + 1}", {})),
+    ("test_reminders", "/test-reminders", "write", 0, lambda w: ("POST", "/test-reminders", {})),
+    ("test_reminder", "/test-reminder", "write", 0, lambda w: ("POST", "/test-reminder", {})),
+]
+
+
+def percentiles(samples):
+    if not samples:
+        return {"p50": None, "p95": None, "p99": None, "mean": None}
+    ordered = sorted(samples)
+
+    def pick(pct):
+        return round(ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))], 3)
+
+    return {"p50": pick(50), "p95": pick(95), "p99": pick(99), "mean": round(statistics.fmean(ordered), 3)}
+
+
+def peak_rss_kb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == "darwin" else peak
+
+
+def execute(client, workload, operation, latencies, errors):
+    name, _, _, _, build = operation
+    request = build(workload)
+    method, url, kwargs = request[:3]
+    start = time.perf_counter()
+    response = client.request(method, url, **kwargs)
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    latencies.setdefault(name, []).append(elapsed_ms)
+    if response.status_code >= 500:
+        errors.append(f"{method} {url} -> {response.status_code}")
+    if len(request) > 3 and response.status_code < 300:
+        workload.remember(request[3], response)
+
+
+def plan_requests(rng, write_share, count):
+    reads = [op for op in OPERATIONS if op[2] == "read" and op[3] > 0]
+    writes = [op for op in OPERATIONS if op[2] == "write" and op[3] > 0]
+    plan = []
+    for _ in range(count):
+        pool = writes if rng.random() < write_share else reads
+        plan.append(rng.choices(pool, weights=[op[3] for op in pool])[0])
+    return plan
+
+
+def run_profile(client, workload, plan, concurrency):
+    latencies, errors = {}, []
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(lambda op: execute(client, workload, op, latencies, errors), plan))
+    wall = time.perf_counter() - start
+    all_samples = [s for samples in latencies.values() for s in samples]
+    return {
+        "requests": len(all_samples),
+        "errors": len(errors),
+        "error_samples": errors[:10],
+        "wall_s": round(wall, 3),
+        "throughput_rps": round(len(all_samples) / wall, 2) if wall else None,
+        "latency_ms": percentiles(all_samples),
+        "endpoints": {name: dict(count=len(s), **percentiles(s)) for name, s in sorted(latencies.items())},
+        "peak_rss_kb": peak_rss_kb(),
+    }
+
+
+def uncovered_routes(app):
+    covered = {op[1] for op in OPERATIONS}
+    routes = set()
+    for route in app.routes:
+        path = getattr(route, "path", None)
+        if path and getattr(route, "methods", None) and not path.startswith(("/docs", "/redoc", "/openapi")):
+            routes.add(path)
+    return sorted(routes - covered)
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline, tolerance):
+    """Return a list of p95 regressions against a baseline result file."""
+    regressions = []
+    for profile, current in results["profiles"].items():
+        previous = baseline.get("profiles", {}).get(profile)
+        if not previous:
+            continue
+        pairs = [("overall", previous["latency_ms"], current["latency_ms"])]
+        # Endpoints with only a handful of samples are too noisy to compare
+        pairs += [(name, previous["endpoints"][name], stats) for name, stats in current["endpoints"].items()
+                  if name in previous["endpoints"] and min(stats["count"], previous["endpoints"][name]["count"])
+                  >= MIN_COMPARE_SAMPLES]
+        for name, before, after in pairs:
+            if before.get("p95") and after.get("p95") and after["p95"] > before["p95"] * (1 + tolerance):
+                regressions.append({"profile": profile, "endpoint": name,
+                                    "p95_before": before["p95"], "p95_after": after["p95"]})
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    datagen.add_arguments(parser)
+    parser.add_argument("--profiles", nargs="+", default=list(PROFILES), choices=list(PROFILES))
+    parser.add_argument("--requests", type=int, default=500, help="Requests per profile")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--output", type=Path, default=None, help="Write results JSON here (default: stdout)")
+    parser.add_argument("--baseline", type=Path, default=None, help="Previous results JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed p95 growth vs baseline")
+    parser.add_argument("--packed", action="store_true",
+                        help="Store per-base documents as a template plus overlays (overlay.py pack)")
+    args = parser.parse_args()
+    scale = datagen.scale_from_args(args)
+
+    workdir = Path(tempfile.mkdtemp(prefix="hse-bench-"))
+    os.environ["DATA_DIR"] = str(workdir / "data")
+    os.environ["DATABASE_URL"] = f"sqlite:///{workdir / 'bench.db'}"
+    os.environ["BREVO_API_KEY"] = ""
+    try:
+        bases = datagen.generate_data_dir(workdir / "data", scale)
+        if args.packed:
+            import overlay
+            overlay.pack(workdir / "data")
+        datagen.generate_programs(os.environ["DATABASE_URL"], scale)
+
+        from fastapi.testclient import TestClient
+        import app as hse_app
+
+        results = {
+            "meta": {
+                "git": git_revision(),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "scale": asdict(scale),
+                "requests_per_profile": args.requests,
+                "concurrency": args.concurrency,
+                "packed": args.packed,
+            },
+            "uncovered_routes": uncovered_routes(hse_app.app),
+            "profiles": {},
+        }
+        with TestClient(hse_app.app) as client:
+            rng = random.Random(scale.seed)
+            workload = Workload(rng, scale, bases)
+            # Touch every endpoint once so cold paths are exercised too
+            results["profiles"]["smoke"] = run_profile(client, workload, list(OPERATIONS), 1)
+            for profile in args.profiles:
+                plan = plan_requests(rng, PROFILES[profile], args.requests)
+                results["profiles"][profile] = run_profile(client, workload, plan, args.concurrency)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    exit_code = 0
+    if args.baseline:
+        with open(args.baseline) as f:
+            results["regressions"] = compare(results, json.load(f), args.tolerance)
+        exit_code = 1 if results["regressions"] else 0
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        args.output.write_text(output)
+        for profile, stats in results["profiles"].items():
+            print(f"{profile:<6} {stats['requests']:>5} req  {stats['throughput_rps']:>8} req/s  "
+                  f"p50 {stats['latency_ms']['p50']} ms  p95 {stats['latency_ms']['p95']} ms  "
+                  f"p99 {stats['latency_ms']['p99']} ms  errors {stats['errors']}")
+        if results.get("regressions"):
+            print(f"{len(results['regressions'])} p95 regressions vs {args.baseline}")
+    else:
+        print(output)
+    sys.exit(exit_code)
+
+
+if __name__ == "__main__":
+    main()
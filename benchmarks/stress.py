@@ -0,0 +1,220 @@
+"""Concurrency stress test for the OTP and Matrix write endpoints.
+
+Starts several worker processes against one shared synthetic data directory,
+the way multiple server workers would share it. Each process drives the app
+in-process from several threads. Every worker owns a disjoint set of
+(store, base, program, month) cells and writes them repeatedly with known
+patches, some with base=all (fanned out to every base file). All workers
+hit the same documents, so the per-document locks are fully contended.
+
+Afterwards the files are read back directly. The run checks that every cell
+holds its worker's final patch and that every file still parses. It then
+runs fsck over the data directory.
+
+    python benchmarks/stress.py --processes 4 --threads 8 --rounds 5
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+BACKEND_DIR = ROOT / "backend"
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+import datagen  # noqa: E402
+
+
+def build_cells(scale: datagen.Scale, bases: list, cells_per_store: int, rng: random.Random):
+    """Pick distinct cells to write; 'all' cells use program ids no per-base cell touches."""
+    stores = [("otp", None)] + [("matrix", c) for c in datagen.CATEGORIES[:scale.categories]]
+    cells = []
+    for kind, category in stores:
+        grid = [(p, m) for p in range(1, scale.programs + 1) for m in datagen.MONTHS]
+        rng.shuffle(grid)
+        all_programs = set(range(1, scale.programs + 1, 4))  # every 4th program is written via base=all
+        picked = 0
+        for program_id, month in grid:
+            if picked >= cells_per_store:
+                break
+            if program_id in all_programs:
+                base = "all"
+            else:
+                base = rng.choice(bases)
+            cells.append({"kind": kind, "category": category, "base": base, "program_id": program_id, "month": month})
+            picked += 1
+    # A base=all write touches the same (program, month) in every base, so
+    # drop duplicates by (kind, category, program, month) for those
+    unique, seen = [], set()
+    for cell in cells:
+        key = (cell["kind"], cell["category"], cell["program_id"], cell["month"],
+               None if cell["base"] == "all" else cell["base"])
+        all_key = key[:4] + (None,)
+        if key in seen or (cell["base"] != "all" and all_key in seen):
+            continue
+        seen.add(key)
+        unique.append(cell)
+    return unique
+
+
+def patch_for(run_id: str, worker: int, round_no: int):
+    return {"plan": round_no + 1, "actual": round_no, "wpts_id": f"{run_id}-w{worker}-r{round_no}",
+            "pic_email": f"stress{worker}@example.com"}
+
+
+def url_for(cell):
+    if cell["kind"] == "otp":
+        return f"/otp/{cell['program_id']}/month/{cell['month']}?base={cell['base']}"
+    return (f"/matrix/{cell['program_id']}/month/{cell['month']}"
+            f"?category={cell['category']}&region=indonesia&base={cell['base']}")
+
+
+def worker_process(process_no: int, threads: int, assignments: dict, rounds: int, run_id: str, data_dir: str):
+    """Run one process's workers; return (requests, failures, latencies)."""
+    os.environ["DATA_DIR"] = data_dir
+    os.environ["DATABASE_URL"] = f"sqlite:///{Path(data_dir).parent / 'stress.db'}"
+    os.environ["BREVO_API_KEY"] = ""
+    sys.path.insert(0, str(BACKEND_DIR))
+    from fastapi.testclient import TestClient
+    import app as hse_app
+
+    client = TestClient(hse_app.app)
+
+    def run_worker(worker):
+        failures, latencies = [], []
+        for round_no in range(rounds):
+            for cell in assignments[worker]:
+                start = time.perf_counter()
+                response = client.put(url_for(cell), json=patch_for(run_id, worker, round_no))
+                latencies.append(time.perf_counter() - start)
+                if response.status_code != 200:
+                    failures.append(f"{url_for(cell)} -> {response.status_code} {response.text[:200]}")
+        return failures, latencies
+
+    workers = [w for w in assignments if w % 1000 == process_no]
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        results = list(pool.map(run_worker, workers))
+    failures = [f for fs, _ in results for f in fs]
+    latencies = [l for _, ls in results for l in ls]
+    return len(latencies), failures, latencies
+
+
+def verify(data_dir: Path, cells_by_worker: dict, rounds: int, run_id: str, bases: list):
+    """Return (checked, lost, corrupt) after reading every document back from disk."""
+    cache, corrupt = {}, []
+
+    def load(name):
+        if name not in cache:
+            try:
+                with open(data_dir / name) as f:
+                    cache[name] = json.load(f)
+            except ValueError as e:
+                corrupt.append(f"{name}: {e}")
+                cache[name] = {"programs": []}
+        return cache[name]
+
+    checked, lost = 0, []
+    for worker, cells in cells_by_worker.items():
+        expected = patch_for(run_id, worker, rounds - 1)
+        for cell in cells:
+            targets = bases if cell["base"] == "all" else [cell["base"]]
+            for base in targets:
+                if cell["kind"] == "otp":
+                    name = f"otp_indonesia_{base}.json"
+                else:
+                    name = f"matrix_{cell['category']}_indonesia_{base}.json"
+                programs = {p["id"]: p for p in load(name).get("programs", [])}
+                actual = programs.get(cell["program_id"], {}).get("months", {}).get(cell["month"], {})
+                checked += 1
+                if any(actual.get(k) != v for k, v in expected.items()):
+                    lost.append({"file": name, "program_id": cell["program_id"], "month": cell["month"],
+                                 "expected": expected["wpts_id"], "found": actual.get("wpts_id")})
+    return checked, lost, corrupt
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stress the OTP/Matrix write endpoints and verify no update is lost.")
+    datagen.add_arguments(parser)
+    parser.add_argument("--processes", type=int, default=4)
+    parser.add_argument("--threads", type=int, default=8, help="Worker threads per process")
+    parser.add_argument("--rounds", type=int, default=3, help="Times each worker rewrites each of its cells")
+    parser.add_argument("--cells", type=int, default=48, help="Cells written per store (OTP + each Matrix category)")
+    parser.add_argument("--output", type=Path, default=None, help="Write the JSON report here")
+    parser.add_argument("--keep", action="store_true", help="Keep the data directory for inspection")
+    args = parser.parse_args()
+    scale = datagen.scale_from_args(args)
+
+    workdir = Path(tempfile.mkdtemp(prefix="hse-stress-"))
+    data_dir = workdir / "data"
+    bases = datagen.generate_data_dir(data_dir, scale)
+    rng = random.Random(scale.seed)
+    run_id = f"stress{scale.seed}"
+
+    # Worker ids encode their process (worker % 1000 == process) so
+    # each process can pick its own workers out of the shared assignment
+    cells = build_cells(scale, bases, args.cells, rng)
+    worker_ids = [t * 1000 + p for p in range(args.processes) for t in range(args.threads)]
+    cells_by_worker = {w: [] for w in worker_ids}
+    for index, cell in enumerate(cells):
+        cells_by_worker[worker_ids[index % len(worker_ids)]].append(cell)
+
+    start = time.perf_counter()
+    ctx = multiprocessing.get_context("spawn")
+    with ctx.Pool(args.processes) as pool:
+        results = pool.starmap(worker_process, [
+            (p, args.threads, cells_by_worker, args.rounds, run_id, str(data_dir)) for p in range(args.processes)])
+    wall = time.perf_counter() - start
+
+    requests_sent = sum(r[0] for r in results)
+    failures = [f for r in results for f in r[1]]
+    latencies = sorted(l for r in results for l in r[2])
+    checked, lost, corrupt = verify(data_dir, cells_by_worker, args.rounds, run_id, bases)
+
+    sys.path.insert(0, str(BACKEND_DIR))
+    import fsck
+    fsck_report = fsck.check(data_dir)
+
+    def pct(p):
+        return round(latencies[min(len(latencies) - 1, int(p / 100 * (len(latencies) - 1)))] * 1000, 3) if latencies else None
+
+    report = {
+        "processes": args.processes,
+        "threads": args.threads,
+        "rounds": args.rounds,
+        "cells": len(cells),
+        "requests": requests_sent,
+        "failed_requests": len(failures),
+        "failure_samples": failures[:10],
+        "wall_s": round(wall, 3),
+        "throughput_rps": round(requests_sent / wall, 2) if wall else None,
+        "latency_ms": {"p50": pct(50), "p95": pct(95), "p99": pct(99)},
+        "cells_checked": checked,
+        "lost_updates": len(lost),
+        "lost_samples": lost[:10],
+        "corrupt_files": corrupt,
+        "fsck": {"errors": fsck_report.count("error"), "warnings": fsck_report.count("warning"),
+                 "drift": fsck_report.count("drift"),
+                 "issues": [i for i in fsck_report.issues if i["level"] != "drift"][:10]},
+    }
+    if args.keep:
+        report["data_dir"] = str(data_dir)
+    else:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        args.output.write_text(output)
+    print(output)
+    ok = not failures and not lost and not corrupt and not report["fsck"]["errors"]
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()